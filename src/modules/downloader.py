@@ -5,9 +5,6 @@
 import os
 import time
 import asyncio
-import threading
-import queue
-import concurrent.futures
 import random
 from datetime import datetime
 from pathlib import Path
@@ -21,11 +18,26 @@ from src.utils.ui_config_manager import UIConfigManager
 from src.utils.config_utils import convert_ui_config_to_dict
 from src.utils.channel_resolver import ChannelResolver
 from src.utils.database_manager import DatabaseManager
+from src.utils.history_interval_store import ids_to_runs
+from src.utils.id_bitmap import MessageIdBitmap
+from src.utils.message_metadata_store import MessageMetadata, extract_message_metadata, deleted_metadata
+from src.utils.concurrency_controller import AdaptiveConcurrencyController
+from src.utils.client_pool import lease_client
+from src.utils.file_utils import link_or_copy_file
+from src.utils.progress_bus import ProgressAggregator, TransferProgress
+from src.utils.download_scheduler import SizeAwareScheduler, ORDER_OLDEST_FIRST, timeout_for_size
+from src.utils.stream_download import (
+    stream_media_to_file, parallel_stream_media_to_file, get_file_unique_id, cleanup_stale_partials,
+    DEFAULT_PARTIAL_RETENTION_DAYS, DEFAULT_PARALLEL_PARTS, DEFAULT_PARALLEL_THRESHOLD
+)
 from src.utils.logger import get_logger
 
 # 仅用于内部调试，不再用于UI输出
 logger = get_logger()
 
+# 单次get_messages请求的最大消息数（Telegram API上限）
+GET_MESSAGES_BATCH_SIZE = 200
+
 class Downloader():
     """
     下载模块，负责下载历史消息的媒体文件
@@ -49,6 +61,8 @@ class Downloader():
         self.ui_config_manager = ui_config_manager
         self.channel_resolver = channel_resolver
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.app = app  # 保存应用程序实例引用
         
         # 获取UI配置并转换为字典
@@ -63,24 +77,39 @@ class Downloader():
         self.download_path = Path(self.download_config.get('download_path', 'downloads'))
         self.download_path.mkdir(exist_ok=True)
         
-        # 创建下载队列和线程
-        self.download_queue = queue.Queue(maxsize=200)  # 增大队列容量
         self.is_running = False
-        self.file_writer_thread = None
-        self.writer_threads = []
-        
-        # 创建文件写入线程池
-        self.writer_pool_size = min(32, os.cpu_count() * 2)  # 写入线程池大小：CPU核心数的2倍，最大32
         
         # 设置并行下载数量
         self.max_concurrent_downloads = self.download_config.get('max_concurrent_downloads', 10)
+        self.min_concurrent_downloads = self.download_config.get('min_concurrent_downloads', 1)
         self.active_downloads = 0  # 当前活跃下载数
-        self.download_semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+        # 自适应并发控制器，在[min_concurrent_downloads, max_concurrent_downloads]范围内调整并发数和请求间隔
+        self.concurrency_controller = self._create_concurrency_controller()
+        # 超过阈值的大文件分成多个区间并行下载
+        self.parallel_range_parts = self.download_config.get('parallel_range_parts', DEFAULT_PARALLEL_PARTS)
+        self.parallel_range_threshold = self.download_config.get(
+            'parallel_range_threshold_mb', DEFAULT_PARALLEL_THRESHOLD // (1024 * 1024)
+        ) * 1024 * 1024
+        
+        # 下载排序策略和当前下载轮次的分道调度器
+        self.download_order = self.download_config.get('download_order', ORDER_OLDEST_FIRST)
+        self.download_scheduler: Optional[SizeAwareScheduler] = None
+        
+        # 同一媒体（相同file_unique_id）已下载过时复用本地文件而不重新下载
+        self.reuse_downloaded_files = self.download_config.get('reuse_downloaded_files', True)
+        
+        # 本地消息元数据的有效天数，有效期内的记录可以直接用于过滤，0表示不使用本地记录
+        self.metadata_max_age_days = self.general_config.get('message_metadata_max_age_days', 7)
+        
+        # 进度聚合器：合并流式下载的数据块级进度，以固定频率发布
+        self.progress_aggregator = ProgressAggregator(self._publish_progress, label="下载")
         
         # 统计信息
         self.download_start_time = None
         self.download_count = 0
         self.total_downloaded_bytes = 0
+        self.reused_count = 0
+        self.reused_bytes = 0
         
         # FloodWait处理
         self.flood_wait_lock = asyncio.Lock()
@@ -96,6 +125,54 @@ class Downloader():
         # 任务控制
         self.is_cancelled = False
         self.is_paused = False
+        
+        # 最近一次消息获取的结果：已删除和获取失败的消息ID区间
+        self.message_fetch_report = {}
+    
+    def _create_concurrency_controller(self) -> AdaptiveConcurrencyController:
+        """
+        按当前配置创建自适应并发控制器
+        
+        Returns:
+            AdaptiveConcurrencyController: 并发控制器实例
+        """
+        return AdaptiveConcurrencyController(
+            min_limit=self.min_concurrent_downloads,
+            max_limit=self.max_concurrent_downloads,
+            on_change=self._on_concurrency_changed
+        )
+    
+    def _on_concurrency_changed(self, state: Dict[str, Any]):
+        """
+        并发状态变化时通知UI
+        
+        Args:
+            state: 并发控制器状态
+        """
+        # 并发数变化后调度器的通道名额随之变化
+        if getattr(self, 'download_scheduler', None):
+            self.download_scheduler.notify_capacity_changed()
+        if hasattr(self, 'emit'):
+            self.emit("concurrency", state)
+    
+    def _publish_progress(self, transfers: List[TransferProgress]):
+        """
+        发布进度聚合器合并后的各文件下载进度
+        
+        Args:
+            transfers: 有变化的传输进度快照
+        """
+        if hasattr(self, 'emit'):
+            self.emit("transfer_progress", transfers)
+    
+    def get_concurrency_state(self) -> Dict[str, Any]:
+        """
+        获取自适应并发控制器的当前状态
+        
+        Returns:
+            Dict[str, Any]: 并发上下限、当前并发数、活跃数、请求间隔、吞吐量等
+        """
+        return self.concurrency_controller.snapshot()
     
     def _setting_has_keywords(self, setting: Dict[str, Any]) -> bool:
         """
@@ -133,7 +210,9 @@ class Downloader():
             
             # 更新并行下载数量
             self.max_concurrent_downloads = self.download_config.get('max_concurrent_downloads', 10)
-            self.download_semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+            self.min_concurrent_downloads = self.download_config.get('min_concurrent_downloads', 1)
+            self.concurrency_controller = self._create_concurrency_controller()
+            self.metadata_max_age_days = self.general_config.get('message_metadata_max_age_days', 7)
             
             logger.info(f"配置已更新，下载设置数: {len(self.download_config.get('downloadSetting', []))}")
         except Exception as e:
@@ -148,13 +227,15 @@ class Downloader():
         status_message = f"开始从频道下载媒体文件（并行下载模式）"
         logger.info(status_message)
         
-        info_message = f"最大并行下载数: {self.max_concurrent_downloads}, 写入线程数: {self.writer_pool_size}"
+        info_message = f"最大并行下载数: {self.max_concurrent_downloads}"
         logger.info(info_message)
         
         # 重置统计信息
         self.download_start_time = time.time()
         self.download_count = 0
         self.total_downloaded_bytes = 0
+        self.reused_count = 0
+        self.reused_bytes = 0
         
         # 重置FloodWait计数器
         self.flood_wait_count = 0
@@ -168,11 +249,10 @@ class Downloader():
         workers = []
         
         try:
-            # 启动文件写入线程
+            # 清理长时间未继续的未完成下载，其余的保留用于断点续传
+            await self._cleanup_stale_partials()
+            
             self.is_running = True
-            self.file_writer_thread = threading.Thread(target=self._file_writer_worker)
-            self.file_writer_thread.daemon = True
-            self.file_writer_thread.start()
             
             # 获取下载设置列表
             download_settings = self.download_config.get('downloadSetting', [])
@@ -183,8 +263,24 @@ class Downloader():
                 
             logger.info(f"配置的下载设置数量: {len(download_settings)}")
             
-            # 创建所有下载任务的集合
-            all_download_tasks = []
+            # 创建分道调度器：扫描与下载流水线并行，扫描最多领先下载工作者scan_ahead条消息，
+            # 排序策略在这些已扫描的消息范围内生效
+            scan_ahead = max(self.max_concurrent_downloads * 4, 100)
+            work_queue = SizeAwareScheduler(
+                capacity=lambda: self.concurrency_controller.limit,
+                maxsize=scan_ahead,
+                policy=self.download_order
+            )
+            self.download_scheduler = work_queue
+            
+            # 先创建工作协程，扫描出第一批消息后即可开始下载
+            num_workers = self.max_concurrent_downloads
+            for i in range(num_workers):
+                worker = asyncio.create_task(self._download_worker(i, work_queue))
+                workers.append(worker)
+            
+            # 扫描计数：已放入队列的消息数
+            total_messages = 0
             
             # 遍历每个下载设置
             for setting in download_settings:
@@ -205,32 +301,19 @@ class Downloader():
                 
                 logger.info(f"准备从频道 {source_channel} 下载媒体文件")
                 
-                await self._process_channel_for_download(source_channel, start_id, end_id, media_types, keywords, all_download_tasks)
+                total_messages += await self._process_channel_for_download(source_channel, start_id, end_id, media_types, keywords, work_queue)
             
-            # 使用批量处理的方式并行下载
-            total_messages = len(all_download_tasks)
-            if total_messages == 0:
-                logger.info("没有符合条件的消息需要下载")
+            if self.is_cancelled:
+                logger.info("下载任务已取消")
                 return
             
-            logger.info(f"开始下载 {total_messages} 条消息中的媒体文件")
-            
-            # 创建下载工作者协程
-            num_workers = min(self.max_concurrent_downloads, total_messages)
-            downloads_per_worker = total_messages // num_workers
-            
-            # 创建工作队列
-            work_queue = asyncio.Queue()
-            
-            # 将所有任务放入队列
-            for task in all_download_tasks:
-                await work_queue.put(task)
+            # 扫描完成，工作协程取完剩余任务后退出
+            work_queue.close()
             
-            # 创建工作协程
-            workers = []
-            for i in range(num_workers):
-                worker = asyncio.create_task(self._download_worker(i, work_queue))
-                workers.append(worker)
+            if total_messages == 0:
+                logger.info("没有符合条件的消息需要下载")
+            else:
+                logger.info(f"扫描完成，共 {total_messages} 条消息进入下载队列，等待下载完成")
                 
             # 等待所有工作协程完成
             try:
@@ -242,21 +325,15 @@ class Downloader():
                     if not worker.done():
                         worker.cancel()
             
-            # 等待队列中的所有文件写入完成
-            while not self.download_queue.empty():
-                logger.info(f"队列中还有 {self.download_queue.qsize()} 个文件等待写入")
-                await asyncio.sleep(1)
-                
-            # 停止文件写入线程
             self.is_running = False
-            if self.file_writer_thread:
-                self.file_writer_thread.join(timeout=60)
                 
             # 计算总体统计信息
             total_time = time.time() - self.download_start_time
             avg_speed_kb = self.total_downloaded_bytes / (total_time * 1024) if total_time > 0 else 0
             summary = f"下载完成 | 总文件: {self.download_count}个 | 总大小: {self.total_downloaded_bytes/1024/1024:.2f}MB | 总耗时: {total_time:.2f}秒 | 平均速度: {avg_speed_kb:.2f}KB/s"
             logger.info(summary)
+            if self.reused_count:
+                logger.info(f"复用已下载文件: {self.reused_count}个 | 节省流量: {self.reused_bytes/1024/1024:.2f}MB")
             logger.info("所有频道的媒体文件下载完成")
             
         except Exception as e:
@@ -283,25 +360,47 @@ class Downloader():
                 except Exception as e:
                     logger.error(f"等待工作协程取消时出错: {e}")
             
-            # 清空下载队列
-            try:
-                while not self.download_queue.empty():
-                    try:
-                        self.download_queue.get_nowait()
-                    except:
-                        pass
-            except Exception as e:
-                logger.error(f"清空下载队列时出错: {e}")
-                
             logger.info("下载任务已完全清理")
     
-    async def _download_worker(self, worker_id: int, queue: asyncio.Queue):
+    async def _cleanup_stale_partials(self):
+        """
+        在线程池中清理下载目录下超过保留天数的未完成下载
+        """
+        retention_days = self.download_config.get('partial_retention_days', DEFAULT_PARTIAL_RETENTION_DAYS)
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, cleanup_stale_partials, str(self.download_path), retention_days)
+        except Exception as e:
+            logger.error(f"清理未完成下载时出错: {e}")
+    
+    async def _put_download_task(self, work_queue: SizeAwareScheduler, task) -> bool:
+        """
+        将下载任务按预估大小放入调度器，缓冲已满时等待工作协程取走任务，等待期间响应取消
+        
+        Args:
+            work_queue: 分道下载调度器
+            task: 下载任务 (message, save_path, channel_id, channel)
+            
+        Returns:
+            bool: 是否成功放入调度器，任务被取消时返回False
+        """
+        message = task[0]
+        size = self._estimate_media_size(message)
+        while not self.is_cancelled:
+            try:
+                await asyncio.wait_for(work_queue.put(task, size, message.id), timeout=0.5)
+                return True
+            except asyncio.TimeoutError:
+                continue
+        return False
+    
+    async def _download_worker(self, worker_id: int, queue: SizeAwareScheduler):
         """
-        下载工作协程，从队列获取任务并下载
+        下载工作协程，从调度器获取任务并下载
         
         Args:
             worker_id: 工作协程ID
-            queue: 下载任务队列
+            queue: 分道下载调度器
         """
         worker_info = f"下载工作协程-{worker_id}"
         logger.info(f"{worker_info} 启动")
@@ -322,7 +421,11 @@ class Downloader():
             
             try:
                 # 获取下一个下载任务
-                task = await queue.get()
+                job = await queue.get()
+                if job is None:
+                    # 扫描已结束，调度器中不会再有新任务
+                    break
+                task, lane, estimated_size = job
                 message, save_path, channel_id, channel = task
                 
                 try:
@@ -335,25 +438,46 @@ class Downloader():
                     # 获取媒体组ID
                     group_id = str(message.media_group_id) if message.media_group_id else f"single_{message.id}"
                     
-                    async with self.download_semaphore:
-                        self.active_downloads += 1
-                        
-                        worker_status = f"{worker_info} 开始下载: {media_type} - {message.id}"
-                        logger.debug(worker_status)
-                        
-                        # 下载文件
-                        download_start_time = time.time()
-                        estimated_size = self._estimate_media_size(message)
-                        
+                    # 同一媒体已下载过时直接复用本地文件，不占用下载名额
+                    if await self._reuse_downloaded_media(message, media_type, str(save_path)):
+                        await self.async_history_manager.add_download_record(channel, message.id, channel_id)
+                        continue
+                    
+                    # 按自适应并发控制器的当前并发数获取下载名额；触发FloodWait时先释放名额再等待，之后重新获取名额续传
+                    while True:
+                        flood_wait = None
+                        await self.concurrency_controller.acquire()
+                        transferred_bytes = 0
+                        acquired_time = time.time()
                         try:
-                            # 设置超时机制
-                            download_timeout = 90  # 90秒超时
+                            self.active_downloads += 1
+                            
+                            worker_status = f"{worker_info} 开始下载: {media_type} - {message.id}"
+                            logger.debug(worker_status)
+                            
+                            # 下载文件
+                            download_start_time = time.time()
+                            
+                            # 按预估大小设置超时，大小未知时使用默认值
+                            download_timeout = timeout_for_size(estimated_size)
+                            # 超时后已下载部分保留在 .part 文件中，从断点继续的最大次数
+                            max_timeout_resumes = 3
                             try:
                                 # 使用超时控制下载文件操作
-                                file_path = await asyncio.wait_for(
-                                    self._download_media_file(message, str(save_path), worker_id),
-                                    timeout=download_timeout
-                                )
+                                timeout_resumes = 0
+                                while True:
+                                    try:
+                                        file_path = await asyncio.wait_for(
+                                            self._download_media_file(message, str(save_path), worker_id),
+                                            timeout=download_timeout
+                                        )
+                                        break
+                                    except asyncio.TimeoutError:
+                                        if timeout_resumes >= max_timeout_resumes or self.is_cancelled:
+                                            raise
+                                        timeout_resumes += 1
+                                        self.concurrency_controller.record_timeout()
+                                        logger.warning(f"{worker_info} 下载超时: message_id={message.id}，从断点续传 ({timeout_resumes}/{max_timeout_resumes})")
                                 
                                 if file_path:
                                     # 计算下载耗时和速度
@@ -364,23 +488,31 @@ class Downloader():
                                     log_msg = f"{worker_info} 下载完成: {file_path} | 大小: {file_size/1024:.2f}KB | 耗时: {download_time:.2f}秒 | 速度: {speed_kb:.2f}KB/s"
                                     logger.debug(log_msg)
                                     
+                                    transferred_bytes = file_size
+                                    
                                     # 更新下载历史
-                                    self.history_manager.add_download_record(channel, message.id, channel_id)
+                                    await self.async_history_manager.add_download_record(channel, message.id, channel_id)
                                 else:
                                     logger.warning(f"{worker_info} 下载失败或无需下载: message_id={message.id}")
                                     
                             except asyncio.TimeoutError:
-                                logger.error(f"{worker_info} 下载超时: message_id={message.id}，超过{download_timeout}秒")
+                                logger.error(f"{worker_info} 下载超时: message_id={message.id}，超过{download_timeout:.0f}秒")
+                                self.concurrency_controller.record_timeout()
+                            except FloodWait as e:
+                                flood_wait = e
                             except Exception as e:
                                 logger.error(f"{worker_info} 下载出错: {e}")
-                            
-                        except FloodWait as e:
-                            logger.warning(f"触发FloodWait，等待 {e.x} 秒")
-                            await self._handle_flood_wait(e.x)
-                            continue
-                            
+                            finally:
+                                self.active_downloads -= 1
                         finally:
-                            self.active_downloads -= 1
+                            # 上报本次下载的字节数和耗时，供控制器计算吞吐量
+                            self.concurrency_controller.release(transferred_bytes, time.time() - acquired_time, transferred_bytes > 0)
+                        
+                        if flood_wait is None or self.is_cancelled:
+                            break
+                        # 等待期间不占用名额，也不计入下载超时
+                        logger.warning(f"{worker_info} 触发FloodWait，等待 {flood_wait.x} 秒后续传: message_id={message.id}")
+                        await self._handle_flood_wait(flood_wait.x, message.id)
                             
                 except Exception as e:
                     logger.error(f"{worker_info} 处理消息时出错: {e}")
@@ -388,7 +520,7 @@ class Downloader():
                 finally:
                     # 只有在成功获取任务后才标记任务完成
                     if task is not None:
-                        queue.task_done()
+                        queue.task_done(lane)
                     
             except asyncio.CancelledError:
                 # 协程被取消
@@ -401,208 +533,52 @@ class Downloader():
                 
         logger.info(f"{worker_info} 退出")
 
-    def _file_writer_worker(self):
-        """
-        文件写入线程，从队列中取出内存中的媒体数据并写入文件
+    async def _get_messages_batch(self, chat_id: Union[str, int], message_ids: List[int]) -> Optional[list]:
         """
-        logger.info("文件写入线程启动")
-        
-        # 创建写入线程池
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.writer_pool_size) as executor:
-            futures = []
-            
-            while self.is_running or not self.download_queue.empty():
-                try:
-                    # 非阻塞模式从队列获取数据，超时时间0.5秒
-                    try:
-                        item = self.download_queue.get(timeout=0.5)
-                    except queue.Empty:
-                        continue
-                    
-                    # 解包队列项
-                    file_path, data, message_id, channel_id, media_type = item
-                    
-                    # 提交写入任务到线程池
-                    future = executor.submit(
-                        self._write_file, file_path, data, message_id, channel_id, media_type
-                    )
-                    futures.append(future)
-                    
-                    # 移除已完成的future
-                    futures = [f for f in futures if not f.done()]
-                    
-                except Exception as e:
-                    logger.error(f"文件写入线程处理队列项时出错: {e}", error_type="FILE_WRITER", recoverable=True)
-            
-            # 等待所有未完成的任务
-            logger.info(f"等待 {len(futures)} 个文件写入任务完成...")
-            concurrent.futures.wait(futures)
-        
-        logger.info("文件写入线程退出")
-    
-    def _write_file(self, file_path, data, message_id, channel_id, media_type):
-        """
-        将数据写入文件
+        批量获取指定ID的消息，FloodWait按全局机制等待后重试，其他错误指数退避重试
         
         Args:
-            file_path: 文件路径
-            data: 文件数据
-            message_id: 消息ID
-            channel_id: 频道ID
-            media_type: 媒体类型
-        """
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # 写入临时文件
-            temp_path = f"{file_path}.tmp"
-            with open(temp_path, 'wb') as f:
-                # 检查media_data类型，处理BytesIO对象
-                if hasattr(data, 'getvalue'):
-                    # 如果是BytesIO或类似IO对象，获取其值
-                    f.write(data.getvalue())
-                    logger.debug(f"处理BytesIO对象并写入文件 {temp_path}")
-                else:
-                    # 如果已经是bytes对象，直接写入
-                    f.write(data)
-                    logger.debug(f"直接写入bytes数据到文件 {temp_path}")
-                
-            # 重命名为最终文件名
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            os.rename(temp_path, file_path)
-            
-            # 增加下载计数和总字节数
-            file_size = len(data)
-            self.download_count += 1
-            self.total_downloaded_bytes += file_size
-            
-            logger.debug(f"文件写入成功: {file_path} (大小: {file_size/1024:.2f}KB)")
-            
-            # 更新下载历史
-            self.history_manager.add_download_record(channel_id, message_id, channel_id)
-            
-            # 触发下载完成事件
-            file_name = os.path.basename(file_path)
-            self.emit("download_complete", message_id, file_name, file_size)
-            
-        except Exception as e:
-            logger.error(f"写入文件失败: {file_path} - {e}", error_type="FILE_WRITE", recoverable=True, file_path=file_path)
-
-    async def _download_message_media_to_memory(self, message: Message, download_path: Path, chat_id: int, channel: str) -> bool:
-        """
-        下载消息媒体到内存
+            chat_id: 频道ID
+            message_ids: 消息ID列表，数量不超过GET_MESSAGES_BATCH_SIZE
         
-        Args:
-            message: 消息对象
-            download_path: 下载目录路径
-            chat_id: 聊天ID
-            channel: 频道名称
-            
         Returns:
-            bool: 是否成功下载
+            Optional[list]: 消息列表（不存在的消息为空消息），多次重试仍失败时返回None
         """
-        # 检查是否已取消
-        if self.is_cancelled:
-            return False
-            
-        # 等待暂停恢复
-        if self.is_paused:
-            await asyncio.sleep(0.5)
+        max_retries = 3
+        retry_count = 0
         
-        try:
-            # 检查消息类型
-            media_type = self._get_media_type(message)
-            if not media_type:
-                return False
-                
-            # 检查是否已经下载过该消息
-            if self.history_manager.is_downloaded(chat_id, message.id):
-                logger.debug(f"消息已下载过: {channel} {message.id}")
-                return False
-                
-            # 获取媒体文件名
-            file_name = self._get_media_file_name(message, media_type)
-            if not file_name:
-                return False
-                
-            # 构建媒体组目录路径
-            media_group_id = getattr(message, 'media_group_id', None)
-            if media_group_id:
-                # 确保media_group_id是安全的文件夹名
-                safe_group_id = self._get_safe_filename(str(media_group_id))
-                media_path = download_path / safe_group_id
-            else:
-                # 单条消息使用message_id作为目录
-                media_path = download_path / f"single_{message.id}"
-                
-            # 创建消息文本文件
-            caption = message.caption or message.text or ""
-            if caption:
-                # 确保目录存在
-                media_path.mkdir(exist_ok=True, parents=True)
-                # 保存消息文本为title.txt
-                try:
-                    with open(media_path / "title.txt", "w", encoding="utf-8") as f:
-                        f.write(caption)
-                except Exception as e:
-                    logger.error(f"保存消息文本失败: {e}")
-            
-            # 构建完整的文件路径
-            file_path = media_path / file_name
-            
-            # 尝试下载媒体
-            start_time = time.time()
-            
+        while not self.is_cancelled:
             try:
-                # 从消息下载媒体文件
-                download_result = await self._download_media_to_memory(message, media_type)
-                if not download_result:
-                    logger.warning(f"下载失败: {channel} {message.id} - {file_name}")
-                    return False
-                
-                media_data, file_id = download_result
-                
-                # 计算下载耗时
-                download_time = time.time() - start_time
-                file_size = len(media_data) if media_data else 0
-                
-                # 验证文件大小
-                if not media_data or file_size == 0:
-                    logger.warning(f"下载的媒体文件大小为0: {channel} {message.id} - {file_name}")
-                    return False
-                
-                # 放入文件写入队列
-                self.download_queue.put((str(file_path), media_data, message.id, chat_id, media_type))
-                
-                # 计算下载速度
-                speed = file_size / (download_time * 1024) if download_time > 0 else 0  # KB/s
-                logger.debug(f"下载成功: {file_name} | 大小: {file_size/1024:.2f}KB | 耗时: {download_time:.2f}秒 | 速度: {speed:.2f}KB/s")
-                
-                return True
-                
+                messages = await self.client.get_messages(chat_id, message_ids)
+                # 只请求一个ID时返回的是单个消息
+                return messages if isinstance(messages, list) else [messages]
             except FloodWait as e:
-                logger.warning(f"触发FloodWait，等待 {e.x} 秒")
+                logger.warning(f"批量获取消息时遇到FloodWait, IDs={message_ids[0]}-{message_ids[-1]}")
                 await self._handle_flood_wait(e.x)
-                return False
-                
             except Exception as e:
-                logger.error(f"下载媒体文件时出错: {e}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"处理媒体消息时出错: {e}")
-            return False
-
-    async def _iter_messages(self, chat_id: Union[str, int], start_id: int = 0, end_id: int = 0):
+                if "PEER_ID_INVALID" in str(e) or retry_count >= max_retries:
+                    raise
+                retry_count += 1
+                wait_time = 2 ** retry_count
+                logger.warning(f"批量获取消息失败: {e}，第 {retry_count}/{max_retries} 次重试，等待 {wait_time}秒")
+                await asyncio.sleep(wait_time)
+        return None
+    
+    async def _iter_messages(self, chat_id: Union[str, int], start_id: int = 0, end_id: int = 0,
+                             skip_known: Optional[Callable[[Dict[int, MessageMetadata]], Set[int]]] = None):
         """
         迭代获取频道消息，按从旧到新的顺序返回
         
+        按ID区间分批调用get_messages，每批完成后立即按ID顺序返回该批消息，
+        不存在或已删除的消息ID以及获取失败的消息ID记录在message_fetch_report中。
+        获取到的消息同时记录到本地消息元数据存储，指定skip_known时，每批先查询本地元数据，
+        由skip_known判断哪些消息不需要再获取，只向服务器请求其余的消息
+        
         Args:
             chat_id: 频道ID
             start_id: 起始消息ID
             end_id: 结束消息ID
+            skip_known: 参数为本批（前后各多一个ID）有效期内的本地元数据，返回无需获取的消息ID集合
         
         Yields:
             Message: 消息对象，按照从旧到新的顺序
@@ -614,108 +590,111 @@ class Downloader():
         if actual_start_id is None or actual_end_id is None:
             logger.error(f"无法获取有效的消息ID范围: chat_id={chat_id}, start_id={start_id}, end_id={end_id}")
             return
-            
+        
         # 计算需要获取的消息数量
         total_messages = actual_end_id - actual_start_id + 1
         logger.info(f"开始获取消息: chat_id={chat_id}, 开始id={actual_start_id}, 结束id={actual_end_id}，共{total_messages}条消息")
         
+        # 不存在或已删除的消息ID，以及多次重试仍获取失败的消息ID
+        deleted_ids = MessageIdBitmap()
+        missing_ids = MessageIdBitmap()
+        fetched_count = 0
+        # 根据本地元数据跳过、没有向服务器请求的消息数
+        skipped_count = 0
+        
         try:
-            # 收集指定范围内的所有消息
-            all_messages = []
-            
-            # 优化策略：使用更高效的方式获取消息
-            # 1. 从较大的批次开始，逐步减小批次大小
-            # 2. 跟踪已尝试获取的消息ID，避免重复尝试
-            # 3. 设置最大尝试次数，防止无限循环
-            
-            # 创建要获取的消息ID列表，按从旧到新的顺序排序
-            message_ids_to_fetch = list(range(actual_start_id, actual_end_id + 1))
-            fetched_messages_map = {}  # 用于存储已获取的消息，键为消息ID
-            
-            # 每次批量获取的最大消息数量
-            max_batch_size = 100
-            
-            # 获取消息的最大尝试次数，避免无限循环
-            max_attempts = 5
-            attempt_count = 0
-            
-            while message_ids_to_fetch and attempt_count < max_attempts:
-                attempt_count += 1
+            for batch_start in range(actual_start_id, actual_end_id + 1, GET_MESSAGES_BATCH_SIZE):
+                if self.is_cancelled:
+                    return
                 
-                # 根据剩余消息数量确定当前批次大小
-                batch_size = min(max_batch_size, len(message_ids_to_fetch))
+                batch_ids = list(range(batch_start, min(batch_start + GET_MESSAGES_BATCH_SIZE - 1, actual_end_id) + 1))
+                if skip_known and self.metadata_max_age_days > 0:
+                    # 多查询前后各一个ID，便于判断位于批次边界的媒体组是否完整
+                    known = await self.async_history_manager.get_message_metadata(
+                        chat_id, batch_ids[0] - 1, batch_ids[-1] + 1, self.metadata_max_age_days
+                    )
+                    skip_ids = skip_known(known) if known else set()
+                    if skip_ids:
+                        fetch_ids = [message_id for message_id in batch_ids if message_id not in skip_ids]
+                        skipped_count += len(batch_ids) - len(fetch_ids)
+                        if not fetch_ids:
+                            logger.debug(f"消息批次 {batch_ids[0]}-{batch_ids[-1]} 已由本地元数据过滤，无需获取")
+                            continue
+                        batch_ids = fetch_ids
                 
-                # 计算当前批次的offset_id，以获取小于此ID的消息
-                # 由于Telegram API是获取"小于offset_id"的消息，需要加1
-                current_offset_id = max(message_ids_to_fetch) + 1
+                try:
+                    messages = await self._get_messages_batch(chat_id, batch_ids)
+                except Exception as e:
+                    if "PEER_ID_INVALID" in str(e):
+                        raise
+                    logger.error(f"获取消息批次失败: IDs={batch_ids[0]}-{batch_ids[-1]}, 错误: {e}")
+                    messages = None
                 
-                logger.info(f"尝试获取消息批次 (第{attempt_count}次): chat_id={chat_id}, offset_id={current_offset_id}, 剩余未获取消息数={len(message_ids_to_fetch)}")
+                if messages is None:
+                    missing_ids.add_range(batch_ids[0], batch_ids[-1])
+                    continue
                 
-                # 记录此批次成功获取的消息数
-                batch_success_count = 0
+                messages_by_id = {message.id: message for message in messages if message is not None}
+                batch_messages = []
+                metadata = []
+                for message_id in batch_ids:
+                    message = messages_by_id.get(message_id)
+                    if message is None:
+                        missing_ids.add(message_id)
+                    elif getattr(message, 'empty', False):
+                        deleted_ids.add(message_id)
+                        metadata.append(deleted_metadata(chat_id, message_id))
+                    else:
+                        batch_messages.append(message)
+                        metadata.append(extract_message_metadata(chat_id, message))
                 
-                try:
-                    # 获取一批消息
-                    async for message in self.client.get_chat_history(
-                        chat_id=chat_id,
-                        limit=batch_size,
-                        offset_id=current_offset_id
-                    ):
-                        # 检查消息ID是否在我们需要的范围内
-                        if message.id in message_ids_to_fetch:
-                            fetched_messages_map[message.id] = message
-                            message_ids_to_fetch.remove(message.id)
-                            batch_success_count += 1
-                        
-                        # 如果消息ID小于我们要获取的最小ID，可以停止这一批次的获取
-                        if message.id < min(message_ids_to_fetch, default=actual_start_id):
-                            logger.debug(f"消息ID {message.id} 小于当前需要获取的最小ID {min(message_ids_to_fetch, default=actual_start_id)}，停止当前批次获取")
-                            break
-                except FloodWait as e:
-                    # 使用全局FloodWait处理机制
-                    logger.warning(f"获取消息批次时遇到FloodWait, offset_id={current_offset_id}, limit={batch_size}")
-                    await self._handle_flood_wait(e.x)
-                    continue
+                # 先记录本批元数据，再逐条返回消息
+                if isinstance(chat_id, int):
+                    await self.async_history_manager.add_message_metadata(metadata)
                 
-                logger.info(f"已获取 {batch_success_count} 条消息，剩余 {len(message_ids_to_fetch)} 条消息待获取")
+                for message in batch_messages:
+                    fetched_count += 1
+                    yield message
                 
-                # 如果此批次没有获取到任何消息，说明可能有些消息不存在或已被删除
-                if batch_success_count == 0:
-                    # 检查是否需要缩小获取范围，尝试一条一条地获取
-                    if batch_size > 1:
-                        logger.info(f"未获取到任何消息，尝试减小批次大小")
-                        max_batch_size = max(1, max_batch_size // 2)
-                    else:
-                        # 如果已经是最小批次大小，且仍未获取到消息，记录并移除前一部分消息ID
-                        # 这些可能是不存在或已删除的消息
-                        if message_ids_to_fetch:
-                            ids_to_skip = message_ids_to_fetch[:min(10, len(message_ids_to_fetch))]
-                            logger.warning(f"无法获取以下消息ID，可能不存在或已被删除：{ids_to_skip}")
-                            for id_to_skip in ids_to_skip:
-                                message_ids_to_fetch.remove(id_to_skip)
+                logger.debug(f"已获取消息批次 {batch_ids[0]}-{batch_ids[-1]}，累计 {fetched_count}/{total_messages} 条")
                 
-                # 避免频繁请求，休眠一小段时间
-                await asyncio.sleep(0.5)
-            
-            # 检查是否还有未获取的消息
-            if message_ids_to_fetch:
-                logger.warning(f"以下消息ID无法获取，将被跳过：{message_ids_to_fetch}")
-            
-            # 将获取到的消息按ID升序排序（从旧到新）
-            all_messages = [fetched_messages_map[msg_id] for msg_id in sorted(fetched_messages_map.keys())]
-            logger.info(f"消息获取完成，共获取{len(all_messages)}/{total_messages}条消息，已按ID升序排序（从旧到新）")
-            
-            # 逐个返回排序后的消息
-            for message in all_messages:
-                yield message
+                # 批次之间使用自适应延迟，避免频繁请求
+                await asyncio.sleep(self.adaptive_delay)
         
-        except FloodWait as e:
-            # 使用全局FloodWait处理机制
-            await self._handle_flood_wait(e.x)
-        except Exception as e:
-            logger.error(f"获取消息失败: {e}")
-            logger.exception("详细错误信息")
+        finally:
+            self.message_fetch_report = {
+                'chat_id': chat_id,
+                'start_id': actual_start_id,
+                'end_id': actual_end_id,
+                'fetched': fetched_count,
+                'skipped': skipped_count,
+                'deleted': ids_to_runs(deleted_ids),
+                'missing': ids_to_runs(missing_ids)
+            }
+            if len(deleted_ids):
+                logger.info(f"以下消息ID不存在或已被删除，共{len(deleted_ids)}条：{self._format_id_runs(self.message_fetch_report['deleted'])}")
+            if len(missing_ids):
+                logger.warning(f"以下消息ID获取失败，已跳过，共{len(missing_ids)}条：{self._format_id_runs(self.message_fetch_report['missing'])}")
+            if skipped_count:
+                logger.info(f"根据本地消息元数据跳过{skipped_count}条无需获取的消息")
+            logger.info(f"消息获取完成，共获取{fetched_count}/{total_messages}条消息")
     
+    def _format_id_runs(self, runs: List[Tuple[int, int]], max_runs: int = 20) -> str:
+        """
+        将消息ID区间格式化为日志文本
+        
+        Args:
+            runs: 闭区间列表
+            max_runs: 最多输出的区间数
+        
+        Returns:
+            str: 形如 "1-5, 8, 10-12" 的文本
+        """
+        parts = [f"{start}-{end}" if start != end else str(start) for start, end in runs[:max_runs]]
+        if len(runs) > max_runs:
+            parts.append(f"...（共{len(runs)}段）")
+        return ", ".join(parts)
+
     def _sanitize_filename(self, filename: str) -> str:
         """
         清理文件名，移除非法字符
@@ -740,6 +719,9 @@ class Downloader():
             wait_time: 需要等待的秒数
             message_id: 触发FloodWait的消息ID，用于日志
         """
+        # 通知并发控制器减小并发数并加大请求间隔
+        self.concurrency_controller.record_flood_wait(wait_time)
+        
         async with self.flood_wait_lock:
             self.flood_wait_count += 1
             current_time = time.time()
@@ -790,9 +772,36 @@ class Downloader():
         
         return True  # 返回True表示FloodWait已处理完成 
 
-    async def _process_channel_for_download(self, channel, start_id, end_id, media_types, keywords, all_download_tasks):
+    def _match_keyword(self, text: str, keywords: List[str]) -> Optional[str]:
+        """
+        检查文本是否包含关键词
+        
+        Args:
+            text: 消息文本
+            keywords: 关键词列表，包含横杠的关键词表示同义关键词组
+        
+        Returns:
+            Optional[str]: 匹配的关键词（同义关键词组返回整个组），未匹配时返回None
+        """
+        lowered = text.lower()
+        for keyword in keywords:
+            # 检查是否是同义关键词组（包含横杠分隔符）
+            if "-" in keyword:
+                # 分割同义关键词，任一同义词匹配即视为匹配
+                synonym_keywords = [k.strip() for k in keyword.split("-") if k.strip()]
+                if any(syn_keyword.lower() in lowered for syn_keyword in synonym_keywords):
+                    return keyword
+            elif keyword.lower() in lowered:
+                # 普通关键词匹配
+                return keyword
+        return None
+    
+    async def _process_channel_for_download(self, channel, start_id, end_id, media_types, keywords, work_queue: SizeAwareScheduler) -> int:
         """
-        处理单个频道的下载过程
+        扫描单个频道的消息，将需要下载的消息按媒体组放入下载队列
+        
+        消息按ID顺序流式处理，同一媒体组的消息ID连续，遇到新的媒体组时即可确定上一个媒体组是否匹配关键词并入队；
+        队列已满时扫描会等待，不会领先下载工作者太多
         
         Args:
             channel: 频道标识符
@@ -800,20 +809,25 @@ class Downloader():
             end_id: 结束消息ID
             media_types: 媒体类型列表
             keywords: 关键词列表
-            all_download_tasks: 所有下载任务列表
+            work_queue: 分道下载调度器
+        
+        Returns:
+            int: 放入下载队列的消息数
         """
         if not channel:
             logger.warning("频道标识符为空，跳过")
-            return
-            
+            return 0
+        
+        queued_count = 0
+        
         try:
             # 解析频道并获取真实ID
             real_channel_id = await self.channel_resolver.get_channel_id(channel)
             
             if not real_channel_id:
                 logger.error(f"无法解析频道 {channel}", error_type="CHANNEL_RESOLVE", recoverable=True)
-                return
-                
+                return 0
+            
             # 获取频道信息，用于创建目录
             channel_info, (channel_title, _) = await self.channel_resolver.format_channel_info(real_channel_id)
             logger.info(f"解析频道: {channel_info}")
@@ -822,138 +836,135 @@ class Downloader():
             
             # 确定有无关键词，进而确定目录组织方式
             has_keywords = bool(keywords and len(keywords) > 0)
-            organize_by_keywords = has_keywords
             
             # 创建主下载目录（如果不存在）
             channel_path = self.download_path / channel_folder_name
             channel_path.mkdir(parents=True, exist_ok=True)
             
-            # 如果需要按关键词组织目录，预先创建关键词目录
-            if organize_by_keywords and keywords:
-                for keyword in keywords:
-                    keyword_folder = self._sanitize_filename(keyword)
-                    keyword_path = channel_path / keyword_folder
-                    keyword_path.mkdir(exist_ok=True)
-            
-            # 获取已下载的消息ID列表
-            downloaded_messages = self.history_manager.get_downloaded_messages(channel)
+            # 获取已下载的消息ID索引（压缩位图，O(1)成员判断）
+            downloaded_messages = await self.async_history_manager.get_downloaded_index(channel)
             logger.info(f"已下载的消息数量: {len(downloaded_messages)}")
             
-            # 先整理所有消息，按照媒体组进行分组
-            messages_by_group = {}  # 媒体组ID -> 消息列表
-            matched_groups = set()  # 匹配关键词的媒体组ID
-            matched_keywords = {}   # 媒体组ID -> 匹配的关键词
-            
-            # 获取频道消息
-            all_messages = []
-            try:
-                # 第一轮遍历：收集所有消息并按媒体组分组
-                async for message in self._iter_messages(real_channel_id, start_id, end_id):
-                    all_messages.append(message)
-            except Exception as e:
-                if "PEER_ID_INVALID" in str(e):
-                    logger.error(f"无法获取频道 {channel} 的消息: 频道ID无效或未加入该频道")
-                    return
-                else:
-                    logger.error(f"获取频道 {channel} 的消息失败: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    return
-            
-            # 处理收集到的所有消息
-            for message in all_messages:
-                if message.id in downloaded_messages:
-                    logger.info(f"消息 {message.id} 已下载，跳过")
-                    continue
-                
-                # 获取媒体类型并检查是否在允许的类型列表中
-                message_media_type = self._get_media_type(message)
-                if not message_media_type:
-                    continue
-                    
-                # 如果指定了媒体类型列表，检查当前媒体是否符合要求
-                if media_types and message_media_type not in media_types:
-                    logger.debug(f"消息ID: {message.id} 的文件类型 {message_media_type} 不在允许的媒体类型列表中，跳过")
-                    continue
-                
-                # 确定媒体组ID
-                group_id = str(message.media_group_id) if message.media_group_id else f"single_{message.id}"
-                
-                # 将消息添加到对应的媒体组
-                if group_id not in messages_by_group:
-                    messages_by_group[group_id] = []
-                messages_by_group[group_id].append(message)
-                
-                # 在关键词模式下，检查消息文本是否包含关键词
-                if has_keywords and keywords and group_id not in matched_groups:
-                    # 获取消息文本（正文或说明文字）
-                    text = message.text or message.caption or ""
-                    if text:
-                        # 检查文本是否包含任何关键词
-                        for keyword in keywords:
-                            # 检查是否是同义关键词组（包含横杠分隔符）
-                            if "-" in keyword:
-                                # 分割同义关键词
-                                synonym_keywords = [k.strip() for k in keyword.split("-") if k.strip()]
-                                # 任一同义词匹配即视为匹配
-                                for syn_keyword in synonym_keywords:
-                                    if syn_keyword.lower() in text.lower():
-                                        matched_groups.add(group_id)
-                                        matched_keywords[group_id] = keyword  # 保存整个同义词组
-                                        logger.info(f"媒体组 {group_id} (消息ID: {message.id}) 匹配同义关键词组: {keyword} 中的 {syn_keyword}")
-                                        break
-                            else:
-                                # 普通关键词匹配
-                                if keyword.lower() in text.lower():
-                                    matched_groups.add(group_id)
-                                    matched_keywords[group_id] = keyword
-                                    logger.info(f"媒体组 {group_id} (消息ID: {message.id}) 匹配关键词: {keyword}")
-                            
-                            # 如果已匹配，无需继续检查其他关键词
-                            if group_id in matched_groups:
-                                break
-            
-            # 准备下载任务
-            messages_to_download = []
-            
-            # 第二轮处理：处理每个媒体组
-            for group_id, messages in messages_by_group.items():
+            async def enqueue_group(group_id: str, messages: List[Message], matched_keyword: Optional[str]) -> bool:
+                """将一个媒体组放入下载队列，返回False表示任务已取消"""
+                nonlocal queued_count
                 # 如果是关键词模式且没有匹配关键词，则跳过整个媒体组
-                if has_keywords and keywords and group_id not in matched_groups:
+                if has_keywords and not matched_keyword:
                     logger.debug(f"媒体组 {group_id} 不包含任何关键词，跳过")
-                    continue
+                    return True
                 
                 current_channel_path = channel_path
                 
                 # 如果匹配了关键词，为该媒体组设置关键词目录
-                if has_keywords and organize_by_keywords and group_id in matched_groups:
-                    matched_keyword = matched_keywords[group_id]
-                    keyword_folder = self._sanitize_filename(matched_keyword)
-                    
-                    # 创建关键词目录
-                    keyword_path = channel_path / keyword_folder
+                if matched_keyword:
+                    keyword_path = channel_path / self._sanitize_filename(matched_keyword)
                     keyword_path.mkdir(exist_ok=True)
-                    
-                    # 更新当前媒体组的下载路径为关键词目录
                     current_channel_path = keyword_path
                 
-                # 将媒体组中的所有消息添加到下载列表
-                for message in messages:
-                    messages_to_download.append((message, current_channel_path, real_channel_id, channel))
-                
                 # 如果是媒体组，记录日志
                 if group_id.startswith("single_"):
                     logger.info(f"准备下载单条消息: ID={messages[0].id}")
                 else:
                     logger.info(f"准备下载媒体组 {group_id}: 包含 {len(messages)} 条消息, IDs={[m.id for m in messages]}")
+                
+                for message in messages:
+                    if not await self._put_download_task(work_queue, (message, current_channel_path, real_channel_id, channel)):
+                        return False
+                    queued_count += 1
+                return True
+            
+            def skip_known(known: Dict[int, MessageMetadata]) -> Set[int]:
+                """根据本地元数据找出不需要获取的消息：已删除、无媒体、已下载、媒体类型不符，以及不含关键词的完整媒体组"""
+                skip_ids = set()
+                groups: Dict[str, List[MessageMetadata]] = {}
+                for message_id, metadata in known.items():
+                    if metadata.deleted:
+                        skip_ids.add(message_id)
+                        continue
+                    groups.setdefault(metadata.group_key, []).append(metadata)
+                    if (not metadata.media_type or message_id in downloaded_messages
+                            or (media_types and metadata.media_type not in media_types)):
+                        skip_ids.add(message_id)
+                
+                if has_keywords:
+                    for group_key, members in groups.items():
+                        ids = [metadata.message_id for metadata in members]
+                        first_id, last_id = min(ids), max(ids)
+                        # 媒体组的消息ID连续，只有前后相邻的消息都已知且不属于该组时才能确定媒体组完整
+                        if members[0].media_group_id and any(
+                            message_id not in known or known[message_id].group_key == group_key
+                            for message_id in (first_id - 1, last_id + 1)
+                        ):
+                            continue
+                        if len(ids) != last_id - first_id + 1:
+                            continue
+                        if not any(metadata.caption and self._match_keyword(metadata.caption, keywords) for metadata in members):
+                            skip_ids.update(ids)
+                return skip_ids
             
-            logger.info(f"找到 {len(messages_to_download)} 条需要下载的消息")
-            all_download_tasks.extend(messages_to_download)
+            # 当前正在收集的媒体组
+            current_group_id = None
+            current_group_messages = []
+            current_keyword = None
             
+            try:
+                async for message in self._iter_messages(real_channel_id, start_id, end_id, skip_known=skip_known):
+                    if self.is_cancelled:
+                        return queued_count
+                    
+                    if message.id in downloaded_messages:
+                        logger.info(f"消息 {message.id} 已下载，跳过")
+                        continue
+                    
+                    # 获取媒体类型并检查是否在允许的类型列表中
+                    message_media_type = self._get_media_type(message)
+                    if not message_media_type:
+                        continue
+                    
+                    # 如果指定了媒体类型列表，检查当前媒体是否符合要求
+                    if media_types and message_media_type not in media_types:
+                        logger.debug(f"消息ID: {message.id} 的文件类型 {message_media_type} 不在允许的媒体类型列表中，跳过")
+                        continue
+                    
+                    # 确定媒体组ID，遇到新的媒体组时上一个媒体组已收集完整
+                    group_id = str(message.media_group_id) if message.media_group_id else f"single_{message.id}"
+                    if group_id != current_group_id:
+                        if current_group_messages and not await enqueue_group(current_group_id, current_group_messages, current_keyword):
+                            return queued_count
+                        current_group_id = group_id
+                        current_group_messages = []
+                        current_keyword = None
+                    current_group_messages.append(message)
+                    
+                    # 在关键词模式下，检查消息文本是否包含关键词
+                    if has_keywords and not current_keyword:
+                        # 获取消息文本（正文或说明文字）
+                        text = message.text or message.caption or ""
+                        if text:
+                            current_keyword = self._match_keyword(text, keywords)
+                            if current_keyword:
+                                logger.info(f"媒体组 {group_id} (消息ID: {message.id}) 匹配关键词: {current_keyword}")
+            except Exception as e:
+                if "PEER_ID_INVALID" in str(e):
+                    logger.error(f"无法获取频道 {channel} 的消息: 频道ID无效或未加入该频道")
+                else:
+                    logger.error(f"获取频道 {channel} 的消息失败: {e}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+                return queued_count
+            
+            # 放入最后一个媒体组
+            if current_group_messages:
+                await enqueue_group(current_group_id, current_group_messages, current_keyword)
+            
+            logger.info(f"频道 {channel} 扫描完成，{queued_count} 条消息进入下载队列")
+        
         except Exception as e:
             logger.error(f"处理频道 {channel} 下载失败: {e}")
             import traceback
             logger.error(traceback.format_exc())
+        
+        return queued_count
 
     def _get_media_type(self, message: Message) -> Optional[str]:
         """
@@ -1076,7 +1087,7 @@ class Downloader():
             photo = message.photo
             if isinstance(photo, list) and photo:
                 photo = photo[-1]  # 获取最高质量的照片
-                return photo.file_size if hasattr(photo, 'file_size') and photo.file_size else 0
+            return photo.file_size if hasattr(photo, 'file_size') and photo.file_size else 0
         elif message.video:
             return message.video.file_size if hasattr(message.video, 'file_size') and message.video.file_size else 0
         elif message.document:
@@ -1094,122 +1105,145 @@ class Downloader():
         
         return 0
     
-    async def _download_media_to_memory(self, message: Message, media_type: str) -> Optional[Tuple[bytes, str]]:
+    def _get_media_file_id(self, message: Message, media_type: str) -> Optional[str]:
         """
-        下载媒体到内存
+        获取消息媒体的文件ID
         
         Args:
             message: 消息对象
             media_type: 媒体类型
             
         Returns:
-            Optional[Tuple[bytes, str]]: (媒体数据, 文件ID)元组，如果下载失败则返回None
+            Optional[str]: 文件ID，如果无法获取则返回None
         """
+        file_id = None
+        if media_type == "photo":
+            # 选择最大尺寸的照片
+            photo = message.photo
+            logger.debug(f"Photo对象类型: {type(photo)}, 值: {photo}")
+            
+            # 修复photo处理逻辑
+            if photo:
+                if isinstance(photo, list):
+                    # 如果是列表，选择最后一个（最高质量）
+                    photo_obj = photo[-1]
+                    file_id = photo_obj.file_id
+                    logger.debug(f"从列表中获取photo file_id: {file_id}")
+                else:
+                    # 如果不是列表，可能是单个对象
+                    file_id = getattr(photo, 'file_id', None)
+                    logger.debug(f"从非列表对象获取photo file_id: {file_id}")
+                    
+                    # 如果无法获取file_id，直接使用photo本身作为file_id
+                    if not file_id and isinstance(photo, str):
+                        file_id = photo
+                        logger.debug(f"直接使用photo字符串作为file_id: {file_id}")
+        elif media_type == "video":
+            file_id = message.video.file_id
+        elif media_type == "document":
+            file_id = message.document.file_id
+        elif media_type == "audio":
+            file_id = message.audio.file_id
+        elif media_type == "animation":
+            file_id = message.animation.file_id
+        elif media_type == "sticker":
+            file_id = message.sticker.file_id
+        elif media_type == "voice":
+            file_id = message.voice.file_id
+        elif media_type == "video_note":
+            file_id = message.video_note.file_id
+        
+        return file_id
+    
+    async def _download_media_stream(self, message: Message, media_type: str, file_path: str) -> bool:
+        """
+        流式下载媒体到文件
+        
+        数据块经有界队列交给写入线程写入 .part 文件，完成后原子重命名为目标文件，
+        单个下载的内存占用约为几个数据块大小，与文件大小无关。
+        超过分段阈值的文件分成多个区间并行下载。
+        出错、超时或取消时保留已下载部分，重试或下次运行时从断点续传；
+        FloodWait直接抛出，由下载工作协程释放下载名额后等待
+        
+        Args:
+            message: 消息对象
+            media_type: 媒体类型
+            file_path: 目标文件路径
+        
+        Returns:
+            bool: 是否下载成功
+        """
+        file_id = self._get_media_file_id(message, media_type)
+        if not file_id:
+            logger.warning(f"无法获取文件ID: {message.id} - {media_type}")
+            return False
+        
+        expected_size = self._estimate_media_size(message)
         max_retries = 3
         retry_count = 0
+        # 不同频道的消息ID可能相同，进度按 (频道ID, 消息ID) 区分
+        transfer_key = (message.chat.id if message.chat else None, message.id)
         
-        while retry_count <= max_retries:
-            try:
+        try:
+            while retry_count <= max_retries:
                 # 检查取消和暂停
                 if self.is_cancelled:
-                    return None
+                    return False
                 if self.is_paused:
                     await asyncio.sleep(0.5)
+                    continue
                 
-                # 执行下载
-                file_id = None
-                if media_type == "photo":
-                    # 选择最大尺寸的照片
-                    photo = message.photo
-                    logger.debug(f"Photo对象类型: {type(photo)}, 值: {photo}")
-                    
-                    # 修复photo处理逻辑
-                    if photo:
-                        if isinstance(photo, list):
-                            # 如果是列表，选择最后一个（最高质量）
-                            photo_obj = photo[-1]
-                            file_id = photo_obj.file_id
-                            logger.debug(f"从列表中获取photo file_id: {file_id}")
+                progress = self.progress_aggregator.callback(transfer_key, os.path.basename(file_path))
+                try:
+                    # 从传输客户端池租用负载最低的客户端，未启用客户端池时使用主客户端
+                    async with lease_client(self.client) as client:
+                        if self.parallel_range_parts > 1 and expected_size >= self.parallel_range_threshold:
+                            logger.debug(f"尝试分段并行下载媒体，file_id: {file_id}，区间数: {self.parallel_range_parts}")
+                            file_size = await parallel_stream_media_to_file(
+                                client, file_id, file_path, expected_size,
+                                parts=self.parallel_range_parts,
+                                progress=progress,
+                                file_unique_id=get_file_unique_id(message)
+                            )
                         else:
-                            # 如果不是列表，可能是单个对象
-                            file_id = getattr(photo, 'file_id', None)
-                            logger.debug(f"从非列表对象获取photo file_id: {file_id}")
-                            
-                            # 如果无法获取file_id，直接使用photo本身作为file_id
-                            if not file_id and isinstance(photo, str):
-                                file_id = photo
-                                logger.debug(f"直接使用photo字符串作为file_id: {file_id}")
-                elif media_type == "video":
-                    file_id = message.video.file_id
-                elif media_type == "document":
-                    file_id = message.document.file_id
-                elif media_type == "audio":
-                    file_id = message.audio.file_id
-                elif media_type == "animation":
-                    file_id = message.animation.file_id
-                elif media_type == "sticker":
-                    file_id = message.sticker.file_id
-                elif media_type == "voice":
-                    file_id = message.voice.file_id
-                elif media_type == "video_note":
-                    file_id = message.video_note.file_id
+                            logger.debug(f"尝试流式下载媒体，file_id: {file_id}")
+                            file_size = await stream_media_to_file(
+                                client, file_id, file_path, expected_size,
+                                progress=progress,
+                                file_unique_id=get_file_unique_id(message)
+                            )
+                    if file_size == 0:
+                        raise OSError("下载返回空数据")
+                    
+                    self.download_count += 1
+                    self.total_downloaded_bytes += file_size
+                    return True
                 
-                if not file_id:
-                    logger.warning(f"无法获取文件ID: {message.id} - {media_type}")
-                    return None
+                except FloodWait:
+                    # 交给下载工作协程在释放下载名额后等待，不计入重试次数
+                    raise
                 
-                # 下载媒体文件
-                try:
-                    logger.debug(f"尝试下载媒体，file_id: {file_id}")
-                    file_data = await self.client.download_media(file_id, in_memory=True)
                 except Exception as e:
-                    logger.error(f"下载媒体file_id={file_id}时出错: {e}")
-                    if retry_count < max_retries:
-                        retry_count += 1
-                        wait_time = 2 ** retry_count
-                        logger.info(f"重试下载 {message.id}，第 {retry_count}/{max_retries} 次，等待 {wait_time}秒")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    return None
-                
-                # 验证文件数据
-                if not file_data:
-                    logger.warning(f"下载返回空数据: {message.id} - {media_type}")
+                    logger.error(f"流式下载媒体时出错: {message.id} - {media_type} - {e}")
+                    
+                    # 检测网络相关错误
+                    error_name = type(e).__name__.lower()
+                    if any(net_err in error_name for net_err in ['network', 'connection', 'timeout', 'socket']):
+                        await self._handle_network_error(e)
+                    
                     if retry_count < max_retries:
                         retry_count += 1
                         wait_time = 2 ** retry_count  # 指数退避
                         logger.info(f"重试下载 {message.id}，第 {retry_count}/{max_retries} 次，等待 {wait_time}秒")
                         await asyncio.sleep(wait_time)
-                        continue
-                    return None
-
-                return file_data, file_id
-                
-            except FloodWait as e:
-                logger.warning(f"触发FloodWait，等待 {e.x} 秒")
-                await self._handle_flood_wait(e.x)
-                # FloodWait不计入重试次数
-                continue
-                
-            except Exception as e:
-                logger.error(f"下载媒体时出错: {message.id} - {media_type} - {e}")
-                
-                # 检测网络相关错误
-                error_name = type(e).__name__.lower()
-                if any(net_err in error_name for net_err in ['network', 'connection', 'timeout', 'socket']):
-                    # 网络相关错误，通知应用程序检查连接状态
-                    await self._handle_network_error(e)
-                
-                if retry_count < max_retries:
-                    retry_count += 1
-                    wait_time = 2 ** retry_count  # 指数退避
-                    logger.info(f"重试下载 {message.id}，第 {retry_count}/{max_retries} 次，等待 {wait_time}秒")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"下载失败，已达到最大重试次数: {message.id}")
-                    return None
-        
-        return None 
+                    else:
+                        logger.error(f"下载失败，已达到最大重试次数: {message.id}")
+                        return False
+            
+            return False
+        finally:
+            # 下载结束（包括超时取消）后移除该文件的进度记录
+            self.progress_aggregator.finish(transfer_key)
 
     async def _download_media_file(self, message: Message, save_path: str, worker_id: int) -> Optional[str]:
         """
@@ -1240,38 +1274,79 @@ class Downloader():
         file_path = os.path.join(save_path, file_name)
         
         try:
-            # 从消息中下载媒体
-            download_result = await self._download_media_to_memory(message, media_type)
-            if not download_result:
+            # 流式下载到 .part 文件，完成后原子重命名，避免整个文件驻留内存
+            if not await self._download_media_stream(message, media_type, file_path):
                 return None
-                
-            media_data, file_id = download_result
             
-            # 写入临时文件
-            temp_path = f"{file_path}.tmp"
-            with open(temp_path, 'wb') as f:
-                # 检查media_data类型，处理BytesIO对象
-                if hasattr(media_data, 'getvalue'):
-                    # 如果是BytesIO或类似IO对象，获取其值
-                    f.write(media_data.getvalue())
-                    logger.debug(f"处理BytesIO对象并写入文件 {temp_path}")
-                else:
-                    # 如果已经是bytes对象，直接写入
-                    f.write(media_data)
-                    logger.debug(f"直接写入bytes数据到文件 {temp_path}")
-                
-            # 重命名为最终文件名
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            os.rename(temp_path, file_path)
+            # 记录文件唯一ID对应的本地文件，之后遇到同一媒体时复用
+            file_unique_id = get_file_unique_id(message)
+            if file_unique_id and self.async_history_manager:
+                await self.async_history_manager.add_media_file(file_unique_id, file_path, os.path.getsize(file_path))
             
             # 返回文件路径
             return file_path
             
+        except FloodWait:
+            raise
         except Exception as e:
             logger.error(f"下载文件失败: {e}")
             return None 
 
+    async def _reuse_downloaded_media(self, message: Message, media_type: str, save_path: str) -> Optional[str]:
+        """
+        按文件唯一ID查找已下载的同一媒体，找到时通过硬链接、reflink或复制放到本次的保存位置
+        
+        索引中的文件已被删除或大小不符时清除该记录，按正常流程下载
+        
+        Args:
+            message: 消息对象
+            media_type: 媒体类型
+            save_path: 保存目录
+            
+        Returns:
+            Optional[str]: 复用成功时返回文件路径，否则返回None
+        """
+        if not self.reuse_downloaded_files or not self.async_history_manager:
+            return None
+        file_unique_id = get_file_unique_id(message)
+        if not file_unique_id:
+            return None
+        record = await self.async_history_manager.get_media_file(file_unique_id)
+        if not record:
+            return None
+        file_name = self._get_media_file_name(message, media_type)
+        if not file_name:
+            return None
+        
+        source_path, source_size = record
+        file_path = os.path.join(save_path, file_name)
+        expected_size = self._estimate_media_size(message)
+        
+        def reuse() -> Tuple[bool, Optional[str]]:
+            """返回 (索引是否有效, 复用方式)"""
+            try:
+                actual_size = os.path.getsize(source_path)
+            except OSError:
+                return False, None
+            if actual_size != source_size or (expected_size and actual_size != expected_size):
+                return False, None
+            if os.path.abspath(source_path) == os.path.abspath(file_path):
+                return True, 'existing'
+            return True, link_or_copy_file(source_path, file_path)
+        
+        valid, method = await asyncio.get_running_loop().run_in_executor(None, reuse)
+        if not valid:
+            logger.debug(f"媒体文件索引已失效，重新下载: {file_unique_id} -> {source_path}")
+            await self.async_history_manager.remove_media_file(file_unique_id)
+            return None
+        if method is None:
+            return None
+        
+        self.reused_count += 1
+        self.reused_bytes += source_size
+        logger.info(f"复用已下载的文件 ({method}): {source_path} -> {file_path}")
+        return file_path
+    
     async def _handle_network_error(self, error):
         """
         处理网络相关错误
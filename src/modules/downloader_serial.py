@@ -18,6 +18,11 @@ from src.utils.ui_config_manager import UIConfigManager
 from src.utils.config_utils import convert_ui_config_to_dict
 from src.utils.channel_resolver import ChannelResolver
 from src.utils.database_manager import DatabaseManager
+from src.utils.stream_download import (
+    stream_media_to_file, get_file_unique_id, cleanup_stale_partials, DEFAULT_PARTIAL_RETENTION_DAYS
+)
+from src.utils.dir_size_tracker import get_directory_size_tracker
+from src.utils.progress_bus import ProgressAggregator, TransferProgress
 from src.utils.logger import get_logger
 
 
@@ -45,6 +50,8 @@ class DownloaderSerial():
         self.ui_config_manager = ui_config_manager
         self.channel_resolver = channel_resolver
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.app = app  # 保存应用程序实例引用
         
         # 获取UI配置并转换为字典
@@ -86,9 +93,8 @@ class DownloaderSerial():
         self._done = False
         self._is_stopped = False
         
-        # 初始化进度追踪变量
-        self._last_progress_time = time.time()
-        self._last_progress_bytes = 0
+        # 进度聚合器：合并数据块级的进度回调，以固定频率发布到UI
+        self.progress_aggregator = ProgressAggregator(self._publish_progress, label="下载")
     
     def get_current_file(self) -> str:
         """
@@ -143,8 +149,7 @@ class DownloaderSerial():
         """
         self._download_progress = (0, 0)
         self._current_speed = 0
-        self._last_progress_time = time.time()
-        self._last_progress_bytes = 0
+        self.progress_aggregator.clear()
         self._is_downloading = False
         self._current_file = None
         logger.info("下载进度计数器已重置")
@@ -190,6 +195,9 @@ class DownloaderSerial():
         logger.info(f"开始从频道下载媒体文件")
         self._is_downloading = True
         
+        # 清理长时间未继续的未完成下载，其余的保留用于断点续传
+        await self._cleanup_stale_partials()
+        
         # 获取下载频道列表
         download_settings = self.download_config.get('downloadSetting', [])
         logger.info(f"获取到 {len(download_settings)} 个下载设置")
@@ -278,8 +286,8 @@ class DownloaderSerial():
                 
                 logger.info(f"下载目录: {channel_download_path}")
                 
-                # 获取该频道的历史记录，使用原始频道名称作为键
-                downloaded_messages = self.history_manager.get_downloaded_messages(channel_name)
+                # 获取该频道的已下载消息ID索引，使用原始频道名称作为键
+                downloaded_messages = await self.async_history_manager.get_downloaded_index(channel_name)
                 logger.info(f"已下载的消息数量: {len(downloaded_messages)}")
                 
                 # 如果有关键词，在频道目录下创建关键词目录
@@ -497,7 +505,7 @@ class DownloaderSerial():
                 if file_path.exists():
                     logger.debug(f"文件已存在: {file_path}，跳过下载")
                     # 标记为已下载
-                    self.history_manager.add_download_record(channel_name, message.id, real_channel_id)
+                    await self.async_history_manager.add_download_record(channel_name, message.id, real_channel_id)
                     # 发送文件已下载跳过事件
                     self.emit("file_already_downloaded", message.id, file_name)
                     continue
@@ -521,12 +529,17 @@ class DownloaderSerial():
                     # 开始时间
                     start_time = time.time()
                     
-                    # 下载文件
-                    download_path = await self.client.download_media(
+                    # 流式下载到 .part 文件，中断后保留已下载部分，下次从断点续传
+                    await stream_media_to_file(
+                        self.client,
                         message,
-                        file_name=str(file_path),
-                        progress=self._download_progress_callback(self.client, message.id, file_name)
+                        str(file_path),
+                        expected_size=self._get_media_size(message) or 0,
+                        progress=self._download_progress_callback(self.client, message.id, file_name),
+                        file_unique_id=get_file_unique_id(message)
                     )
+                    self.progress_aggregator.finish(message.id)
+                    download_path = str(file_path)
                     
                     # 计算下载时间
                     download_time = time.time() - start_time
@@ -543,7 +556,7 @@ class DownloaderSerial():
                             f"下载完成: {file_name} ({file_size_mb:.2f}MB, {download_time:.2f}s, {speed_mbps:.2f}MB/s)")
                         
                         # 标记为已下载，使用原始频道名称作为键
-                        self.history_manager.add_download_record(channel_name, message.id, real_channel_id)
+                        await self.async_history_manager.add_download_record(channel_name, message.id, real_channel_id)
                         
                         # 发送下载完成事件
                         file_size = int(file_size_mb * 1024 * 1024)  # 转换为字节
@@ -562,10 +575,12 @@ class DownloaderSerial():
                         logger.error(f"下载失败: {file_name}", error_type="DOWNLOAD_FAIL", recoverable=True)
                 
                 except FloodWait as e:
+                    self.progress_aggregator.finish(message.id)
                     logger.warning(f"下载受限，等待 {e.x} 秒")
                     await asyncio.sleep(e.x)
                     
                 except Exception as e:
+                    self.progress_aggregator.finish(message.id)
                     logger.error(f"下载异常: {str(e)}", error_type="DOWNLOAD_ERROR", recoverable=True)
                     
                     # 检测网络相关错误
@@ -586,9 +601,22 @@ class DownloaderSerial():
         # 发送所有下载完成信号
         self.emit("all_downloads_complete")
     
+    async def _cleanup_stale_partials(self):
+        """
+        在线程池中清理下载目录下超过保留天数的未完成下载
+        """
+        retention_days = self.download_config.get('partial_retention_days', DEFAULT_PARTIAL_RETENTION_DAYS)
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, cleanup_stale_partials, str(self.download_path), retention_days)
+        except Exception as e:
+            logger.error(f"清理未完成下载时出错: {e}")
+    
     def _download_progress_callback(self, client, message_id, filename):
         """下载进度回调函数
         
+        每个数据块的进度只记录到进度聚合器，由聚合器按固定频率发布到UI并限制日志频率
+        
         Args:
             client: 客户端对象
             message_id: 消息ID
@@ -597,53 +625,19 @@ class DownloaderSerial():
         Returns:
             回调函数
         """
-        # 返回一个内部的回调函数来处理进度更新
-        def callback(current, total):
-            try:
-                if total == 0:
-                    return
-                
-                # 计算进度百分比
-                percentage = 100 * (current / total)
-                
-                # 计算下载速度
-                now = time.time()
-                time_diff = now - self._last_progress_time
-                
-                if time_diff > 0:
-                    speed = (current - self._last_progress_bytes) / time_diff
-                    self._current_speed = speed  # 保存当前速度供get_download_speed方法使用
-                    
-                    # 获取格式化后的速度
-                    speed_value, speed_unit = self.get_download_speed()
-                    speed_str = f"{speed_value:.1f} {speed_unit}"
-                    
-                    # 计算剩余时间
-                    remaining_bytes = total - current
-                    if speed > 0:
-                        time_remaining = remaining_bytes / speed  # 剩余时间（秒）
-                        if time_remaining < 60:
-                            time_str = f"{time_remaining:.1f}秒"
-                        elif time_remaining < 3600:
-                            time_str = f"{time_remaining / 60:.1f}分钟"
-                        else:
-                            time_str = f"{time_remaining / 3600:.1f}小时"
-                    else:
-                        time_str = "未知"
-                    
-                    # 更新最后进度信息
-                    self._last_progress_time = now
-                    self._last_progress_bytes = current
-                    
-                    # 打印进度信息
-                    logger.info(f"下载进度: {percentage:.2f}% ({current}/{total}) - 速度: {speed_str} - 剩余时间: {time_str} - 文件: {filename}")
-                    
-                    # 发出进度更新事件
-                    self.emit("progress", current, total, filename)
-            except Exception as e:
-                logger.error(f"计算下载进度时出错: {str(e)}")
-            
-        return callback
+        return self.progress_aggregator.callback(message_id, filename)
+    
+    def _publish_progress(self, transfers: List[TransferProgress]):
+        """发布进度聚合器合并后的下载进度
+        
+        Args:
+            transfers: 有变化的传输进度快照
+        """
+        for transfer in transfers:
+            # 保存平滑后的速度供get_download_speed方法使用
+            self._current_speed = transfer.speed
+            if transfer.total > 0:
+                self.emit("progress", transfer.current, transfer.total, transfer.name)
     
     def _sanitize_filename(self, filename: str) -> str:
         """
@@ -1021,39 +1015,31 @@ class DownloaderSerial():
     async def _check_directory_size_limit(self) -> Tuple[bool, int, int]:
         """检查下载目录大小是否超过限制
         
+        使用下载开始时读取的配置和下载目录的字节计数器，只有首次检查需要等待后台遍历完成
+        
         Returns:
             Tuple[bool, int, int]: (是否超过限制, 当前大小(MB), 限制大小(MB))
         """
         try:
-            # 获取最新配置
-            ui_config = self.ui_config_manager.get_ui_config()
-            config = convert_ui_config_to_dict(ui_config)
-            download_config = config.get('DOWNLOAD', {})
-            
             # 检查是否启用了目录大小限制
-            dir_size_limit_enabled = download_config.get('dir_size_limit_enabled', False)
+            dir_size_limit_enabled = self.download_config.get('dir_size_limit_enabled', False)
             if not dir_size_limit_enabled:
                 return False, 0, 0
                 
             # 获取下载路径和大小限制
-            download_path = download_config.get('download_path', 'downloads')
-            limit_mb = download_config.get('dir_size_limit', 1000)  # 默认1000MB (1GB)
-            
-            # 计算当前目录大小
-            total_size = 0
-            path_obj = Path(download_path)
+            download_path = self.download_config.get('download_path', 'downloads')
+            limit_mb = self.download_config.get('dir_size_limit', 1000)  # 默认1000MB (1GB)
             
             # 检查路径是否存在
-            if not path_obj.exists():
+            if not Path(download_path).exists():
                 return False, 0, 0
-                
-            # 遍历目录计算总大小
-            for dirpath, dirnames, filenames in os.walk(download_path):
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    # 跳过符号链接
-                    if not os.path.islink(file_path):
-                        total_size += os.path.getsize(file_path)
+            
+            # 读取目录大小计数器，首次使用时等待初始遍历完成
+            tracker = get_directory_size_tracker(download_path)
+            if not tracker.ready:
+                await asyncio.get_running_loop().run_in_executor(None, tracker.wait_ready)
+            tracker.maybe_reconcile()
+            total_size = tracker.total
             
             # 转换为MB
             current_size_mb = total_size / (1024 * 1024)
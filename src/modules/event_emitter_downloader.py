@@ -19,6 +19,8 @@ class EventEmitterDownloader(BaseEventEmitter):
     progress_updated = Signal(int, int, str)  # 进度更新信号 (当前, 总数, 文件名)
     download_completed = Signal(int, str, int)  # 下载完成信号 (消息ID, 文件名, 文件大小)
     all_downloads_completed = Signal()  # 所有下载完成信号
+    concurrency_updated = Signal(dict)  # 自适应并发状态更新信号 (状态字典)
+    transfer_progress_updated = Signal(list)  # 各文件下载进度信号 (TransferProgress列表，约10Hz)
     
     def __init__(self, original_downloader: OriginalDownloader):
         """初始化下载器包装类
@@ -78,6 +80,14 @@ class EventEmitterDownloader(BaseEventEmitter):
             elif event_type == "all_downloads_complete":
                 self.all_downloads_completed.emit()
                 logger.debug("发射all_downloads_completed信号")
+            
+            elif event_type == "concurrency":
+                if args:
+                    self.concurrency_updated.emit(args[0])
+            
+            elif event_type == "transfer_progress":
+                if args:
+                    self.transfer_progress_updated.emit(args[0])
                 
         except Exception as e:
             logger.error(f"发射Qt信号时发生错误: {e}")
@@ -22,6 +22,7 @@ class EventEmitterUploader(BaseEventEmitter):
     file_already_uploaded = Signal(object)  # 文件已上传信号 (文件数据)
     final_message_sent = Signal(object)  # 最终消息发送成功信号 (消息数据)
     final_message_error = Signal(object)  # 最终消息发送失败信号 (错误数据)
+    transfer_progress_updated = Signal(list)  # 各文件上传进度信号 (TransferProgress列表，约10Hz)
     
     def __init__(self, original_uploader: OriginalUploader):
         """初始化上传器包装类
@@ -114,6 +115,10 @@ class EventEmitterUploader(BaseEventEmitter):
                     error_data = args[0]
                     self.final_message_error.emit(error_data)
                     logger.debug(f"发射final_message_error信号: {error_data}")
+            
+            elif event_type == "transfer_progress":
+                if args:
+                    self.transfer_progress_updated.emit(args[0])
                 
         except Exception as e:
             logger.error(f"发射Qt信号时发生错误: {e}")
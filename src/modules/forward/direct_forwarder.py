@@ -34,6 +34,8 @@ class DirectForwarder:
         """
         self.client = client
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.general_config = general_config or {}
         self.emit = emit  # 添加事件发射函数
         
@@ -170,7 +172,7 @@ class DirectForwarder:
             # 检查是否已转发到此频道
             all_forwarded = True
             for message in filtered_messages:
-                if not self.history_manager or not self.history_manager.is_message_forwarded(source_channel, message.id, target_channel):
+                if not self.history_manager or not await self.async_history_manager.is_message_forwarded(source_channel, message.id, target_channel):
                     all_forwarded = False
                     break
             
@@ -229,7 +231,7 @@ class DirectForwarder:
                         
                         # 转发成功后才记录历史
                         if self.history_manager:
-                            self.history_manager.add_forward_record(
+                            await self.async_history_manager.add_forward_record(
                                 source_channel,
                                 message.id,
                                 target_channel,
@@ -328,7 +330,7 @@ class DirectForwarder:
                                 # 记录转发历史
                                 if self.history_manager:
                                     for message in filtered_messages:
-                                        self.history_manager.add_forward_record(
+                                        await self.async_history_manager.add_forward_record(
                                             source_channel,
                                             message.id,
                                             target_channel,
@@ -383,7 +385,7 @@ class DirectForwarder:
                             # 转发成功后才记录历史
                             if self.history_manager:
                                 for message in filtered_messages:
-                                    self.history_manager.add_forward_record(
+                                    await self.async_history_manager.add_forward_record(
                                         source_channel,
                                         message.id,
                                         target_channel,
@@ -416,7 +418,7 @@ class DirectForwarder:
                             # 转发成功后才记录历史
                             if self.history_manager:
                                 for message in filtered_messages:
-                                    self.history_manager.add_forward_record(
+                                    await self.async_history_manager.add_forward_record(
                                         source_channel,
                                         message.id,
                                         target_channel,
@@ -448,7 +450,7 @@ class DirectForwarder:
                             # 转发成功后才记录历史
                             if self.history_manager:
                                 for message in filtered_messages:
-                                    self.history_manager.add_forward_record(
+                                    await self.async_history_manager.add_forward_record(
                                         source_channel,
                                         message.id,
                                         target_channel,
@@ -55,6 +55,8 @@ class Forwarder():
         self.ui_config_manager = ui_config_manager
         self.channel_resolver = channel_resolver
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.downloader = downloader
         self.uploader = uploader
         self.app = app  # 保存应用程序实例引用
@@ -78,7 +80,10 @@ class Forwarder():
         self.message_filter = MessageFilter(self.config, self._emit_event)
         
         # 创建媒体组收集器，用于分组和优化消息获取
-        self.media_group_collector = MediaGroupCollector(self.message_iterator, self.message_filter, self._emit_event)
+        self.media_group_collector = MediaGroupCollector(
+            self.message_iterator, self.message_filter, self._emit_event,
+            metadata_max_age_days=self.general_config.get('message_metadata_max_age_days', 7)
+        )
         
         # 初始化重构后的组件
         self.message_downloader = MessageDownloader(client)
@@ -210,7 +215,10 @@ class Forwarder():
         self.message_iterator.set_forwarder(self)
         
         # 重新创建MediaGroupCollector实例，确保基于最新配置和无状态残留
-        self.media_group_collector = MediaGroupCollector(self.message_iterator, self.message_filter, self._emit_event)
+        self.media_group_collector = MediaGroupCollector(
+            self.message_iterator, self.message_filter, self._emit_event,
+            metadata_max_age_days=self.general_config.get('message_metadata_max_age_days', 7)
+        )
         
         # 更新DirectForwarder使用新的MessageFilter实例
         self.direct_forwarder.message_filter = self.message_filter
@@ -449,7 +457,7 @@ class Forwarder():
                                         # 转发到所有目标频道
                                         for target_channel, target_id, target_info in valid_target_channels:
                                             # 检查是否已转发
-                                            if self.history_manager and self.history_manager.is_message_forwarded(source_channel, message_id, target_channel):
+                                            if self.history_manager and await self.async_history_manager.is_message_forwarded(source_channel, message_id, target_channel):
                                                 _logger.debug(f"纯文本消息 {message_id} 已转发到 {target_info}，跳过")
                                                 continue
                                             
@@ -474,7 +482,7 @@ class Forwarder():
                                                 
                                                 # 记录转发历史
                                                 if self.history_manager:
-                                                    self.history_manager.add_forward_record(source_channel, message_id, target_channel, source_id)
+                                                    await self.async_history_manager.add_forward_record(source_channel, message_id, target_channel, source_id)
                                                 
                                                 # 发送转发完成信号到UI
                                                 self._emit_event("message_forwarded", message_id, target_info)
@@ -17,7 +17,8 @@ class MediaGroupCollector:
     媒体组收集器，用于从频道获取媒体组消息
     """
     
-    def __init__(self, message_iterator: MessageIterator, message_filter: MessageFilter, emit=None):
+    def __init__(self, message_iterator: MessageIterator, message_filter: MessageFilter, emit=None,
+                 metadata_max_age_days: int = 7):
         """
         初始化媒体组收集器
         
@@ -25,16 +26,18 @@ class MediaGroupCollector:
             message_iterator: 消息迭代器实例
             message_filter: 消息过滤器实例
             emit: 事件发射函数，用于发送事件到UI
+            metadata_max_age_days: 本地消息元数据的有效天数，0表示不使用本地记录
         """
         self.message_iterator = message_iterator
         self.message_filter = message_filter
         self.emit = emit
+        self.metadata_max_age_days = metadata_max_age_days
         
         # 设置过滤器的事件发射器
         if self.emit and hasattr(self.message_filter, 'emit'):
             self.message_filter.emit = self.emit
     
-    def _filter_unforwarded_ids(self, start_id: int, end_id: int, source_channel: str, target_channels: List[str], history_manager) -> List[int]:
+    async def _filter_unforwarded_ids(self, start_id: int, end_id: int, source_channel: str, target_channels: List[str], history_manager) -> List[int]:
         """
         根据转发历史预过滤未转发的消息ID
         
@@ -52,30 +55,73 @@ class MediaGroupCollector:
             # 如果没有历史管理器，返回全部ID
             return list(range(start_id, end_id + 1))
         
-        unforwarded_ids = []
         total_ids = end_id - start_id + 1
         
         _logger.info(f"开始预过滤已转发的消息ID，范围: {start_id}-{end_id} (共{total_ids}个ID)")
         
-        # 遍历ID范围，检查每个ID是否已转发到所有目标频道
-        for msg_id in range(start_id, end_id + 1):
-            is_fully_forwarded = True
-            
-            # 检查是否已转发到所有目标频道
-            for target_channel in target_channels:
-                if not history_manager.is_message_forwarded(source_channel, msg_id, target_channel):
-                    is_fully_forwarded = False
-                    break
-            
-            # 如果没有完全转发，则添加到未转发列表
-            if not is_fully_forwarded:
-                unforwarded_ids.append(msg_id)
+        # 一次范围查询获取各目标频道的已转发ID集合
+        forwarded_matrix = await history_manager.get_async_manager().get_forwarded_matrix(
+            source_channel, target_channels, start_id=start_id, end_id=end_id
+        )
+        
+        # 只有已转发到所有目标频道的ID才会被过滤
+        unforwarded_ids = []
+        if target_channels:
+            fully_forwarded = set.intersection(*(forwarded_matrix[target] for target in target_channels))
+            unforwarded_ids = [msg_id for msg_id in range(start_id, end_id + 1) if msg_id not in fully_forwarded]
         
         filtered_count = total_ids - len(unforwarded_ids)
         _logger.info(f"预过滤完成: 总消息 {total_ids} 个, 已转发 {filtered_count} 个, 需要获取 {len(unforwarded_ids)} 个")
         
         return unforwarded_ids
 
+    async def _prune_deleted_ids(self, source_id: int, message_ids: List[int], history_manager) -> List[int]:
+        """
+        根据本地消息元数据去掉已知已删除的消息ID，已删除的消息ID不会再出现新消息，无需重新获取
+        
+        只使用有效期内的记录，过期的删除标记不参与过滤，对应的消息会重新获取并刷新本地记录
+        
+        Args:
+            source_id: 源频道ID
+            message_ids: 待获取的消息ID列表（升序）
+            history_manager: 历史管理器实例
+            
+        Returns:
+            List[int]: 去掉已删除消息后的ID列表
+        """
+        if (not history_manager or not message_ids or not isinstance(source_id, int)
+                or self.metadata_max_age_days <= 0):
+            return message_ids
+        
+        known = await history_manager.get_async_manager().get_message_metadata(
+            source_id, message_ids[0], message_ids[-1], self.metadata_max_age_days
+        )
+        deleted_ids = {message_id for message_id, metadata in known.items() if metadata.deleted}
+        if not deleted_ids:
+            return message_ids
+        
+        _logger.info(f"根据本地消息元数据跳过 {len(deleted_ids)} 个已删除的消息ID")
+        return [message_id for message_id in message_ids if message_id not in deleted_ids]
+
+    async def _pending_message_ids(self, source_id: int, start_id: int, end_id: int, source_channel: str,
+                                   target_channels: List[str], history_manager) -> List[int]:
+        """
+        获取范围内需要处理的消息ID：去掉已转发到所有目标频道的ID和本地元数据中已知已删除的ID
+        
+        Args:
+            source_id: 源频道ID
+            start_id: 起始消息ID
+            end_id: 结束消息ID
+            source_channel: 源频道标识
+            target_channels: 目标频道列表
+            history_manager: 历史管理器实例
+            
+        Returns:
+            List[int]: 需要处理的消息ID列表（升序）
+        """
+        unforwarded_ids = await self._filter_unforwarded_ids(start_id, end_id, source_channel, target_channels, history_manager)
+        return await self._prune_deleted_ids(source_id, unforwarded_ids, history_manager)
+
     async def _resolve_message_range(self, source_id: int, pair: dict) -> tuple[int, int, bool]:
         """
         解析和验证消息ID范围，处理end_id=0的情况
@@ -160,8 +206,8 @@ class MediaGroupCollector:
             fallback_groups = await self.get_media_groups(source_id, source_channel, pair)
             return fallback_groups, {}
         
-        # 预过滤已转发的消息ID
-        unforwarded_ids = self._filter_unforwarded_ids(start_id, end_id, source_channel, target_channels, history_manager)
+        # 预过滤已转发和已删除的消息ID
+        unforwarded_ids = await self._pending_message_ids(source_id, start_id, end_id, source_channel, target_channels, history_manager)
         
         # 如果没有未转发的消息，直接返回空结果
         if not unforwarded_ids:
@@ -243,8 +289,8 @@ class MediaGroupCollector:
             if complete_media_group_texts:
                 _logger.info(f"📝 完整范围预提取: 找到 {len(complete_media_group_texts)} 个媒体组的文本内容")
         
-        # 预过滤已转发的消息ID
-        unforwarded_ids = self._filter_unforwarded_ids(start_id, end_id, source_channel, target_channels, history_manager)
+        # 预过滤已转发和已删除的消息ID
+        unforwarded_ids = await self._pending_message_ids(source_id, start_id, end_id, source_channel, target_channels, history_manager)
         
         # 如果没有未转发的消息，直接返回空结果（但保留预提取的文本）
         if not unforwarded_ids:
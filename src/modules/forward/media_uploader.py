@@ -19,6 +19,8 @@ from src.utils.video_processor import VideoProcessor
 from src.utils.logger import get_logger
 from src.utils.translation_manager import tr
 from src.utils.flood_wait_handler import FloodWaitHandler, execute_with_flood_wait
+from src.utils.client_pool import lease_client
+from src.utils.parallel_upload import enable_parallel_upload_from_config
 
 # 导入原生的 FloodWait 处理器
 try:
@@ -46,6 +48,8 @@ class MediaUploader:
         """
         self.client = client
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.general_config = general_config or {}
         self.video_processor = VideoProcessor()
         self._video_dimensions = {}
@@ -126,7 +130,7 @@ class MediaUploader:
                     return False
         
         # 使用FloodWaitHandler处理上传
-        async def upload_operation():
+        async def send_media(client: Client):
             if len(media_group) == 1:
                 # 单个媒体
                 media_item = media_group[0]
@@ -136,7 +140,7 @@ class MediaUploader:
                     debug_message = f"尝试发送照片到 {target_info}"
                     _logger.debug(debug_message)
                     
-                    sent_message = await self.client.send_photo(
+                    sent_message = await client.send_photo(
                         chat_id=target_id,
                         photo=media_item.media,
                         caption=media_item.caption,
@@ -154,7 +158,7 @@ class MediaUploader:
                     debug_message = f"尝试发送视频到 {target_info}"
                     _logger.debug(debug_message)
                     
-                    sent_message = await self.client.send_video(
+                    sent_message = await client.send_video(
                         chat_id=target_id,
                         video=media_item.media,
                         caption=media_item.caption,
@@ -169,7 +173,7 @@ class MediaUploader:
                     debug_message = f"尝试发送文档到 {target_info}"
                     _logger.debug(debug_message)
                     
-                    sent_message = await self.client.send_document(
+                    sent_message = await client.send_document(
                         chat_id=target_id,
                         document=media_item.media,
                         caption=media_item.caption,
@@ -179,7 +183,7 @@ class MediaUploader:
                     debug_message = f"尝试发送音频到 {target_info}"
                     _logger.debug(debug_message)
                     
-                    sent_message = await self.client.send_audio(
+                    sent_message = await client.send_audio(
                         chat_id=target_id,
                         audio=media_item.media,
                         caption=media_item.caption,
@@ -201,7 +205,7 @@ class MediaUploader:
                 debug_message = f"尝试发送媒体组到 {target_info}"
                 _logger.debug(debug_message)
                 
-                sent_messages = await self.client.send_media_group(
+                sent_messages = await client.send_media_group(
                     chat_id=target_id,
                     media=media_group,
                     disable_notification=True
@@ -209,6 +213,13 @@ class MediaUploader:
             
             return sent_messages
         
+        async def upload_operation():
+            # 从传输客户端池租用负载最低的客户端，未启用客户端池时使用主客户端
+            async with lease_client(self.client, target_id) as client:
+                # 大文件按通用配置并行上传分片，租用的客户端各自启用
+                enable_parallel_upload_from_config(client, self.general_config)
+                return await send_media(client)
+        
         # 使用FloodWaitHandler执行上传操作
         upload_result = await self._execute_with_flood_wait(upload_operation)
         
@@ -218,7 +229,7 @@ class MediaUploader:
             # 记录转发历史
             if self.history_manager:
                 for message in media_group_download.messages:
-                    self.history_manager.add_forward_record(
+                    await self.async_history_manager.add_forward_record(
                         media_group_download.source_channel,
                         message.id,
                         target_channel,
@@ -11,6 +11,7 @@ from pyrogram.types import Message
 from pyrogram.errors import FloodWait
 
 from src.utils.logger import get_logger
+from src.utils.client_pool import lease_client
 
 # 导入原生的 FloodWait 处理器
 try:
@@ -93,6 +94,17 @@ class MessageDownloader:
             # 没有FloodWait处理器，直接执行
             return await func(*args, **kwargs)
     
+    async def _download_media(self, message: Message, file_path: Path):
+        """
+        使用传输客户端池中负载最低的客户端下载媒体，未启用客户端池时使用主客户端
+        
+        Args:
+            message: 消息对象
+            file_path: 保存路径
+        """
+        async with lease_client(self.client) as client:
+            await client.download_media(message, file_name=str(file_path))
+    
     async def _download_single_message(self, message: Message, download_dir: Path, chat_id: int) -> Optional[Tuple[Path, str]]:
         """
         下载单个消息的媒体文件，使用智能FloodWait处理器
@@ -110,7 +122,7 @@ class MessageDownloader:
             file_path = download_dir / f"{chat_id}_{message.id}_photo.jpg"
             
             async def download_photo():
-                await self.client.download_media(message, file_name=str(file_path))
+                await self._download_media(message, file_path)
                 return file_path, "photo"
             
             result = await self._execute_with_flood_wait(download_photo)
@@ -139,7 +151,7 @@ class MessageDownloader:
             file_path = download_dir / safe_file_name
             
             async def download_video():
-                await self.client.download_media(message, file_name=str(file_path))
+                await self._download_media(message, file_path)
                 return file_path, "video"
             
             result = await self._execute_with_flood_wait(download_video)
@@ -168,7 +180,7 @@ class MessageDownloader:
             file_path = download_dir / safe_file_name
             
             async def download_document():
-                await self.client.download_media(message, file_name=str(file_path))
+                await self._download_media(message, file_path)
                 return file_path, "document"
             
             result = await self._execute_with_flood_wait(download_document)
@@ -197,7 +209,7 @@ class MessageDownloader:
             file_path = download_dir / safe_file_name
             
             async def download_audio():
-                await self.client.download_media(message, file_name=str(file_path))
+                await self._download_media(message, file_path)
                 return file_path, "audio"
             
             result = await self._execute_with_flood_wait(download_audio)
@@ -217,7 +229,7 @@ class MessageDownloader:
             file_path = download_dir / f"{chat_id}_{message.id}_animation.mp4"
             
             async def download_animation():
-                await self.client.download_media(message, file_name=str(file_path))
+                await self._download_media(message, file_path)
                 return file_path, "video"  # 作为视频上传
             
             result = await self._execute_with_flood_wait(download_animation)
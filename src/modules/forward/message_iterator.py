@@ -9,6 +9,7 @@ from pyrogram import Client
 from pyrogram.types import Message
 from pyrogram.errors import FloodWait
 
+from src.utils.message_metadata_store import extract_message_metadata
 from src.utils.logger import get_logger
 
 # 导入原生的 FloodWait 处理器
@@ -70,6 +71,30 @@ class MessageIterator:
             # 没有FloodWait处理器，直接执行
             return await func(*args, **kwargs)
 
+    async def _record_metadata(self, chat_id: Union[str, int], messages: List[Message]):
+        """
+        把获取到的消息元数据记录到本地存储，供后续按范围规划和过滤时使用
+        
+        Args:
+            chat_id: 频道ID
+            messages: 本批获取到的消息
+        """
+        history_manager = getattr(self.forwarder, 'history_manager', None) if self.forwarder else None
+        if not history_manager or not messages:
+            return
+        if not isinstance(chat_id, int):
+            # 频道用户名等标识符不能作为存储键，使用消息所属对话的数字ID
+            chat = next((msg.chat for msg in messages if getattr(msg, 'chat', None)), None)
+            if chat is None:
+                return
+            chat_id = chat.id
+        try:
+            await history_manager.get_async_manager().add_message_metadata(
+                [extract_message_metadata(chat_id, message) for message in messages]
+            )
+        except Exception as e:
+            _logger.debug(f"记录消息元数据失败: {e}")
+
     async def check_message_range(self, chat_id: Union[str, int], start_id: int, end_id: int) -> tuple[int, int]:
         """
         检查并调整消息ID范围，确保范围合理
@@ -205,10 +230,13 @@ class MessageIterator:
                         
                         # 处理获取到的消息
                         batch_valid_count = 0
+                        batch_messages = []
                         for message in messages:
                             if message and message.id in set(batch_ids):
                                 fetched_messages_map[message.id] = message
+                                batch_messages.append(message)
                                 batch_valid_count += 1
+                        await self._record_metadata(chat_id, batch_messages)
                         
                         # 更新累积总数
                         total_collected += batch_valid_count
@@ -386,6 +414,7 @@ class MessageIterator:
                         # 过滤掉None消息并按ID排序
                         valid_messages = [msg for msg in messages if msg is not None]
                         valid_messages.sort(key=lambda x: x.id)
+                        await self._record_metadata(chat_id, valid_messages)
                         
                         for message in valid_messages:
                             # 在yield消息前再次检查停止标志
@@ -44,6 +44,8 @@ class ParallelProcessor:
         """
         self.client = client
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.general_config = general_config or {}
         self.emit = emit  # 事件发射回调函数
         
@@ -186,6 +188,23 @@ class ParallelProcessor:
         
         return await execute_with_flood_wait(get_message, max_retries=3)
     
+    async def _get_forwarded_matrix(self, source_channel: str, message_ids: List[int], target_channels: List[Tuple[str, int, str]]) -> Dict[str, Set[int]]:
+        """
+        批量获取消息在各目标频道的转发状态
+        
+        Args:
+            source_channel: 源频道标识符
+            message_ids: 要检查的消息ID列表
+            target_channels: 目标频道列表
+            
+        Returns:
+            Dict[str, Set[int]]: 目标频道 -> 已转发的消息ID集合，没有历史管理器时均为空集合
+        """
+        target_names = [target_channel for target_channel, _, _ in target_channels]
+        if not self.history_manager:
+            return {target_channel: set() for target_channel in target_names}
+        return await self.async_history_manager.get_forwarded_matrix(source_channel, target_names, message_ids=message_ids)
+    
     async def _producer_download_media_groups_parallel(self, 
                                                  source_channel: str, 
                                                  source_id: int, 
@@ -214,6 +233,13 @@ class ParallelProcessor:
             
             _logger.info(f"开始并行下载 {total_groups} 个媒体组")
             
+            # 一次批量查询所有媒体组消息的转发状态，避免逐条查询历史记录
+            forwarded_matrix = await self._get_forwarded_matrix(
+                source_channel,
+                [message_id for _, message_ids in media_groups_info for message_id in message_ids],
+                target_channels
+            )
+            
             for group_id, message_ids in media_groups_info:
                 # 检查是否收到停止信号
                 if self.should_stop or not self.download_running:
@@ -231,12 +257,9 @@ class ParallelProcessor:
                     not_forwarded_targets = []
                     
                     for target_channel, target_id, target_info in target_channels:
-                        target_all_forwarded = True
-                        for message_id in message_ids:
-                            if not self.history_manager or not self.history_manager.is_message_forwarded(source_channel, message_id, target_channel):
-                                target_all_forwarded = False
-                                all_forwarded = False
-                                break
+                        target_all_forwarded = forwarded_matrix[target_channel].issuperset(message_ids)
+                        if not target_all_forwarded:
+                            all_forwarded = False
                         
                         if target_all_forwarded:
                             forwarded_targets.append(target_info)
@@ -453,12 +476,10 @@ class ParallelProcessor:
                     forwarded_targets = []
                     not_forwarded_targets = []
                     
+                    forwarded_matrix = await self._get_forwarded_matrix(source_channel, message_ids, target_channels)
+                    
                     for target_channel, _, target_info in target_channels:
-                        all_forwarded = True
-                        for message in media_group_download.messages:
-                            if not self.history_manager or not self.history_manager.is_message_forwarded(media_group_download.source_channel, message.id, target_channel):
-                                all_forwarded = False
-                                break
+                        all_forwarded = forwarded_matrix[target_channel].issuperset(message_ids)
                         
                         if all_forwarded:
                             forwarded_targets.append(target_info)
@@ -510,11 +531,7 @@ class ParallelProcessor:
                             break
                             
                         # 检查是否已转发到此频道
-                        all_forwarded = True
-                        for message in media_group_download.messages:
-                            if not self.history_manager or not self.history_manager.is_message_forwarded(media_group_download.source_channel, message.id, target_channel):
-                                all_forwarded = False
-                                break
+                        all_forwarded = forwarded_matrix[target_channel].issuperset(message_ids)
                         
                         if all_forwarded:
                             _logger.debug(f"{group_id} {message_ids} 已转发到频道 {target_info}，跳过")
@@ -557,7 +574,7 @@ class ParallelProcessor:
                                     # 记录转发历史
                                     if self.history_manager:
                                         for message in media_group_download.messages:
-                                            self.history_manager.add_forward_record(
+                                            await self.async_history_manager.add_forward_record(
                                                 media_group_download.source_channel,
                                                 message.id,
                                                 target_channel,
@@ -5,14 +5,15 @@
 import os
 import time
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Union, Any, Optional, Tuple
+from typing import List, Dict, Union, Any, Optional, Set, Tuple
 import mimetypes
 
 from pyrogram import Client
 from pyrogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio, Message
-from pyrogram.errors import FloodWait, MediaEmpty, MediaInvalid
+from pyrogram.errors import FloodWait, MediaEmpty, MediaInvalid, FileReferenceExpired, FileIdInvalid
 
 from src.utils.ui_config_manager import UIConfigManager
 from src.utils.config_utils import convert_ui_config_to_dict
@@ -21,10 +22,27 @@ from src.utils.database_manager import DatabaseManager
 from src.utils.logger import get_logger
 from src.utils.video_processor import VideoProcessor
 from src.utils.file_utils import calculate_file_hash, get_file_size
+from src.utils.file_hash_cache import file_fingerprint
+from src.utils.content_fingerprint import quick_fingerprint
+from src.utils.rate_limiter import RequestRateLimiter
+from src.utils.uploaded_media_cache import message_file_id, pre_upload_media
+from src.utils.parallel_upload import enable_parallel_upload_from_config
+from src.utils.progress_bus import ProgressAggregator, TransferProgress
 
 # 仅用于内部调试，不再用于UI输出
 logger = get_logger()
 
+# 计算完整哈希的工作线程数
+HASH_WORKERS = 2
+# 提前计算完整哈希的文件数
+HASH_PREFETCH_AHEAD = 4
+# 默认同时上传的媒体组数
+DEFAULT_CONCURRENT_UPLOADS = 3
+# 扫描和准备阶段最多领先上传的媒体组数
+UPLOAD_PREPARE_AHEAD = 2
+# 使用缓存的file_id发送时表示file_id已失效、需要重新上传的错误
+FILE_ID_INVALID_ERRORS = (FileReferenceExpired, FileIdInvalid, MediaEmpty)
+
 class Uploader():
     """
     上传模块，负责将本地文件上传到目标频道
@@ -48,6 +66,8 @@ class Uploader():
         self.ui_config_manager = ui_config_manager
         self.channel_resolver = channel_resolver
         self.history_manager = history_manager
+        # 异步历史记录接口，数据库I/O在专用线程中执行，不阻塞事件循环
+        self.async_history_manager = history_manager.get_async_manager() if history_manager else None
         self.app = app  # 保存应用程序实例引用
         
         # 获取UI配置并转换为字典
@@ -69,8 +89,30 @@ class Uploader():
         # 初始化视频处理器
         self.video_processor = VideoProcessor()
         
-        # 文件哈希缓存
+        # 文件哈希缓存：文件路径 -> (文件指纹, 哈希值)，进程外由数据库持久化
         self.file_hash_cache = {}
+        # 快速指纹缓存：文件路径 -> (文件指纹, 快速指纹)
+        self.quick_key_cache = {}
+        # 完整哈希在专用线程池中计算，进行中的计算按文件路径记录
+        self._hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="file-hash")
+        self._hash_tasks: Dict[str, asyncio.Task] = {}
+        # 没有快速指纹的历史上传记录的文件大小，为None时未知；文件大小不在其中时，快速指纹未命中即可判定未上传过
+        self._unindexed_upload_sizes: Optional[Set[int]] = None
+        # 在后台为历史上传记录补记快速指纹的任务
+        self._fingerprint_backfill_task: Optional[asyncio.Task] = None
+        
+        # 所有上传协程共享的请求速率限制器
+        self._upload_limiter = RequestRateLimiter(self.upload_config.get('delay_between_uploads', 0.5))
+        # 准备阶段提前生成的视频缩略图：文件路径 -> 生成任务
+        self._thumbnail_tasks: Dict[str, asyncio.Task] = {}
+        # 本次运行中已确认失效的file_id
+        self._invalid_file_ids = set()
+        
+        # 进度聚合器：合并各文件的分片级上传进度，以固定频率发布
+        self.progress_aggregator = ProgressAggregator(self._publish_progress, label="上传")
+        
+        # 大文件按通用配置并行上传分片
+        enable_parallel_upload_from_config(self.client, self.general_config)
     
     async def upload_local_files(self):
         """
@@ -83,6 +125,9 @@ class Uploader():
         ui_config = self.ui_config_manager.get_ui_config()
         self.config = convert_ui_config_to_dict(ui_config)
         self.upload_config = self.config.get('UPLOAD', {})
+        self.general_config = self.config.get('GENERAL', {})
+        self._upload_limiter = RequestRateLimiter(self.upload_config.get('delay_between_uploads', 0.5))
+        enable_parallel_upload_from_config(self.client, self.general_config)
         logger.debug("已刷新上传配置")
         logger.debug(f"完整的上传配置: {self.upload_config}")
         
@@ -100,16 +145,15 @@ class Uploader():
         
         logger.info(f"配置的目标频道数量: {len(target_channels)}")
         
+        # 历史中没有快速指纹的上传记录按文件大小限制快速判定，并在后台补记快速指纹
+        await self._refresh_unindexed_uploads(start_backfill=True)
+        
         # 获取上传目录
         upload_dir = Path(self.upload_config.get('directory', 'uploads'))
         if not upload_dir.exists() or not upload_dir.is_dir():
             logger.error(f"上传目录不存在或不是目录: {upload_dir}", error_type="DIRECTORY", recoverable=False)
             return
         
-        # 上传计数
-        upload_count = 0
-        total_uploaded = 0
-        
         # 获取媒体组列表（每个子文件夹作为一个媒体组）
         media_groups = [d for d in upload_dir.iterdir() if d.is_dir()]
         
@@ -192,320 +236,427 @@ class Uploader():
         
         # 开始上传
         start_time = time.time()
-        total_files = 0
-        total_media_groups = len(media_groups)
+        upload_count, total_files = await self._upload_media_group_dirs(media_groups, valid_targets)
         
-        for idx, group_dir in enumerate(media_groups):                  
-            # 更新进度
-            progress = (idx / total_media_groups) * 100
-            self.emit("progress", progress, idx, total_media_groups)
+        # 上传完成后，发送最终消息
+        await self._send_final_message(valid_targets, upload_count > 0)
+        
+        # 上传完成统计
+        end_time = time.time()
+        upload_time = end_time - start_time
+        
+        if upload_count > 0:
+            logger.info(f"上传完成: 成功上传 {upload_count} 个媒体组，共 {total_files} 个文件，耗时 {upload_time:.2f} 秒")
+            self.emit("complete", True, {
+                "total_groups": upload_count,
+                "total_files": total_files,
+                "total_time": upload_time
+            })
+        else:
+            logger.warning("没有媒体组被成功上传")
+        
+        logger.info("所有媒体文件上传完成")
+    
+    def _list_media_files(self, group_dir: Path) -> List[Path]:
+        """
+        列出媒体组文件夹中的有效媒体文件
+        
+        Args:
+            group_dir: 媒体组文件夹
             
-            group_name = group_dir.name
-            logger.info(f"处理媒体组 [{group_name}] ({idx+1}/{total_media_groups})")
+        Returns:
+            List[Path]: 媒体文件列表
+        """
+        try:
+            return [f for f in group_dir.iterdir() if f.is_file() and self._is_valid_media_file(f)]
+        except OSError as e:
+            logger.error(f"读取媒体组文件夹 {group_dir} 失败: {e}", error_type="FILE_READ", recoverable=True)
+            return []
+    
+    def _get_group_caption(self, group_dir: Path) -> Optional[str]:
+        """
+        按上传配置确定媒体组的说明文字
+        
+        Args:
+            group_dir: 媒体组文件夹
             
-            # 获取媒体组中的文件
-            media_files = [f for f in group_dir.iterdir() if f.is_file() and self._is_valid_media_file(f)]
+        Returns:
+            Optional[str]: 说明文字，不使用说明文字时返回None
+        """
+        group_name = group_dir.name
+        
+        # 从upload_config中获取caption相关参数
+        options = self.upload_config.get('options', {})
+        logger.debug(f"上传配置选项: {options}")
+        
+        # 检查options是否为空，如果为空则使用默认值
+        if not options:
+            logger.warning("上传配置options为空，使用默认值")
+            options = {
+                "use_folder_name": True,
+                "read_title_txt": False,
+                "send_final_message": False,
+                "auto_thumbnail": True
+            }
+        
+        # 明确转换为布尔值，避免字符串或其他类型的问题
+        use_folder_name = bool(options.get('use_folder_name', True))
+        read_title_txt = bool(options.get('read_title_txt', False))
+        
+        # 确保互斥性：如果两个选项都为true，优先使用read_title_txt
+        if use_folder_name and read_title_txt:
+            logger.warning("检测到use_folder_name和read_title_txt同时为true，将优先使用read_title_txt")
+            use_folder_name = False
+        
+        # 兼容性处理：如果read_title_txt为"true"字符串，确保转换为布尔值
+        if isinstance(read_title_txt, str) and read_title_txt.lower() == "true":
+            read_title_txt = True
+        # 同样处理use_folder_name
+        if isinstance(use_folder_name, str) and use_folder_name.lower() == "false":
+            use_folder_name = False
+        
+        logger.info(f"caption相关参数: use_folder_name={use_folder_name}, read_title_txt={read_title_txt}")
+        
+        caption = None
+        
+        # 根据配置决定如何设置caption
+        if read_title_txt:
+            # 检查是否有title.txt文件
+            caption_file = group_dir / "title.txt"
+            if caption_file.exists():
+                try:
+                    with open(caption_file, 'r', encoding='utf-8') as f:
+                        caption = f.read().strip()
+                    logger.info(f"已读取媒体组 {group_name} 的说明文本，长度：{len(caption)} 字符")
+                except Exception as e:
+                    logger.error(f"读取说明文本文件失败: {e}", error_type="FILE_READ", recoverable=True)
+        elif use_folder_name:
+            # 使用文件夹名称作为说明文字
+            caption = group_name
+            logger.info(f"使用文件夹名称 '{group_name}' 作为说明文本")
+        
+        return caption
+    
+    async def _upload_media_group_dirs(self, media_groups: List[Path], valid_targets: List[Tuple[str, int, str]]) -> Tuple[int, int]:
+        """
+        以流水线方式上传媒体组文件夹
+        
+        扫描协程依次列出各文件夹中的媒体文件，准备协程读取说明文字并在后台开始计算文件哈希和生成视频缩略图，
+        多个上传协程并发上传已准备好的媒体组，所有请求经过共享的速率限制器。
+        保持顺序时各上传协程先并发上传文件数据得到file_id，只有发送消息按文件夹顺序进行：
+        每个媒体组等前一个媒体组发送完成后再用file_id发送，频道中的顺序与文件夹顺序一致
+        
+        Args:
+            media_groups: 媒体组文件夹列表
+            valid_targets: 目标频道列表，元组(channel_id, channel_name, channel_info)
             
-            if not media_files:
-                logger.warning(f"媒体组文件夹 {group_name} 中没有有效的媒体文件")
-                continue
+        Returns:
+            Tuple[int, int]: (成功上传的媒体组数, 上传的文件数)
+        """
+        total_media_groups = len(media_groups)
+        workers = max(1, int(self.upload_config.get('max_concurrent_uploads', DEFAULT_CONCURRENT_UPLOADS)))
+        preserve_order = bool(self.upload_config.get('preserve_group_order', True))
+        logger.info(f"上传协程数: {workers}，{'按文件夹顺序上传' if preserve_order else '不保持文件夹顺序'}")
+        
+        loop = asyncio.get_running_loop()
+        scanned: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_PREPARE_AHEAD)
+        prepared: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_PREPARE_AHEAD)
+        # 保持顺序时第i个媒体组等待第i-1个媒体组的事件
+        turns = [asyncio.Event() for _ in media_groups] if preserve_order else None
+        stats = {'groups': 0, 'files': 0, 'done': 0}
+        
+        async def scan():
+            for idx, group_dir in enumerate(media_groups):
+                media_files = await loop.run_in_executor(None, self._list_media_files, group_dir)
+                await scanned.put((idx, group_dir, media_files))
+            await scanned.put(None)
+        
+        async def prepare():
+            while True:
+                item = await scanned.get()
+                if item is None:
+                    break
+                idx, group_dir, media_files = item
+                caption = None
+                if media_files:
+                    caption = self._get_group_caption(group_dir)
+                    self._prefetch_file_hashes(media_files)
+                    self._prepare_thumbnails(media_files)
+                await prepared.put((idx, group_dir, media_files, caption))
+            for _ in range(workers):
+                await prepared.put(None)
+        
+        async def upload():
+            while True:
+                item = await prepared.get()
+                if item is None:
+                    break
+                idx, group_dir, media_files, caption = item
+                group_name = group_dir.name
+                try:
+                    if turns is not None:
+                        # 轮到之前先上传文件数据，轮到时只需用file_id发送消息
+                        if media_files:
+                            await self._pre_upload_group(media_files, valid_targets[0][1])
+                        if idx > 0:
+                            await turns[idx - 1].wait()
+                    
+                    logger.info(f"处理媒体组 [{group_name}] ({idx+1}/{total_media_groups})")
+                    if not media_files:
+                        logger.warning(f"媒体组文件夹 {group_name} 中没有有效的媒体文件")
+                        continue
+                    
+                    logger.info(f"媒体组 {group_name} 包含 {len(media_files)} 个文件")
+                    groups, files = await self._upload_group(group_name, media_files, caption, valid_targets)
+                    stats['groups'] += groups
+                    stats['files'] += files
+                except Exception as e:
+                    logger.error(f"上传媒体组 [{group_name}] 时出错: {e}", error_type="UPLOAD", recoverable=True)
+                finally:
+                    if turns is not None:
+                        turns[idx].set()
+                    stats['done'] += 1
+                    self.emit("progress", (stats['done'] / total_media_groups) * 100, stats['done'], total_media_groups)
+        
+        tasks = [asyncio.create_task(scan()), asyncio.create_task(prepare())]
+        tasks.extend(asyncio.create_task(upload()) for _ in range(workers))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self._discard_prepared_thumbnails()
+        
+        return stats['groups'], stats['files']
+    
+    async def _upload_group(self, group_name: str, media_files: List[Path], caption: Optional[str],
+                            valid_targets: List[Tuple[str, int, str]]) -> Tuple[int, int]:
+        """
+        将一个媒体组上传到所有目标频道，有多个目标频道时先上传到第一个频道再复制到其他频道
+        
+        Args:
+            group_name: 媒体组名称
+            media_files: 媒体文件列表
+            caption: 说明文字
+            valid_targets: 目标频道列表，元组(channel_id, channel_name, channel_info)
             
-            logger.info(f"媒体组 {group_name} 包含 {len(media_files)} 个文件")
-            
-            # 从upload_config中获取caption相关参数
-            options = self.upload_config.get('options', {})
-            logger.debug(f"上传配置选项: {options}")
-            
-            # 检查options是否为空，如果为空则使用默认值
-            if not options:
-                logger.warning("上传配置options为空，使用默认值")
-                options = {
-                    "use_folder_name": True,
-                    "read_title_txt": False,
-                    "send_final_message": False,
-                    "auto_thumbnail": True
-                }
-            
-            # 明确转换为布尔值，避免字符串或其他类型的问题
-            use_folder_name = bool(options.get('use_folder_name', True))
-            read_title_txt = bool(options.get('read_title_txt', False))
-            
-            # 确保互斥性：如果两个选项都为true，优先使用read_title_txt
-            if use_folder_name and read_title_txt:
-                logger.warning("检测到use_folder_name和read_title_txt同时为true，将优先使用read_title_txt")
-                use_folder_name = False
-            
-            # 兼容性处理：如果read_title_txt为"true"字符串，确保转换为布尔值
-            if isinstance(read_title_txt, str) and read_title_txt.lower() == "true":
-                read_title_txt = True
-            # 同样处理use_folder_name
-            if isinstance(use_folder_name, str) and use_folder_name.lower() == "false":
-                use_folder_name = False
-            
-            logger.info(f"caption相关参数: use_folder_name={use_folder_name}, read_title_txt={read_title_txt}")
-            
-            caption = None
-            
-            # 根据配置决定如何设置caption
-            if read_title_txt:
-                # 检查是否有title.txt文件
-                caption_file = group_dir / "title.txt"
-                if caption_file.exists():
-                    try:
-                        with open(caption_file, 'r', encoding='utf-8') as f:
-                            caption = f.read().strip()
-                        logger.info(f"已读取媒体组 {group_name} 的说明文本，长度：{len(caption)} 字符")
-                    except Exception as e:
-                        logger.error(f"读取说明文本文件失败: {e}", error_type="FILE_READ", recoverable=True)
-            elif use_folder_name:
-                # 使用文件夹名称作为说明文字
-                caption = group_name
-                logger.info(f"使用文件夹名称 '{group_name}' 作为说明文本")
+        Returns:
+            Tuple[int, int]: (成功上传的媒体组数，0或1, 上传的文件数，每个频道分别计数)
+        """
+        upload_count = 0
+        total_files = 0
+        
+        # 上传到所有目标频道
+        if len(valid_targets) > 1:
+            # 有多个目标频道，使用优化逻辑
+            first_target, first_target_id, first_target_info = valid_targets[0]
+            other_targets = valid_targets[1:]
             
-            # 上传到所有目标频道
-            if len(valid_targets) > 1:
-                # 有多个目标频道，使用优化逻辑
-                first_target, first_target_id, first_target_info = valid_targets[0]
-                other_targets = valid_targets[1:]
-                
-                # 先上传到第一个目标频道
-                logger.info(f"上传媒体组 [{group_name}] 到第一个目标频道 {first_target_info}")
-                
-                # 上传媒体组
-                if len(media_files) == 1:
-                    # 单个文件，直接上传
-                    success, actually_uploaded, message = await self._upload_single_file_with_message(media_files[0], first_target_id, caption)
-                    if success:
-                        if actually_uploaded:
+            # 先上传到第一个目标频道
+            logger.info(f"上传媒体组 [{group_name}] 到第一个目标频道 {first_target_info}")
+            
+            # 上传媒体组
+            if len(media_files) == 1:
+                # 单个文件，直接上传
+                success, actually_uploaded, message = await self._upload_single_file_with_message(media_files[0], first_target_id, caption)
+                if success:
+                    if actually_uploaded:
+                        total_files += 1
+                        upload_count += 1
+                        
+                        # 如果上传成功并且有消息对象，复制到其他频道
+                        if message:
+                            for target, target_id, target_info in other_targets:
+                                try:
+                                    logger.info(f"复制消息到频道: {target_info}")
+                                    
+                                    # 使用copy_message复制消息
+                                    await self._upload_limiter.wait()
+                                    copied_message = await self.client.copy_message(
+                                        chat_id=target_id,
+                                        from_chat_id=first_target_id,
+                                        message_id=message.id,
+                                        disable_notification=True
+                                    )
+                                    
+                                    if copied_message:
+                                        logger.info(f"成功复制消息到频道: {target_info}")
+                                        total_files += 1  # 增加文件计数（每个频道算一次）
+                                        
+                                        # 记录上传历史 - 添加复制的消息记录
+                                        file_str = str(media_files[0])
+                                        file_hash = await self._get_file_hash(media_files[0])
+                                        
+                                        if file_hash:
+                                            target_id_str = str(target_id)
+                                            file_size = get_file_size(media_files[0])
+                                            media_type = self._get_media_type(media_files[0])
+                                            
+                                            # 添加到历史记录
+                                            await self.async_history_manager.add_upload_record_by_hash(
+                                                file_hash=file_hash,
+                                                file_path=file_str,
+                                                target_channel=target_id_str,
+                                                file_size=file_size,
+                                                media_type=media_type
+                                            )
+                                            
+                                            logger.info(f"已记录文件 {media_files[0].name} 复制到 {target_info} 的历史记录")
+                                    else:
+                                        logger.warning(f"复制消息到 {target_info} 返回空结果")
+                                        raise Exception("复制消息返回空结果")
+                                
+                                except Exception as e:
+                                    logger.error(f"复制消息到频道 {target_info} 失败: {e}")
+                                    # 如果复制失败，尝试直接上传
+                                    logger.info(f"尝试直接上传文件 [{media_files[0].name}] 到频道 {target_info}")
+                                    direct_success, direct_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
+                                    if direct_success and direct_uploaded:
+                                        total_files += 1  # 增加文件计数（直接上传成功）
+                                
+                    else:
+                        logger.info(f"文件 {media_files[0].name} 已存在于目标频道，不计入上传统计")
+                else:
+                    # 第一个频道上传失败，尝试直接上传到其他频道
+                    logger.warning(f"上传文件 [{media_files[0].name}] 到第一个目标频道失败，将直接上传到其他频道")
+                    
+                    for target, target_id, target_info in other_targets:
+                        logger.info(f"上传文件 [{media_files[0].name}] 到 {target_info}")
+                        direct_success, direct_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
+                        if direct_success and direct_uploaded:
                             total_files += 1
                             upload_count += 1
+                        
+            else:
+                # 多个文件，作为媒体组上传
+                success, actually_uploaded, messages = await self._upload_media_group_with_messages(media_files, first_target_id, caption)
+                if success:
+                    if actually_uploaded:
+                        # 只有在实际上传时才增加计数
+                        total_files += len(media_files)
+                        upload_count += 1
+                        
+                        # 如果上传成功并且有消息对象，复制到其他频道
+                        if messages and len(messages) > 0:
+                            # 获取媒体组的第一个消息的ID
+                            first_message_id = messages[0].id
+                            logger.info(f"媒体组第一条消息ID: {first_message_id}")
                             
-                            # 如果上传成功并且有消息对象，复制到其他频道
-                            if message:
-                                for target, target_id, target_info in other_targets:
-                                    try:
-                                        logger.info(f"复制消息到频道: {target_info}")
+                            # 媒体组消息是连续的，计算消息ID范围
+                            message_count = len(messages)
+                            
+                            for target, target_id, target_info in other_targets:
+                                try:
+                                    logger.info(f"复制媒体组到频道: {target_info}")
+                                    
+                                    # 使用copy_media_group复制媒体组（保持原始消息性质）
+                                    if len(messages) > 1 and hasattr(messages[0], 'media_group_id') and messages[0].media_group_id:
+                                        # 多条消息的媒体组，使用copy_media_group
+                                        await self._upload_limiter.wait()
+                                        copied_messages = await self.client.copy_media_group(
+                                            chat_id=target_id,
+                                            from_chat_id=first_target_id,
+                                            message_id=first_message_id,
+                                            disable_notification=True
+                                        )
                                         
-                                        # 使用copy_message复制消息
+                                        if copied_messages:
+                                            logger.info(f"成功复制媒体组到频道: {target_info}，共 {len(copied_messages)} 条消息")
+                                            total_files += len(media_files)  # 增加文件计数（每个频道算一次）
+                                        else:
+                                            logger.warning(f"复制媒体组到 {target_info} 返回空结果")
+                                            raise Exception("复制媒体组返回空结果")
+                                    else:
+                                        # 单条消息，使用copy_message
+                                        await self._upload_limiter.wait()
                                         copied_message = await self.client.copy_message(
                                             chat_id=target_id,
                                             from_chat_id=first_target_id,
-                                            message_id=message.id,
+                                            message_id=first_message_id,
                                             disable_notification=True
                                         )
                                         
                                         if copied_message:
-                                            logger.info(f"成功复制消息到频道: {target_info}")
-                                            total_files += 1  # 增加文件计数（每个频道算一次）
-                                            
-                                            # 记录上传历史 - 添加复制的消息记录
-                                            file_str = str(media_files[0])
-                                            file_hash = self.file_hash_cache.get(file_str)
-                                            if not file_hash:
-                                                file_hash = calculate_file_hash(media_files[0])
-                                                if file_hash:
-                                                    self.file_hash_cache[file_str] = file_hash
-                                            
-                                            if file_hash:
-                                                target_id_str = str(target_id)
-                                                file_size = get_file_size(media_files[0])
-                                                media_type = self._get_media_type(media_files[0])
-                                                
-                                                # 添加到历史记录
-                                                self.history_manager.add_upload_record_by_hash(
-                                                    file_hash=file_hash,
-                                                    file_path=file_str,
-                                                    target_channel=target_id_str,
-                                                    file_size=file_size,
-                                                    media_type=media_type
-                                                )
-                                                
-                                                logger.info(f"已记录文件 {media_files[0].name} 复制到 {target_info} 的历史记录")
+                                            logger.info(f"成功复制单条消息到频道: {target_info}")
+                                            total_files += len(media_files)  # 增加文件计数（每个频道算一次）
                                         else:
                                             logger.warning(f"复制消息到 {target_info} 返回空结果")
                                             raise Exception("复制消息返回空结果")
                                     
-                                    except Exception as e:
-                                        logger.error(f"复制消息到频道 {target_info} 失败: {e}")
-                                        # 如果复制失败，尝试直接上传
-                                        logger.info(f"尝试直接上传文件 [{media_files[0].name}] 到频道 {target_info}")
-                                        direct_success, direct_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
-                                        if direct_success and direct_uploaded:
-                                            total_files += 1  # 增加文件计数（直接上传成功）
-                                    
-                                    # 简单的速率限制
-                                    await asyncio.sleep(1)
-                        else:
-                            logger.info(f"文件 {media_files[0].name} 已存在于目标频道，不计入上传统计")
-                    else:
-                        # 第一个频道上传失败，尝试直接上传到其他频道
-                        logger.warning(f"上传文件 [{media_files[0].name}] 到第一个目标频道失败，将直接上传到其他频道")
-                        
-                        for target, target_id, target_info in other_targets:
-                            logger.info(f"上传文件 [{media_files[0].name}] 到 {target_info}")
-                            direct_success, direct_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
-                            if direct_success and direct_uploaded:
-                                total_files += 1
-                                upload_count += 1
-                            
-                            # 简单的速率限制
-                            await asyncio.sleep(1)
-                else:
-                    # 多个文件，作为媒体组上传
-                    success, actually_uploaded, messages = await self._upload_media_group_with_messages(media_files, first_target_id, caption)
-                    if success:
-                        if actually_uploaded:
-                            # 只有在实际上传时才增加计数
-                            total_files += len(media_files)
-                            upload_count += 1
-                            
-                            # 如果上传成功并且有消息对象，复制到其他频道
-                            if messages and len(messages) > 0:
-                                # 获取媒体组的第一个消息的ID
-                                first_message_id = messages[0].id
-                                logger.info(f"媒体组第一条消息ID: {first_message_id}")
-                                
-                                # 媒体组消息是连续的，计算消息ID范围
-                                message_count = len(messages)
-                                
-                                for target, target_id, target_info in other_targets:
-                                    try:
-                                        logger.info(f"复制媒体组到频道: {target_info}")
+                                    # 记录所有文件的上传历史
+                                    for media_file in media_files:
+                                        file_str = str(media_file)
+                                        file_hash = await self._get_file_hash(media_file)
                                         
-                                        # 使用copy_media_group复制媒体组（保持原始消息性质）
-                                        if len(messages) > 1 and hasattr(messages[0], 'media_group_id') and messages[0].media_group_id:
-                                            # 多条消息的媒体组，使用copy_media_group
-                                            copied_messages = await self.client.copy_media_group(
-                                                chat_id=target_id,
-                                                from_chat_id=first_target_id,
-                                                message_id=first_message_id,
-                                                disable_notification=True
-                                            )
+                                        if file_hash:
+                                            target_id_str = str(target_id)
+                                            file_size = get_file_size(media_file)
+                                            media_type = self._get_media_type(media_file)
                                             
-                                            if copied_messages:
-                                                logger.info(f"成功复制媒体组到频道: {target_info}，共 {len(copied_messages)} 条消息")
-                                                total_files += len(media_files)  # 增加文件计数（每个频道算一次）
-                                            else:
-                                                logger.warning(f"复制媒体组到 {target_info} 返回空结果")
-                                                raise Exception("复制媒体组返回空结果")
-                                        else:
-                                            # 单条消息，使用copy_message
-                                            copied_message = await self.client.copy_message(
-                                                chat_id=target_id,
-                                                from_chat_id=first_target_id,
-                                                message_id=first_message_id,
-                                                disable_notification=True
+                                            # 添加到历史记录
+                                            await self.async_history_manager.add_upload_record_by_hash(
+                                                file_hash=file_hash,
+                                                file_path=file_str,
+                                                target_channel=target_id_str,
+                                                file_size=file_size,
+                                                media_type=media_type
                                             )
                                             
-                                            if copied_message:
-                                                logger.info(f"成功复制单条消息到频道: {target_info}")
-                                                total_files += len(media_files)  # 增加文件计数（每个频道算一次）
-                                            else:
-                                                logger.warning(f"复制消息到 {target_info} 返回空结果")
-                                                raise Exception("复制消息返回空结果")
-                                        
-                                        # 记录所有文件的上传历史
-                                        for media_file in media_files:
-                                            file_str = str(media_file)
-                                            file_hash = self.file_hash_cache.get(file_str)
-                                            if not file_hash:
-                                                file_hash = calculate_file_hash(media_file)
-                                                if file_hash:
-                                                    self.file_hash_cache[file_str] = file_hash
-                                            
-                                            if file_hash:
-                                                target_id_str = str(target_id)
-                                                file_size = get_file_size(media_file)
-                                                media_type = self._get_media_type(media_file)
-                                                
-                                                # 添加到历史记录
-                                                self.history_manager.add_upload_record_by_hash(
-                                                    file_hash=file_hash,
-                                                    file_path=file_str,
-                                                    target_channel=target_id_str,
-                                                    file_size=file_size,
-                                                    media_type=media_type
-                                                )
-                                                
-                                                logger.debug(f"已记录文件 {media_file.name} 的复制历史到频道 {target_info}")
-                                        
-                                        logger.info(f"已记录媒体组 {group_name} 的所有文件复制到 {target_info} 的历史记录，共 {len(media_files)} 个文件")
+                                            logger.debug(f"已记录文件 {media_file.name} 的复制历史到频道 {target_info}")
                                     
-                                    except Exception as e:
-                                        logger.error(f"复制媒体组到频道 {target_info} 失败: {e}")
-                                        # 如果复制失败，尝试直接上传
-                                        logger.info(f"尝试直接上传媒体组到频道 {target_info}")
-                                        direct_success, direct_uploaded = await self._upload_media_group(media_files, target_id, caption)
-                                        if direct_success and direct_uploaded:
-                                            total_files += len(media_files)  # 增加文件计数（直接上传成功）
-                                            logger.info(f"直接上传媒体组到 {target_info} 成功")
-                                        else:
-                                            logger.warning(f"直接上传媒体组到 {target_info} 也失败")
-                                    
-                                    # 简单的速率限制
-                                    await asyncio.sleep(1.5)
-                        else:
-                            logger.info(f"媒体组 {group_name} 的所有文件都已存在于目标频道，不计入上传统计")
+                                    logger.info(f"已记录媒体组 {group_name} 的所有文件复制到 {target_info} 的历史记录，共 {len(media_files)} 个文件")
+                                
+                                except Exception as e:
+                                    logger.error(f"复制媒体组到频道 {target_info} 失败: {e}")
+                                    # 如果复制失败，尝试直接上传
+                                    logger.info(f"尝试直接上传媒体组到频道 {target_info}")
+                                    direct_success, direct_uploaded = await self._upload_media_group(media_files, target_id, caption)
+                                    if direct_success and direct_uploaded:
+                                        total_files += len(media_files)  # 增加文件计数（直接上传成功）
+                                        logger.info(f"直接上传媒体组到 {target_info} 成功")
+                                    else:
+                                        logger.warning(f"直接上传媒体组到 {target_info} 也失败")
+                                
                     else:
-                        # 第一个频道上传失败，尝试直接上传到其他频道
-                        logger.warning(f"上传媒体组 [{group_name}] 到第一个目标频道失败，将直接上传到其他频道")
-                        
-                        for target, target_id, target_info in other_targets:
-                            logger.info(f"上传媒体组 [{group_name}] 到 {target_info}")
-                            direct_success, direct_uploaded = await self._upload_media_group(media_files, target_id, caption)
-                            if direct_success and direct_uploaded:
-                                total_files += len(media_files)
-                                upload_count += 1
-                            
-                            # 简单的速率限制
-                            await asyncio.sleep(2)
-            else:
-                # 只有一个目标频道，使用原有逻辑
-                target, target_id, target_info = valid_targets[0]                         
-                logger.info(f"上传媒体组 [{group_name}] 到 {target_info}")
-                
-                # 上传媒体组
-                if len(media_files) == 1:
-                    # 单个文件，直接上传
-                    success, actually_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
-                    if success:
-                        if actually_uploaded:
-                            total_files += 1
-                            upload_count += 1
-                        else:
-                            logger.info(f"文件 {media_files[0].name} 已存在于目标频道，不计入上传统计")
+                        logger.info(f"媒体组 {group_name} 的所有文件都已存在于目标频道，不计入上传统计")
                 else:
-                    # 多个文件，作为媒体组上传
-                    success, actually_uploaded = await self._upload_media_group(media_files, target_id, caption)
-                    if success:
-                        if actually_uploaded:
-                            # 只有在实际上传时才增加计数
+                    # 第一个频道上传失败，尝试直接上传到其他频道
+                    logger.warning(f"上传媒体组 [{group_name}] 到第一个目标频道失败，将直接上传到其他频道")
+                    
+                    for target, target_id, target_info in other_targets:
+                        logger.info(f"上传媒体组 [{group_name}] 到 {target_info}")
+                        direct_success, direct_uploaded = await self._upload_media_group(media_files, target_id, caption)
+                        if direct_success and direct_uploaded:
                             total_files += len(media_files)
                             upload_count += 1
-                        else:
-                            logger.info(f"媒体组 {group_name} 的所有文件都已存在于目标频道，不计入上传统计")
-            
-            # 简单的速率限制，防止过快发送请求
-            await asyncio.sleep(2)
-        
-        # 上传完成后，发送最终消息
-        await self._send_final_message(valid_targets, upload_count > 0)
-        
-        # 上传完成统计
-        end_time = time.time()
-        upload_time = end_time - start_time
-        
-        if upload_count > 0:
-            logger.info(f"上传完成: 成功上传 {upload_count} 个媒体组，共 {total_files} 个文件，耗时 {upload_time:.2f} 秒")
-            self.emit("complete", True, {
-                "total_groups": upload_count,
-                "total_files": total_files,
-                "total_time": upload_time
-            })
+                        
         else:
-            logger.warning("没有媒体组被成功上传")
+            # 只有一个目标频道，使用原有逻辑
+            target, target_id, target_info = valid_targets[0]                         
+            logger.info(f"上传媒体组 [{group_name}] 到 {target_info}")
+            
+            # 上传媒体组
+            if len(media_files) == 1:
+                # 单个文件，直接上传
+                success, actually_uploaded = await self._upload_single_file(media_files[0], target_id, caption)
+                if success:
+                    if actually_uploaded:
+                        total_files += 1
+                        upload_count += 1
+                    else:
+                        logger.info(f"文件 {media_files[0].name} 已存在于目标频道，不计入上传统计")
+            else:
+                # 多个文件，作为媒体组上传
+                success, actually_uploaded = await self._upload_media_group(media_files, target_id, caption)
+                if success:
+                    if actually_uploaded:
+                        # 只有在实际上传时才增加计数
+                        total_files += len(media_files)
+                        upload_count += 1
+                    else:
+                        logger.info(f"媒体组 {group_name} 的所有文件都已存在于目标频道，不计入上传统计")
         
-        logger.info("所有媒体文件上传完成")
+        return upload_count, total_files
     
     def _is_valid_media_file(self, file_path: Path) -> bool:
         """
@@ -546,449 +697,511 @@ class Uploader():
         
         return False
     
-    async def _upload_media_group(self, files: List[Path], chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+    def _prepare_thumbnails(self, files: List[Path]):
         """
-        将多个文件作为媒体组上传
+        在后台开始生成视频文件的缩略图，上传时直接使用
         
         Args:
-            files: 文件路径列表
-            chat_id: 目标聊天ID
-            caption: 说明文本，仅会应用到第一个媒体
+            files: 即将上传的文件列表
+        """
+        for file in files:
+            file_str = str(file)
+            if file_str not in self._thumbnail_tasks and self._get_media_type(file) == "video":
+                self._thumbnail_tasks[file_str] = asyncio.create_task(self.video_processor.extract_thumbnail_async(file_str))
+    
+    async def _take_thumbnail(self, file: Path):
+        """
+        获取视频文件的缩略图，优先使用准备阶段生成的结果，每个结果只使用一次
+        
+        Args:
+            file: 视频文件路径
             
         Returns:
-            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+            与 VideoProcessor.extract_thumbnail_async 相同的结果
         """
-        # 最多支持10个媒体文件作为一个组
-        if len(files) > 10:
-            # 分组上传
-            logger.warning(f"媒体组包含 {len(files)} 个文件，超过最大限制(10)，将分批上传")
-            chunks = [files[i:i+10] for i in range(0, len(files), 10)]
-            success = True
-            actually_uploaded = False
-            for i, chunk in enumerate(chunks):
-                chunk_success, chunk_uploaded = await self._upload_media_group_chunk(chunk, chat_id, caption if i == 0 else None)
-                if not chunk_success:
-                    success = False
-                if chunk_uploaded:
-                    actually_uploaded = True
-                # 批次间隔
-                await asyncio.sleep(3)
-            return success, actually_uploaded
-        else:
-            # 直接上传这组文件
-            return await self._upload_media_group_chunk(files, chat_id, caption)
+        task = self._thumbnail_tasks.pop(str(file), None)
+        if task is not None:
+            return await task
+        return await self.video_processor.extract_thumbnail_async(str(file))
     
-    async def _upload_media_group_chunk(self, files: List[Path], chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+    async def _get_video_attributes(self, file: Path) -> Tuple[Optional[str], Optional[int], Optional[int], Optional[int]]:
         """
-        上传一个媒体组块（最多10个文件）
+        获取上传视频文件时使用的缩略图和视频尺寸，生成失败时对应项为None
         
+        Args:
+            file: 视频文件路径
+            
         Returns:
-            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+            Tuple[Optional[str], Optional[int], Optional[int], Optional[int]]: (缩略图路径, 宽度, 高度, 时长)，缩略图由调用方删除
         """
-        if not files:
-            return False, False
-        
-        chat_id_str = str(chat_id)
+        try:
+            result = await self._take_thumbnail(file)
+        except Exception as e:
+            logger.warning(f"生成视频缩略图失败: {e}")
+            return None, None, None, None
+        
+        if not result:
+            return None, None, None, None
+        if not isinstance(result, tuple):
+            logger.debug(f"已生成视频缩略图: {result}")
+            return result, None, None, None
+        
+        thumbnail, width, height, duration = (tuple(result) + (None, None, None))[:4]
+        # 确保duration是整数类型
+        if duration is not None:
+            duration = int(duration)
+        if width and height:
+            logger.debug(f"已生成视频缩略图: {thumbnail}, 尺寸: {width}x{height}, 时长: {duration if duration else '未知'}秒")
+        else:
+            logger.debug(f"已生成视频缩略图: {thumbnail}")
+        return thumbnail, width, height, duration
+    
+    async def _discard_prepared_thumbnails(self):
+        """取消未使用的缩略图生成任务，删除已生成但未使用的缩略图"""
+        tasks, self._thumbnail_tasks = self._thumbnail_tasks, {}
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+                continue
+            if task.cancelled() or task.exception():
+                continue
+            result = task.result()
+            thumb = result[0] if isinstance(result, tuple) else result
+            try:
+                if thumb and os.path.exists(thumb):
+                    os.remove(thumb)
+            except Exception as e:
+                logger.warning(f"删除缩略图失败: {e}")
+    
+    async def _get_file_hash(self, file_path: Path) -> Optional[str]:
+        """
+        获取文件的MD5哈希，已在后台计算的文件等待其结果
         
-        # 过滤已上传的文件
-        filtered_files = []
-        file_hashes = {}  # 存储文件哈希值
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            Optional[str]: 文件哈希值，文件不存在或读取失败时返回None
+        """
+        task = self._hash_tasks.get(str(file_path))
+        if task is not None:
+            return await asyncio.shield(task)
+        return await self._compute_file_hash(file_path)
+    
+    def _prefetch_file_hashes(self, files: List[Path]):
+        """
+        在后台开始计算文件的完整哈希，使哈希计算与前面文件的上传重叠
         
+        Args:
+            files: 即将上传的文件列表
+        """
         for file in files:
             file_str = str(file)
-            # 计算文件哈希
-            if file_str in self.file_hash_cache:
-                file_hash = self.file_hash_cache[file_str]
-            else:
-                file_hash = calculate_file_hash(file)
-                if file_hash:
-                    self.file_hash_cache[file_str] = file_hash
-                else:
-                    logger.warning(f"无法计算文件哈希值: {file}")
-                    continue
-            
-            # 检查是否已上传
-            if self.history_manager.is_file_hash_uploaded(file_hash, chat_id_str):
-                logger.info(f"文件 {file.name} (哈希: {file_hash[:8]}...) 已上传到频道 {chat_id_str}，从媒体组中跳过")
-                
-                # 发送文件已上传事件
-                self.emit("file_already_uploaded", {
-                    "chat_id": chat_id,
-                    "file_name": file.name,
-                    "file_path": file_str,
-                    "file_hash": file_hash,
-                    "media_type": self._get_media_type(file)
-                })
-            else:
-                filtered_files.append(file)
-                file_hashes[file_str] = file_hash
+            if file_str in self._hash_tasks or file_str in self.file_hash_cache:
+                continue
+            task = asyncio.create_task(self._compute_file_hash(file))
+            self._hash_tasks[file_str] = task
+            task.add_done_callback(lambda _, key=file_str: self._hash_tasks.pop(key, None))
+    
+    async def _get_quick_key(self, file_path: Path) -> Optional[str]:
+        """
+        获取文件的快速指纹，只读取文件头部、中部和尾部的样本
         
-        # 如果所有文件都已上传过，直接返回成功
-        if not filtered_files:
-            logger.info(f"媒体组中的所有文件都已上传到频道 {chat_id_str}，跳过整个媒体组")
-            return True, False  # 成功但没有实际上传新文件
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            Optional[str]: 快速指纹，文件不存在或读取失败时返回None
+        """
+        file_str = str(file_path)
+        fingerprint = file_fingerprint(file_str)
+        if fingerprint is None:
+            return None
+        
+        cached = self.quick_key_cache.get(file_str)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        
+        # 不使用完整哈希的线程池，避免排在大文件的哈希计算之后
+        loop = asyncio.get_running_loop()
+        quick_key = await loop.run_in_executor(None, quick_fingerprint, file_str)
+        if quick_key:
+            self.quick_key_cache[file_str] = (fingerprint, quick_key)
+        return quick_key
+    
+    async def _refresh_unindexed_uploads(self, start_backfill: bool = False):
+        """
+        重新读取没有快速指纹的历史上传记录，更新不能仅凭快速指纹判定的文件大小
         
-        # 如果过滤后只剩一个文件，作为单个文件上传
-        if len(filtered_files) == 1:
-            logger.info(f"媒体组中只有一个文件需要上传，转为单文件上传")
-            return await self._upload_single_file(filtered_files[0], chat_id, caption)
+        Args:
+            start_backfill: 是否在后台为这些记录补记快速指纹
+        """
+        rows = await self.async_history_manager.get_unindexed_uploads()
+        if rows is None:
+            self._unindexed_upload_sizes = None
+            return
+        self._unindexed_upload_sizes = {file_size for _, _, file_size in rows}
+        if not rows:
+            return
+        logger.debug(f"上传历史中有 {len(rows)} 条记录没有快速指纹，相同大小的文件去重将等待完整哈希")
+        if start_backfill and (self._fingerprint_backfill_task is None or self._fingerprint_backfill_task.done()):
+            self._fingerprint_backfill_task = asyncio.create_task(self._backfill_upload_fingerprints(rows))
+    
+    def _quick_key_conclusive(self, quick_key: str) -> bool:
+        """
+        判断快速指纹未命中时能否直接判定文件未上传过，没有快速指纹的历史记录中存在相同大小或大小未知的记录时不能
         
-        # 准备媒体组
-        media_group = []
-        thumbnails = []  # 记录生成的缩略图文件以便清理
+        Args:
+            quick_key: 形如 "<大小>:<样本哈希>" 的快速指纹
+            
+        Returns:
+            bool: 是否可以直接判定
+        """
+        sizes = self._unindexed_upload_sizes
+        if sizes is None or 0 in sizes:
+            return False
+        try:
+            return int(quick_key.split(':', 1)[0]) not in sizes
+        except ValueError:
+            return False
+    
+    async def _backfill_upload_fingerprints(self, rows: List[Tuple[str, str, int]]):
+        """
+        为快速指纹功能之前的上传记录补记快速指纹，记录中的文件仍存在且完整哈希与记录一致时才写入；
+        完整哈希经过持久化哈希缓存，已读取过的文件之后不再重复读取
         
+        Args:
+            rows: (文件哈希, 文件路径, 文件大小) 列表
+        """
+        indexed = 0
         try:
-            for i, file in enumerate(filtered_files):
-                file_caption = caption if i == 0 else None
-                media_type = self._get_media_type(file)
-                
-                if media_type == "photo":
-                    media = InputMediaPhoto(
-                        media=str(file),
-                        caption=file_caption
-                    )
-                    media_group.append(media)
-                
-                elif media_type == "video":
-                    # 生成缩略图和获取视频尺寸
-                    thumbnail = None
-                    width = height = None
-                    duration = None
-                    try:
-                        result = await self.video_processor.extract_thumbnail_async(str(file))
-                        if result:
-                            if isinstance(result, tuple) and len(result) == 4:
-                                thumbnail, width, height, duration = result
-                                # 确保duration是整数类型
-                                if duration is not None:
-                                    duration = int(duration)
-                            elif isinstance(result, tuple) and len(result) == 3:
-                                thumbnail, width, height = result
-                            else:
-                                thumbnail = result
-                            
-                            thumbnails.append(thumbnail)
-                            if width and height:
-                                logger.debug(f"已生成视频缩略图: {thumbnail}, 尺寸: {width}x{height}, 时长: {duration if duration else '未知'}秒")
-                            else:
-                                logger.debug(f"已生成视频缩略图: {thumbnail}")
-                    except Exception as e:
-                        logger.warning(f"生成视频缩略图失败: {e}")
-                    
-                    # 创建媒体对象，包含宽度、高度和时长
-                    media = InputMediaVideo(
-                        media=str(file),
-                        caption=file_caption,
-                        thumb=thumbnail,
-                        supports_streaming=True,
-                        width=width,
-                        height=height,
-                        duration=duration
-                    )
-                    media_group.append(media)
-                
-                elif media_type == "document":
-                    media = InputMediaDocument(
-                        media=str(file),
-                        caption=file_caption
-                    )
-                    media_group.append(media)
-                
-                elif media_type == "audio":
-                    media = InputMediaAudio(
-                        media=str(file),
-                        caption=file_caption
-                    )
-                    media_group.append(media)
-                
-                else:
-                    logger.warning(f"不支持的媒体类型: {file}")
+            for file_hash, file_path, file_size in rows:
+                path = Path(file_path) if file_path else None
+                if path is None or not path.is_file():
                     continue
+                if file_size > 0 and get_file_size(path) != file_size:
+                    continue
+                quick_key = await self._get_quick_key(path)
+                if quick_key and await self._compute_file_hash(path) == file_hash:
+                    await self.async_history_manager.add_content_fingerprint(quick_key, file_hash)
+                    indexed += 1
+        except Exception as e:
+            logger.warning(f"补记上传历史的快速指纹失败: {e}")
+        
+        if indexed:
+            logger.info(f"已为 {indexed} 条历史上传记录补记快速指纹")
+        await self._refresh_unindexed_uploads()
+    
+    async def _check_file_uploaded(self, file: Path, chat_id_str: str) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        检查文件内容是否已上传到目标频道
+        
+        先比较快速指纹，未命中任何已上传内容时直接判定为未上传，完整哈希留在后台计算，
+        只有快速指纹命中时才等待完整哈希并查询上传历史
+        
+        Args:
+            file: 文件路径
+            chat_id_str: 目标频道ID
             
-            if not media_group:
-                logger.warning("没有有效的媒体文件可以上传")
-                return False, False
-            
-            # 上传媒体组
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    # 捕获任何上传问题
-                    logger.info(f"上传媒体组 ({len(media_group)} 个文件)...")
-                    
-                    start_time = time.time()
-                    result = await self.client.send_media_group(
-                        chat_id=chat_id,
-                        media=media_group
-                    )
-                    end_time = time.time()
-                    
-                    upload_time = end_time - start_time
-                    logger.info(f"媒体组上传成功，耗时 {upload_time:.2f} 秒")
-                    
-                    # 保存上传历史记录
-                    for msg in result:
-                        # 获取文件路径和大小
-                        if hasattr(msg, 'file') and hasattr(msg.file, 'size'):
-                            file_size = msg.file.size
-                        else:
-                            file_size = 0
-                        
-                        # 确定媒体类型
-                        if msg.photo:
-                            file_media_type = "photo"
-                        elif msg.video:
-                            file_media_type = "video"
-                        elif msg.document:
-                            file_media_type = "document"
-                        elif msg.audio:
-                            file_media_type = "audio"
-                        else:
-                            file_media_type = "unknown"
-                        
-                        # 用消息ID确定对应的媒体文件
-                        # 由于PyroGram不提供足够的信息来确定哪个消息对应哪个文件
-                        # 我们假设消息顺序与文件顺序相同
-                        idx = min(result.index(msg), len(filtered_files) - 1)
-                        file_path = str(filtered_files[idx])
-                        file_hash = file_hashes.get(file_path)
-                        
-                        if file_hash:
-                            # 记录上传
-                            self.history_manager.add_upload_record_by_hash(
-                                file_hash=file_hash,
-                                file_path=file_path,
-                                target_channel=chat_id_str,
-                                file_size=file_size,
-                                media_type=file_media_type
-                            )
-                    
-                    # 发送上传成功事件
-                    media_group_info = {
-                        "chat_id": chat_id,
-                        "media_count": len(media_group),
-                        "upload_time": upload_time,
-                        "is_group": True,
-                        "files": [str(f) for f in filtered_files]
-                    }
-                    self.emit("media_upload", media_group_info)
-                    
-                    # 同时为媒体组发送file_uploaded事件
-                    self.emit("file_uploaded", f"媒体组({len(media_group)}个文件)", True)
-                    
-                    return True, True  # 成功且实际上传了新文件
-                    
-                except FloodWait as e:
-                    logger.warning(f"触发FloodWait，等待 {e.x} 秒")
-                    await asyncio.sleep(e.x)
-                except (MediaEmpty, MediaInvalid) as e:
-                    logger.error(f"媒体无效: {e}", error_type="MEDIA", recoverable=True)
-                    return False, False
-                except Exception as e:
-                    if retry < max_retries - 1:
-                        logger.warning(f"上传失败，将在 {(retry + 1) * 2} 秒后重试: {e}")
-                        await asyncio.sleep((retry + 1) * 2)
-                    else:
-                        logger.error(f"上传媒体组失败，已达到最大重试次数: {e}", error_type="UPLOAD", recoverable=True)
-                        return False, False
+        Returns:
+            Tuple[Optional[bool], Optional[str]]: (是否已上传, 文件哈希)，无法读取文件时为 (None, None)，
+            未计算完整哈希即判定为未上传时文件哈希为None
+        """
+        file_str = str(file)
+        task = self._hash_tasks.get(file_str)
+        cached = self.file_hash_cache.get(file_str)
+        quick_key = None
+        
+        # 完整哈希已经可用时直接使用
+        if not ((task is not None and task.done()) or (cached and cached[0] == file_fingerprint(file_str))):
+            quick_key = await self._get_quick_key(file)
+            if quick_key is None:
+                return None, None
+            if self._quick_key_conclusive(quick_key) and not await self.async_history_manager.get_content_hashes(quick_key):
+                logger.debug(f"文件 {file.name} 的快速指纹未命中已上传内容，跳过完整哈希等待")
+                self._prefetch_file_hashes([file])
+                return False, None
+        
+        file_hash = await self._get_file_hash(file)
+        if not file_hash:
+            return None, None
+        
+        uploaded = await self.async_history_manager.is_file_hash_uploaded(file_hash, chat_id_str)
+        if uploaded and quick_key:
+            # 补记快速指纹之前的历史记录
+            await self.async_history_manager.add_content_fingerprint(quick_key, file_hash)
+        return uploaded, file_hash
+    
+    async def _record_upload(self, file: Path, chat_id_str: str, file_size: int, media_type: str,
+                             message: Optional[Message] = None) -> Optional[str]:
+        """
+        等待文件的完整哈希并记录上传历史和快速指纹，有发送结果时同时记录其file_id
+        
+        Args:
+            file: 文件路径
+            chat_id_str: 目标频道ID
+            file_size: 文件大小
+            media_type: 媒体类型
+            message: 发送文件得到的消息
             
-            return False, False
+        Returns:
+            Optional[str]: 文件哈希值，无法计算时返回None
+        """
+        file_hash = await self._get_file_hash(file)
+        if not file_hash:
+            logger.warning(f"无法计算文件哈希值，未记录上传历史: {file}")
+            return None
+        
+        await self.async_history_manager.add_upload_record_by_hash(
+            file_hash=file_hash,
+            file_path=str(file),
+            target_channel=chat_id_str,
+            file_size=file_size,
+            media_type=media_type
+        )
+        quick_key = await self._get_quick_key(file)
+        if quick_key:
+            await self.async_history_manager.add_content_fingerprint(quick_key, file_hash)
+        
+        uploaded_media = message_file_id(message) if message else None
+        if uploaded_media:
+            await self.async_history_manager.set_uploaded_media(file_hash, *uploaded_media)
+        return file_hash
+    
+    async def _get_cached_file_id(self, file_hash: Optional[str], media_type: str) -> Optional[str]:
+        """
+        查询相同内容之前上传得到的file_id
+        
+        Args:
+            file_hash: 文件内容哈希，尚未计算时为None
+            media_type: 本次发送使用的媒体类型
             
-        finally:
-            # 清理缩略图
-            for thumb in thumbnails:
-                try:
-                    if os.path.exists(thumb):
-                        os.remove(thumb)
-                        logger.debug(f"已删除缩略图: {thumb}")
-                except Exception as e:
-                    logger.warning(f"删除缩略图失败: {e}")
+        Returns:
+            Optional[str]: 媒体类型相同的file_id，没有时返回None
+        """
+        if not file_hash:
+            return None
+        cached = await self.async_history_manager.get_uploaded_media(file_hash)
+        if cached and cached[0] == media_type:
+            return cached[1]
+        return None
+    
+    async def _send_with_file_id(self, send, file: Path, file_hash: Optional[str], file_id: Optional[str]):
+        """
+        有缓存的file_id时用file_id发送，file_id失效时删除缓存并改为上传文件
+        
+        Args:
+            send: 发送函数，参数为文件路径或file_id
+            file: 文件路径
+            file_hash: 文件内容哈希
+            file_id: 缓存的file_id
+            
+        Returns:
+            发送函数的返回值
+        """
+        if not file_id or file_id in self._invalid_file_ids:
+            return await send(str(file))
+        try:
+            logger.info(f"文件 {file.name} 之前已上传过，使用缓存的file_id发送")
+            return await send(file_id)
+        except FILE_ID_INVALID_ERRORS as e:
+            logger.info(f"文件 {file.name} 缓存的file_id已失效，重新上传: {e}")
+            self._invalid_file_ids.add(file_id)
+            await self.async_history_manager.remove_uploaded_media(file_hash)
+            return await send(str(file))
     
-    async def _upload_single_file(self, file: Path, chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+    async def _send_media_group(self, chat_id: int, media_group: List, cached_media: List[Tuple[Any, Path]],
+                                file_hashes: Dict[str, Optional[str]], thumbnails: List[str]) -> List[Message]:
         """
-        上传单个文件
+        发送媒体组，其中使用缓存file_id的媒体失效时改为上传文件后重新发送
         
         Args:
-            file: 文件路径
             chat_id: 目标聊天ID
-            caption: 说明文本
+            media_group: 媒体列表
+            cached_media: 使用缓存file_id的媒体及其文件
+            file_hashes: 文件路径 -> 文件哈希
+            thumbnails: 生成的缩略图列表，改为上传视频时生成的缩略图追加到其中，由调用方删除
             
         Returns:
-            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+            List[Message]: 发送得到的消息列表
         """
-        media_type = self._get_media_type(file)
-        
-        if not media_type:
-            logger.warning(f"不支持的媒体类型: {file}")
-            return False, False
+        try:
+            return await self.client.send_media_group(chat_id=chat_id, media=media_group)
+        except FILE_ID_INVALID_ERRORS as e:
+            if not cached_media:
+                raise
+            # 无法确定是哪个file_id失效，全部改为上传文件
+            logger.info(f"媒体组中缓存的file_id已失效，重新上传 {len(cached_media)} 个文件: {e}")
+            for media, file in cached_media:
+                self._invalid_file_ids.add(media.media)
+                media.media = str(file)
+                if isinstance(media, InputMediaVideo):
+                    # 以file_id发送时没有生成缩略图和视频尺寸，改为上传文件时补上
+                    media.thumb, media.width, media.height, media.duration = await self._get_video_attributes(file)
+                    if media.thumb:
+                        thumbnails.append(media.thumb)
+                await self.async_history_manager.remove_uploaded_media(file_hashes.get(str(file)))
+            cached_media.clear()
+            return await self.client.send_media_group(chat_id=chat_id, media=media_group)
+    
+    async def _pre_upload_group(self, media_files: List[Path], chat_id: int):
+        """
+        并发上传媒体组中各文件的数据并缓存得到的file_id，不发送消息
         
-        # 计算文件哈希
-        file_str = str(file)
-        if file_str in self.file_hash_cache:
-            file_hash = self.file_hash_cache[file_str]
-        else:
-            file_hash = calculate_file_hash(file)
-            if file_hash:
-                self.file_hash_cache[file_str] = file_hash
-            else:
-                logger.warning(f"无法计算文件哈希值: {file}")
-            return False, False
+        Args:
+            media_files: 媒体文件列表
+            chat_id: 第一个目标频道ID
+        """
+        await asyncio.gather(*(self._pre_upload_file(file, chat_id) for file in media_files))
+    
+    async def _pre_upload_file(self, file: Path, chat_id: int):
+        """
+        上传文件数据并缓存得到的file_id，已上传到目标频道或已有file_id的文件跳过，
+        失败时只记录日志，发送时会重新上传
         
-        # 检查文件是否已上传到目标频道
-        chat_id_str = str(chat_id)
-        if self.history_manager.is_file_hash_uploaded(file_hash, chat_id_str):
-            logger.info(f"文件 {file.name} (哈希: {file_hash[:8]}...) 已上传到频道 {chat_id_str}，跳过上传")
-            
-            # 发送文件已上传事件
-            self.emit("file_already_uploaded", {
-                "chat_id": chat_id,
-                "file_name": file.name,
-                "file_path": file_str,
-                "file_hash": file_hash,
-                "media_type": media_type
-            })
-            
-            return True, False  # 返回成功，但实际未上传新文件
+        Args:
+            file: 文件路径
+            chat_id: 目标频道ID
+        """
+        media_type = self._get_media_type(file)
+        if not media_type:
+            return
+        uploaded, file_hash = await self._check_file_uploaded(file, str(chat_id))
+        if uploaded is None or uploaded:
+            return
+        file_hash = file_hash or await self._get_file_hash(file)
+        if not file_hash or await self._get_cached_file_id(file_hash, media_type):
+            return
         
-        # 缩略图文件路径和视频尺寸
         thumbnail = None
-        width = height = None
-        duration = None
-        
         try:
-            # 处理视频缩略图和获取尺寸
+            width = height = duration = None
             if media_type == "video":
-                try:
-                    result = await self.video_processor.extract_thumbnail_async(str(file))
-                    if result:
-                        if isinstance(result, tuple) and len(result) == 4:
-                            thumbnail, width, height, duration = result
-                            # 确保duration是整数类型
-                            if duration is not None:
-                                duration = int(duration)
-                        elif isinstance(result, tuple) and len(result) == 3:
-                            thumbnail, width, height = result
-                        else:
-                            thumbnail = result
-                        
-                        if width and height:
-                            logger.debug(f"已生成视频缩略图: {thumbnail}, 尺寸: {width}x{height}, 时长: {duration if duration else '未知'}秒")
-                        else:
-                            logger.debug(f"已生成视频缩略图: {thumbnail}")
-                except Exception as e:
-                    logger.warning(f"生成视频缩略图失败: {e}")
-            
-            # 上传文件
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    logger.info(f"上传文件: {file.name} (哈希: {file_hash[:8]}...)...")
-                    
-                    start_time = time.time()
-                    
-                    if media_type == "photo":
-                        result = await self.client.send_photo(
-                            chat_id=chat_id,
-                            photo=str(file),
-                            caption=caption
-                        )
-                    elif media_type == "video":
-                        result = await self.client.send_video(
-                            chat_id=chat_id,
-                            video=str(file),
-                            caption=caption,
-                            thumb=thumbnail,
-                            supports_streaming=True,
-                            width=width,
-                            height=height,
-                            duration=duration
-                        )
-                    elif media_type == "document":
-                        result = await self.client.send_document(
-                            chat_id=chat_id,
-                            document=str(file),
-                            caption=caption
-                        )
-                    elif media_type == "audio":
-                        result = await self.client.send_audio(
-                            chat_id=chat_id,
-                            audio=str(file),
-                            caption=caption
-                        )
-                    else:
-                        logger.warning(f"不支持的媒体类型: {media_type}")
-                        return False, False
-                    
-                    end_time = time.time()
-                    upload_time = end_time - start_time
-                    
-                    logger.info(f"文件 {file.name} 上传成功，耗时 {upload_time:.2f} 秒")
-                    
-                    # 保存上传历史记录
-                    if result:
-                        # 获取文件大小
-                        if hasattr(result, 'file') and hasattr(result.file, 'size'):
-                            file_size = result.file.size
-                        else:
-                            file_size = get_file_size(file)
-                        
-                        # 使用文件哈希记录上传
-                        self.history_manager.add_upload_record_by_hash(
-                            file_hash=file_hash,
-                            file_path=file_str,
-                            target_channel=chat_id_str,
-                            file_size=file_size,
-                            media_type=media_type
-                        )
-                    
-                    # 发送上传成功事件
-                    self.emit("media_upload", {
-                        "chat_id": chat_id,
-                        "file_name": file.name,
-                        "file_path": file_str,
-                        "file_hash": file_hash,
-                        "media_type": media_type,
-                        "upload_time": upload_time,
-                        "file_size": file_size if 'file_size' in locals() else get_file_size(file)
-                    })
-                    
-                    # 同时发送file_uploaded事件，确保向下兼容
-                    self.emit("file_uploaded", str(file), True)
-                    
-                    return True, True  # 上传成功且实际上传了新文件
-                    
-                except FloodWait as e:
-                    logger.warning(f"触发FloodWait，等待 {e.x} 秒")
-                    await asyncio.sleep(e.x)
-                except (MediaEmpty, MediaInvalid) as e:
-                    logger.error(f"媒体无效: {e}", error_type="MEDIA", recoverable=True)
-                    return False, False
-                except Exception as e:
-                    if retry < max_retries - 1:
-                        logger.warning(f"上传失败，将在 {(retry + 1) * 2} 秒后重试: {e}")
-                        await asyncio.sleep((retry + 1) * 2)
-                    else:
-                        logger.error(f"上传文件 {file.name} 失败: {e}")
-                        
-                        # 检测网络相关错误
-                        error_name = type(e).__name__.lower()
-                        if any(net_err in error_name for net_err in ['network', 'connection', 'timeout', 'socket']):
-                            # 网络相关错误，通知应用程序检查连接状态
-                            await self._handle_network_error(e)
-                        
-                        return False, False
-            
-            return False, False
-            
+                thumbnail, width, height, duration = await self._get_video_attributes(file)
+            
+            start_time = time.time()
+            uploaded_media = await pre_upload_media(
+                self.client, chat_id, file, media_type, thumbnail, width, height, duration,
+                progress=self.progress_aggregator.callback((chat_id, str(file)), file.name)
+            )
+            if uploaded_media:
+                await self.async_history_manager.set_uploaded_media(file_hash, *uploaded_media)
+                logger.debug(f"已预先上传文件 {file.name}，耗时 {time.time() - start_time:.2f} 秒")
+        except FloodWait as e:
+            logger.warning(f"预先上传文件 {file.name} 触发FloodWait，发送时重新上传")
+            self._upload_limiter.record_flood_wait(e.x)
+        except Exception as e:
+            logger.warning(f"预先上传文件 {file.name} 失败，发送时重新上传: {e}")
         finally:
-            # 清理缩略图
+            self.progress_aggregator.finish((chat_id, str(file)))
             if thumbnail and os.path.exists(thumbnail):
                 try:
                     os.remove(thumbnail)
-                    logger.debug(f"已删除缩略图: {thumbnail}")
                 except Exception as e:
                     logger.warning(f"删除缩略图失败: {e}")
     
+    def _publish_progress(self, transfers: List[TransferProgress]):
+        """
+        发布进度聚合器合并后的各文件上传进度
+        
+        Args:
+            transfers: 有变化的传输进度快照
+        """
+        if hasattr(self, 'emit'):
+            self.emit("transfer_progress", transfers)
+    
+    async def _compute_file_hash(self, file_path: Path) -> Optional[str]:
+        """
+        计算文件的MD5哈希，文件大小、修改时间和inode未变化时使用缓存，否则在线程池中重新计算
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            Optional[str]: 文件哈希值，文件不存在或读取失败时返回None
+        """
+        file_str = str(file_path)
+        fingerprint = file_fingerprint(file_str)
+        if fingerprint is None:
+            logger.warning(f"文件不存在或无法访问: {file_str}")
+            return None
+        
+        cached = self.file_hash_cache.get(file_str)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        
+        file_hash = None
+        if self.async_history_manager:
+            file_hash = await self.async_history_manager.get_cached_file_hash(file_str, fingerprint)
+        
+        if not file_hash:
+            loop = asyncio.get_running_loop()
+            file_hash = await loop.run_in_executor(self._hash_executor, calculate_file_hash, file_path)
+            if not file_hash:
+                return None
+            # 计算期间文件被修改时不写入持久缓存，下次重新计算
+            if self.async_history_manager and file_fingerprint(file_str) == fingerprint:
+                await self.async_history_manager.set_cached_file_hash(file_str, fingerprint, file_hash)
+            logger.debug(f"已计算文件哈希: {file_path.name} -> {file_hash[:8]}...")
+        
+        self.file_hash_cache[file_str] = (fingerprint, file_hash)
+        return file_hash
+    
+    async def _upload_media_group(self, files: List[Path], chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+        """
+        将多个文件作为媒体组上传
+        
+        Args:
+            files: 文件路径列表
+            chat_id: 目标聊天ID
+            caption: 说明文本，仅会应用到第一个媒体
+            
+        Returns:
+            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+        """
+        # 最多支持10个媒体文件作为一个组
+        if len(files) > 10:
+            # 分组上传
+            logger.warning(f"媒体组包含 {len(files)} 个文件，超过最大限制(10)，将分批上传")
+            chunks = [files[i:i+10] for i in range(0, len(files), 10)]
+            success = True
+            actually_uploaded = False
+            for i, chunk in enumerate(chunks):
+                chunk_success, chunk_uploaded = await self._upload_media_group_chunk(chunk, chat_id, caption if i == 0 else None)
+                if not chunk_success:
+                    success = False
+                if chunk_uploaded:
+                    actually_uploaded = True
+            return success, actually_uploaded
+        else:
+            # 直接上传这组文件
+            return await self._upload_media_group_chunk(files, chat_id, caption)
+    
+    async def _upload_media_group_chunk(self, files: List[Path], chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+        """
+        上传一个媒体组块（最多10个文件）
+        
+        Returns:
+            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+        """
+        success, actually_uploaded, _ = await self._upload_media_group_chunk_with_messages(files, chat_id, caption)
+        return success, actually_uploaded
+    
+    async def _upload_single_file(self, file: Path, chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool]:
+        """
+        上传单个文件
+        
+        Args:
+            file: 文件路径
+            chat_id: 目标聊天ID
+            caption: 说明文本
+            
+        Returns:
+            Tuple[bool, bool]: (是否成功, 是否实际上传)第一个元素表示操作是否成功，第二个元素表示是否实际上传了文件
+        """
+        success, uploaded, _ = await self._upload_single_file_with_message(file, chat_id, caption)
+        return success, uploaded
+    
     def _get_media_type(self, file_path: Path) -> Optional[str]:
         """
         根据文件确定媒体类型
@@ -1058,6 +1271,9 @@ class Uploader():
             
             logger.info(f"上传文件 [{file.name}] ({idx+1}/{total_files})")
             
+            # 当前和之后几个文件的完整哈希在后台计算，与上传重叠
+            self._prefetch_file_hashes(files[idx:idx + HASH_PREFETCH_AHEAD])
+            
             # 先上传到第一个目标频道
             first_target_id = first_target[1]
             first_target_info = first_target[2]
@@ -1077,6 +1293,7 @@ class Uploader():
                         logger.info(f"复制消息到频道: {target_info}")
                         
                         # 使用copy_message复制消息
+                        await self._upload_limiter.wait()
                         await self.client.copy_message(
                             chat_id=target_id,
                             from_chat_id=first_target_id,
@@ -1085,9 +1302,6 @@ class Uploader():
                         
                         logger.info(f"成功复制消息到频道: {target_info}")
                         
-                        # 简单的速率限制
-                        await asyncio.sleep(1)
-                        
                     except Exception as e:
                         logger.error(f"复制消息到频道 {target_info} 失败: {e}")
                         # 如果复制失败，尝试直接上传
@@ -1108,15 +1322,9 @@ class Uploader():
                     if direct_success and direct_uploaded:
                         file_uploaded = True
                     
-                    # 简单的速率限制
-                    await asyncio.sleep(1)
-            
             if file_uploaded:
                 upload_count += 1
             
-            # 间隔时间
-            await asyncio.sleep(0.5)
-        
         return upload_count
 
     async def _handle_network_error(self, error):
@@ -1200,6 +1408,7 @@ class Uploader():
                     max_retries = 3
                     for retry in range(max_retries):
                         try:
+                            await self._upload_limiter.wait()
                             message = await self.client.send_message(
                                 chat_id=target_id,
                                 text=html_content,
@@ -1231,9 +1440,6 @@ class Uploader():
                                     "error": str(e)
                                 })
                     
-                    # 添加延迟以避免触发频率限制
-                    await asyncio.sleep(1)
-                    
                 except Exception as e:
                     logger.error(f"发送最终消息到频道 {target_info} 时出错: {e}")
         
@@ -1242,9 +1448,7 @@ class Uploader():
 
     async def _upload_single_file_with_message(self, file: Path, chat_id: int, caption: Optional[str] = None) -> Tuple[bool, bool, Optional[Message]]:
         """
-        上传单个文件并返回消息对象
-        
-        这个方法是对_upload_single_file的扩展，增加了返回上传后的消息对象，用于消息复制功能
+        上传单个文件并返回消息对象，用于消息复制功能，_upload_single_file 也通过该方法上传
         
         Args:
             file: 文件路径
@@ -1261,21 +1465,15 @@ class Uploader():
             logger.warning(f"不支持的媒体类型: {file}")
             return False, False, None
         
-        # 计算文件哈希
-        file_str = str(file)
-        if file_str in self.file_hash_cache:
-            file_hash = self.file_hash_cache[file_str]
-        else:
-            file_hash = calculate_file_hash(file)
-            if file_hash:
-                self.file_hash_cache[file_str] = file_hash
-            else:
-                logger.warning(f"无法计算文件哈希值: {file}")
-                return False, False, None
-        
         # 检查文件是否已上传到目标频道
+        file_str = str(file)
         chat_id_str = str(chat_id)
-        if self.history_manager.is_file_hash_uploaded(file_hash, chat_id_str):
+        uploaded, file_hash = await self._check_file_uploaded(file, chat_id_str)
+        if uploaded is None:
+            logger.warning(f"无法计算文件哈希值: {file}")
+            return False, False, None
+        
+        if uploaded:
             logger.info(f"文件 {file.name} (哈希: {file_hash[:8]}...) 已上传到频道 {chat_id_str}，跳过上传")
             
             # 发送文件已上传事件
@@ -1289,74 +1487,67 @@ class Uploader():
             
             return True, False, None  # 返回成功，但实际未上传新文件，消息对象为None
         
-        # 缩略图文件路径和视频尺寸
-        thumbnail = None
-        width = height = None
-        duration = None
+        # 相同内容之前上传过时直接使用其file_id发送，不再上传文件数据
+        cached_file_id = await self._get_cached_file_id(file_hash, media_type)
+        
+        # 视频的缩略图路径和尺寸，上传文件时才生成，缓存的file_id失效后改为上传文件时也会生成
+        video_attributes = None
         
         try:
-            # 处理视频缩略图和获取尺寸
-            if media_type == "video":
-                try:
-                    result = await self.video_processor.extract_thumbnail_async(str(file))
-                    if result:
-                        if isinstance(result, tuple) and len(result) == 4:
-                            thumbnail, width, height, duration = result
-                            # 确保duration是整数类型
-                            if duration is not None:
-                                duration = int(duration)
-                        elif isinstance(result, tuple) and len(result) == 3:
-                            thumbnail, width, height = result
-                        else:
-                            thumbnail = result
-                        
-                        if width and height:
-                            logger.debug(f"已生成视频缩略图: {thumbnail}, 尺寸: {width}x{height}, 时长: {duration if duration else '未知'}秒")
-                        else:
-                            logger.debug(f"已生成视频缩略图: {thumbnail}")
-                except Exception as e:
-                    logger.warning(f"生成视频缩略图失败: {e}")
+            # 上传进度按 (目标频道ID, 文件路径) 汇总，以file_id发送时没有进度
+            progress = self.progress_aggregator.callback((chat_id, str(file)), file.name)
+            
+            async def send(source: str):
+                """以文件路径或file_id发送文件"""
+                nonlocal video_attributes
+                if media_type == "photo":
+                    return await self.client.send_photo(
+                        chat_id=chat_id,
+                        photo=source,
+                        caption=caption,
+                        progress=progress
+                    )
+                elif media_type == "video":
+                    if source == str(file) and video_attributes is None:
+                        video_attributes = await self._get_video_attributes(file)
+                    thumbnail, width, height, duration = video_attributes or (None, None, None, None)
+                    return await self.client.send_video(
+                        chat_id=chat_id,
+                        video=source,
+                        caption=caption,
+                        thumb=thumbnail,
+                        supports_streaming=True,
+                        width=width,
+                        height=height,
+                        duration=duration,
+                        progress=progress
+                    )
+                elif media_type == "document":
+                    return await self.client.send_document(
+                        chat_id=chat_id,
+                        document=source,
+                        caption=caption,
+                        progress=progress
+                    )
+                elif media_type == "audio":
+                    return await self.client.send_audio(
+                        chat_id=chat_id,
+                        audio=source,
+                        caption=caption,
+                        progress=progress
+                    )
+                raise ValueError(f"不支持的媒体类型: {media_type}")
             
             # 上传文件
             max_retries = 3
             for retry in range(max_retries):
                 try:
-                    logger.info(f"上传文件: {file.name} (哈希: {file_hash[:8]}...)...")
+                    logger.info(f"上传文件: {file.name}...")
                     
+                    await self._upload_limiter.wait()
                     start_time = time.time()
                     
-                    if media_type == "photo":
-                        message = await self.client.send_photo(
-                            chat_id=chat_id,
-                            photo=str(file),
-                            caption=caption
-                        )
-                    elif media_type == "video":
-                        message = await self.client.send_video(
-                            chat_id=chat_id,
-                            video=str(file),
-                            caption=caption,
-                            thumb=thumbnail,
-                            supports_streaming=True,
-                            width=width,
-                            height=height,
-                            duration=duration
-                        )
-                    elif media_type == "document":
-                        message = await self.client.send_document(
-                            chat_id=chat_id,
-                            document=str(file),
-                            caption=caption
-                        )
-                    elif media_type == "audio":
-                        message = await self.client.send_audio(
-                            chat_id=chat_id,
-                            audio=str(file),
-                            caption=caption
-                        )
-                    else:
-                        logger.warning(f"不支持的媒体类型: {media_type}")
-                        return False, False, None
+                    message = await self._send_with_file_id(send, file, file_hash, cached_file_id)
                     
                     end_time = time.time()
                     upload_time = end_time - start_time
@@ -1372,13 +1563,7 @@ class Uploader():
                             file_size = get_file_size(file)
                         
                         # 使用文件哈希记录上传
-                        self.history_manager.add_upload_record_by_hash(
-                            file_hash=file_hash,
-                            file_path=file_str,
-                            target_channel=chat_id_str,
-                            file_size=file_size,
-                            media_type=media_type
-                        )
+                        file_hash = await self._record_upload(file, chat_id_str, file_size, media_type, message)
                     
                     # 发送上传成功事件
                     self.emit("media_upload", {
@@ -1398,6 +1583,7 @@ class Uploader():
                     
                 except FloodWait as e:
                     logger.warning(f"触发FloodWait，等待 {e.x} 秒")
+                    self._upload_limiter.record_flood_wait(e.x)
                     await asyncio.sleep(e.x)
                 except (MediaEmpty, MediaInvalid) as e:
                     logger.error(f"媒体无效: {e}", error_type="MEDIA", recoverable=True)
@@ -1420,7 +1606,9 @@ class Uploader():
             return False, False, None
             
         finally:
+            self.progress_aggregator.finish((chat_id, str(file)))
             # 清理缩略图
+            thumbnail = video_attributes[0] if video_attributes else None
             if thumbnail and os.path.exists(thumbnail):
                 try:
                     os.remove(thumbnail)
@@ -1466,9 +1654,6 @@ class Uploader():
                 if chunk_messages:
                     all_messages.extend(chunk_messages)
                     
-                # 批次间隔
-                await asyncio.sleep(3)
-                
             return success, actually_uploaded, all_messages if all_messages else None
         else:
             # 直接上传这组文件
@@ -1488,23 +1673,17 @@ class Uploader():
         
         # 过滤已上传的文件
         filtered_files = []
-        file_hashes = {}  # 存储文件哈希值
+        file_hashes = {}  # 存储文件哈希值，快速指纹未命中的文件尚未计算哈希
         
         for file in files:
             file_str = str(file)
-            # 计算文件哈希
-            if file_str in self.file_hash_cache:
-                file_hash = self.file_hash_cache[file_str]
-            else:
-                file_hash = calculate_file_hash(file)
-                if file_hash:
-                    self.file_hash_cache[file_str] = file_hash
-                else:
-                    logger.warning(f"无法计算文件哈希值: {file}")
-                    continue
-            
             # 检查是否已上传
-            if self.history_manager.is_file_hash_uploaded(file_hash, chat_id_str):
+            uploaded, file_hash = await self._check_file_uploaded(file, chat_id_str)
+            if uploaded is None:
+                logger.warning(f"无法计算文件哈希值: {file}")
+                continue
+            
+            if uploaded:
                 logger.info(f"文件 {file.name} (哈希: {file_hash[:8]}...) 已上传到频道 {chat_id_str}，从媒体组中跳过")
                 
                 # 发送文件已上传事件
@@ -1533,48 +1712,35 @@ class Uploader():
         # 准备媒体组
         media_group = []
         thumbnails = []  # 记录生成的缩略图文件以便清理
+        cached_media = []  # 使用缓存file_id的媒体及其文件
+        media_files = []  # 与media_group按位置一一对应的文件
         
         try:
             for i, file in enumerate(filtered_files):
                 file_caption = caption if i == 0 else None
                 media_type = self._get_media_type(file)
+                # 相同内容之前上传过时直接使用其file_id
+                file_id = await self._get_cached_file_id(file_hashes.get(str(file)), media_type)
+                source = file_id or str(file)
                 
                 if media_type == "photo":
                     media = InputMediaPhoto(
-                        media=str(file),
+                        media=source,
                         caption=file_caption
                     )
                     media_group.append(media)
                 
                 elif media_type == "video":
-                    # 生成缩略图和获取视频尺寸
-                    thumbnail = None
-                    width = height = None
-                    duration = None
-                    try:
-                        result = await self.video_processor.extract_thumbnail_async(str(file))
-                        if result:
-                            if isinstance(result, tuple) and len(result) == 4:
-                                thumbnail, width, height, duration = result
-                                # 确保duration是整数类型
-                                if duration is not None:
-                                    duration = int(duration)
-                            elif isinstance(result, tuple) and len(result) == 3:
-                                thumbnail, width, height = result
-                            else:
-                                thumbnail = result
-                            
+                    # 生成缩略图和获取视频尺寸，以file_id发送时不需要
+                    thumbnail = width = height = duration = None
+                    if not file_id:
+                        thumbnail, width, height, duration = await self._get_video_attributes(file)
+                        if thumbnail:
                             thumbnails.append(thumbnail)
-                            if width and height:
-                                logger.debug(f"已生成视频缩略图: {thumbnail}, 尺寸: {width}x{height}, 时长: {duration if duration else '未知'}秒")
-                            else:
-                                logger.debug(f"已生成视频缩略图: {thumbnail}")
-                    except Exception as e:
-                        logger.warning(f"生成视频缩略图失败: {e}")
                     
                     # 创建媒体对象，包含宽度、高度和时长
                     media = InputMediaVideo(
-                        media=str(file),
+                        media=source,
                         caption=file_caption,
                         thumb=thumbnail,
                         supports_streaming=True,
@@ -1586,14 +1752,14 @@ class Uploader():
                 
                 elif media_type == "document":
                     media = InputMediaDocument(
-                        media=str(file),
+                        media=source,
                         caption=file_caption
                     )
                     media_group.append(media)
                 
                 elif media_type == "audio":
                     media = InputMediaAudio(
-                        media=str(file),
+                        media=source,
                         caption=file_caption
                     )
                     media_group.append(media)
@@ -1601,6 +1767,10 @@ class Uploader():
                 else:
                     logger.warning(f"不支持的媒体类型: {file}")
                     continue
+                
+                media_files.append(file)
+                if file_id:
+                    cached_media.append((media, file))
             
             if not media_group:
                 logger.warning("没有有效的媒体文件可以上传")
@@ -1613,24 +1783,18 @@ class Uploader():
                     # 捕获任何上传问题
                     logger.info(f"上传媒体组 ({len(media_group)} 个文件)...")
                     
+                    await self._upload_limiter.wait()
                     start_time = time.time()
-                    messages = await self.client.send_media_group(
-                        chat_id=chat_id,
-                        media=media_group
-                    )
+                    messages = await self._send_media_group(chat_id, media_group, cached_media, file_hashes, thumbnails)
                     end_time = time.time()
                     
                     upload_time = end_time - start_time
                     logger.info(f"媒体组上传成功，耗时 {upload_time:.2f} 秒")
                     
-                    # 保存上传历史记录
-                    for msg in messages:
-                        # 获取文件路径和大小
-                        if hasattr(msg, 'file') and hasattr(msg.file, 'size'):
-                            file_size = msg.file.size
-                        else:
-                            file_size = 0
-                        
+                    # 保存上传历史记录，send_media_group返回的消息与media_group按位置一一对应
+                    if len(messages) != len(media_files):
+                        logger.warning(f"媒体组返回 {len(messages)} 条消息，与 {len(media_files)} 个文件不一致，只记录能对应的部分")
+                    for msg, file in zip(messages, media_files):
                         # 确定媒体类型
                         if msg.photo:
                             file_media_type = "photo"
@@ -1643,22 +1807,8 @@ class Uploader():
                         else:
                             file_media_type = "unknown"
                         
-                        # 用消息ID确定对应的媒体文件
-                        # 由于PyroGram不提供足够的信息来确定哪个消息对应哪个文件
-                        # 我们假设消息顺序与文件顺序相同
-                        idx = min(messages.index(msg), len(filtered_files) - 1)
-                        file_path = str(filtered_files[idx])
-                        file_hash = file_hashes.get(file_path)
-                        
-                        if file_hash:
-                            # 记录上传
-                            self.history_manager.add_upload_record_by_hash(
-                                file_hash=file_hash,
-                                file_path=file_path,
-                                target_channel=chat_id_str,
-                                file_size=file_size,
-                                media_type=file_media_type
-                            )
+                        # 记录上传
+                        await self._record_upload(file, chat_id_str, get_file_size(file), file_media_type, msg)
                     
                     # 发送上传成功事件
                     media_group_info = {
@@ -1666,7 +1816,7 @@ class Uploader():
                         "media_count": len(media_group),
                         "upload_time": upload_time,
                         "is_group": True,
-                        "files": [str(f) for f in filtered_files]
+                        "files": [str(f) for f in media_files]
                     }
                     self.emit("media_upload", media_group_info)
                     
@@ -1677,6 +1827,7 @@ class Uploader():
                     
                 except FloodWait as e:
                     logger.warning(f"触发FloodWait，等待 {e.x} 秒")
+                    self._upload_limiter.record_flood_wait(e.x)
                     await asyncio.sleep(e.x)
                 except (MediaEmpty, MediaInvalid) as e:
                     logger.error(f"媒体无效: {e}", error_type="MEDIA", recoverable=True)
@@ -1733,6 +1884,9 @@ class Uploader():
             
             logger.info(f"上传文件 [{file.name}] ({idx+1}/{total_files})")
             
+            # 当前和之后几个文件的完整哈希在后台计算，与上传重叠
+            self._prefetch_file_hashes(files[idx:idx + HASH_PREFETCH_AHEAD])
+            
             # 先上传到第一个目标频道
             logger.info(f"上传文件 [{file.name}] 到第一个目标频道 {first_target_info}")
             
@@ -1751,6 +1905,7 @@ class Uploader():
                         logger.info(f"复制消息到频道: {target_info}")
                         
                         # 使用copy_message复制消息
+                        await self._upload_limiter.wait()
                         copied_message = await self.client.copy_message(
                             chat_id=target_id,
                             from_chat_id=first_target_id,
@@ -1768,12 +1923,7 @@ class Uploader():
                         if copied_message:
                             # 计算文件哈希（复用缓存）
                             file_str = str(file)
-                            if file_str in self.file_hash_cache:
-                                file_hash = self.file_hash_cache[file_str]
-                            else:
-                                file_hash = calculate_file_hash(file)
-                                if file_hash:
-                                    self.file_hash_cache[file_str] = file_hash
+                            file_hash = await self._get_file_hash(file)
                             
                             if file_hash:
                                 # 获取文件大小
@@ -1795,7 +1945,7 @@ class Uploader():
                                     media_type = self._get_media_type(file)
                                 
                                 # 记录上传历史
-                                self.history_manager.add_upload_record_by_hash(
+                                await self.async_history_manager.add_upload_record_by_hash(
                                     file_hash=file_hash,
                                     file_path=file_str,
                                     target_channel=str(target_id),
@@ -1823,9 +1973,6 @@ class Uploader():
                         direct_success, direct_uploaded = await self._upload_single_file(file, target_id)
                         # 直接上传不改变file_uploaded状态
                     
-                    # 简单的速率限制
-                    await asyncio.sleep(1)
-                
                 if file_uploaded:
                     upload_count += 1
                 
@@ -1841,9 +1988,6 @@ class Uploader():
                     if direct_success and direct_uploaded:
                         file_uploaded = True
                     
-                    # 简单的速率限制
-                    await asyncio.sleep(1)
-                
                 if file_uploaded:
                     upload_count += 1
             
@@ -1853,26 +1997,16 @@ class Uploader():
                 
                 # 检查其他频道是否也已上传
                 file_str = str(file)
-                file_hash = self.file_hash_cache.get(file_str)
-                if not file_hash:
-                    file_hash = calculate_file_hash(file)
-                    if file_hash:
-                        self.file_hash_cache[file_str] = file_hash
+                file_hash = await self._get_file_hash(file)
                 
                 if file_hash:
                     for target, target_id, target_info in other_targets:
                         target_id_str = str(target_id)
-                        if not self.history_manager.is_file_hash_uploaded(file_hash, target_id_str):
+                        if not await self.async_history_manager.is_file_hash_uploaded(file_hash, target_id_str):
                             logger.info(f"文件 {file.name} 在频道 {target_info} 中不存在，尝试直接上传")
                             direct_success, direct_uploaded = await self._upload_single_file(file, target_id)
                             # 这种情况下不增加upload_count，因为文件在第一个频道已经存在
                         else:
                             logger.info(f"文件 {file.name} 在频道 {target_info} 中已存在，跳过")
                         
-                        # 简单的速率限制
-                        await asyncio.sleep(1)
-            
-            # 间隔时间
-            await asyncio.sleep(0.5)
-        
         return upload_count 
\ No newline at end of file
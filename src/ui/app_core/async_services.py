@@ -85,6 +85,7 @@ class AsyncServicesInitializer:
                 # 3. 初始化history_manager
                 from src.utils.database_manager import DatabaseManager
                 self.app.history_manager = DatabaseManager()
+                self.app.history_manager.attach_channel_resolver(self.app.channel_resolver)
                 logger.info("已创建历史管理器")
                 
                 # 4-8. 不初始化其他核心组件，等待用户登录后再初始化
@@ -164,8 +165,10 @@ class AsyncServicesInitializer:
                 try:
                     from src.utils.database_manager import DatabaseManager
                     self.app.history_manager = DatabaseManager()
+                    self.app.history_manager.attach_channel_resolver(self.app.channel_resolver)
                     logger.info("已创建历史管理器")
                     initialized_components.append('history_manager')
+                    self.app.task_manager.add_task("history_schema_migration", self.migrate_history_schema())
                 except Exception as e:
                     logger.error(f"创建历史管理器时出错: {e}")
                     failed_components.append('history_manager')
@@ -278,6 +281,21 @@ class AsyncServicesInitializer:
             logger.error(f"错误详情:\n{traceback.format_exc()}")
             return False
     
+    async def migrate_history_schema(self):
+        """将旧版历史数据库迁移为以数字频道ID为键的表结构（需要客户端解析频道）"""
+        history_manager = getattr(self.app, 'history_manager', None)
+        channel_resolver = getattr(self.app, 'channel_resolver', None)
+        if not history_manager or not channel_resolver or not getattr(channel_resolver.client, 'is_connected', False):
+            return
+        from src.utils.history_schema import SCHEMA_V2
+        if history_manager.schema_version >= SCHEMA_V2:
+            return
+        try:
+            logger.info("正在迁移历史数据库表结构...")
+            await history_manager.get_async_manager().migrate_schema_v2(channel_resolver)
+        except Exception as e:
+            logger.error(f"迁移历史数据库表结构失败，继续使用旧版表结构: {e}")
+    
     async def init_remaining_components(self):
         """初始化剩余的核心组件（首次登录成功后调用）"""
         try:
@@ -312,7 +330,11 @@ class AsyncServicesInitializer:
                 self.app.channel_resolver.client = self.app.client_manager.client
                 logger.info("已更新频道解析器的客户端引用")
             
-            # 10. 如果主窗口已初始化，更新状态栏
+            # 10. 客户端可用后迁移历史数据库表结构
+            if getattr(self.app, 'history_manager', None):
+                self.app.task_manager.add_task("history_schema_migration", self.migrate_history_schema())
+            
+            # 11. 如果主窗口已初始化，更新状态栏
             if hasattr(self.app, 'main_window') and self.app.client_manager.me:
                 # 获取用户信息并格式化
                 me = self.app.client_manager.me
@@ -170,7 +170,14 @@ class CleanupManager:
                     logger.debug("Telegram客户端已停止")
                 except Exception as e:
                     logger.error(f"停止Telegram客户端时出错: {e}")
-            
+
+            # 提交历史记录写缓冲并关闭数据库连接
+            if hasattr(self.app, 'history_manager') and self.app.history_manager:
+                try:
+                    self.app.history_manager.close()
+                except Exception as e:
+                    logger.error(f"关闭历史管理器时出错: {e}")
+
             # 确保关闭所有视图的资源
             if hasattr(self.app, 'main_window') and self.app.main_window:
                 if hasattr(self.app.main_window, 'opened_views'):
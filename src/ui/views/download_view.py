@@ -17,6 +17,7 @@ from PySide6.QtGui import QColor, QCursor
 from src.utils.logger import get_logger
 from src.utils.ui_config_models import MediaType
 from src.utils.translation_manager import tr
+from src.utils.dir_size_tracker import get_directory_size_tracker
 
 import os
 import time
@@ -393,6 +394,11 @@ class DownloadView(QWidget):
         self.overall_progress_label = QLabel(tr("ui.download.status.overall_progress", completed=0, total=0, percent=0))
         status_layout.addWidget(self.overall_progress_label)
         
+        # 自适应并发状态（仅并行下载模式）
+        self.concurrency_label = QLabel("")
+        self.concurrency_label.setVisible(False)
+        status_layout.addWidget(self.concurrency_label)
+        
         # 添加伸展因子，使内容靠上对齐
         status_layout.addStretch(1)
         
@@ -405,6 +411,8 @@ class DownloadView(QWidget):
         # 创建下载列表
         self.download_list = QListWidget()
         self.download_list.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # 任务ID -> 下载列表项，更新进度时不必遍历列表
+        self._download_items = {}
         list_layout.addWidget(self.download_list)
         
         # 将两个标签页添加到标签页控件
@@ -671,8 +679,13 @@ class DownloadView(QWidget):
         download_path = self.download_path.text()
         limit_mb = self.dir_size_limit.value()
         
-        # 获取当前目录大小（字节）
-        current_size_bytes = self._get_directory_size(download_path)
+        # 获取当前目录大小（字节），目录大小计数器完成首次遍历前直接遍历目录
+        tracker = get_directory_size_tracker(download_path)
+        if tracker.ready:
+            tracker.maybe_reconcile()
+            current_size_bytes = tracker.total
+        else:
+            current_size_bytes = self._get_directory_size(download_path)
         # 转换为MB
         current_size_mb = current_size_bytes / (1024 * 1024)
         
@@ -758,6 +771,7 @@ class DownloadView(QWidget):
         
         # 清空下载列表
         self.download_list.clear()
+        self._download_items.clear()
         
         # 重置计数器和进度显示
         self.completed_downloads = 0
@@ -863,15 +877,17 @@ class DownloadView(QWidget):
             }
             download_setting.append(setting_item)
         
-        # 按照现有配置结构更新DOWNLOAD部分
-        download_config = {
+        # 在现有DOWNLOAD配置的基础上更新，界面上没有的下载选项沿用现有配置
+        previous_download = self.config.get('DOWNLOAD', {}) if isinstance(self.config, dict) else {}
+        download_config = dict(previous_download) if isinstance(previous_download, dict) else {}
+        download_config.update({
             'downloadSetting': download_setting,
             'download_path': self.download_path.text(),
             'parallel_download': self.parallel_check.isChecked(),
             'max_concurrent_downloads': self.max_downloads.value(),
             'dir_size_limit_enabled': self.dir_size_limit_check.isChecked(),
             'dir_size_limit': self.dir_size_limit.value()
-        }
+        })
         
         # 组织完整配置，确保保留现有的其他配置项（特别是主题设置）
         updated_config = {}
@@ -929,19 +945,15 @@ class DownloadView(QWidget):
             status: 状态说明
         """
         # 查找现有项目
-        found = False
-        for i in range(self.download_list.count()):
-            item = self.download_list.item(i)
-            if item.data(Qt.UserRole) == task_id:
-                item.setText(f"{filename} - {status} [{progress}%]")
-                found = True
-                break
-        
-        # 没找到则添加新项目
-        if not found:
+        item = self._download_items.get(task_id)
+        if item is not None:
+            item.setText(f"{filename} - {status} [{progress}%]")
+        else:
+            # 没找到则添加新项目
             item = QListWidgetItem(f"{filename} - {status} [{progress}%]")
             item.setData(Qt.UserRole, task_id)
             self.download_list.addItem(item)
+            self._download_items[task_id] = item
             # 滚动到最新项目
             self.download_list.scrollToBottom()
             
@@ -1226,6 +1238,7 @@ class DownloadView(QWidget):
     def clear_download_list(self):
         """清空下载列表"""
         self.download_list.clear()
+        self._download_items.clear()
         self.download_tabs.setTabText(1, tr("ui.download.list_tab"))  # 恢复标签页文本
         
     def load_config(self, config):
@@ -1366,9 +1379,63 @@ class DownloadView(QWidget):
             logger.info("连接文件已下载跳过信号")
             self.downloader.file_already_downloaded.connect(self._on_file_already_downloaded)
             
+            # 自适应并发状态信号（仅并行下载器提供）
+            if hasattr(self.downloader, 'concurrency_updated'):
+                logger.info("连接并发状态信号")
+                self.downloader.concurrency_updated.connect(self._on_concurrency_updated)
+            
+            # 各文件下载进度信号（仅并行下载器提供）
+            if hasattr(self.downloader, 'transfer_progress_updated'):
+                logger.info("连接各文件下载进度信号")
+                self.downloader.transfer_progress_updated.connect(self._on_transfer_progress)
+            
         except Exception as e:
             logger.error(f"连接下载器信号时出错: {e}")
     
+    def _on_concurrency_updated(self, state):
+        """处理自适应并发状态更新信号
+        
+        Args:
+            state: 并发控制器状态字典
+        """
+        try:
+            self.concurrency_label.setText(tr(
+                "ui.download.status.concurrency",
+                active=state.get('active', 0),
+                limit=state.get('limit', 0),
+                min=state.get('min_limit', 0),
+                max=state.get('max_limit', 0),
+                spacing=f"{state.get('spacing', 0):.2f}",
+                speed=self._format_size(state.get('throughput', 0)),
+                floods=state.get('flood_waits', 0),
+                timeouts=state.get('timeouts', 0)
+            ))
+            self.concurrency_label.setVisible(True)
+        except Exception as e:
+            logger.error(f"更新并发状态显示时出错: {e}")
+    
+    def _on_transfer_progress(self, transfers):
+        """处理各文件下载进度信号，在下载列表中显示进行中的文件，完成的文件由下载完成信号显示
+        
+        Args:
+            transfers: 有变化的传输进度快照列表
+        """
+        try:
+            for transfer in transfers:
+                if transfer.done:
+                    item = self._download_items.pop(transfer.key, None)
+                    if item is not None:
+                        self.download_list.takeItem(self.download_list.row(item))
+                    continue
+                status = tr(
+                    "ui.download.status.transfer",
+                    speed=self._format_size(transfer.speed),
+                    eta=f"{transfer.eta:.0f}" if transfer.eta is not None else "-"
+                )
+                self.update_download_progress(transfer.key, transfer.name, int(transfer.percent), status)
+        except Exception as e:
+            logger.error(f"更新文件下载进度时出错: {e}")
+    
     def _handle_task_progress(self, task_id, progress, status):
         """处理任务进度更新
         
@@ -1588,6 +1655,18 @@ class DownloadView(QWidget):
                         self.downloader.all_downloads_completed.disconnect(self._on_all_downloads_complete)
                     except:
                         pass
+
+                if hasattr(self.downloader, 'concurrency_updated'):
+                    try:
+                        self.downloader.concurrency_updated.disconnect(self._on_concurrency_updated)
+                    except:
+                        pass
+
+                if hasattr(self.downloader, 'transfer_progress_updated'):
+                    try:
+                        self.downloader.transfer_progress_updated.disconnect(self._on_transfer_progress)
+                    except:
+                        pass
                 
                 if hasattr(self.downloader, 'error_occurred'):
                     try:
@@ -1620,6 +1699,11 @@ class DownloadView(QWidget):
 
     def _check_directory_size_limit_on_startup(self):
         """启动时检查下载目录大小，如果超过限制则显示警告"""
+        # 目录大小计数器在后台完成首次遍历后再检查，避免启动时阻塞界面
+        if self.dir_size_limit_check.isChecked() and not get_directory_size_tracker(self.download_path.text()).ready:
+            QTimer.singleShot(1000, self._check_directory_size_limit_on_startup)
+            return
+        
         # 检查下载目录大小是否超过限制
         exceeded, current_size_mb, limit_mb = self._check_directory_size_limit()
         if exceeded:
@@ -1010,51 +1010,24 @@ class ForwardView(QWidget):
             int: 已转发的消息数量
         """
         try:
-            if not hasattr(self, 'forwarder') or not self.forwarder or not hasattr(self.forwarder, 'history_manager'):
+            async_history_manager = getattr(getattr(self, 'forwarder', None), 'async_history_manager', None)
+            if not async_history_manager:
                 return 0
             
-            history_manager = self.forwarder.history_manager
-            if not history_manager:
-                return 0
-            
-            # 获取所有已转发的消息ID列表
-            forwarded_messages = history_manager.get_forwarded_messages(source_channel, target_channel)
-            
-            if not forwarded_messages:
-                return 0
-            
-            # 如果有消息ID范围限制，筛选在范围内的消息
-            if start_id > 0 or end_id > 0:
-                # 获取实际的结束ID（如果end_id为0，需要获取最新消息ID）
-                actual_end_id = end_id
-                if end_id == 0 and start_id > 0:
-                    # 尝试获取最新消息ID
-                    latest_id = await self._get_latest_message_id(source_channel)
-                    if latest_id and latest_id > 0:
-                        actual_end_id = latest_id
-                    else:
-                        # 如果无法获取最新ID，不过滤消息（计算所有已转发消息）
-                        actual_end_id = float('inf')
-                
-                # 计算在指定范围内的已转发消息数
-                if start_id > 0 and actual_end_id > 0:
-                    # 有明确范围
-                    count = len([msg_id for msg_id in forwarded_messages 
-                               if start_id <= msg_id <= actual_end_id])
-                elif start_id > 0:
-                    # 只有起始ID
-                    count = len([msg_id for msg_id in forwarded_messages 
-                               if msg_id >= start_id])
-                elif actual_end_id > 0 and actual_end_id != float('inf'):
-                    # 只有结束ID
-                    count = len([msg_id for msg_id in forwarded_messages 
-                               if msg_id <= actual_end_id])
-                else:
-                    # 无范围限制，返回所有已转发消息数
-                    count = len(forwarded_messages)
-            else:
-                # 无范围限制，返回所有已转发消息数
-                count = len(forwarded_messages)
+            # 获取实际的结束ID（如果end_id为0，需要获取最新消息ID）
+            actual_end_id = end_id if end_id > 0 else None
+            if end_id == 0 and start_id > 0:
+                # 尝试获取最新消息ID，无法获取时不限制结束ID
+                latest_id = await self._get_latest_message_id(source_channel)
+                if latest_id and latest_id > 0:
+                    actual_end_id = latest_id
+            
+            # 在数据库线程中统计，首次查询时加载索引不会阻塞界面
+            count = await async_history_manager.count_forwarded_range(
+                source_channel, target_channel,
+                start_id if start_id > 0 else None,
+                actual_end_id
+            )
             
             logger.debug(f"频道对 {source_channel} -> {target_channel} 在指定范围内已转发 {count} 条消息")
             return count
@@ -565,12 +565,17 @@ class UploadView(QWidget):
             'enable_web_page_preview': self.enable_web_page_preview_check.isChecked()
         }
         
+        # 界面上没有的上传并发选项沿用现有配置
+        previous_upload = self.config.get('UPLOAD', {}) if isinstance(self.config, dict) else {}
+        
         # 创建上传配置
         upload_config = {
             'target_channels': target_channels,
             'directory': upload_dir,
             'caption_template': '{filename}',  # 保持默认模板
             'delay_between_uploads': round(float(self.upload_delay.value()), 1),  # 四舍五入到一位小数
+            'max_concurrent_uploads': previous_upload.get('max_concurrent_uploads', 3),
+            'preserve_group_order': previous_upload.get('preserve_group_order', True),
             'options': upload_options
         }
         
@@ -842,6 +847,8 @@ class UploadView(QWidget):
                 self.uploader.add_event_listener("error", self._handle_upload_error)
                 # 连接文件已上传事件
                 self.uploader.add_event_listener("file_already_uploaded", self._handle_file_already_uploaded)
+                # 连接各文件上传进度事件
+                self.uploader.add_event_listener("transfer_progress", self._handle_transfer_progress)
                 
                 logger.debug("已成功连接上传器事件")
             
@@ -856,6 +863,9 @@ class UploadView(QWidget):
                 if hasattr(self.uploader, 'file_already_uploaded'):
                     self.uploader.file_already_uploaded.connect(self._handle_file_already_uploaded)
                 
+                if hasattr(self.uploader, 'transfer_progress_updated'):
+                    self.uploader.transfer_progress_updated.connect(self._handle_transfer_progress)
+                
                 logger.debug("已成功连接上传器Qt信号")
         
         except Exception as e:
@@ -889,6 +899,21 @@ class UploadView(QWidget):
             time_left = self._format_time(kwargs['remaining_time']) if kwargs['remaining_time'] > 0 else "-"
             self.upload_speed_label.setText(f"速度: {speed} | 剩余时间: {time_left}")
 
+    def _handle_transfer_progress(self, transfers):
+        """处理各文件上传进度事件，显示最近更新的进行中文件
+        
+        Args:
+            transfers: 有变化的传输进度快照列表，传输标识为 (目标频道ID, 文件路径)
+        """
+        try:
+            active = [transfer for transfer in transfers if not transfer.done]
+            if not active:
+                return
+            transfer = active[-1]
+            self.update_upload_progress(transfer.key[1], int(transfer.percent), transfer.speed, transfer.eta or 0)
+        except Exception as e:
+            logger.error(f"更新文件上传进度时出错: {e}")
+
     def _handle_file_uploaded(self, file_path, success=True, **kwargs):
         """处理单个文件上传完成事件
         
@@ -6,5 +6,6 @@ from .logger import get_logger
 from .client_manager import ClientManager
 from .channel_resolver import ChannelResolver
 from .database_manager import DatabaseManager
+from .async_database_manager import AsyncDatabaseManager
 from .video_processor import VideoProcessor
 from .resource_manager import ResourceManager, TempFile, TempDir, ResourceSession
\ No newline at end of file
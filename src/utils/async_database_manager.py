@@ -0,0 +1,371 @@
+"""
+异步数据库管理器模块，为DatabaseManager提供不阻塞事件循环的异步接口
+所有数据库操作在专用的数据库线程中按提交顺序依次执行
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from src.utils.database_manager import DatabaseManager
+from src.utils.history_schema import parse_channel_id
+from src.utils.id_bitmap import MessageIdBitmap
+from src.utils.message_metadata_store import MessageMetadata
+from src.utils.file_hash_cache import FileFingerprint
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 数据库线程退出信号
+_STOP = object()
+
+
+class AsyncDatabaseManager:
+    """
+    DatabaseManager的异步外观，每个方法都是对应同步方法的可等待版本
+    
+    调用在专用数据库线程中执行，结果通过call_soon_threadsafe回到调用方的事件循环，
+    因此SQLite的磁盘I/O不会阻塞驱动Qt界面和Pyrogram连接的qasync事件循环
+    """
+    
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        初始化异步数据库管理器
+        
+        Args:
+            db_manager: 同步数据库管理器实例
+        """
+        self.db_manager = db_manager
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name="history-db-async")
+        self._thread.daemon = True
+        self._thread.start()
+        # 备份、清理等耗时维护操作使用单独的线程，不阻塞数据库线程上的日常查询
+        self._maintenance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-db-maintenance")
+    
+    def _worker(self):
+        """数据库线程主循环，按顺序执行队列中的调用"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            func, args, kwargs, loop, future = item
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                if future is None:
+                    logger.error(f"数据库后台调用 {getattr(func, '__name__', func)} 失败: {e}")
+                else:
+                    self._resolve(loop, future, None, e)
+            else:
+                if future is not None:
+                    self._resolve(loop, future, result, None)
+    
+    @staticmethod
+    def _resolve(loop: asyncio.AbstractEventLoop, future: asyncio.Future, result: Any, error: Optional[BaseException]):
+        """将执行结果投递回调用方的事件循环"""
+        def _set():
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        
+        try:
+            loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            # 事件循环已关闭，调用方不再等待结果
+            pass
+    
+    async def _call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        将同步调用提交到数据库线程并等待结果
+        
+        Args:
+            func: 要执行的同步方法
+            *args: 位置参数
+            **kwargs: 关键字参数
+        
+        Returns:
+            Any: 同步方法的返回值
+        """
+        if self._stopped:
+            # 数据库线程已停止（应用退出过程中），直接同步执行
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((func, args, kwargs, loop, future))
+        return await future
+    
+    def _submit(self, func: Callable, *args, **kwargs):
+        """
+        将同步调用提交到数据库线程，不等待结果，供事件循环中的同步回调使用
+        
+        Args:
+            func: 要执行的同步方法
+            *args: 位置参数
+            **kwargs: 关键字参数
+        """
+        if self._stopped:
+            func(*args, **kwargs)
+            return
+        self._queue.put((func, args, kwargs, None, None))
+    
+    async def _call_maintenance(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在维护线程中执行耗时的数据库维护操作并等待结果
+        
+        Args:
+            func: 要执行的同步方法
+            *args: 位置参数
+            **kwargs: 关键字参数
+        
+        Returns:
+            Any: 同步方法的返回值
+        """
+        if self._stopped:
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._maintenance_executor, lambda: func(*args, **kwargs))
+    
+    def stop(self, timeout: float = 5):
+        """
+        停止数据库线程，已提交的调用会先执行完成
+        
+        Args:
+            timeout: 等待线程退出的最长时间（秒）
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self._maintenance_executor.shutdown(wait=False)
+        self._queue.put(_STOP)
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+    
+    # ==================== 下载历史记录方法 ====================
+    
+    async def is_message_downloaded(self, channel_id: str, message_id: int) -> bool:
+        """检查消息是否已下载"""
+        return await self._call(self.db_manager.is_message_downloaded, channel_id, message_id)
+    
+    async def is_downloaded(self, channel_id: str, message_id: int) -> bool:
+        """检查消息是否已下载，是is_message_downloaded的别名"""
+        return await self._call(self.db_manager.is_downloaded, channel_id, message_id)
+    
+    async def add_download_record(self, channel_id: str, message_id: int, real_channel_id: Optional[int] = None):
+        """添加下载记录"""
+        await self._call(self.db_manager.add_download_record, channel_id, message_id, real_channel_id)
+    
+    async def add_download_records(self, records: List[Tuple[str, int, Optional[int]]]):
+        """批量添加下载记录"""
+        await self._call(self.db_manager.add_download_records, records)
+    
+    async def get_downloaded_messages(self, channel_id: str) -> List[int]:
+        """获取频道已下载的消息ID列表"""
+        return await self._call(self.db_manager.get_downloaded_messages, channel_id)
+    
+    async def get_downloaded_index(self, channel_id: str) -> MessageIdBitmap:
+        """获取频道已下载消息ID索引的副本"""
+        return await self._call(self.db_manager.get_downloaded_index, channel_id)
+    
+    async def iter_downloaded_ids(self, channel_id: str, start_id: int, end_id: int) -> List[int]:
+        """获取频道在指定范围内已下载的消息ID列表（按ID顺序）"""
+        return await self._call(lambda: list(self.db_manager.iter_downloaded_ids(channel_id, start_id, end_id)))
+    
+    async def get_downloaded_intervals(self, channel_id: str, start_id: Optional[int] = None,
+                                       end_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """获取频道已下载消息ID的连续区间"""
+        return await self._call(self.db_manager.get_downloaded_intervals, channel_id, start_id, end_id)
+    
+    # ==================== 上传历史记录方法 ====================
+    
+    async def is_file_uploaded(self, file_path: str, target_channel: str) -> bool:
+        """检查文件是否已上传到指定频道"""
+        return await self._call(self.db_manager.is_file_uploaded, file_path, target_channel)
+    
+    async def add_upload_record(self, file_path: str, target_channel: str, file_size: int, media_type: str):
+        """添加上传记录"""
+        await self._call(self.db_manager.add_upload_record, file_path, target_channel, file_size, media_type)
+    
+    async def get_uploaded_files(self, target_channel: Optional[str] = None) -> List[str]:
+        """获取已上传到指定频道的文件列表"""
+        return await self._call(self.db_manager.get_uploaded_files, target_channel)
+    
+    async def is_file_hash_uploaded(self, file_hash: str, target_channel: str) -> bool:
+        """检查文件哈希是否已上传到目标频道"""
+        return await self._call(self.db_manager.is_file_hash_uploaded, file_hash, target_channel)
+    
+    async def add_upload_record_by_hash(self, file_hash: str, file_path: str, target_channel: str, file_size: int, media_type: str):
+        """使用文件哈希添加上传记录"""
+        await self._call(self.db_manager.add_upload_record_by_hash, file_hash, file_path, target_channel, file_size, media_type)
+    
+    async def get_cached_file_hash(self, file_path: str, fingerprint: FileFingerprint, algorithm: str = 'md5') -> Optional[str]:
+        """查询文件指纹未变化时缓存的文件哈希"""
+        return await self._call(self.db_manager.get_cached_file_hash, file_path, fingerprint, algorithm)
+    
+    async def set_cached_file_hash(self, file_path: str, fingerprint: FileFingerprint, file_hash: str, algorithm: str = 'md5'):
+        """记录文件的哈希及计算时的文件指纹"""
+        await self._call(self.db_manager.set_cached_file_hash, file_path, fingerprint, file_hash, algorithm)
+    
+    async def get_content_hashes(self, quick_key: str) -> List[str]:
+        """查询快速指纹对应的已上传内容的完整哈希"""
+        return await self._call(self.db_manager.get_content_hashes, quick_key)
+    
+    async def add_content_fingerprint(self, quick_key: str, file_hash: str):
+        """记录已上传内容的快速指纹及完整哈希"""
+        await self._call(self.db_manager.add_content_fingerprint, quick_key, file_hash)
+    
+    async def get_unindexed_uploads(self) -> Optional[List[Tuple[str, str, int]]]:
+        """查询尚未记录快速指纹的上传记录"""
+        return await self._call(self.db_manager.get_unindexed_uploads)
+    
+    async def get_uploaded_media(self, file_hash: str) -> Optional[Tuple[str, str]]:
+        """查询相同内容首次上传后得到的file_id"""
+        return await self._call(self.db_manager.get_uploaded_media, file_hash)
+    
+    async def set_uploaded_media(self, file_hash: str, media_type: str, file_id: str, file_unique_id: Optional[str] = None):
+        """记录内容上传后得到的file_id"""
+        await self._call(self.db_manager.set_uploaded_media, file_hash, media_type, file_id, file_unique_id)
+    
+    async def remove_uploaded_media(self, file_hash: str):
+        """删除已失效的file_id记录"""
+        await self._call(self.db_manager.remove_uploaded_media, file_hash)
+    
+    # ==================== 媒体文件索引方法 ====================
+    
+    async def get_media_file(self, file_unique_id: str) -> Optional[Tuple[str, int]]:
+        """查询文件唯一ID对应的已下载文件"""
+        return await self._call(self.db_manager.get_media_file, file_unique_id)
+    
+    async def add_media_file(self, file_unique_id: str, file_path: str, file_size: int):
+        """记录文件唯一ID对应的已下载文件"""
+        await self._call(self.db_manager.add_media_file, file_unique_id, file_path, file_size)
+    
+    async def remove_media_file(self, file_unique_id: str):
+        """删除文件唯一ID的记录"""
+        await self._call(self.db_manager.remove_media_file, file_unique_id)
+    
+    # ==================== 消息元数据方法 ====================
+    
+    async def add_message_metadata(self, records: List[MessageMetadata]):
+        """批量记录消息元数据"""
+        await self._call(self.db_manager.add_message_metadata, records)
+    
+    async def get_message_metadata(self, chat_id: int, start_id: int, end_id: int,
+                                   max_age_days: Optional[float] = None) -> Dict[int, MessageMetadata]:
+        """查询一段消息ID区间内已记录的消息元数据"""
+        return await self._call(self.db_manager.get_message_metadata, chat_id, start_id, end_id, max_age_days)
+    
+    # ==================== 转发历史记录方法 ====================
+    
+    async def is_message_forwarded(self, source_channel: str, message_id: int, target_channel: str) -> bool:
+        """检查消息是否已转发到指定目标频道"""
+        return await self._call(self.db_manager.is_message_forwarded, source_channel, message_id, target_channel)
+    
+    async def add_forward_record(self, source_channel: str, message_id: int, target_channel: str, real_source_id: Optional[int] = None):
+        """添加转发记录"""
+        await self._call(self.db_manager.add_forward_record, source_channel, message_id, target_channel, real_source_id)
+    
+    async def add_forward_records(self, records: List[Tuple[str, int, str, Optional[int]]]):
+        """批量添加转发记录"""
+        await self._call(self.db_manager.add_forward_records, records)
+    
+    async def get_forwarded_messages(self, source_channel: str, target_channel: Optional[str] = None) -> List[int]:
+        """获取从源频道已转发到目标频道的消息ID列表"""
+        return await self._call(self.db_manager.get_forwarded_messages, source_channel, target_channel)
+    
+    async def get_forwarded_index(self, source_channel: str, target_channel: str) -> MessageIdBitmap:
+        """获取源频道到目标频道已转发消息ID索引的副本"""
+        return await self._call(self.db_manager.get_forwarded_index, source_channel, target_channel)
+    
+    async def iter_forwarded_ids(self, source_channel: str, target_channel: str, start_id: int, end_id: int) -> List[int]:
+        """获取指定范围内已转发到目标频道的消息ID列表（按ID顺序）"""
+        return await self._call(lambda: list(self.db_manager.iter_forwarded_ids(source_channel, target_channel, start_id, end_id)))
+    
+    async def count_forwarded_range(self, source_channel: str, target_channel: str, start_id: Optional[int] = None,
+                                    end_id: Optional[int] = None) -> int:
+        """统计指定范围内已转发到目标频道的消息数"""
+        return await self._call(self.db_manager.count_forwarded_range, source_channel, target_channel, start_id, end_id)
+    
+    async def get_forwarded_intervals(self, source_channel: str, target_channel: str, start_id: Optional[int] = None,
+                                      end_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """获取源频道已转发到目标频道的消息ID连续区间"""
+        return await self._call(self.db_manager.get_forwarded_intervals, source_channel, target_channel, start_id, end_id)
+    
+    async def get_forwarded_matrix(self, source_channel: str, target_channels: List[str],
+                                   start_id: Optional[int] = None, end_id: Optional[int] = None,
+                                   message_ids: Optional[List[int]] = None) -> Dict[str, Set[int]]:
+        """批量查询一段消息ID在各目标频道的转发状态"""
+        return await self._call(self.db_manager.get_forwarded_matrix, source_channel, target_channels,
+                                start_id=start_id, end_id=end_id, message_ids=message_ids)
+    
+    # ==================== 数据管理方法 ====================
+    
+    async def migrate_schema_v2(self, channel_resolver) -> bool:
+        """
+        通过频道解析器把v1历史表中的频道标识符解析为数字ID，然后迁移为v2表结构
+        
+        解析在事件循环中进行，复制数据在数据库线程中进行；无法解析的标识符先使用临时键，
+        之后再被解析时由register_channel_alias改写
+        
+        Args:
+            channel_resolver: 频道解析器实例
+        
+        Returns:
+            bool: 是否执行了迁移
+        """
+        identifiers = await self._call(self.db_manager.get_legacy_channel_identifiers)
+        if not identifiers:
+            return await self._call(self.db_manager.migrate_to_v2, {})
+        
+        alias_map: Dict[str, int] = {}
+        for identifier, real_id in identifiers.items():
+            if parse_channel_id(identifier) is not None:
+                continue
+            if real_id is not None:
+                alias_map[identifier] = real_id
+                continue
+            try:
+                alias_map[identifier] = await channel_resolver.get_channel_id(identifier)
+            except Exception as e:
+                logger.warning(f"迁移历史记录时无法解析频道 {identifier}，暂用临时键: {e}")
+        
+        return await self._call(self.db_manager.migrate_to_v2, alias_map)
+    
+    async def register_channel_alias(self, alias: str, channel_id: int):
+        """记录频道标识符对应的数字频道ID"""
+        await self._call(self.db_manager.register_channel_alias, alias, channel_id)
+    
+    def register_channel_alias_nowait(self, alias: str, channel_id: int):
+        """在数据库线程中记录频道标识符对应的数字频道ID，不等待改写完成"""
+        self._submit(self.db_manager.register_channel_alias, alias, channel_id)
+    
+    async def executemany(self, sql: str, rows: List[Tuple]) -> int:
+        """在单个事务中批量执行SQL语句"""
+        return await self._call(self.db_manager.executemany, sql, rows)
+    
+    async def flush(self):
+        """提交写缓冲中的所有记录"""
+        await self._call(self.db_manager.flush)
+    
+    async def cleanup_old_records(self, days: int = 30, batch_size: int = 5000, pause: float = 0.01):
+        """分批清理指定天数前的历史记录"""
+        await self._call_maintenance(self.db_manager.cleanup_old_records, days, batch_size, pause)
+    
+    async def get_database_stats(self) -> Dict[str, Any]:
+        """获取数据库统计信息"""
+        return await self._call(self.db_manager.get_database_stats)
+    
+    async def optimize_database(self):
+        """优化数据库性能"""
+        await self._call_maintenance(self.db_manager.optimize_database)
+    
+    async def backup_database(self, backup_path: str, pages_per_step: int = 256, step_pause: float = 0.005,
+                              progress: Optional[Callable[[int, int], None]] = None):
+        """按页分步在线备份数据库，progress回调在维护线程中调用"""
+        await self._call_maintenance(self.db_manager.backup_database, backup_path, pages_per_step, step_pause, progress)
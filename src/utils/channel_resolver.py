@@ -4,7 +4,7 @@
 
 import re
 import time
-from typing import Dict, List, Tuple, Optional, Union, Any
+from typing import Dict, List, Tuple, Optional, Union, Any, Callable
 from datetime import datetime, timedelta
 
 from pyrogram.errors import FloodWait, ChannelPrivate, UserNotParticipant
@@ -33,6 +33,32 @@ class ChannelResolver:
         self._forward_status_cache: Dict[str, Tuple[bool, datetime]] = {}
         # 缓存过期时间（分钟）
         self._cache_expiry_minutes = 60
+        # 频道标识符解析出数字ID时的回调，参数为 (频道标识符, 数字ID)
+        self._resolve_listeners: List[Callable[[str, int], None]] = []
+    
+    def add_resolve_listener(self, callback: Callable[[str, int], None]):
+        """
+        注册频道解析回调，每当频道标识符解析出数字ID时调用
+        
+        Args:
+            callback: 回调函数，参数为 (频道标识符, 数字ID)
+        """
+        if callback not in self._resolve_listeners:
+            self._resolve_listeners.append(callback)
+    
+    def _notify_resolved(self, channel_identifier: Union[str, int], numeric_id: int):
+        """
+        通知频道标识符已解析出数字ID
+        
+        Args:
+            channel_identifier: 频道标识符
+            numeric_id: 数字频道ID
+        """
+        for callback in self._resolve_listeners:
+            try:
+                callback(str(channel_identifier), numeric_id)
+            except Exception as e:
+                logger.warning(f"频道解析回调执行失败: {e}")
     
     async def resolve_channel(self, channel_identifier: str) -> Tuple[str, Optional[int]]:
         """
@@ -137,6 +163,7 @@ class ChannelResolver:
             chat = await self.client.get_chat(channel_id)
             # 缓存频道实体
             self._channel_cache[str_channel_id] = (chat.id, chat)
+            self._notify_resolved(str_channel_id, chat.id)
             
             # 返回实体
             return chat
@@ -175,6 +202,9 @@ class ChannelResolver:
         
         # 缓存并返回数字ID
         self._channel_cache[str_channel_id] = (chat.id, chat)
+        if channel_identifier.strip() != str_channel_id:
+            # 原始写法（如链接）与标准化后的用户名都映射到同一数字ID
+            self._notify_resolved(channel_identifier.strip(), chat.id)
         return chat.id
     
     async def check_forward_permission(self, channel_id: Union[str, int]) -> bool:
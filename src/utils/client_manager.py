@@ -5,6 +5,7 @@
 import os
 import asyncio
 import time
+import inspect
 from typing import Optional, Dict, Any, Union
 from PySide6.QtCore import QObject, Signal
 
@@ -19,6 +20,7 @@ from pyrogram.errors import (
 
 from src.utils.ui_config_manager import UIConfigManager
 from src.utils.config_utils import convert_ui_config_to_dict, get_proxy_settings_from_config
+from src.utils.client_pool import ClientPool, register_client_pool, unregister_client_pool
 from src.utils.logger import get_logger
 
 # 导入原生的 FloodWait 处理器
@@ -51,6 +53,8 @@ class ClientManager(QObject):
         self.ui_config_manager = ui_config_manager
         self.session_name = session_name
         self.client = None
+        # 传输客户端池，GENERAL.client_pool_size 大于0时随主客户端启动
+        self.client_pool: Optional[ClientPool] = None
         self.me = None  # 用户信息
         self.is_authorized = False
         self.connection_active = False
@@ -220,6 +224,7 @@ class ClientManager(QObject):
                 api_hash=self.api_hash,
                 phone_number=self.phone_number,
                 **proxy_args,
+                **self._get_transmission_args(),
                 sleep_threshold=0  # 完全禁用Pyrogram内置FloodWait处理，全部交给我们的处理器
             )
             logger.info("客户端创建成功")
@@ -232,6 +237,23 @@ class ClientManager(QObject):
             logger.error(f"创建客户端时出错: {e}")
             raise
     
+    def _get_transmission_args(self) -> Dict[str, Any]:
+        """
+        获取客户端的并发传输参数
+        
+        Pyrogram默认同一时间只进行一个文件传输，并发下载和分段下载的请求会在客户端内部排队，
+        这里按下载配置放宽该限制；旧版本Pyrogram不支持该参数时返回空字典
+        
+        Returns:
+            Dict[str, Any]: 传给Client构造函数的参数
+        """
+        if 'max_concurrent_transmissions' not in inspect.signature(Client.__init__).parameters:
+            return {}
+        download_config = self.config.get('DOWNLOAD', {}) if self.config else {}
+        max_downloads = max(1, download_config.get('max_concurrent_downloads', 10))
+        range_parts = max(1, download_config.get('parallel_range_parts', 4))
+        return {'max_concurrent_transmissions': max_downloads * range_parts}
+    
     async def start_client(self):
         """
         启动客户端
@@ -282,6 +304,8 @@ class ClientManager(QObject):
             
             logger.info(f"客户端已启动：{user_info}")
             
+            await self._start_client_pool()
+            
             # 发出信号
             self.connection_status_changed.emit(True, self.me)
             
@@ -299,6 +323,53 @@ class ClientManager(QObject):
             logger.error(f"启动客户端时出错: {str(e)}")
             raise
     
+    def _create_pool_client(self, index: int, session_string: str) -> Client:
+        """
+        创建传输客户端池中的客户端，使用主会话的授权，会话只保存在内存中且不接收更新
+        
+        Args:
+            index: 客户端序号
+            session_string: 主客户端导出的会话字符串
+            
+        Returns:
+            Client: 未启动的客户端实例
+        """
+        client = Client(
+            name=f"{self.session_name}_pool_{index}",
+            api_id=self.api_id,
+            api_hash=self.api_hash,
+            session_string=session_string,
+            in_memory=True,
+            no_updates=True,
+            **(self.proxy_settings or {}),
+            **self._get_transmission_args(),
+            sleep_threshold=0
+        )
+        self._enable_flood_wait_handling(client)
+        return client
+    
+    async def _start_client_pool(self):
+        """按配置启动传输客户端池，启动失败时只使用主客户端"""
+        await self._stop_client_pool()
+        pool_size = self.config.get('GENERAL', {}).get('client_pool_size', 0) if self.config else 0
+        if not pool_size or not self.client:
+            return
+        try:
+            pool = ClientPool(self.client, pool_size, self._create_pool_client)
+            await pool.start()
+            self.client_pool = pool
+            register_client_pool(self.client, pool)
+        except Exception as e:
+            logger.error(f"启动传输客户端池时出错: {e}")
+    
+    async def _stop_client_pool(self):
+        """停止传输客户端池"""
+        pool, self.client_pool = self.client_pool, None
+        if pool is None:
+            return
+        unregister_client_pool(pool.main_client)
+        await pool.stop()
+    
     async def stop_client(self):
         """
         停止客户端
@@ -310,6 +381,12 @@ class ClientManager(QObject):
             try:
                 logger.info("正在停止客户端...")
                 
+                # 先停止传输客户端池
+                try:
+                    await self._stop_client_pool()
+                except Exception as pool_error:
+                    logger.warning(f"停止传输客户端池时出错: {pool_error}")
+                
                 # 首先禁用FloodWait处理器
                 try:
                     self._disable_flood_wait_handling(self.client)
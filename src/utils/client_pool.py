@@ -0,0 +1,220 @@
+"""
+传输客户端池模块
+为同一账号创建若干额外的Pyrogram会话，下载和上传等传输任务从池中租用负载最低的客户端，
+避免所有传输共用主客户端的一个MTProto连接及其会话级限制。
+每个池客户端各自维护到媒体数据中心的连接，跨数据中心的文件传输也会分散到不同会话上
+"""
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from pyrogram import Client, utils
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 主客户端 -> 客户端池，由 ClientManager 在启动和停止时注册和注销
+_pools: "weakref.WeakKeyDictionary[Client, ClientPool]" = weakref.WeakKeyDictionary()
+
+
+class ClientPool:
+    """
+    传输客户端池，成员包括主客户端和若干使用主会话授权的内存会话客户端
+    
+    lease() 选择当前租用数最少的已连接客户端，租用数相同时优先选择池客户端，
+    让主客户端留给消息扫描等其他请求
+    """
+    
+    def __init__(self, main_client: Client, size: int, client_factory: Callable[[int, str], Client]):
+        """
+        初始化客户端池
+        
+        Args:
+            main_client: 已启动的主客户端
+            size: 额外会话数量
+            client_factory: 创建池客户端的函数，参数为 (序号, 会话字符串)
+        """
+        self.main_client = main_client
+        self.size = max(0, size)
+        self.client_factory = client_factory
+        self._clients: List[Client] = []
+        self._load: Dict[int, int] = {}
+        # 已同步过对话信息的 (客户端, 对话ID)
+        self._known_peers: Set[Tuple[int, Union[int, str]]] = set()
+    
+    @property
+    def clients(self) -> List[Client]:
+        """池中所有客户端，主客户端在前"""
+        return [self.main_client] + self._clients
+    
+    async def start(self):
+        """使用主客户端导出的会话字符串创建并启动池客户端，单个客户端启动失败不影响其他客户端"""
+        if self.size == 0:
+            return
+        try:
+            session_string = await self.main_client.export_session_string()
+        except Exception as e:
+            logger.error(f"导出会话失败，不启用传输客户端池: {e}")
+            return
+        
+        async def start_one(index: int) -> Optional[Client]:
+            client = self.client_factory(index, session_string)
+            try:
+                await asyncio.wait_for(client.start(), timeout=15)
+                return client
+            except Exception as e:
+                logger.warning(f"传输客户端 {index} 启动失败: {type(e).__name__}: {e}")
+                return None
+        
+        results = await asyncio.gather(*(start_one(index) for index in range(self.size)))
+        self._clients = [client for client in results if client is not None]
+        logger.info(f"传输客户端池已启动: {len(self._clients)}/{self.size} 个额外会话")
+    
+    async def stop(self):
+        """停止所有池客户端"""
+        clients, self._clients = self._clients, []
+        self._known_peers.clear()
+        for client in clients:
+            try:
+                if getattr(client, 'is_connected', False):
+                    await client.stop()
+            except Exception as e:
+                logger.warning(f"停止传输客户端时出错 (将忽略): {e}")
+        if clients:
+            logger.info(f"传输客户端池已停止: {len(clients)} 个额外会话")
+    
+    def _pick(self) -> Client:
+        """选择租用数最少的已连接客户端，没有可用的池客户端时返回主客户端"""
+        candidates = [client for client in self._clients if getattr(client, 'is_connected', True)]
+        candidates.append(self.main_client)
+        return min(candidates, key=lambda client: (self._load.get(id(client), 0), client is self.main_client))
+    
+    async def _prepare_peer(self, client: Client, chat_id: Union[int, str]) -> bool:
+        """
+        把主客户端中的对话信息同步到池客户端，池客户端使用内存会话，发送消息前需要对话的access_hash
+        
+        Args:
+            client: 池客户端
+            chat_id: 对话ID或用户名
+        
+        Returns:
+            bool: 是否同步成功
+        """
+        key = (id(client), chat_id)
+        if key in self._known_peers:
+            return True
+        try:
+            peer = await self.main_client.resolve_peer(chat_id)
+            peer_id = utils.get_peer_id(peer)
+            access_hash = getattr(peer, 'access_hash', 0)
+            peer_type = 'channel' if hasattr(peer, 'channel_id') else 'group' if hasattr(peer, 'chat_id') else 'user'
+            await client.storage.update_peers([(peer_id, access_hash, peer_type, None, None)])
+            self._known_peers.add(key)
+            return True
+        except Exception as e:
+            logger.debug(f"同步对话 {chat_id} 到传输客户端失败，改用主客户端: {e}")
+            return False
+    
+    @asynccontextmanager
+    async def lease(self, chat_id: Optional[Union[int, str]] = None) -> AsyncIterator[Client]:
+        """
+        租用一个客户端，退出上下文时归还
+        
+        Args:
+            chat_id: 需要向其发送消息的对话，指定时会先把对话信息同步到池客户端
+        
+        Yields:
+            Client: 租用的客户端
+        """
+        # 选中后立即计入租用数，同步对话期间并发的租用会选择其他客户端
+        client = self._pick()
+        self._load[id(client)] = self._load.get(id(client), 0) + 1
+        if chat_id is not None and client is not self.main_client:
+            prepared = False
+            try:
+                prepared = await self._prepare_peer(client, chat_id)
+            finally:
+                if not prepared:
+                    self._load[id(client)] -= 1
+            if not prepared:
+                client = self.main_client
+                self._load[id(client)] = self._load.get(id(client), 0) + 1
+        try:
+            yield client
+        finally:
+            self._load[id(client)] -= 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取各客户端的租用数
+        
+        Returns:
+            Dict[str, Any]: 包含额外会话数和每个客户端的租用数，主客户端在前
+        """
+        return {
+            'size': len(self._clients),
+            'load': [self._load.get(id(client), 0) for client in self.clients]
+        }
+
+
+def register_client_pool(main_client: Client, pool: ClientPool):
+    """
+    注册主客户端的传输客户端池
+    
+    Args:
+        main_client: 主客户端
+        pool: 客户端池
+    """
+    _pools[main_client] = pool
+
+
+def unregister_client_pool(main_client: Client) -> Optional[ClientPool]:
+    """
+    注销主客户端的传输客户端池
+    
+    Args:
+        main_client: 主客户端
+    
+    Returns:
+        Optional[ClientPool]: 被注销的客户端池，未注册时返回None
+    """
+    return _pools.pop(main_client, None)
+
+
+def get_client_pool(main_client: Client) -> Optional[ClientPool]:
+    """
+    获取主客户端的传输客户端池
+    
+    Args:
+        main_client: 主客户端
+    
+    Returns:
+        Optional[ClientPool]: 客户端池，未启用时返回None
+    """
+    try:
+        return _pools.get(main_client)
+    except TypeError:
+        return None
+
+
+@asynccontextmanager
+async def lease_client(main_client: Client, chat_id: Optional[Union[int, str]] = None) -> AsyncIterator[Client]:
+    """
+    从主客户端的传输客户端池租用客户端，未启用客户端池时直接使用主客户端
+    
+    Args:
+        main_client: 主客户端
+        chat_id: 需要向其发送消息的对话
+    
+    Yields:
+        Client: 租用的客户端
+    """
+    pool = get_client_pool(main_client)
+    if pool is None:
+        yield main_client
+        return
+    async with pool.lease(chat_id) as client:
+        yield client
@@ -0,0 +1,236 @@
+"""
+自适应并发控制模块，按实测吞吐量和限流事件调整下载并发数与请求间隔
+采用AIMD策略：吞吐量稳定或上升时每个统计窗口并发数加1，触发FloodWait或超时时并发数按比例减半，
+请求间隔与之相反，拥塞时加倍，恢复后逐步减半直至为0
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class AdaptiveConcurrencyController:
+    """
+    自适应并发控制器，替代固定大小的信号量
+    
+    工作协程在每次下载前调用 acquire()，下载结束后调用 release() 上报传输字节数和耗时；
+    FloodWait和超时分别通过 record_flood_wait() 和 record_timeout() 上报
+    """
+    
+    def __init__(self, min_limit: int = 1, max_limit: int = 10, initial_limit: Optional[int] = None,
+                 window_seconds: float = 5.0, decrease_factor: float = 0.5,
+                 max_spacing: float = 5.0, on_change: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        初始化并发控制器
+        
+        Args:
+            min_limit: 并发数下限
+            max_limit: 并发数上限
+            initial_limit: 初始并发数，为None时取上下限的中间值
+            window_seconds: 吞吐量统计窗口长度（秒），也是两次减小并发之间的最短间隔
+            decrease_factor: 拥塞时并发数的乘性减小系数
+            max_spacing: 请求间隔上限（秒）
+            on_change: 状态变化回调，参数为 snapshot() 的结果
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        if initial_limit is None:
+            initial_limit = (self.min_limit + self.max_limit + 1) // 2
+        self.limit = max(self.min_limit, min(initial_limit, self.max_limit))
+        self.window_seconds = window_seconds
+        self.decrease_factor = decrease_factor
+        self.max_spacing = max_spacing
+        self.on_change = on_change
+        
+        # 当前活跃下载数和请求间隔
+        self.active = 0
+        self.spacing = 0.0
+        self._next_start = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        
+        # 统计窗口
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_congested = False
+        self._last_decrease = 0.0
+        self._last_throughput = 0.0
+        
+        # 指数加权平均的吞吐量（字节/秒）和单文件耗时（秒）
+        self.throughput = 0.0
+        self.latency = 0.0
+        self.flood_waits = 0
+        self.timeouts = 0
+    
+    async def acquire(self):
+        """
+        获取一个下载名额，活跃数达到当前并发上限时等待，获取后按请求间隔错开开始时间
+        """
+        loop = asyncio.get_running_loop()
+        while self.active >= self.limit:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # 已被唤醒但随即取消，把名额让给其他等待者
+                    self._wake_waiters()
+                raise
+        self.active += 1
+        
+        if self.spacing > 0:
+            # 预约下一个开始时间，多个协程按间隔依次开始
+            now = loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.spacing
+            if start > now:
+                try:
+                    await asyncio.sleep(start - now)
+                except BaseException:
+                    self.active -= 1
+                    self._wake_waiters()
+                    raise
+    
+    def release(self, nbytes: int = 0, duration: float = 0.0, success: bool = True):
+        """
+        释放下载名额并上报本次下载的结果
+        
+        Args:
+            nbytes: 传输的字节数
+            duration: 下载耗时（秒）
+            success: 是否成功
+        """
+        self.active = max(0, self.active - 1)
+        if success:
+            self._window_bytes += nbytes
+            self._window_count += 1
+            self._window_latency += duration
+        self._maybe_adjust()
+        self._wake_waiters()
+    
+    def record_flood_wait(self, wait_seconds: float):
+        """
+        上报FloodWait，乘性减小并发数并加大请求间隔
+        
+        Args:
+            wait_seconds: Telegram要求等待的秒数
+        """
+        self.flood_waits += 1
+        self._decrease(f"FloodWait {wait_seconds}秒", min_spacing=min(self.max_spacing, max(0.5, wait_seconds / 10)))
+    
+    def record_timeout(self):
+        """上报下载超时，乘性减小并发数"""
+        self.timeouts += 1
+        self._decrease("下载超时", min_spacing=0.0)
+    
+    def _decrease(self, reason: str, min_spacing: float):
+        """
+        乘性减小并发数，同一统计窗口内的多次拥塞事件只减小一次
+        
+        Args:
+            reason: 触发原因，用于日志
+            min_spacing: 减小后请求间隔的下限
+        """
+        self._window_congested = True
+        now = time.monotonic()
+        self.spacing = min(self.max_spacing, max(self.spacing * 2, min_spacing))
+        if now - self._last_decrease >= self.window_seconds:
+            self._last_decrease = now
+            new_limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+            if new_limit != self.limit:
+                logger.warning(f"{reason}，并发数由 {self.limit} 降至 {new_limit}，请求间隔 {self.spacing:.2f}秒")
+                self.limit = new_limit
+        self._notify()
+    
+    def _maybe_adjust(self):
+        """统计窗口结束时根据吞吐量加性增加并发数，并逐步减小请求间隔"""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        
+        window_throughput = self._window_bytes / elapsed
+        if self._window_count:
+            window_latency = self._window_latency / self._window_count
+            self.latency = window_latency if not self.latency else 0.7 * self.latency + 0.3 * window_latency
+        self.throughput = window_throughput if not self.throughput else 0.7 * self.throughput + 0.3 * window_throughput
+        
+        if not self._window_congested and self._window_count:
+            # 间隔按半衰减，足够小后归零
+            self.spacing = self.spacing / 2 if self.spacing > 0.05 else 0.0
+            if window_throughput >= self._last_throughput * 0.9:
+                # 吞吐量没有明显下降，继续探测更高的并发
+                if self.limit < self.max_limit:
+                    self.limit += 1
+                    logger.debug(f"吞吐量 {window_throughput/1024:.1f}KB/s，并发数增至 {self.limit}")
+            elif self.limit > self.min_limit:
+                # 增加并发后吞吐量反而下降，说明已超过链路容量，退回一步
+                self.limit -= 1
+                logger.debug(f"吞吐量下降至 {window_throughput/1024:.1f}KB/s，并发数降至 {self.limit}")
+            self._last_throughput = window_throughput
+        
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_congested = False
+        self._notify()
+    
+    def set_bounds(self, min_limit: int, max_limit: int):
+        """
+        更新并发数上下限，当前并发数截断到新范围内
+        
+        Args:
+            min_limit: 并发数下限
+            max_limit: 并发数上限
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = max(self.min_limit, min(self.limit, self.max_limit))
+        self._wake_waiters()
+        self._notify()
+    
+    def _wake_waiters(self):
+        """唤醒等待名额的协程，由其重新检查活跃数"""
+        free = self.limit - self.active
+        while self._waiters and free > 0:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+    
+    def _notify(self):
+        """调用状态变化回调"""
+        if self.on_change:
+            try:
+                self.on_change(self.snapshot())
+            except Exception as e:
+                logger.error(f"并发状态回调出错: {e}")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取当前状态
+        
+        Returns:
+            Dict[str, Any]: 包含并发上下限、当前并发数、活跃数、请求间隔、吞吐量、耗时和拥塞事件计数
+        """
+        return {
+            'limit': self.limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'active': self.active,
+            'spacing': round(self.spacing, 3),
+            'throughput': self.throughput,
+            'latency': self.latency,
+            'flood_waits': self.flood_waits,
+            'timeouts': self.timeouts
+        }
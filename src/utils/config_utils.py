@@ -60,6 +60,18 @@ def convert_ui_config_to_dict(ui_config: Any) -> Dict[str, Any]:
             general_dict['proxy_password'] = ui_config.GENERAL.proxy_password
         if hasattr(ui_config.GENERAL, 'auto_restart_session'):
             general_dict['auto_restart_session'] = ui_config.GENERAL.auto_restart_session
+        if hasattr(ui_config.GENERAL, 'client_pool_size'):
+            general_dict['client_pool_size'] = ui_config.GENERAL.client_pool_size
+        if hasattr(ui_config.GENERAL, 'message_metadata_max_age_days'):
+            general_dict['message_metadata_max_age_days'] = ui_config.GENERAL.message_metadata_max_age_days
+        if hasattr(ui_config.GENERAL, 'parallel_upload_parts'):
+            general_dict['parallel_upload_parts'] = ui_config.GENERAL.parallel_upload_parts
+        if hasattr(ui_config.GENERAL, 'parallel_upload_sessions'):
+            general_dict['parallel_upload_sessions'] = ui_config.GENERAL.parallel_upload_sessions
+        if hasattr(ui_config.GENERAL, 'parallel_upload_max_sessions'):
+            general_dict['parallel_upload_max_sessions'] = ui_config.GENERAL.parallel_upload_max_sessions
+        if hasattr(ui_config.GENERAL, 'parallel_upload_threshold_mb'):
+            general_dict['parallel_upload_threshold_mb'] = ui_config.GENERAL.parallel_upload_threshold_mb
             
         config_dict['GENERAL'] = general_dict
         
@@ -68,9 +80,14 @@ def convert_ui_config_to_dict(ui_config: Any) -> Dict[str, Any]:
             download_dict = {}
             
             # 处理基本属性
-            for field in ["download_path", "parallel_download", "max_concurrent_downloads"]:
+            for field in ["download_path", "parallel_download", "max_concurrent_downloads", "min_concurrent_downloads", "partial_retention_days",
+                          "parallel_range_parts", "parallel_range_threshold_mb", "reuse_downloaded_files"]:
                 if hasattr(ui_config.DOWNLOAD, field):
                     download_dict[field] = getattr(ui_config.DOWNLOAD, field)
+            if hasattr(ui_config.DOWNLOAD, 'download_order'):
+                # 处理枚举类型
+                download_order = ui_config.DOWNLOAD.download_order
+                download_dict['download_order'] = download_order.value if hasattr(download_order, 'value') else download_order
             
             # 处理downloadSetting字段
             if hasattr(ui_config.DOWNLOAD, 'downloadSetting'):
@@ -111,7 +128,7 @@ def convert_ui_config_to_dict(ui_config: Any) -> Dict[str, Any]:
             upload = ui_config.UPLOAD
             
             # 添加基本字段
-            for field in ["directory", "caption_template", "delay_between_uploads"]:
+            for field in ["directory", "caption_template", "delay_between_uploads", "max_concurrent_uploads", "preserve_group_order"]:
                 if hasattr(upload, field):
                     upload_dict[field] = getattr(upload, field)
             
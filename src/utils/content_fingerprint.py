@@ -0,0 +1,96 @@
+"""
+文件内容快速指纹模块
+上传去重以完整MD5为准，但计算完整哈希需要读取整个文件。快速指纹只读取文件头部、中部和尾部的样本，
+与文件大小一起用非加密哈希组成键。已上传内容的快速指纹及其完整哈希记录在数据库中，
+新文件的快速指纹没有命中任何记录时一定不是已上传的内容，不必等待完整哈希就可以开始上传
+"""
+
+import os
+import zlib
+import sqlite3
+from typing import List, Optional, Union
+from pathlib import Path
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 每个样本的大小（字节）
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+
+def quick_fingerprint(file_path: Union[str, Path], sample_size: int = DEFAULT_SAMPLE_SIZE) -> Optional[str]:
+    """
+    计算文件的快速指纹：文件大小加头部、中部和尾部样本的CRC32，不超过三个样本大小的文件读取全部内容
+    
+    Args:
+        file_path: 文件路径
+        sample_size: 每个样本的大小（字节）
+    
+    Returns:
+        Optional[str]: 形如 "<大小>:<样本哈希>" 的指纹，文件不存在或读取失败时返回None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= sample_size * 3:
+                return f"{size}:{zlib.crc32(f.read()):08x}"
+            
+            digests = []
+            for offset in (0, (size - sample_size) // 2, size - sample_size):
+                f.seek(offset)
+                digests.append(f"{zlib.crc32(f.read(sample_size)):08x}")
+            return f"{size}:{''.join(digests)}"
+    except OSError as e:
+        logger.warning(f"计算文件快速指纹失败: {file_path}, 错误: {e}")
+        return None
+
+
+class ContentFingerprintStore:
+    """
+    快速指纹到完整哈希的映射，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    
+    不同内容可能得到相同的快速指纹，因此一个快速指纹可以对应多个完整哈希
+    """
+    
+    TABLE = 'content_fingerprints'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建快速指纹表
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                quick_key TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                PRIMARY KEY (quick_key, file_hash)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_hash ON {self.TABLE}(file_hash)')
+    
+    def add(self, conn: sqlite3.Connection, quick_key: str, file_hash: str):
+        """
+        记录快速指纹对应的完整哈希
+        
+        Args:
+            conn: 数据库连接
+            quick_key: 快速指纹
+            file_hash: 完整哈希
+        """
+        conn.execute(f'INSERT OR IGNORE INTO {self.TABLE} (quick_key, file_hash) VALUES (?, ?)', (quick_key, file_hash))
+    
+    def get_hashes(self, conn: sqlite3.Connection, quick_key: str) -> List[str]:
+        """
+        查询快速指纹对应的所有完整哈希
+        
+        Args:
+            conn: 数据库连接
+            quick_key: 快速指纹
+        
+        Returns:
+            List[str]: 完整哈希列表，快速指纹未记录时为空
+        """
+        return [row[0] for row in conn.execute(f'SELECT file_hash FROM {self.TABLE} WHERE quick_key = ?', (quick_key,))]
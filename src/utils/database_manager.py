@@ -6,116 +6,984 @@
 import sqlite3
 import os
 import time
+import queue
+import atexit
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Union, Optional, Set, Any, Tuple
+from typing import Dict, List, Union, Optional, Set, Any, Tuple, Iterator, Callable
 from contextlib import contextmanager
 
+from src.utils.id_bitmap import MessageIdBitmap
+from src.utils.history_interval_store import (
+    IntervalHistoryStore, KIND_DOWNLOAD, KIND_FORWARD, STORAGE_MODE_ROWS, STORAGE_MODE_INTERVALS
+)
+from src.utils.media_file_index import MediaFileIndex
+from src.utils.message_metadata_store import MessageMetadata, MessageMetadataStore
+from src.utils.file_hash_cache import FileFingerprint, FileHashCacheStore
+from src.utils.content_fingerprint import ContentFingerprintStore
+from src.utils.uploaded_media_cache import UploadedMediaStore
+from src.utils.history_schema import (
+    SCHEMA_V1, SCHEMA_V2, SQL_BY_VERSION, ChannelKey, create_schema_v1, create_schema_v2,
+    get_schema_version, set_schema_version, ensure_row_counters, read_row_counters,
+    load_aliases, collect_v1_identifiers, migrate_v1_to_v2,
+    rekey_channel, parse_channel_id, provisional_key, is_provisional_key
+)
 from src.utils.logger import get_logger
 
 logger = get_logger()
 
+
+class _ConnectionPool:
+    """SQLite长连接池，复用连接并统一设置PRAGMA参数"""
+    
+    def __init__(self, db_path: str, max_size: int = 4):
+        """
+        初始化连接池
+        
+        Args:
+            db_path: 数据库文件路径
+            max_size: 连接池最大连接数
+        """
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """创建新连接并应用性能相关的PRAGMA设置"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+        # WAL模式允许读写并发，synchronous=NORMAL在WAL模式下仍能保证数据库一致性
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=268435456')  # 256MB内存映射
+        conn.execute('PRAGMA cache_size=-16000')  # 约16MB页缓存
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """从连接池借出一个连接，连接数达到上限时阻塞等待"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            create = self._created < self.max_size
+            if create:
+                self._created += 1
+        
+        if create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+    
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """
+        归还连接
+        
+        Args:
+            conn: 要归还的连接
+            discard: 是否丢弃该连接（连接已损坏时使用）
+        """
+        if discard:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+    
+    def close_all(self):
+        """关闭所有空闲连接，之后仍可按需重新创建连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+
+
 class DatabaseManager:
     """数据库管理器，使用SQLite统一管理下载、上传和转发历史记录"""
     
-    def __init__(self, db_path: str = "history/history.db"):
+    def __init__(self, db_path: str = "history/history.db", pool_size: int = 4,
+                 write_batch_size: int = 200, write_flush_interval_ms: int = 200,
+                 storage_mode: Optional[str] = None):
         """
         初始化数据库管理器
         
         Args:
             db_path: 数据库文件路径
+            pool_size: 连接池最大连接数
+            write_batch_size: 写缓冲累计达到该条数时立即批量提交
+            write_flush_interval_ms: 写缓冲的最长提交间隔（毫秒）
+            storage_mode: 下载/转发历史的存储模式，'rows'为逐行存储，'intervals'为区间存储；
+                为None时沿用数据库中记录的模式
         """
         # 确保history文件夹存在
         history_dir = Path(db_path).parent
         history_dir.mkdir(exist_ok=True)
         
         self.db_path = db_path
-        self._lock = threading.RLock()  # 可重入锁，支持嵌套调用
+        self._lock = threading.RLock()  # 可重入锁，保护写缓冲状态
+        self._pool = _ConnectionPool(db_path, max_size=pool_size)
+        self._interval_store = IntervalHistoryStore()
+        self._media_file_index = MediaFileIndex()
+        self._message_metadata = MessageMetadataStore()
+        self._file_hash_cache = FileHashCacheStore()
+        self._content_fingerprints = ContentFingerprintStore()
+        self._uploaded_media = UploadedMediaStore()
+        self.storage_mode = STORAGE_MODE_ROWS
+        self.schema_version = SCHEMA_V2
+        self._sql = SQL_BY_VERSION[SCHEMA_V2]
+        
+        # v2表结构以数字频道ID为键：频道标识符（用户名、链接等）到数字ID的映射
+        self._alias_cache: Dict[str, int] = {}
+        
+        # 写缓冲：add_*_record先写入内存，由后台线程合并为单个事务提交
+        # 键为对应表的唯一约束，读取时同时检查缓冲，保证能读到自己刚写入的记录
+        self.write_batch_size = max(1, write_batch_size)
+        self.write_flush_interval = max(1, write_flush_interval_ms) / 1000.0
+        # 缓冲中的记录为命名参数字典，可直接用于当前表结构版本的插入语句
+        self._pending_downloads: Dict[Tuple[ChannelKey, int], Dict[str, Any]] = {}
+        self._pending_forwards: Dict[Tuple[ChannelKey, int, ChannelKey], Dict[str, Any]] = {}
+        self._pending_uploads_by_path: Dict[Tuple[str, ChannelKey], Dict[str, Any]] = {}
+        self._pending_uploads_by_hash: Dict[Tuple[str, ChannelKey], Dict[str, Any]] = {}
+        self._pending_aliases: Dict[str, int] = {}
+        # 写入记录时附带的频道解析结果，可能需要改写临时键下的历史，提交写缓冲前再应用
+        self._pending_alias_registrations: Dict[str, int] = {}
+        self._flush_lock = threading.Lock()  # 保证同一时间只有一个批量提交
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._closed = False
+        
+        # 内存ID索引：首次查询某频道时从数据库加载，之后随add_*_record同步更新
+        # 键为频道键（v1为频道标识符，v2为数字频道ID）
+        self._download_index: Dict[ChannelKey, MessageIdBitmap] = {}
+        self._forward_index: Dict[Tuple[ChannelKey, ChannelKey], MessageIdBitmap] = {}
+        # 正在从数据库加载的索引：(记录类型, 索引键) -> (加载期间新增的消息ID, 加载完成事件)
+        self._index_loads: Dict[Tuple[str, Any], Tuple[List[int], threading.Event]] = {}
+        # 每次清空内存ID索引时递增，加载期间发生变化的索引需要重新加载
+        self._index_generation = 0
+        
+        # 异步外观，首次调用get_async_manager时创建
+        self._async_manager = None
         
         # 初始化数据库
-        self._init_database()
+        self._init_database(storage_mode)
+        
+        # 启动后台写入线程
+        self._writer_thread = threading.Thread(target=self._writer_worker, name="history-db-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+        atexit.register(self.close)
         
         logger.info(f"数据库管理器初始化完成: {db_path}")
     
-    def _init_database(self):
-        """初始化数据库表结构"""
+    def _init_database(self, storage_mode: Optional[str] = None):
+        """
+        初始化数据库表结构
+        
+        Args:
+            storage_mode: 期望的历史存储模式，为None时沿用数据库中记录的模式
+        """
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            # 新数据库直接使用v2表结构，旧数据库保持v1直到执行migrate_to_v2
+            version = get_schema_version(conn)
+            if version is None:
+                create_schema_v2(conn)
+                set_schema_version(conn, SCHEMA_V2)
+                version = SCHEMA_V2
+            elif version == SCHEMA_V1:
+                create_schema_v1(conn)
+                logger.info("历史数据库仍为旧版表结构，将在频道解析器可用后迁移为数字频道ID表结构")
+            else:
+                create_schema_v2(conn)
+                self._alias_cache = load_aliases(conn)
+            self.schema_version = version
+            self._sql = SQL_BY_VERSION[version]
+            ensure_row_counters(conn, version)
             
-            # 创建下载历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS download_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    channel_id TEXT NOT NULL,
-                    real_channel_id INTEGER,
-                    message_id INTEGER NOT NULL,
-                    download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(channel_id, message_id)
-                )
-            ''')
+            # 区间存储表
+            self._interval_store.create_schema(conn)
+            self.storage_mode = self._interval_store.get_storage_mode(conn)
+            if storage_mode == STORAGE_MODE_INTERVALS and self.storage_mode == STORAGE_MODE_ROWS:
+                # 此时尚无其他访问，可以直接完成迁移
+                download_count, forward_count = self._interval_store.migrate_rows(conn, queries=self._sql)
+                self.storage_mode = STORAGE_MODE_INTERVALS
+                logger.info(f"历史记录已迁移为区间存储：下载记录 {download_count} 条，转发记录 {forward_count} 条")
+            elif storage_mode == STORAGE_MODE_ROWS and self.storage_mode == STORAGE_MODE_INTERVALS:
+                logger.warning("数据库已使用区间存储，无法切换回逐行存储，继续使用区间存储")
             
-            # 创建上传历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS upload_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_hash TEXT NOT NULL,
-                    file_path TEXT,
-                    target_channel TEXT NOT NULL,
-                    file_size INTEGER,
-                    media_type TEXT,
-                    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(file_hash, target_channel)
-                )
-            ''')
+            # 媒体文件索引表
+            self._media_file_index.create_schema(conn)
             
-            # 创建转发历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS forward_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source_channel TEXT NOT NULL,
-                    real_source_id INTEGER,
-                    message_id INTEGER NOT NULL,
-                    target_channel TEXT NOT NULL,
-                    forward_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(source_channel, message_id, target_channel)
-                )
-            ''')
+            # 消息元数据表
+            self._message_metadata.create_schema(conn)
             
-            # 创建索引以提高查询性能
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_channel ON download_history(channel_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_message ON download_history(message_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_hash ON upload_history(file_hash)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_channel ON upload_history(target_channel)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_source ON forward_history(source_channel)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_message ON forward_history(message_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_target ON forward_history(target_channel)')
+            # 文件哈希缓存表
+            self._file_hash_cache.create_schema(conn)
             
-            # 创建时间索引用于数据清理
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_time ON download_history(download_time)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_time ON upload_history(upload_time)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_time ON forward_history(forward_time)')
+            # 快速指纹表
+            self._content_fingerprints.create_schema(conn)
             
-            conn.commit()
+            # 已上传媒体file_id表
+            self._uploaded_media.create_schema(conn)
             
+            conn.commit()
+        
         logger.info("数据库表结构初始化完成")
     
     @contextmanager
     def _get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = None
+        """从连接池获取数据库连接的上下文管理器"""
+        conn = self._pool.acquire()
+        broken = False
         try:
-            conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
             yield conn
         except Exception as e:
             logger.error(f"数据库连接错误: {e}")
-            if conn:
+            try:
                 conn.rollback()
+            except Exception:
+                broken = True
             raise
         finally:
-            if conn:
-                conn.close()
+            self._pool.release(conn, discard=broken)
+    
+    # ==================== 写缓冲方法 ====================
+    
+    def _pending_count(self) -> int:
+        """获取写缓冲中待提交的记录数"""
+        return (len(self._pending_downloads) + len(self._pending_forwards) +
+                len(self._pending_uploads_by_path) + len(self._pending_uploads_by_hash) + len(self._pending_aliases) +
+                len(self._pending_alias_registrations))
+    
+    def _enqueue_write(self, pending: Dict, key: Tuple, params: Dict[str, Any],
+                       index_map: Optional[Dict] = None, index_key: Any = None, message_id: Optional[int] = None):
+        """
+        将一条记录放入写缓冲，并同步更新已加载的内存ID索引
+        
+        Args:
+            pending: 目标缓冲字典
+            key: 记录的唯一键
+            params: 插入语句的命名参数
+            index_map: 对应的内存ID索引字典
+            index_key: 内存ID索引的键
+            message_id: 写入内存ID索引的消息ID
+        """
+        with self._lock:
+            pending.setdefault(key, params)
+            if index_map is not None:
+                index = index_map.get(index_key)
+                if index is not None:
+                    index.add(message_id)
+                else:
+                    kind = KIND_DOWNLOAD if index_map is self._download_index else KIND_FORWARD
+                    loading = self._index_loads.get((kind, index_key))
+                    if loading is not None:
+                        loading[0].append(message_id)
+            should_flush = self._pending_count() >= self.write_batch_size
+        
+        if self._closed:
+            # 已关闭时后台线程不再运行，直接同步提交
+            self.flush()
+        elif should_flush:
+            self._flush_event.set()
+    
+    def _writer_worker(self):
+        """后台写入线程，按批量大小或时间间隔提交写缓冲"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.write_flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"后台提交历史记录失败: {e}")
+    
+    def _execute_batch(self, conn: sqlite3.Connection, sql: str, rows: List[Tuple], label: str) -> int:
+        """
+        批量执行插入语句，整批失败时逐条重试以隔离出错的记录
+        
+        Args:
+            conn: 数据库连接
+            sql: 插入语句
+            rows: 参数列表
+            label: 记录类型名称，用于日志
+        
+        Returns:
+            int: 实际插入的记录数
+        """
+        if not rows:
+            return 0
+        try:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            return conn.total_changes - before
+        except sqlite3.Error as e:
+            logger.warning(f"批量添加{label}记录失败，改为逐条写入: {e}")
+            inserted = 0
+            for row in rows:
+                try:
+                    cursor = conn.execute(sql, row)
+                    inserted += max(cursor.rowcount, 0)
+                except sqlite3.Error as row_error:
+                    logger.error(f"添加{label}记录失败: {row_error}")
+            return inserted
+    
+    def _write_intervals(self, conn: sqlite3.Connection, downloads: Dict, forwards: Dict) -> Tuple[int, int]:
+        """
+        以区间存储模式写入下载和转发记录
+        
+        Args:
+            conn: 数据库连接
+            downloads: 待写入的下载记录，键为 (频道, 消息ID)
+            forwards: 待写入的转发记录，键为 (源频道, 消息ID, 目标频道)
+        
+        Returns:
+            Tuple[int, int]: (新增下载记录数, 新增转发记录数)
+        """
+        download_groups: Dict[str, List[int]] = {}
+        for channel_id, message_id in downloads:
+            download_groups.setdefault(channel_id, []).append(message_id)
+        forward_groups: Dict[Tuple[str, str], List[int]] = {}
+        for source_channel, message_id, target_channel in forwards:
+            forward_groups.setdefault((source_channel, target_channel), []).append(message_id)
+        
+        download_added = sum(
+            self._interval_store.add_ids(conn, KIND_DOWNLOAD, channel_id, '', ids)
+            for channel_id, ids in download_groups.items()
+        )
+        forward_added = sum(
+            self._interval_store.add_ids(conn, KIND_FORWARD, source_channel, target_channel, ids)
+            for (source_channel, target_channel), ids in forward_groups.items()
+        )
+        return download_added, forward_added
+    
+    def flush(self):
+        """应用排队的频道别名，再将写缓冲中的所有记录在一个事务中提交到数据库"""
+        self._apply_alias_registrations()
+        with self._flush_lock:
+            self._flush_pending()
+    
+    def _flush_pending(self):
+        """提交写缓冲，调用方需持有self._flush_lock"""
+        with self._lock:
+            downloads = dict(self._pending_downloads)
+            forwards = dict(self._pending_forwards)
+            uploads_by_path = dict(self._pending_uploads_by_path)
+            uploads_by_hash = dict(self._pending_uploads_by_hash)
+            aliases = dict(self._pending_aliases)
+        
+        if not (downloads or forwards or uploads_by_path or uploads_by_hash or aliases):
+            return
+        
+        sql = self._sql
+        try:
+            with self._get_connection() as conn:
+                if aliases:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO channel_aliases (alias, channel_id) VALUES (?, ?)',
+                        aliases.items()
+                    )
+                if self.storage_mode == STORAGE_MODE_INTERVALS:
+                    download_added, forward_added = self._write_intervals(conn, downloads, forwards)
+                else:
+                    download_added = self._execute_batch(conn, sql['insert_download'], list(downloads.values()), "下载")
+                    forward_added = self._execute_batch(conn, sql['insert_forward'], list(forwards.values()), "转发")
+                upload_added = self._execute_batch(conn, sql['insert_upload_path'], list(uploads_by_path.values()), "上传")
+                upload_added += self._execute_batch(conn, sql['insert_upload_hash'], list(uploads_by_hash.values()), "上传")
+                conn.commit()
+        except Exception as e:
+            # 提交失败时保留缓冲，等待下一次重试
+            logger.error(f"批量提交历史记录失败: {e}")
+            return
+        
+        # 提交成功后才从缓冲中移除，保证提交期间的读取仍能在缓冲中命中
+        with self._lock:
+            for key in downloads:
+                self._pending_downloads.pop(key, None)
+            for key in forwards:
+                self._pending_forwards.pop(key, None)
+            for key in uploads_by_path:
+                self._pending_uploads_by_path.pop(key, None)
+            for key in uploads_by_hash:
+                self._pending_uploads_by_hash.pop(key, None)
+            for alias, channel_id in aliases.items():
+                if self._pending_aliases.get(alias) == channel_id:
+                    del self._pending_aliases[alias]
+        
+        logger.debug(f"批量提交历史记录：下载 {download_added} 条，转发 {forward_added} 条，上传 {upload_added} 条")
+    
+    def executemany(self, sql: str, rows: List[Tuple]) -> int:
+        """
+        在单个事务中批量执行SQL语句
+        
+        Args:
+            sql: 要执行的SQL语句
+            rows: 参数列表
+        
+        Returns:
+            int: 受影响的记录数
+        """
+        self.flush()
+        with self._get_connection() as conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            conn.commit()
+            changed = conn.total_changes - before
+        # 直接写入的SQL可能修改历史表，清空内存ID索引以保证一致
+        self._invalidate_indexes()
+        return changed
+    
+    def get_async_manager(self):
+        """
+        获取该数据库管理器的异步外观，所有异步调用共享同一个数据库线程
+        
+        Returns:
+            AsyncDatabaseManager: 异步数据库管理器实例
+        """
+        with self._lock:
+            if self._async_manager is None:
+                from src.utils.async_database_manager import AsyncDatabaseManager
+                self._async_manager = AsyncDatabaseManager(self)
+            return self._async_manager
+    
+    def close(self):
+        """停止后台写入线程，提交剩余的写缓冲并关闭连接池"""
+        if self._closed:
+            return
+        if self._async_manager is not None:
+            # 先让数据库线程执行完已提交的调用
+            self._async_manager.stop()
+        self._closed = True
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._writer_thread.is_alive() and self._writer_thread is not threading.current_thread():
+            self._writer_thread.join(timeout=5)
+        self.flush()
+        self._pool.close_all()
+        logger.info("数据库管理器已关闭")
+    
+    # ==================== 频道键方法 ====================
+    
+    def _channel_key(self, identifier: ChannelKey) -> ChannelKey:
+        """
+        将频道标识符转换为历史表使用的频道键，只查询不写入，供读取路径使用
+        
+        v1表结构直接使用标识符；v2表结构使用数字频道ID，尚未解析的用户名或链接先使用稳定的临时键，
+        解析出真实ID后由register_channel_alias整体改写
+        
+        Args:
+            identifier: 频道ID、用户名或链接
+        
+        Returns:
+            ChannelKey: 频道键
+        """
+        if self.schema_version < SCHEMA_V2:
+            return identifier
+        numeric = parse_channel_id(identifier)
+        if numeric is not None:
+            return numeric
+        alias = str(identifier).strip()
+        key = self._alias_cache.get(alias)
+        return key if key is not None else provisional_key(alias)
+    
+    def _record_channel_key(self, identifier: ChannelKey) -> ChannelKey:
+        """
+        获取写入记录使用的频道键，首次使用临时键时将别名放入写缓冲
+        
+        Args:
+            identifier: 频道ID、用户名或链接
+        
+        Returns:
+            ChannelKey: 频道键
+        """
+        if self.schema_version < SCHEMA_V2 or parse_channel_id(identifier) is not None:
+            return self._channel_key(identifier)
+        alias = str(identifier).strip()
+        key = self._alias_cache.get(alias)
+        if key is not None:
+            return key
+        with self._lock:
+            key = self._alias_cache.get(alias)
+            if key is None:
+                key = provisional_key(alias)
+                self._alias_cache[alias] = key
+                self._pending_aliases[alias] = key
+                logger.debug(f"频道 {alias} 尚未解析为数字ID，暂用临时键记录历史")
+        return key
+    
+    def _queue_channel_alias(self, alias: ChannelKey, channel_id: int):
+        """
+        记录写入时附带的数字频道ID，由后台写入线程在提交写缓冲前调用register_channel_alias
+        
+        Args:
+            alias: 频道用户名、链接等标识符
+            channel_id: 数字频道ID
+        """
+        if self.schema_version < SCHEMA_V2 or parse_channel_id(alias) is not None:
+            return
+        alias = str(alias).strip()
+        channel_id = int(channel_id)
+        if self._alias_cache.get(alias) == channel_id:
+            return
+        with self._lock:
+            self._pending_alias_registrations[alias] = channel_id
+    
+    def _apply_alias_registrations(self):
+        """应用排队的频道别名，调用方不能持有self._flush_lock"""
+        with self._lock:
+            registrations, self._pending_alias_registrations = self._pending_alias_registrations, {}
+        for alias, channel_id in registrations.items():
+            try:
+                self.register_channel_alias(alias, channel_id)
+            except Exception as e:
+                logger.error(f"记录频道 {alias} 的数字ID失败: {e}")
+    
+    def register_channel_alias(self, alias: ChannelKey, channel_id: int):
+        """
+        记录频道标识符对应的数字频道ID，之前以临时键记录的历史会改写到该ID下
+        
+        Args:
+            alias: 频道用户名、链接等标识符
+            channel_id: 数字频道ID
+        """
+        if self.schema_version < SCHEMA_V2 or channel_id is None or parse_channel_id(alias) is not None:
+            return
+        alias = str(alias).strip()
+        channel_id = int(channel_id)
+        if self._alias_cache.get(alias) == channel_id:
+            return
+        
+        with self._lock:
+            previous = self._alias_cache.get(alias)
+            if previous is None or not is_provisional_key(previous):
+                self._alias_cache[alias] = channel_id
+                self._pending_aliases[alias] = channel_id
+                return
+        
+        # 改写临时键下的记录：先提交写缓冲，再在同一把锁内改写数据库和剩余状态
+        with self._flush_lock:
+            with self._lock:
+                previous = self._alias_cache.get(alias)
+                if previous == channel_id or previous is None or not is_provisional_key(previous):
+                    self._alias_cache[alias] = channel_id
+                    self._pending_aliases[alias] = channel_id
+                    return
+                for other_alias, key in list(self._alias_cache.items()):
+                    if key == previous or other_alias == alias:
+                        self._alias_cache[other_alias] = channel_id
+                        self._pending_aliases[other_alias] = channel_id
+                self._flush_pending()
+                try:
+                    with self._get_connection() as conn:
+                        rekey_channel(conn, previous, channel_id)
+                        self._interval_store.rekey(conn, previous, channel_id)
+                        conn.commit()
+                except Exception as e:
+                    logger.error(f"改写频道 {alias} 的历史记录失败: {e}")
+                self._rekey_pending(lambda key: channel_id if key == previous else key)
+                self._clear_indexes()
+                logger.info(f"频道 {alias} 已解析为 {channel_id}，已改写其临时历史记录")
+    
+    def attach_channel_resolver(self, channel_resolver):
+        """
+        订阅频道解析器的解析结果，使新解析的频道标识符自动映射到数字频道ID
+        
+        解析回调在事件循环中同步调用，改写临时键下的历史记录可能较慢，因此交给数据库线程执行
+        
+        Args:
+            channel_resolver: 频道解析器实例
+        """
+        if channel_resolver is not None and hasattr(channel_resolver, 'add_resolve_listener'):
+            channel_resolver.add_resolve_listener(self.get_async_manager().register_channel_alias_nowait)
+    
+    def _rekey_pending(self, mapper: Callable[[ChannelKey], ChannelKey]):
+        """
+        按映射函数改写写缓冲中记录的频道键，调用方需持有self._lock
+        
+        Args:
+            mapper: 频道键映射函数
+        """
+        downloads, self._pending_downloads = self._pending_downloads, {}
+        for (channel, message_id), params in downloads.items():
+            params['channel'] = mapper(channel)
+            self._pending_downloads.setdefault((params['channel'], message_id), params)
+        forwards, self._pending_forwards = self._pending_forwards, {}
+        for (source, message_id, target), params in forwards.items():
+            params['source'] = mapper(source)
+            params['target'] = mapper(target)
+            self._pending_forwards.setdefault((params['source'], message_id, params['target']), params)
+        uploads, self._pending_uploads_by_path = self._pending_uploads_by_path, {}
+        for (file_path, target), params in uploads.items():
+            params['target'] = mapper(target)
+            self._pending_uploads_by_path.setdefault((file_path, params['target']), params)
+        uploads, self._pending_uploads_by_hash = self._pending_uploads_by_hash, {}
+        for (file_hash, target), params in uploads.items():
+            params['target'] = mapper(target)
+            self._pending_uploads_by_hash.setdefault((file_hash, params['target']), params)
+    
+    def get_legacy_channel_identifiers(self) -> Dict[str, Optional[int]]:
+        """
+        获取v1表中出现过的频道标识符，供迁移前解析数字频道ID
+        
+        Returns:
+            Dict[str, Optional[int]]: 频道标识符 -> 记录中已保存的数字频道ID（未知为None）
+        """
+        if self.schema_version >= SCHEMA_V2:
+            return {}
+        self.flush()
+        with self._get_connection() as conn:
+            return collect_v1_identifiers(conn)
+    
+    def migrate_to_v2(self, alias_map: Dict[str, int], vacuum: bool = True) -> bool:
+        """
+        将v1表结构迁移为以数字频道ID为键的v2表结构
+        
+        复制数据期间不提交写缓冲，新记录留在缓冲中并可正常查询；切换表结构时改写缓冲中的频道键
+        
+        Args:
+            alias_map: 频道标识符 -> 数字频道ID，未包含的标识符使用临时键，之后解析时再改写
+            vacuum: 迁移后是否执行VACUUM回收旧表占用的空间
+        
+        Returns:
+            bool: 是否执行了迁移
+        """
+        if self.schema_version >= SCHEMA_V2:
+            return False
+        
+        start_time = time.time()
+        with self._flush_lock:
+            self._flush_pending()
+            with self._get_connection() as conn:
+                try:
+                    mapping = migrate_v1_to_v2(conn, alias_map, self._interval_store.remap_keys)
+                    # 切换期间阻止新的读写，保证缓冲、索引和表结构版本一致
+                    with self._lock:
+                        conn.commit()
+                        self.schema_version = SCHEMA_V2
+                        self._sql = SQL_BY_VERSION[SCHEMA_V2]
+                        self._alias_cache = {alias: key for alias, key in mapping.items()
+                                             if parse_channel_id(alias) is None}
+                        self._rekey_pending(self._record_channel_key)
+                        self._clear_indexes()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"迁移历史数据库表结构失败: {e}")
+                    raise
+                
+                unresolved = sum(1 for key in mapping.values() if is_provisional_key(key))
+                logger.info(f"历史数据库已迁移为数字频道ID表结构：{len(mapping)} 个频道标识符，"
+                            f"{unresolved} 个暂未解析，耗时 {time.time() - start_time:.2f}秒")
+                if vacuum:
+                    try:
+                        conn.execute('VACUUM')
+                    except sqlite3.Error as e:
+                        logger.warning(f"迁移后回收数据库空间失败: {e}")
+        return True
+    
+    # ==================== 内存ID索引方法 ====================
+    
+    def _load_index(self, kind: str, source: ChannelKey, target: ChannelKey, sql: str,
+                    params: Dict[str, Any]) -> MessageIdBitmap:
+        """
+        从数据库加载消息ID索引，不持有self._lock
+        
+        Args:
+            kind: 记录类型，区间存储模式下使用
+            source: 源频道，区间存储模式下使用
+            target: 目标频道，区间存储模式下使用
+            sql: 逐行存储模式下查询消息ID的语句名称
+            params: 查询的命名参数
+        
+        Returns:
+            MessageIdBitmap: 加载完成的消息ID索引
+        """
+        index = MessageIdBitmap()
+        with self._get_connection() as conn:
+            if self.storage_mode == STORAGE_MODE_INTERVALS:
+                for start_id, end_id in self._interval_store.get_intervals(conn, kind, source, target):
+                    index.add_range(start_id, end_id)
+                return index
+            
+            cursor = conn.execute(self._sql[sql], params)
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                for row in rows:
+                    index.add(row[0])
+        return index
+    
+    def _get_index(self, kind: str, index_map: Dict, index_key: Any, load: Callable[[], MessageIdBitmap],
+                   pending_ids: Callable[[], List[int]]) -> MessageIdBitmap:
+        """
+        获取内存ID索引，未加载时在锁外从数据库加载，再在锁内安装
+        
+        加载期间新增的记录由_enqueue_write收集，安装时与加载开始时写缓冲中的记录一起并入索引；
+        同一索引同时只有一个线程加载，其他线程等待其完成；加载期间索引被清空时重新加载
+        
+        Args:
+            kind: 记录类型
+            index_map: 内存ID索引字典
+            index_key: 索引键
+            load: 从数据库加载索引的函数
+            pending_ids: 返回写缓冲中该索引消息ID的函数，在锁内调用
+        
+        Returns:
+            MessageIdBitmap: 消息ID索引
+        """
+        load_key = (kind, index_key)
+        while True:
+            with self._lock:
+                index = index_map.get(index_key)
+                if index is not None:
+                    return index
+                loading = self._index_loads.get(load_key)
+                if loading is None:
+                    loading = (pending_ids(), threading.Event())
+                    self._index_loads[load_key] = loading
+                    generation = self._index_generation
+                    owner = True
+                else:
+                    owner = False
+            
+            if not owner:
+                loading[1].wait()
+                continue
+            
+            try:
+                index = load()
+            except BaseException:
+                with self._lock:
+                    self._index_loads.pop(load_key, None)
+                loading[1].set()
+                raise
+            
+            with self._lock:
+                self._index_loads.pop(load_key, None)
+                installed = generation == self._index_generation
+                if installed:
+                    index.update(loading[0])
+                    index_map[index_key] = index
+            loading[1].set()
+            if installed:
+                return index
+    
+    def _downloaded_index(self, channel_id: str) -> MessageIdBitmap:
+        """
+        获取频道已下载消息的内存ID索引，首次调用时从数据库加载
+        
+        返回的是会被add_download_record修改的索引本身，读取时需持有self._lock
+        
+        Args:
+            channel_id: 频道ID或用户名
+        
+        Returns:
+            MessageIdBitmap: 已下载消息ID集合
+        """
+        channel_key = self._channel_key(channel_id)
+        
+        def load() -> MessageIdBitmap:
+            start_time = time.time()
+            index = self._load_index(KIND_DOWNLOAD, channel_key, '', 'select_download_ids', {'channel': channel_key})
+            logger.debug(f"加载下载索引：频道 {channel_id}, {len(index)} 条记录, 耗时 {time.time() - start_time:.3f}秒")
+            return index
+        
+        return self._get_index(
+            KIND_DOWNLOAD, self._download_index, channel_key, load,
+            lambda: [msg_id for channel, msg_id in self._pending_downloads if channel == channel_key]
+        )
+    
+    def _forwarded_index(self, source_channel: str, target_channel: str) -> MessageIdBitmap:
+        """
+        获取源频道到目标频道已转发消息的内存ID索引，首次调用时从数据库加载
+        
+        返回的是会被add_forward_record修改的索引本身，读取时需持有self._lock
+        
+        Args:
+            source_channel: 源频道
+            target_channel: 目标频道
+        
+        Returns:
+            MessageIdBitmap: 已转发消息ID集合
+        """
+        source_key = self._channel_key(source_channel)
+        target_key = self._channel_key(target_channel)
+        
+        def load() -> MessageIdBitmap:
+            start_time = time.time()
+            index = self._load_index(KIND_FORWARD, source_key, target_key, 'select_forward_ids',
+                                     {'source': source_key, 'target': target_key})
+            logger.debug(f"加载转发索引：{source_channel} -> {target_channel}, {len(index)} 条记录, 耗时 {time.time() - start_time:.3f}秒")
+            return index
+        
+        return self._get_index(
+            KIND_FORWARD, self._forward_index, (source_key, target_key), load,
+            lambda: [msg_id for source, msg_id, target in self._pending_forwards
+                     if source == source_key and target == target_key]
+        )
+    
+    def get_downloaded_index(self, channel_id: str) -> MessageIdBitmap:
+        """
+        获取频道已下载消息ID索引的副本，首次调用时从数据库加载
+        
+        Args:
+            channel_id: 频道ID或用户名
+        
+        Returns:
+            MessageIdBitmap: 已下载消息ID集合，之后新增的记录不会反映在副本中
+        """
+        index = self._downloaded_index(channel_id)
+        with self._lock:
+            return index.copy()
+    
+    def get_forwarded_index(self, source_channel: str, target_channel: str) -> MessageIdBitmap:
+        """
+        获取源频道到目标频道已转发消息ID索引的副本，首次调用时从数据库加载
+        
+        Args:
+            source_channel: 源频道
+            target_channel: 目标频道
+        
+        Returns:
+            MessageIdBitmap: 已转发消息ID集合，之后新增的记录不会反映在副本中
+        """
+        index = self._forwarded_index(source_channel, target_channel)
+        with self._lock:
+            return index.copy()
+    
+    def iter_downloaded_ids(self, channel_id: str, start_id: int, end_id: int) -> Iterator[int]:
+        """
+        按ID顺序遍历频道在指定范围内已下载的消息ID
+        
+        Args:
+            channel_id: 频道ID或用户名
+            start_id: 起始消息ID（包含）
+            end_id: 结束消息ID（包含）
+        
+        Returns:
+            Iterator[int]: 已下载消息ID迭代器
+        """
+        index = self._downloaded_index(channel_id)
+        with self._lock:
+            return iter(list(index.iter_range(start_id, end_id)))
+    
+    def iter_forwarded_ids(self, source_channel: str, target_channel: str, start_id: int, end_id: int) -> Iterator[int]:
+        """
+        按ID顺序遍历指定范围内已转发到目标频道的消息ID
+        
+        Args:
+            source_channel: 源频道
+            target_channel: 目标频道
+            start_id: 起始消息ID（包含）
+            end_id: 结束消息ID（包含）
+        
+        Returns:
+            Iterator[int]: 已转发消息ID迭代器
+        """
+        index = self._forwarded_index(source_channel, target_channel)
+        with self._lock:
+            return iter(list(index.iter_range(start_id, end_id)))
+    
+    def count_forwarded_range(self, source_channel: str, target_channel: str, start_id: Optional[int] = None,
+                              end_id: Optional[int] = None) -> int:
+        """
+        统计指定范围内已转发到目标频道的消息数
+        
+        Args:
+            source_channel: 源频道
+            target_channel: 目标频道
+            start_id: 起始消息ID（包含），为None表示不限
+            end_id: 结束消息ID（包含），为None表示不限
+        
+        Returns:
+            int: 已转发消息数
+        """
+        index = self._forwarded_index(source_channel, target_channel)
+        with self._lock:
+            return index.count_range(start_id if start_id is not None else 0,
+                                     end_id if end_id is not None else float('inf'))
+    
+    def get_downloaded_intervals(self, channel_id: str, start_id: Optional[int] = None,
+                                 end_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        获取频道已下载消息ID的连续区间
+        
+        Args:
+            channel_id: 频道ID或用户名
+            start_id: 起始消息ID（包含），为None表示不限
+            end_id: 结束消息ID（包含），为None表示不限
+        
+        Returns:
+            List[Tuple[int, int]]: 按起始ID排序的闭区间列表
+        """
+        if self.storage_mode != STORAGE_MODE_INTERVALS:
+            return self._runs_in_range(self._downloaded_index(channel_id), start_id, end_id)
+        self.flush()
+        with self._get_connection() as conn:
+            return self._interval_store.get_intervals(conn, KIND_DOWNLOAD, self._channel_key(channel_id), '',
+                                                      start_id, end_id)
+    
+    def get_forwarded_intervals(self, source_channel: str, target_channel: str, start_id: Optional[int] = None,
+                                end_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        获取源频道已转发到目标频道的消息ID连续区间
+        
+        Args:
+            source_channel: 源频道
+            target_channel: 目标频道
+            start_id: 起始消息ID（包含），为None表示不限
+            end_id: 结束消息ID（包含），为None表示不限
+        
+        Returns:
+            List[Tuple[int, int]]: 按起始ID排序的闭区间列表
+        """
+        if self.storage_mode != STORAGE_MODE_INTERVALS:
+            return self._runs_in_range(self._forwarded_index(source_channel, target_channel), start_id, end_id)
+        self.flush()
+        with self._get_connection() as conn:
+            return self._interval_store.get_intervals(conn, KIND_FORWARD, self._channel_key(source_channel),
+                                                      self._channel_key(target_channel), start_id, end_id)
+    
+    def _runs_in_range(self, index: MessageIdBitmap, start_id: Optional[int], end_id: Optional[int]) -> List[Tuple[int, int]]:
+        """将内存ID索引在指定范围内的部分压缩为连续区间"""
+        low = start_id if start_id is not None else 0
+        high = end_id if end_id is not None else float('inf')
+        runs: List[Tuple[int, int]] = []
+        with self._lock:
+            for message_id in index.iter_range(low, high):
+                if runs and message_id == runs[-1][1] + 1:
+                    runs[-1] = (runs[-1][0], message_id)
+                else:
+                    runs.append((message_id, message_id))
+        return runs
+    
+    def _invalidate_indexes(self):
+        """清空内存ID索引，在批量删除记录后调用，下次查询时重新加载"""
+        with self._lock:
+            self._clear_indexes()
+    
+    def _clear_indexes(self):
+        """清空内存ID索引并使正在进行的加载失效，调用方需持有self._lock"""
+        self._download_index.clear()
+        self._forward_index.clear()
+        self._index_generation += 1
     
     # ==================== 下载历史记录方法 ====================
     
@@ -130,40 +998,42 @@ class DatabaseManager:
         Returns:
             bool: 是否已下载
         """
+        index = self._downloaded_index(channel_id)
         with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT 1 FROM download_history WHERE channel_id = ? AND message_id = ?',
-                    (channel_id, message_id)
-                )
-                return cursor.fetchone() is not None
+            return message_id in index
+    
+    def add_download_record(self, channel_id: str, message_id: int, real_channel_id: Optional[int] = None):
+        """
+        添加下载记录（写入写缓冲，由后台线程批量提交）
+        
+        Args:
+            channel_id: 频道ID或用户名
+            message_id: 消息ID
+            real_channel_id: 真实频道ID（数字形式）
+        """
+        try:
+            if real_channel_id is not None:
+                self._queue_channel_alias(channel_id, real_channel_id)
+            channel_key = self._record_channel_key(channel_id)
+            self._enqueue_write(
+                self._pending_downloads,
+                (channel_key, message_id),
+                {'channel': channel_key, 'real_id': real_channel_id, 'message_id': message_id},
+                self._download_index, channel_key, message_id
+            )
+            logger.debug(f"添加下载记录：频道 {channel_id}, 消息ID {message_id}")
+        except Exception as e:
+            logger.error(f"添加下载记录失败: {e}")
     
-    def add_download_record(self, channel_id: str, message_id: int, real_channel_id: Optional[int] = None):
+    def add_download_records(self, records: List[Tuple[str, int, Optional[int]]]):
         """
-        添加下载记录
+        批量添加下载记录
         
         Args:
-            channel_id: 频道ID或用户名
-            message_id: 消息ID
-            real_channel_id: 真实频道ID（数字形式）
+            records: (频道ID或用户名, 消息ID, 真实频道ID) 元组列表
         """
-        with self._lock:
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''INSERT OR IGNORE INTO download_history 
-                           (channel_id, real_channel_id, message_id) 
-                           VALUES (?, ?, ?)''',
-                        (channel_id, real_channel_id, message_id)
-                    )
-                    conn.commit()
-                    
-                    if cursor.rowcount > 0:
-                        logger.debug(f"添加下载记录：频道 {channel_id}, 消息ID {message_id}")
-            except Exception as e:
-                logger.error(f"添加下载记录失败: {e}")
+        for channel_id, message_id, real_channel_id in records:
+            self.add_download_record(channel_id, message_id, real_channel_id)
     
     def get_downloaded_messages(self, channel_id: str) -> List[int]:
         """
@@ -175,14 +1045,9 @@ class DatabaseManager:
         Returns:
             List[int]: 已下载的消息ID列表
         """
+        index = self._downloaded_index(channel_id)
         with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT message_id FROM download_history WHERE channel_id = ? ORDER BY message_id',
-                    (channel_id,)
-                )
-                return [row['message_id'] for row in cursor.fetchall()]
+            return list(index)
     
     # 为了兼容性添加别名
     def is_downloaded(self, channel_id: str, message_id: int) -> bool:
@@ -211,18 +1076,22 @@ class DatabaseManager:
         Returns:
             bool: 是否已上传
         """
+        target_key = self._channel_key(target_channel)
         with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT 1 FROM upload_history WHERE file_path = ? AND target_channel = ?',
-                    (file_path, target_channel)
-                )
-                return cursor.fetchone() is not None
+            if (file_path, target_key) in self._pending_uploads_by_path:
+                return True
+            if any(row['file_path'] == file_path and row['target'] == target_key
+                   for row in self._pending_uploads_by_hash.values()):
+                return True
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql['file_uploaded'], {'file_path': file_path, 'target': target_key})
+            return cursor.fetchone() is not None
     
     def add_upload_record(self, file_path: str, target_channel: str, file_size: int, media_type: str):
         """
-        添加上传记录
+        添加上传记录（写入写缓冲，由后台线程批量提交）
         
         Args:
             file_path: 文件路径
@@ -230,22 +1099,16 @@ class DatabaseManager:
             file_size: 文件大小（字节）
             media_type: 媒体类型
         """
-        with self._lock:
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''INSERT OR IGNORE INTO upload_history 
-                           (file_path, target_channel, file_size, media_type) 
-                           VALUES (?, ?, ?, ?)''',
-                        (file_path, target_channel, file_size, media_type)
-                    )
-                    conn.commit()
-                    
-                    if cursor.rowcount > 0:
-                        logger.debug(f"添加上传记录：文件 {file_path} 到频道 {target_channel}")
-            except Exception as e:
-                logger.error(f"添加上传记录失败: {e}")
+        try:
+            target_key = self._record_channel_key(target_channel)
+            self._enqueue_write(
+                self._pending_uploads_by_path,
+                (file_path, target_key),
+                {'file_path': file_path, 'target': target_key, 'file_size': file_size, 'media_type': media_type}
+            )
+            logger.debug(f"添加上传记录：文件 {file_path} 到频道 {target_channel}")
+        except Exception as e:
+            logger.error(f"添加上传记录失败: {e}")
     
     def get_uploaded_files(self, target_channel: Optional[str] = None) -> List[str]:
         """
@@ -257,17 +1120,14 @@ class DatabaseManager:
         Returns:
             List[str]: 已上传的文件路径列表
         """
-        with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                if target_channel is None:
-                    cursor.execute('SELECT DISTINCT file_path FROM upload_history ORDER BY file_path')
-                else:
-                    cursor.execute(
-                        'SELECT DISTINCT file_path FROM upload_history WHERE target_channel = ? ORDER BY file_path',
-                        (target_channel,)
-                    )
-                return [row['file_path'] for row in cursor.fetchall()]
+        self.flush()
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            if target_channel is None:
+                cursor.execute(self._sql['uploaded_files'])
+            else:
+                cursor.execute(self._sql['uploaded_files_target'], {'target': self._channel_key(target_channel)})
+            return [row['file_path'] for row in cursor.fetchall()]
     
     def is_file_hash_uploaded(self, file_hash: str, target_channel: str) -> bool:
         """
@@ -280,18 +1140,19 @@ class DatabaseManager:
         Returns:
             bool: 是否已上传
         """
+        target_key = self._channel_key(target_channel)
         with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT 1 FROM upload_history WHERE file_hash = ? AND target_channel = ?',
-                    (file_hash, target_channel)
-                )
-                return cursor.fetchone() is not None
+            if (file_hash, target_key) in self._pending_uploads_by_hash:
+                return True
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql['hash_uploaded'], {'file_hash': file_hash, 'target': target_key})
+            return cursor.fetchone() is not None
     
     def add_upload_record_by_hash(self, file_hash: str, file_path: str, target_channel: str, file_size: int, media_type: str):
         """
-        使用文件哈希添加上传记录
+        使用文件哈希添加上传记录（写入写缓冲，由后台线程批量提交）
         
         Args:
             file_hash: 文件哈希值
@@ -300,22 +1161,241 @@ class DatabaseManager:
             file_size: 文件大小（字节）
             media_type: 媒体类型
         """
-        with self._lock:
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''INSERT OR IGNORE INTO upload_history 
-                           (file_hash, file_path, target_channel, file_size, media_type) 
-                           VALUES (?, ?, ?, ?, ?)''',
-                        (file_hash, file_path, target_channel, file_size, media_type)
-                    )
+        try:
+            target_key = self._record_channel_key(target_channel)
+            self._enqueue_write(
+                self._pending_uploads_by_hash,
+                (file_hash, target_key),
+                {'file_hash': file_hash, 'file_path': file_path, 'target': target_key,
+                 'file_size': file_size, 'media_type': media_type}
+            )
+            logger.debug(f"添加上传记录：文件哈希 {file_hash} (路径: {file_path}) 到频道 {target_channel}")
+        except Exception as e:
+            logger.error(f"添加上传记录失败: {e}")
+    
+    def get_cached_file_hash(self, file_path: str, fingerprint: FileFingerprint, algorithm: str = 'md5') -> Optional[str]:
+        """
+        查询文件的缓存哈希，文件指纹已变化的记录会被删除
+        
+        Args:
+            file_path: 文件路径
+            fingerprint: 文件当前的指纹
+            algorithm: 哈希算法
+        
+        Returns:
+            Optional[str]: 缓存的哈希值，没有有效记录时返回None
+        """
+        try:
+            with self._get_connection() as conn:
+                file_hash = self._file_hash_cache.get(conn, file_path, algorithm, fingerprint)
+                if conn.in_transaction:
                     conn.commit()
-                    
-                    if cursor.rowcount > 0:
-                        logger.debug(f"添加上传记录：文件哈希 {file_hash} (路径: {file_path}) 到频道 {target_channel}")
-            except Exception as e:
-                logger.error(f"添加上传记录失败: {e}")
+                return file_hash
+        except Exception as e:
+            logger.error(f"查询文件哈希缓存失败: {e}")
+            return None
+    
+    def set_cached_file_hash(self, file_path: str, fingerprint: FileFingerprint, file_hash: str, algorithm: str = 'md5'):
+        """
+        记录文件的哈希及计算时的文件指纹
+        
+        Args:
+            file_path: 文件路径
+            fingerprint: 计算哈希时的文件指纹
+            file_hash: 哈希值
+            algorithm: 哈希算法
+        """
+        try:
+            with self._get_connection() as conn:
+                self._file_hash_cache.put(conn, file_path, algorithm, fingerprint, file_hash)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录文件哈希缓存失败: {e}")
+    
+    def get_content_hashes(self, quick_key: str) -> List[str]:
+        """
+        查询快速指纹对应的已上传内容的完整哈希
+        
+        Args:
+            quick_key: 快速指纹
+        
+        Returns:
+            List[str]: 完整哈希列表，查询失败时为空
+        """
+        try:
+            with self._get_connection() as conn:
+                return self._content_fingerprints.get_hashes(conn, quick_key)
+        except Exception as e:
+            logger.error(f"查询快速指纹失败: {e}")
+            return []
+    
+    def add_content_fingerprint(self, quick_key: str, file_hash: str):
+        """
+        记录已上传内容的快速指纹及完整哈希
+        
+        Args:
+            quick_key: 快速指纹
+            file_hash: 完整哈希
+        """
+        try:
+            with self._get_connection() as conn:
+                self._content_fingerprints.add(conn, quick_key, file_hash)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录快速指纹失败: {e}")
+    
+    def get_unindexed_uploads(self) -> Optional[List[Tuple[str, str, int]]]:
+        """
+        查询尚未记录快速指纹的按哈希上传记录（快速指纹功能之前的历史），每个哈希一条，
+        文件大小与这些记录相同的文件，快速指纹未命中不能说明未上传过
+        
+        Returns:
+            Optional[List[Tuple[str, str, int]]]: (文件哈希, 文件路径, 文件大小) 列表，文件大小未知时为0，查询失败时返回None
+        """
+        # 写缓冲中的上传记录也需要计入
+        self.flush()
+        try:
+            with self._get_connection() as conn:
+                return [(row[0], row[1], int(row[2] or 0)) for row in conn.execute(self._sql['unindexed_uploads'])]
+        except Exception as e:
+            logger.error(f"查询没有快速指纹的上传记录失败: {e}")
+            return None
+    
+    def get_uploaded_media(self, file_hash: str) -> Optional[Tuple[str, str]]:
+        """
+        查询相同内容首次上传后得到的file_id
+        
+        Args:
+            file_hash: 文件内容哈希
+        
+        Returns:
+            Optional[Tuple[str, str]]: (媒体类型, file_id)，未记录时返回None
+        """
+        try:
+            with self._get_connection() as conn:
+                return self._uploaded_media.get(conn, file_hash)
+        except Exception as e:
+            logger.error(f"查询已上传媒体失败: {e}")
+            return None
+    
+    def set_uploaded_media(self, file_hash: str, media_type: str, file_id: str, file_unique_id: Optional[str] = None):
+        """
+        记录内容上传后得到的file_id
+        
+        Args:
+            file_hash: 文件内容哈希
+            media_type: 媒体类型
+            file_id: Telegram文件ID
+            file_unique_id: Telegram文件唯一ID
+        """
+        try:
+            with self._get_connection() as conn:
+                self._uploaded_media.put(conn, file_hash, media_type, file_id, file_unique_id)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录已上传媒体失败: {e}")
+    
+    def remove_uploaded_media(self, file_hash: str):
+        """
+        删除已失效的file_id记录
+        
+        Args:
+            file_hash: 文件内容哈希
+        """
+        try:
+            with self._get_connection() as conn:
+                self._uploaded_media.remove(conn, file_hash)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"删除已上传媒体记录失败: {e}")
+    
+    # ==================== 媒体文件索引方法 ====================
+    
+    def get_media_file(self, file_unique_id: str) -> Optional[Tuple[str, int]]:
+        """
+        查询文件唯一ID对应的已下载文件
+        
+        Args:
+            file_unique_id: 文件唯一ID
+        
+        Returns:
+            Optional[Tuple[str, int]]: (文件路径, 文件大小)，未记录时返回None
+        """
+        try:
+            with self._get_connection() as conn:
+                return self._media_file_index.get(conn, file_unique_id)
+        except Exception as e:
+            logger.error(f"查询媒体文件索引失败: {e}")
+            return None
+    
+    def add_media_file(self, file_unique_id: str, file_path: str, file_size: int):
+        """
+        记录文件唯一ID对应的已下载文件
+        
+        Args:
+            file_unique_id: 文件唯一ID
+            file_path: 文件路径
+            file_size: 文件大小（字节）
+        """
+        try:
+            with self._get_connection() as conn:
+                self._media_file_index.put(conn, file_unique_id, file_path, file_size)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录媒体文件索引失败: {e}")
+    
+    def remove_media_file(self, file_unique_id: str):
+        """
+        删除文件唯一ID的记录，用于清理已失效的索引
+        
+        Args:
+            file_unique_id: 文件唯一ID
+        """
+        try:
+            with self._get_connection() as conn:
+                self._media_file_index.remove(conn, file_unique_id)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"删除媒体文件索引失败: {e}")
+    
+    # ==================== 消息元数据方法 ====================
+    
+    def add_message_metadata(self, records: List[MessageMetadata]):
+        """
+        批量记录消息元数据
+        
+        Args:
+            records: 消息元数据列表
+        """
+        if not records:
+            return
+        try:
+            with self._get_connection() as conn:
+                self._message_metadata.put_many(conn, records)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录消息元数据失败: {e}")
+    
+    def get_message_metadata(self, chat_id: int, start_id: int, end_id: int,
+                             max_age_days: Optional[float] = None) -> Dict[int, MessageMetadata]:
+        """
+        查询一段消息ID区间内已记录的消息元数据
+        
+        Args:
+            chat_id: 频道ID
+            start_id: 起始消息ID（包含）
+            end_id: 结束消息ID（包含）
+            max_age_days: 记录的最长有效期（天），为None时不限制
+        
+        Returns:
+            Dict[int, MessageMetadata]: 消息ID -> 元数据，查询失败时返回空字典
+        """
+        try:
+            with self._get_connection() as conn:
+                return self._message_metadata.get_range(conn, chat_id, start_id, end_id, max_age_days)
+        except Exception as e:
+            logger.error(f"查询消息元数据失败: {e}")
+            return {}
     
     # ==================== 转发历史记录方法 ====================
     
@@ -331,19 +1411,13 @@ class DatabaseManager:
         Returns:
             bool: 是否已转发
         """
+        index = self._forwarded_index(source_channel, target_channel)
         with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    '''SELECT 1 FROM forward_history 
-                       WHERE source_channel = ? AND message_id = ? AND target_channel = ?''',
-                    (source_channel, message_id, target_channel)
-                )
-                return cursor.fetchone() is not None
+            return message_id in index
     
     def add_forward_record(self, source_channel: str, message_id: int, target_channel: str, real_source_id: Optional[int] = None):
         """
-        添加转发记录
+        添加转发记录（写入写缓冲，由后台线程批量提交）
         
         Args:
             source_channel: 源频道
@@ -351,22 +1425,30 @@ class DatabaseManager:
             target_channel: 目标频道
             real_source_id: 真实源频道ID（数字形式）
         """
-        with self._lock:
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''INSERT OR IGNORE INTO forward_history 
-                           (source_channel, real_source_id, message_id, target_channel) 
-                           VALUES (?, ?, ?, ?)''',
-                        (source_channel, real_source_id, message_id, target_channel)
-                    )
-                    conn.commit()
-                    
-                    if cursor.rowcount > 0:
-                        logger.debug(f"添加转发记录：源频道 {source_channel} 的消息ID {message_id} 到目标频道 {target_channel}")
-            except Exception as e:
-                logger.error(f"添加转发记录失败: {e}")
+        try:
+            if real_source_id is not None:
+                self._queue_channel_alias(source_channel, real_source_id)
+            source_key = self._record_channel_key(source_channel)
+            target_key = self._record_channel_key(target_channel)
+            self._enqueue_write(
+                self._pending_forwards,
+                (source_key, message_id, target_key),
+                {'source': source_key, 'real_id': real_source_id, 'message_id': message_id, 'target': target_key},
+                self._forward_index, (source_key, target_key), message_id
+            )
+            logger.debug(f"添加转发记录：源频道 {source_channel} 的消息ID {message_id} 到目标频道 {target_channel}")
+        except Exception as e:
+            logger.error(f"添加转发记录失败: {e}")
+    
+    def add_forward_records(self, records: List[Tuple[str, int, str, Optional[int]]]):
+        """
+        批量添加转发记录
+        
+        Args:
+            records: (源频道, 消息ID, 目标频道, 真实源频道ID) 元组列表
+        """
+        for source_channel, message_id, target_channel, real_source_id in records:
+            self.add_forward_record(source_channel, message_id, target_channel, real_source_id)
     
     def get_forwarded_messages(self, source_channel: str, target_channel: Optional[str] = None) -> List[int]:
         """
@@ -379,101 +1461,155 @@ class DatabaseManager:
         Returns:
             List[int]: 已转发的消息ID列表
         """
-        with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                if target_channel is None:
-                    cursor.execute(
-                        'SELECT DISTINCT message_id FROM forward_history WHERE source_channel = ? ORDER BY message_id',
-                        (source_channel,)
-                    )
+        if target_channel is not None:
+            index = self._forwarded_index(source_channel, target_channel)
+            with self._lock:
+                return list(index)
+        
+        source_key = self._channel_key(source_channel)
+        self.flush()
+        with self._get_connection() as conn:
+            if self.storage_mode == STORAGE_MODE_INTERVALS:
+                merged = MessageIdBitmap()
+                for target in self._interval_store.get_targets(conn, KIND_FORWARD, source_key):
+                    for start_id, end_id in self._interval_store.get_intervals(conn, KIND_FORWARD, source_key, target):
+                        merged.add_range(start_id, end_id)
+                return list(merged)
+            
+            cursor = conn.cursor()
+            cursor.execute(self._sql['select_forward_ids_any'], {'source': source_key})
+            return [row['message_id'] for row in cursor.fetchall()]
+    
+    def get_forwarded_matrix(self, source_channel: str, target_channels: List[str],
+                             start_id: Optional[int] = None, end_id: Optional[int] = None,
+                             message_ids: Optional[List[int]] = None) -> Dict[str, Set[int]]:
+        """
+        批量查询一段消息ID在各目标频道的转发状态，基于内存ID索引代替逐条查询数据库
+        
+        Args:
+            source_channel: 源频道
+            target_channels: 目标频道列表
+            start_id: 起始消息ID（包含），与end_id一起指定查询范围
+            end_id: 结束消息ID（包含）
+            message_ids: 消息ID列表，指定时忽略start_id和end_id
+        
+        Returns:
+            Dict[str, Set[int]]: 目标频道 -> 已转发到该频道的消息ID集合
+        """
+        result: Dict[str, Set[int]] = {target: set() for target in target_channels}
+        if not target_channels:
+            return result
+        
+        if message_ids is None and (start_id is None or end_id is None):
+            return result
+        
+        wanted_ids = set(message_ids) if message_ids is not None else None
+        for target in target_channels:
+            index = self._forwarded_index(source_channel, target)
+            with self._lock:
+                if wanted_ids is not None:
+                    result[target] = {msg_id for msg_id in wanted_ids if msg_id in index}
                 else:
-                    cursor.execute(
-                        '''SELECT DISTINCT message_id FROM forward_history 
-                           WHERE source_channel = ? AND target_channel = ? ORDER BY message_id''',
-                        (source_channel, target_channel)
-                    )
-                return [row['message_id'] for row in cursor.fetchall()]
+                    result[target] = set(index.iter_range(start_id, end_id))
+        
+        return result
     
     # ==================== 数据管理方法 ====================
     
-    def cleanup_old_records(self, days: int = 30):
+    def _delete_in_batches(self, sql_name: str, cutoff_timestamp: str, batch_size: int, pause: float) -> int:
+        """
+        分批删除过期记录，每批单独提交，批次之间让出数据库写锁
+        
+        Args:
+            sql_name: 批量删除语句名称
+            cutoff_timestamp: 截止时间
+            batch_size: 每批最多删除的记录数
+            pause: 批次之间的等待时间（秒）
+        
+        Returns:
+            int: 删除的记录数
+        """
+        deleted = 0
+        while True:
+            with self._get_connection() as conn:
+                cursor = conn.execute(self._sql[sql_name], {'cutoff': cutoff_timestamp, 'limit': batch_size})
+                conn.commit()
+                count = max(cursor.rowcount, 0)
+            deleted += count
+            if count < batch_size or self._closed:
+                return deleted
+            # 让后台写入线程和其他连接在批次之间获得写锁
+            time.sleep(pause)
+    
+    def cleanup_old_records(self, days: int = 30, batch_size: int = 5000, pause: float = 0.01):
         """
         清理指定天数前的历史记录
         
+        按批删除并在批次之间让出写锁，清理大量记录时不会长时间阻塞写入；应在事件循环之外调用
+        
         Args:
             days: 保留天数，默认30天
+            batch_size: 每批最多删除的记录数
+            pause: 批次之间的等待时间（秒）
         """
         cutoff_date = datetime.now() - timedelta(days=days)
         cutoff_timestamp = cutoff_date.isoformat()
+        batch_size = max(1, batch_size)
         
-        with self._lock:
-            try:
+        self.flush()
+        try:
+            download_deleted = self._delete_in_batches('delete_download_batch', cutoff_timestamp, batch_size, pause)
+            upload_deleted = self._delete_in_batches('delete_upload_batch', cutoff_timestamp, batch_size, pause)
+            forward_deleted = self._delete_in_batches('delete_forward_batch', cutoff_timestamp, batch_size, pause)
+            
+            # 区间记录行数很少，一次删除即可
+            if self.storage_mode == STORAGE_MODE_INTERVALS:
                 with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    
-                    # 清理下载历史
-                    cursor.execute(
-                        'DELETE FROM download_history WHERE download_time < ?',
-                        (cutoff_timestamp,)
-                    )
-                    download_deleted = cursor.rowcount
-                    
-                    # 清理上传历史
-                    cursor.execute(
-                        'DELETE FROM upload_history WHERE upload_time < ?',
-                        (cutoff_timestamp,)
-                    )
-                    upload_deleted = cursor.rowcount
-                    
-                    # 清理转发历史
-                    cursor.execute(
-                        'DELETE FROM forward_history WHERE forward_time < ?',
-                        (cutoff_timestamp,)
-                    )
-                    forward_deleted = cursor.rowcount
-                    
+                    download_deleted += self._interval_store.delete_older_than(conn, KIND_DOWNLOAD, cutoff_timestamp)
+                    forward_deleted += self._interval_store.delete_older_than(conn, KIND_FORWARD, cutoff_timestamp)
                     conn.commit()
-                    
-                    logger.info(f"数据清理完成：删除下载记录 {download_deleted} 条，上传记录 {upload_deleted} 条，转发记录 {forward_deleted} 条")
-                    
-            except Exception as e:
-                logger.error(f"数据清理失败: {e}")
+            
+            logger.info(f"数据清理完成：删除下载记录 {download_deleted} 条，上传记录 {upload_deleted} 条，转发记录 {forward_deleted} 条")
+        
+        except Exception as e:
+            logger.error(f"数据清理失败: {e}")
+        finally:
+            self._invalidate_indexes()
     
     def get_database_stats(self) -> Dict[str, Any]:
         """
-        获取数据库统计信息
+        获取数据库统计信息，记录数来自触发器维护的计数器，无需全表扫描，不包含写缓冲中尚未提交的记录
         
         Returns:
             Dict[str, Any]: 数据库统计信息
         """
-        with self._lock:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # 获取各表记录数
-                cursor.execute('SELECT COUNT(*) FROM download_history')
-                download_count = cursor.fetchone()[0]
-                
-                cursor.execute('SELECT COUNT(*) FROM upload_history')
-                upload_count = cursor.fetchone()[0]
-                
-                cursor.execute('SELECT COUNT(*) FROM forward_history')
-                forward_count = cursor.fetchone()[0]
-                
-                # 获取数据库文件大小
-                db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
-                
-                return {
-                    'download_records': download_count,
-                    'upload_records': upload_count,
-                    'forward_records': forward_count,
-                    'database_size_mb': round(db_size / (1024 * 1024), 2),
-                    'database_path': self.db_path
-                }
+        with self._get_connection() as conn:
+            counts = read_row_counters(conn, self.schema_version)
+            download_count = counts['download']
+            upload_count = counts['upload']
+            forward_count = counts['forward']
+            
+            # 区间存储模式下按区间覆盖的消息ID数统计
+            if self.storage_mode == STORAGE_MODE_INTERVALS:
+                download_count += self._interval_store.count_ids(conn, KIND_DOWNLOAD)
+                forward_count += self._interval_store.count_ids(conn, KIND_FORWARD)
+            
+            # 获取数据库文件大小
+            db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+            
+            return {
+                'download_records': download_count,
+                'upload_records': upload_count,
+                'forward_records': forward_count,
+                'database_size_mb': round(db_size / (1024 * 1024), 2),
+                'database_path': self.db_path,
+                'storage_mode': self.storage_mode,
+                'schema_version': self.schema_version
+            }
     
     def optimize_database(self):
         """优化数据库性能"""
+        self.flush()
         with self._lock:
             try:
                 with self._get_connection() as conn:
@@ -481,28 +1617,51 @@ class DatabaseManager:
                     
                     # 重建索引
                     cursor.execute('REINDEX')
+                    conn.commit()
                     
                     # 清理数据库文件
                     cursor.execute('VACUUM')
                     
-                    conn.commit()
-                    
                     logger.info("数据库优化完成")
-                    
+            
             except Exception as e:
                 logger.error(f"数据库优化失败: {e}")
     
-    def backup_database(self, backup_path: str):
+    def backup_database(self, backup_path: str, pages_per_step: int = 256, step_pause: float = 0.005,
+                        progress: Optional[Callable[[int, int], None]] = None):
         """
-        备份数据库
+        使用SQLite在线备份接口按页分步备份数据库
+        
+        只在提交写缓冲时持有提交锁，之后在专用连接上开启读事务固定WAL快照再备份：
+        备份期间写缓冲照常提交，其他连接的写入也不会使备份重新开始，备份内容为开始时的快照；
+        应在事件循环之外调用
         
         Args:
             backup_path: 备份文件路径
+            pages_per_step: 每步复制的页数
+            step_pause: 每步之间的等待时间（秒）
+            progress: 进度回调，参数为 (剩余页数, 总页数)
         """
-        with self._lock:
-            try:
-                import shutil
-                shutil.copy2(self.db_path, backup_path)
-                logger.info(f"数据库备份完成: {backup_path}")
-            except Exception as e:
-                logger.error(f"数据库备份失败: {e}") 
\ No newline at end of file
+        start_time = time.time()
+        self.flush()
+        source = target = None
+        try:
+            source = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            # 读事务固定快照，之后提交的写入对备份不可见
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            target = sqlite3.connect(backup_path)
+            
+            def _on_progress(status, remaining, total):
+                if progress is not None:
+                    progress(remaining, total)
+            
+            source.backup(target, pages=max(1, pages_per_step), progress=_on_progress, sleep=step_pause)
+            logger.info(f"数据库备份完成: {backup_path}, 耗时 {time.time() - start_time:.2f}秒")
+        except Exception as e:
+            logger.error(f"数据库备份失败: {e}")
+        finally:
+            if target is not None:
+                target.close()
+            if source is not None:
+                source.close()
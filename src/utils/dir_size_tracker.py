@@ -0,0 +1,264 @@
+"""
+下载目录大小统计模块
+为下载根目录维护一个字节计数器：首次使用时在后台线程中用 scandir 遍历一次得到初始值，
+之后由写入文件和删除文件的代码上报变化，并定期在后台重新遍历校准，
+目录大小限制检查只需读取计数器，不必在每次下载前遍历整个目录
+
+未完成下载的 .part 文件在下载过程中不断增长而不上报，完成时被重命名为目标文件，
+因此不计入统计，只统计已完成的文件
+"""
+
+import os
+import stat
+import time
+import threading
+from typing import Dict, Optional, Set
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 两次后台校准之间的最短间隔（秒）
+DEFAULT_RECONCILE_INTERVAL = 600.0
+# 不计入统计的临时文件后缀：未完成下载及其状态文件、复用文件和整块写入时的临时文件
+UNTRACKED_SUFFIXES = ('.part', '.part.json', '.link.tmp', '.tmp')
+
+# 下载根目录 -> 统计器
+_trackers: Dict[str, "DirectorySizeTracker"] = {}
+_registry_lock = threading.Lock()
+
+
+class DirectorySizeTracker:
+    """
+    单个目录的字节计数器，统计目录下所有普通文件（不含符号链接和临时文件）的大小之和
+    
+    遍历期间上报的变化：所在子目录已遍历完的计入遍历结果，尚未遍历的由遍历本身反映；
+    正在遍历的子目录中可能有少量偏差，由下一次校准修正
+    """
+    
+    def __init__(self, root: str, reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL):
+        """
+        初始化目录大小统计器
+        
+        Args:
+            root: 目录路径
+            reconcile_interval: 两次后台校准之间的最短间隔（秒）
+        """
+        self.root = os.path.abspath(root)
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._total = 0
+        self._ready = threading.Event()
+        self._scanning = False
+        self._walked_dirs: Set[str] = set()
+        self._walk_delta = 0
+        self._last_reconcile = 0.0
+    
+    @property
+    def total(self) -> int:
+        """当前统计的目录总大小（字节）"""
+        return self._total
+    
+    @property
+    def ready(self) -> bool:
+        """是否已完成首次遍历"""
+        return self._ready.is_set()
+    
+    def contains(self, path: str) -> bool:
+        """
+        检查路径是否位于统计的目录下
+        
+        Args:
+            path: 文件路径
+        
+        Returns:
+            bool: 是否位于目录下
+        """
+        return os.path.abspath(path).startswith(self.root + os.sep)
+    
+    def start_scan(self) -> bool:
+        """
+        在后台线程中遍历目录，完成后用遍历结果替换计数器
+        
+        Returns:
+            bool: 是否启动了新的遍历，已有遍历在进行时返回False
+        """
+        with self._lock:
+            if self._scanning:
+                return False
+            self._scanning = True
+            self._walked_dirs = set()
+            self._walk_delta = 0
+        threading.Thread(target=self._scan, name="dir-size-scan", daemon=True).start()
+        return True
+    
+    def _scan(self):
+        """遍历目录统计文件大小"""
+        started = time.time()
+        total = 0
+        files = 0
+        stack = [self.root]
+        try:
+            while stack:
+                dir_path = stack.pop()
+                try:
+                    with os.scandir(dir_path) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                                elif entry.is_file(follow_symlinks=False) and not is_untracked(entry.name):
+                                    total += entry.stat(follow_symlinks=False).st_size
+                                    files += 1
+                            except OSError:
+                                continue
+                except OSError:
+                    pass
+                with self._lock:
+                    self._walked_dirs.add(dir_path)
+        finally:
+            with self._lock:
+                previous = self._total
+                self._total = total + self._walk_delta
+                self._scanning = False
+                self._walked_dirs = set()
+                self._walk_delta = 0
+                self._last_reconcile = time.monotonic()
+            was_ready = self.ready
+            self._ready.set()
+        
+        if was_ready and previous != self._total:
+            logger.debug(f"目录大小已校准: {self.root} {previous} -> {self._total} 字节")
+        logger.debug(f"目录大小统计完成: {self.root} 共 {files} 个文件 {total/1024/1024:.1f}MB，耗时 {time.time() - started:.2f}秒")
+    
+    def _apply(self, path: str, delta: int):
+        """
+        记录一个文件的大小变化
+        
+        Args:
+            path: 文件路径
+            delta: 大小变化（字节）
+        """
+        with self._lock:
+            if self._scanning and os.path.dirname(os.path.abspath(path)) in self._walked_dirs:
+                self._walk_delta += delta
+            self._total = max(0, self._total + delta)
+    
+    def add_file(self, path: str, size: int):
+        """
+        上报新写入的文件
+        
+        Args:
+            path: 文件路径
+            size: 文件大小（字节）
+        """
+        self._apply(path, size)
+    
+    def remove_file(self, path: str, size: int):
+        """
+        上报被删除的文件
+        
+        Args:
+            path: 文件路径
+            size: 删除前的文件大小（字节）
+        """
+        self._apply(path, -size)
+    
+    def maybe_reconcile(self):
+        """距上次遍历超过校准间隔时在后台重新遍历"""
+        if self.ready and not self._scanning and time.monotonic() - self._last_reconcile >= self.reconcile_interval:
+            self.start_scan()
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待首次遍历完成
+        
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等待
+        
+        Returns:
+            bool: 是否已完成
+        """
+        return self._ready.wait(timeout)
+
+
+def is_untracked(path: str) -> bool:
+    """
+    检查文件是否为不计入统计的临时文件
+    
+    Args:
+        path: 文件路径或文件名
+    
+    Returns:
+        bool: 是否不计入统计
+    """
+    return path.endswith(UNTRACKED_SUFFIXES)
+
+
+def tracked_file_size(path: str) -> Optional[int]:
+    """
+    获取计入统计的文件大小，用于在覆盖或删除文件前记录其大小
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        Optional[int]: 文件大小（字节），文件不存在、不是普通文件或不计入统计时返回None
+    """
+    if is_untracked(path):
+        return None
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+
+def get_directory_size_tracker(root: str) -> DirectorySizeTracker:
+    """
+    获取目录的大小统计器，首次获取时创建并在后台开始遍历
+    
+    Args:
+        root: 目录路径
+    
+    Returns:
+        DirectorySizeTracker: 统计器实例，同一目录共享同一个实例
+    """
+    key = os.path.abspath(root)
+    with _registry_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = DirectorySizeTracker(key)
+            _trackers[key] = tracker
+            tracker.start_scan()
+    return tracker
+
+
+def notify_file_added(path: str, size: int):
+    """
+    向包含该文件的所有统计器上报新写入的文件
+    
+    Args:
+        path: 文件路径
+        size: 文件大小（字节）
+    """
+    if is_untracked(path):
+        return
+    for tracker in list(_trackers.values()):
+        if tracker.contains(path):
+            tracker.add_file(path, size)
+
+
+def notify_file_removed(path: str, size: int):
+    """
+    向包含该文件的所有统计器上报被删除的文件
+    
+    Args:
+        path: 文件路径
+        size: 删除前的文件大小（字节）
+    """
+    if is_untracked(path):
+        return
+    for tracker in list(_trackers.values()):
+        if tracker.contains(path):
+            tracker.remove_file(path, size)
@@ -0,0 +1,237 @@
+"""
+按文件大小分道的下载调度模块
+根据预估大小把下载任务分到小、中、大三个通道，为较小文件的通道预留工作名额，
+避免一批大视频占满所有工作协程而让大量小图片长时间等待；通道内按选定策略排序
+"""
+
+import heapq
+import asyncio
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 下载通道
+LANE_SMALL = 'small'
+LANE_MEDIUM = 'medium'
+LANE_LARGE = 'large'
+LANES = (LANE_SMALL, LANE_MEDIUM, LANE_LARGE)
+
+# 排序策略
+ORDER_OLDEST_FIRST = 'oldest_first'
+ORDER_NEWEST_FIRST = 'newest_first'
+ORDER_SMALLEST_FIRST = 'smallest_first'
+ORDER_POLICIES = (ORDER_OLDEST_FIRST, ORDER_NEWEST_FIRST, ORDER_SMALLEST_FIRST)
+
+# 通道划分阈值：小于10MB为小文件，小于200MB为中等文件，其余为大文件
+DEFAULT_LANE_THRESHOLDS = (10 * 1024 * 1024, 200 * 1024 * 1024)
+# 小文件和中等文件通道预留的名额比例，大文件通道不能占用这些名额
+DEFAULT_LANE_RESERVES = {LANE_SMALL: 0.2, LANE_MEDIUM: 0.2}
+
+# 超时计算：基础时间加上按最低期望速度传完整个文件所需的时间
+DEFAULT_TIMEOUT_BASE = 30.0
+DEFAULT_MIN_SPEED = 128 * 1024
+# 大小未知时的超时时间
+DEFAULT_UNKNOWN_SIZE_TIMEOUT = 90.0
+
+
+def timeout_for_size(size: int, base: float = DEFAULT_TIMEOUT_BASE, min_speed: float = DEFAULT_MIN_SPEED,
+                     unknown: float = DEFAULT_UNKNOWN_SIZE_TIMEOUT) -> float:
+    """
+    按预估文件大小计算下载超时时间
+    
+    Args:
+        size: 预估文件大小（字节），0表示未知
+        base: 基础超时时间（秒）
+        min_speed: 最低期望下载速度（字节/秒）
+        unknown: 大小未知时的超时时间（秒）
+    
+    Returns:
+        float: 超时时间（秒）
+    """
+    if size <= 0:
+        return unknown
+    return base + size / min_speed
+
+
+class SizeAwareScheduler:
+    """
+    分道下载调度器，替代FIFO队列在扫描和下载工作协程之间传递任务
+    
+    put() 在缓冲任务数达到上限时等待，对扫描形成反压；get() 只分派到未超过名额上限的通道：
+    每个通道可以使用的名额为总容量减去比它小的通道的预留名额，小文件通道不受限制。
+    在满足名额限制的通道中，按排序策略选择队首最靠前的任务
+    """
+    
+    def __init__(self, capacity: Callable[[], int], maxsize: int = 100, policy: str = ORDER_OLDEST_FIRST,
+                 thresholds: Tuple[int, int] = DEFAULT_LANE_THRESHOLDS,
+                 reserves: Optional[Dict[str, float]] = None):
+        """
+        初始化调度器
+        
+        Args:
+            capacity: 返回当前可同时下载数量的函数，通常为并发控制器的当前并发数
+            maxsize: 缓冲任务数上限
+            policy: 排序策略
+            thresholds: (小文件上限, 中等文件上限)，单位字节
+            reserves: 各通道预留名额占总容量的比例
+        """
+        if policy not in ORDER_POLICIES:
+            logger.warning(f"未知的下载排序策略: {policy}，使用 {ORDER_OLDEST_FIRST}")
+            policy = ORDER_OLDEST_FIRST
+        self.capacity = capacity
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.thresholds = thresholds
+        self.reserves = reserves if reserves is not None else dict(DEFAULT_LANE_RESERVES)
+        
+        self._heaps: Dict[str, List[tuple]] = {lane: [] for lane in LANES}
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._pending = 0
+        self._closed = False
+        self._seq = count()
+        self._waiters: List[asyncio.Future] = []
+    
+    def classify(self, size: int) -> str:
+        """
+        按预估大小确定通道，大小未知的任务归入中等文件通道
+        
+        Args:
+            size: 预估文件大小（字节）
+        
+        Returns:
+            str: 通道名称
+        """
+        if size <= 0:
+            return LANE_MEDIUM
+        if size < self.thresholds[0]:
+            return LANE_SMALL
+        if size < self.thresholds[1]:
+            return LANE_MEDIUM
+        return LANE_LARGE
+    
+    def _sort_key(self, size: int, message_id: int) -> tuple:
+        """按排序策略生成堆排序键"""
+        if self.policy == ORDER_NEWEST_FIRST:
+            return (-message_id,)
+        if self.policy == ORDER_SMALLEST_FIRST:
+            return (size, message_id)
+        return (message_id,)
+    
+    def _reserved(self, lane: str, capacity: int) -> int:
+        """
+        计算通道的预留名额，总容量不足时不预留
+        
+        Args:
+            lane: 通道名称
+            capacity: 当前总容量
+        
+        Returns:
+            int: 预留名额数
+        """
+        share = self.reserves.get(lane, 0)
+        if share <= 0 or capacity < len(LANES):
+            return 0
+        return max(1, int(capacity * share))
+    
+    def _lane_limit(self, lane: str, capacity: int) -> int:
+        """通道可使用的名额上限：总容量减去更小文件通道的预留名额，至少为1"""
+        smaller = LANES[:LANES.index(lane)]
+        return max(1, capacity - sum(self._reserved(other, capacity) for other in smaller))
+    
+    def _pick_lane(self) -> Optional[str]:
+        """选择下一个分派任务的通道，没有可分派的任务时返回None"""
+        capacity = max(1, self.capacity())
+        if sum(self._active.values()) >= capacity:
+            return None
+        candidates = [
+            lane for lane in LANES
+            if self._heaps[lane] and self._active[lane] < self._lane_limit(lane, capacity)
+        ]
+        if not candidates:
+            return None
+        # 优先满足未用满预留名额的通道
+        starved = [lane for lane in candidates if self._active[lane] < self._reserved(lane, capacity)]
+        return min(starved or candidates, key=lambda lane: self._heaps[lane][0])
+    
+    async def _wait_change(self):
+        """等待调度状态变化"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+    
+    def _wake(self):
+        """唤醒所有等待者，由其重新检查条件"""
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+    
+    async def put(self, item: Any, size: int, message_id: int):
+        """
+        放入下载任务，缓冲已满时等待
+        
+        Args:
+            item: 下载任务
+            size: 预估文件大小（字节）
+            message_id: 消息ID，用于按新旧排序
+        """
+        while self._pending >= self.maxsize and not self._closed:
+            await self._wait_change()
+        lane = self.classify(size)
+        heapq.heappush(self._heaps[lane], (*self._sort_key(size, message_id), next(self._seq), item, size))
+        self._pending += 1
+        self._wake()
+    
+    async def get(self) -> Optional[Tuple[Any, str, int]]:
+        """
+        取出下一个可分派的下载任务，调用方完成后必须调用 task_done()
+        
+        Returns:
+            Optional[Tuple[Any, str, int]]: (下载任务, 通道, 预估大小)，调度器已关闭且没有剩余任务时返回None
+        """
+        while True:
+            lane = self._pick_lane()
+            if lane is not None:
+                entry = heapq.heappop(self._heaps[lane])
+                self._pending -= 1
+                self._active[lane] += 1
+                self._wake()
+                return entry[-2], lane, entry[-1]
+            if self._closed and self._pending == 0:
+                return None
+            await self._wait_change()
+    
+    def task_done(self, lane: str):
+        """
+        标记某个通道的任务已完成，释放名额
+        
+        Args:
+            lane: get() 返回的通道
+        """
+        self._active[lane] = max(0, self._active[lane] - 1)
+        self._wake()
+    
+    def notify_capacity_changed(self):
+        """总容量变化后唤醒等待分派的工作协程"""
+        self._wake()
+    
+    def close(self):
+        """标记不会再有新任务，工作协程取完剩余任务后 get() 返回None"""
+        self._closed = True
+        self._wake()
+    
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        获取各通道的排队数和执行数
+        
+        Returns:
+            Dict[str, Dict[str, int]]: 通道名称 -> {'pending': 排队数, 'active': 执行数}
+        """
+        return {lane: {'pending': len(self._heaps[lane]), 'active': self._active[lane]} for lane in LANES}
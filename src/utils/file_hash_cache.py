@@ -0,0 +1,126 @@
+"""
+文件哈希缓存模块
+按文件路径保存哈希值以及计算时文件的大小、修改时间和inode，
+再次上传同一目录时，只要文件的这些属性没有变化就直接使用缓存的哈希，只有新文件或已修改的文件才需要重新读取
+"""
+
+import os
+import sqlite3
+from typing import NamedTuple, Optional, Union
+from pathlib import Path
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class FileFingerprint(NamedTuple):
+    """文件的stat指纹，任一字段变化都视为文件已修改"""
+    
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+def file_fingerprint(file_path: Union[str, Path]) -> Optional[FileFingerprint]:
+    """
+    获取文件的stat指纹
+    
+    Args:
+        file_path: 文件路径
+    
+    Returns:
+        Optional[FileFingerprint]: 文件指纹，文件不存在或无法访问时返回None
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return FileFingerprint(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class FileHashCacheStore:
+    """
+    文件哈希缓存存储，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    
+    每个路径和哈希算法只保留一条记录，指纹不一致时记录作废
+    """
+    
+    TABLE = 'file_hash_cache'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建文件哈希缓存表
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                file_path TEXT NOT NULL,
+                algorithm TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                file_hash TEXT NOT NULL,
+                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (file_path, algorithm)
+            ) WITHOUT ROWID
+        ''')
+    
+    def get(self, conn: sqlite3.Connection, file_path: str, algorithm: str,
+            fingerprint: FileFingerprint) -> Optional[str]:
+        """
+        查询文件的缓存哈希，记录的指纹与当前指纹不一致时删除该记录
+        
+        Args:
+            conn: 数据库连接
+            file_path: 文件路径
+            algorithm: 哈希算法
+            fingerprint: 文件当前的指纹
+        
+        Returns:
+            Optional[str]: 缓存的哈希值，没有有效记录时返回None
+        """
+        row = conn.execute(
+            f'SELECT file_size, mtime_ns, inode, file_hash FROM {self.TABLE} WHERE file_path = ? AND algorithm = ?',
+            (file_path, algorithm)
+        ).fetchone()
+        if row is None:
+            return None
+        if FileFingerprint(row[0], row[1], row[2]) != fingerprint:
+            self.remove(conn, file_path, algorithm)
+            return None
+        return row[3]
+    
+    def put(self, conn: sqlite3.Connection, file_path: str, algorithm: str,
+            fingerprint: FileFingerprint, file_hash: str):
+        """
+        记录或更新文件的哈希
+        
+        Args:
+            conn: 数据库连接
+            file_path: 文件路径
+            algorithm: 哈希算法
+            fingerprint: 计算哈希时的文件指纹
+            file_hash: 哈希值
+        """
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.TABLE} (file_path, algorithm, file_size, mtime_ns, inode, file_hash, updated_time) '
+            f'VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)',
+            (file_path, algorithm, fingerprint.size, fingerprint.mtime_ns, fingerprint.inode, file_hash)
+        )
+    
+    def remove(self, conn: sqlite3.Connection, file_path: str, algorithm: Optional[str] = None):
+        """
+        删除文件的哈希记录
+        
+        Args:
+            conn: 数据库连接
+            file_path: 文件路径
+            algorithm: 哈希算法，为None时删除该路径的所有记录
+        """
+        if algorithm is None:
+            conn.execute(f'DELETE FROM {self.TABLE} WHERE file_path = ?', (file_path,))
+        else:
+            conn.execute(f'DELETE FROM {self.TABLE} WHERE file_path = ? AND algorithm = ?', (file_path, algorithm))
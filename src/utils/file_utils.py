@@ -4,13 +4,18 @@ TG-Manager 文件工具类
 """
 
 import os
+import shutil
 import hashlib
 from pathlib import Path
 from typing import Union, Optional
+from src.utils.dir_size_tracker import notify_file_added, notify_file_removed, tracked_file_size
 from src.utils.logger import get_logger
 
 logger = get_logger()
 
+# Linux上的FICLONE ioctl请求码，用于在Btrfs、XFS等文件系统上创建写时复制的文件副本
+_FICLONE = 0x40049409
+
 def calculate_file_hash(file_path: Union[str, Path], algorithm: str = 'md5', buffer_size: int = 65536) -> Optional[str]:
     """
     计算文件的哈希值
@@ -65,4 +70,65 @@ def get_file_size(file_path: Union[str, Path]) -> int:
         return file_path.stat().st_size
     except Exception as e:
         logger.error(f"获取文件大小时出错: {e}")
-        return 0 
\ No newline at end of file
+        return 0
+
+def _reflink(source: str, target: str):
+    """
+    创建写时复制的文件副本，平台或文件系统不支持时抛出OSError
+    
+    Args:
+        source: 源文件路径
+        target: 目标文件路径
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("当前平台不支持reflink")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+
+def link_or_copy_file(source: Union[str, Path], target: Union[str, Path]) -> Optional[str]:
+    """
+    将已有文件放到新位置，依次尝试硬链接、reflink和复制，目标文件已存在时被替换
+    
+    硬链接和reflink不占用额外的磁盘空间；硬链接与源文件共享同一份数据，修改其中一个会影响另一个
+    
+    Args:
+        source: 源文件路径
+        target: 目标文件路径
+        
+    Returns:
+        Optional[str]: 使用的方式，'hardlink'、'reflink'或'copy'，全部失败时返回None
+    """
+    source = str(source)
+    target = str(target)
+    temp_path = f"{target}.link.tmp"
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    
+    for method, create in (('hardlink', os.link), ('reflink', _reflink), ('copy', shutil.copy2)):
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            create(source, temp_path)
+            # 先在临时路径上创建，再原子替换，避免留下不完整的目标文件
+            replaced_size = tracked_file_size(target)
+            os.replace(temp_path, target)
+            if replaced_size is not None:
+                notify_file_removed(target, replaced_size)
+            notify_file_added(target, os.path.getsize(target))
+            return method
+        except OSError as e:
+            logger.debug(f"使用 {method} 复用文件失败: {source} -> {target} - {e}")
+    
+    try:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    except OSError:
+        pass
+    logger.error(f"复用文件失败: {source} -> {target}")
+    return None
@@ -0,0 +1,531 @@
+"""
+历史数据库基准测试模块，生成大规模合成历史数据库并测量DatabaseManager各公开方法的延迟和吞吐量
+结果以JSON报告输出，便于在合并前对比历史记录层的性能回归
+
+用法:
+    python -m src.utils.history_benchmark --rows 1000000 --output bench_history.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.database_manager import DatabaseManager
+from src.utils.history_schema import SCHEMA_V2, create_schema_v2, ensure_row_counters, set_schema_version
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 下载、转发、上传记录在总行数中的占比
+_DOWNLOAD_SHARE = 0.45
+_FORWARD_SHARE = 0.45
+# 合成记录的时间分布范围（天），清理基准删除其中较早的部分
+_HISTORY_DAYS = 90
+
+
+class SyntheticHistory:
+    """
+    合成历史数据生成器
+    
+    频道大小服从Zipf分布（少数大频道占大部分记录），每个频道的消息ID由连续片段和随机间隔组成，
+    与顺序下载/转发产生的真实ID分布相近
+    """
+    
+    def __init__(self, total_rows: int, channel_count: int = 64, seed: int = 42):
+        """
+        初始化生成器
+        
+        Args:
+            total_rows: 生成的总记录数
+            channel_count: 频道数量
+            seed: 随机种子，相同参数生成相同的数据
+        """
+        self.total_rows = total_rows
+        self.channel_count = max(2, channel_count)
+        self.random = random.Random(seed)
+        # 频道使用真实形式的数字ID，并为每个频道生成一个用户名
+        self.channels: List[Tuple[str, int]] = [
+            (f"@bench_channel_{index}", -1001000000000 - index) for index in range(self.channel_count)
+        ]
+        weights = [1.0 / (rank + 1) ** 1.1 for rank in range(self.channel_count)]
+        total_weight = sum(weights)
+        self.channel_shares = [weight / total_weight for weight in weights]
+        # 每个源频道转发到1至4个目标频道
+        self.forward_targets: Dict[int, List[int]] = {
+            index: self.random.sample(
+                [other for other in range(self.channel_count) if other != index],
+                k=min(self.channel_count - 1, 1 + index % 4)
+            )
+            for index in range(self.channel_count)
+        }
+        # 每个频道已生成的最大消息ID，用于抽取查询样本
+        self.max_ids: Dict[int, int] = {}
+    
+    def iter_message_ids(self, count: int) -> Iterator[int]:
+        """
+        生成count个递增的消息ID，连续片段平均长度200，片段之间平均间隔20
+        
+        Args:
+            count: 消息ID数量
+        
+        Yields:
+            int: 消息ID
+        """
+        message_id = self.random.randint(1, 1000)
+        produced = 0
+        while produced < count:
+            run_length = min(count - produced, max(1, int(self.random.expovariate(1 / 200))))
+            for _ in range(run_length):
+                yield message_id
+                message_id += 1
+            produced += run_length
+            message_id += max(1, int(self.random.expovariate(1 / 20)))
+    
+    def _timestamp(self, now: datetime) -> str:
+        """生成分布在最近_HISTORY_DAYS天内的时间戳，格式与CURRENT_TIMESTAMP一致"""
+        offset = timedelta(seconds=self.random.randint(0, _HISTORY_DAYS * 86400))
+        return (now - offset).strftime('%Y-%m-%d %H:%M:%S')
+    
+    def build(self, db_path: str, batch_size: int = 100000, overwrite: bool = False):
+        """
+        生成v2表结构的合成历史数据库
+        
+        Args:
+            db_path: 数据库文件路径
+            batch_size: 每次批量插入的记录数
+            overwrite: 数据库文件已存在时是否覆盖
+        
+        Raises:
+            FileExistsError: 数据库文件已存在且不允许覆盖时抛出
+        """
+        if os.path.exists(db_path) and not overwrite:
+            raise FileExistsError(f"数据库文件已存在: {db_path}")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        
+        start_time = time.time()
+        now = datetime.now()
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        create_schema_v2(conn)
+        set_schema_version(conn, SCHEMA_V2)
+        conn.executemany(
+            'INSERT INTO channel_aliases (alias, channel_id) VALUES (?, ?)',
+            self.channels
+        )
+        
+        download_rows = int(self.total_rows * _DOWNLOAD_SHARE)
+        forward_rows = int(self.total_rows * _FORWARD_SHARE)
+        upload_rows = self.total_rows - download_rows - forward_rows
+        
+        def _insert(sql: str, rows: Iterator[Tuple]):
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    conn.executemany(sql, batch)
+                    batch = []
+            if batch:
+                conn.executemany(sql, batch)
+        
+        def _download_rows() -> Iterator[Tuple]:
+            for index, share in enumerate(self.channel_shares):
+                channel_id = self.channels[index][1]
+                last_id = 0
+                for message_id in self.iter_message_ids(max(1, int(download_rows * share))):
+                    last_id = message_id
+                    yield channel_id, message_id, self._timestamp(now)
+                self.max_ids[index] = max(self.max_ids.get(index, 0), last_id)
+        
+        def _forward_rows() -> Iterator[Tuple]:
+            for index, share in enumerate(self.channel_shares):
+                source_id = self.channels[index][1]
+                targets = self.forward_targets[index]
+                per_target = max(1, int(forward_rows * share / len(targets)))
+                for target in sorted(targets, key=lambda other: self.channels[other][1]):
+                    last_id = 0
+                    for message_id in self.iter_message_ids(per_target):
+                        last_id = message_id
+                        yield source_id, self.channels[target][1], message_id, self._timestamp(now)
+                    self.max_ids[index] = max(self.max_ids.get(index, 0), last_id)
+        
+        def _upload_rows() -> Iterator[Tuple]:
+            for number in range(upload_rows):
+                target = self.channels[self.random.randrange(self.channel_count)][1]
+                file_hash = f"{self.random.getrandbits(128):032x}"
+                yield (file_hash, target, f"/bench/files/{number}.jpg",
+                       self.random.randint(10_000, 50_000_000), 'photo', self._timestamp(now))
+        
+        _insert('INSERT OR IGNORE INTO download_history_v2 (channel_id, message_id, download_time) VALUES (?, ?, ?)',
+                _download_rows())
+        _insert('INSERT OR IGNORE INTO forward_history_v2 (source_id, target_id, message_id, forward_time) '
+                'VALUES (?, ?, ?, ?)', _forward_rows())
+        _insert('INSERT OR IGNORE INTO upload_history_v2 '
+                '(file_hash, target_id, file_path, file_size, media_type, upload_time) VALUES (?, ?, ?, ?, ?, ?)',
+                _upload_rows())
+        ensure_row_counters(conn, SCHEMA_V2)
+        conn.commit()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        logger.info(f"合成历史数据库已生成：{self.total_rows} 条记录，耗时 {time.time() - start_time:.1f}秒")
+
+
+class HistoryBenchmark:
+    """对DatabaseManager的公开方法逐项计时并汇总为报告"""
+    
+    def __init__(self, db_manager: DatabaseManager, history: SyntheticHistory, iterations: int = 2000, seed: int = 7):
+        """
+        初始化基准测试
+        
+        Args:
+            db_manager: 被测数据库管理器
+            history: 生成该数据库的合成数据描述
+            iterations: 单项查询的采样次数
+            seed: 随机种子
+        """
+        self.db = db_manager
+        self.history = history
+        self.iterations = max(10, iterations)
+        self.random = random.Random(seed)
+        self.results: Dict[str, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def _summarize(latencies: List[float], elapsed: float, operations: int) -> Dict[str, Any]:
+        """
+        汇总延迟样本
+        
+        Args:
+            latencies: 单次调用延迟（秒）
+            elapsed: 总耗时（秒）
+            operations: 完成的操作数
+        
+        Returns:
+            Dict[str, Any]: 统计结果，延迟单位为毫秒
+        """
+        ordered = sorted(latencies)
+        
+        def _percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+        
+        return {
+            'samples': len(ordered),
+            'p50_ms': round(_percentile(0.50), 4),
+            'p99_ms': round(_percentile(0.99), 4),
+            'max_ms': round(ordered[-1] * 1000, 4) if ordered else 0.0,
+            'mean_ms': round(statistics.fmean(ordered) * 1000, 4) if ordered else 0.0,
+            'ops_per_sec': round(operations / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+    
+    def measure(self, name: str, func: Callable[[], Any], iterations: Optional[int] = None):
+        """
+        重复调用func并记录每次延迟
+        
+        Args:
+            name: 结果名称
+            func: 被测调用
+            iterations: 调用次数，默认使用self.iterations
+        """
+        iterations = iterations or self.iterations
+        latencies = []
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            call_start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - call_start)
+        self.results[name] = self._summarize(latencies, time.perf_counter() - start_time, iterations)
+        logger.info(f"{name}: p50={self.results[name]['p50_ms']}ms p99={self.results[name]['p99_ms']}ms")
+    
+    def _sample_channel(self) -> Tuple[int, str, int]:
+        """按频道大小加权抽取一个频道，返回 (序号, 用户名, 数字ID)"""
+        index = self.random.choices(range(self.history.channel_count), weights=self.history.channel_shares)[0]
+        alias, channel_id = self.history.channels[index]
+        return index, alias, channel_id
+    
+    def _sample_message_id(self, index: int) -> int:
+        """在频道已有的ID范围内随机抽取一个消息ID（可能命中也可能落在间隔中）"""
+        return self.random.randint(1, max(1, self.history.max_ids.get(index, 1)))
+    
+    def _sample_forward_pair(self) -> Tuple[int, str, str]:
+        """抽取一组 (源频道序号, 源频道用户名, 目标频道用户名)"""
+        index, alias, _ = self._sample_channel()
+        target = self.random.choice(self.history.forward_targets[index])
+        return index, alias, self.history.channels[target][0]
+    
+    def run_lookups(self):
+        """单条查询：首次加载索引的冷查询和索引已加载后的热查询"""
+        cold_latencies = []
+        start_time = time.perf_counter()
+        for index, (alias, _) in enumerate(self.history.channels):
+            call_start = time.perf_counter()
+            self.db.get_downloaded_index(alias)
+            cold_latencies.append(time.perf_counter() - call_start)
+        self.results['get_downloaded_index.cold'] = self._summarize(
+            cold_latencies, time.perf_counter() - start_time, len(cold_latencies))
+        
+        def _downloaded():
+            index, alias, _ = self._sample_channel()
+            self.db.is_message_downloaded(alias, self._sample_message_id(index))
+        
+        def _downloaded_numeric():
+            index, _, channel_id = self._sample_channel()
+            self.db.is_downloaded(str(channel_id), self._sample_message_id(index))
+        
+        def _forwarded():
+            index, source, target = self._sample_forward_pair()
+            self.db.is_message_forwarded(source, self._sample_message_id(index), target)
+        
+        def _file_uploaded():
+            _, _, channel_id = self._sample_channel()
+            self.db.is_file_uploaded(f"/bench/files/{self.random.randrange(1 << 20)}.jpg", str(channel_id))
+        
+        def _hash_uploaded():
+            _, _, channel_id = self._sample_channel()
+            self.db.is_file_hash_uploaded(f"{self.random.getrandbits(128):032x}", str(channel_id))
+        
+        self.measure('is_message_downloaded', _downloaded)
+        self.measure('is_downloaded.numeric_id', _downloaded_numeric)
+        self.measure('is_message_forwarded', _forwarded)
+        self.measure('is_file_uploaded', _file_uploaded)
+        self.measure('is_file_hash_uploaded', _hash_uploaded)
+    
+    def run_range_queries(self, window: int = 1000):
+        """
+        范围预过滤：转发前批量判断一段消息ID在各目标频道的状态
+        
+        Args:
+            window: 每次查询的消息ID范围大小
+        """
+        def _matrix():
+            index, alias, _ = self._sample_channel()
+            start_id = self._sample_message_id(index)
+            targets = [self.history.channels[target][0] for target in self.history.forward_targets[index]]
+            self.db.get_forwarded_matrix(alias, targets, start_id=start_id, end_id=start_id + window)
+        
+        def _matrix_ids():
+            index, alias, _ = self._sample_channel()
+            start_id = self._sample_message_id(index)
+            targets = [self.history.channels[target][0] for target in self.history.forward_targets[index]]
+            self.db.get_forwarded_matrix(alias, targets, message_ids=list(range(start_id, start_id + 10)))
+        
+        def _iter_downloaded():
+            index, alias, _ = self._sample_channel()
+            start_id = self._sample_message_id(index)
+            sum(1 for _ in self.db.iter_downloaded_ids(alias, start_id, start_id + window))
+        
+        def _iter_forwarded():
+            index, source, target = self._sample_forward_pair()
+            start_id = self._sample_message_id(index)
+            sum(1 for _ in self.db.iter_forwarded_ids(source, target, start_id, start_id + window))
+        
+        def _downloaded_intervals():
+            index, alias, _ = self._sample_channel()
+            start_id = self._sample_message_id(index)
+            self.db.get_downloaded_intervals(alias, start_id, start_id + window)
+        
+        def _forwarded_intervals():
+            index, source, target = self._sample_forward_pair()
+            start_id = self._sample_message_id(index)
+            self.db.get_forwarded_intervals(source, target, start_id, start_id + window)
+        
+        self.measure(f'get_forwarded_matrix.range_{window}', _matrix)
+        self.measure('get_forwarded_matrix.media_group', _matrix_ids)
+        self.measure(f'iter_downloaded_ids.range_{window}', _iter_downloaded)
+        self.measure(f'iter_forwarded_ids.range_{window}', _iter_forwarded)
+        self.measure(f'get_downloaded_intervals.range_{window}', _downloaded_intervals)
+        self.measure(f'get_forwarded_intervals.range_{window}', _forwarded_intervals)
+        
+        # 全量列表查询开销较大，少量采样
+        bulk_iterations = max(5, self.iterations // 100)
+        self.measure('get_downloaded_messages', lambda: self.db.get_downloaded_messages(self._sample_channel()[1]),
+                     bulk_iterations)
+        self.measure('get_forwarded_messages.target', lambda: self.db.get_forwarded_messages(*self._sample_forward_pair()[1:]),
+                     bulk_iterations)
+        self.measure('get_forwarded_messages.all_targets',
+                     lambda: self.db.get_forwarded_messages(self._sample_channel()[1]), bulk_iterations)
+        self.measure('get_uploaded_files.target',
+                     lambda: self.db.get_uploaded_files(str(self._sample_channel()[2])), bulk_iterations)
+    
+    def run_inserts(self, threads: int = 4, per_thread: int = 5000):
+        """
+        并发写入：多个线程同时调用add_*_record，最后统计包含提交在内的整体吞吐量
+        
+        Args:
+            threads: 写入线程数
+            per_thread: 每个线程写入的记录数
+        """
+        base_id = max(self.history.max_ids.values(), default=0) + 1_000_000
+        for name, make_call in (
+            ('add_download_record', lambda alias, message_id: self.db.add_download_record(alias, message_id)),
+            ('add_forward_record', lambda alias, message_id: self.db.add_forward_record(
+                alias, message_id, self.history.channels[0][0] if alias != self.history.channels[0][0]
+                else self.history.channels[1][0])),
+            ('add_upload_record_by_hash', lambda alias, message_id: self.db.add_upload_record_by_hash(
+                f"bench-{message_id:032d}", f"/bench/new/{message_id}.jpg", alias, 1024, 'photo')),
+        ):
+            latencies: List[List[float]] = [[] for _ in range(threads)]
+            
+            def _worker(worker: int):
+                alias = self.history.channels[worker % self.history.channel_count][0]
+                first_id = base_id + worker * per_thread
+                for message_id in range(first_id, first_id + per_thread):
+                    call_start = time.perf_counter()
+                    make_call(alias, message_id)
+                    latencies[worker].append(time.perf_counter() - call_start)
+            
+            start_time = time.perf_counter()
+            workers = [threading.Thread(target=_worker, args=(worker,)) for worker in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.db.flush()
+            elapsed = time.perf_counter() - start_time
+            result = self._summarize([value for values in latencies for value in values], elapsed, threads * per_thread)
+            result['threads'] = threads
+            self.results[f'{name}.concurrent'] = result
+            logger.info(f"{name}.concurrent: {result['ops_per_sec']} 条/秒")
+            base_id += threads * per_thread
+    
+    def run_maintenance(self, backup_dir: str, include_optimize: bool = False):
+        """
+        维护操作：统计、备份、保留期清理（单次执行，记录耗时）
+        
+        Args:
+            backup_dir: 备份文件目录
+            include_optimize: 是否包含REINDEX和VACUUM（大库上耗时很长）
+        """
+        self.measure('get_database_stats', self.db.get_database_stats, max(10, self.iterations // 20))
+        
+        backup_path = os.path.join(backup_dir, 'history_backup.db')
+        self.measure('backup_database', lambda: self.db.backup_database(backup_path, pages_per_step=1024), 1)
+        if os.path.exists(backup_path):
+            self.results['backup_database']['backup_size_mb'] = round(os.path.getsize(backup_path) / (1024 * 1024), 2)
+            os.remove(backup_path)
+        
+        # 保留60天：约删除三分之一的合成记录
+        before = self.db.get_database_stats()
+        self.measure('cleanup_old_records', lambda: self.db.cleanup_old_records(days=60), 1)
+        after = self.db.get_database_stats()
+        self.results['cleanup_old_records']['rows_deleted'] = sum(
+            before[key] - after[key] for key in ('download_records', 'upload_records', 'forward_records'))
+        
+        if include_optimize:
+            self.measure('optimize_database', self.db.optimize_database, 1)
+
+
+def run_benchmark(rows: int = 1_000_000, iterations: int = 2000, threads: int = 4, channels: int = 64,
+                  storage_mode: Optional[str] = None, db_path: Optional[str] = None, keep: bool = False,
+                  include_optimize: bool = False, seed: int = 42, overwrite: bool = False) -> Dict[str, Any]:
+    """
+    生成合成数据库并运行全部基准测试
+    
+    Args:
+        rows: 合成记录总数
+        iterations: 单项查询的采样次数
+        threads: 并发写入的线程数
+        channels: 合成频道数量
+        storage_mode: 存储模式，'rows'或'intervals'，为None时使用逐行存储
+        db_path: 合成数据库路径，为None时使用临时目录
+        keep: 结束后是否保留合成数据库
+        include_optimize: 是否测量optimize_database
+        seed: 随机种子
+        overwrite: db_path已存在时是否覆盖
+    
+    Returns:
+        Dict[str, Any]: 基准测试报告
+    
+    Raises:
+        FileExistsError: db_path已存在且不允许覆盖时抛出
+    """
+    if db_path and os.path.exists(db_path) and not overwrite:
+        raise FileExistsError(f"数据库文件已存在: {db_path}")
+    work_dir = tempfile.mkdtemp(prefix='history_bench_')
+    db_path = db_path or os.path.join(work_dir, 'history.db')
+    history = SyntheticHistory(rows, channel_count=channels, seed=seed)
+    history.build(db_path, overwrite=overwrite)
+    fixture_size = os.path.getsize(db_path)
+    
+    db_manager = DatabaseManager(db_path, storage_mode=storage_mode)
+    try:
+        benchmark = HistoryBenchmark(db_manager, history, iterations=iterations, seed=seed)
+        benchmark.run_lookups()
+        benchmark.run_range_queries()
+        benchmark.run_inserts(threads=threads)
+        benchmark.run_maintenance(work_dir, include_optimize=include_optimize)
+        stats = db_manager.get_database_stats()
+    finally:
+        db_manager.close()
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix) and not db_path.startswith(work_dir):
+                    os.remove(db_path + suffix)
+    
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'rows': rows,
+            'channels': channels,
+            'iterations': iterations,
+            'threads': threads,
+            'seed': seed,
+            'storage_mode': stats['storage_mode'],
+            'schema_version': stats['schema_version'],
+            'fixture_size_mb': round(fixture_size / (1024 * 1024), 2),
+            'sqlite_version': sqlite3.sqlite_version,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': benchmark.results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="历史数据库基准测试")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="合成记录总数（建议1M至50M）")
+    parser.add_argument('--iterations', type=int, default=2000, help="单项查询的采样次数")
+    parser.add_argument('--threads', type=int, default=4, help="并发写入的线程数")
+    parser.add_argument('--channels', type=int, default=64, help="合成频道数量")
+    parser.add_argument('--storage-mode', choices=['rows', 'intervals'], default=None, help="历史存储模式")
+    parser.add_argument('--db-path', default=None, help="合成数据库路径，默认使用临时目录")
+    parser.add_argument('--overwrite', action='store_true', help="--db-path已存在时覆盖")
+    parser.add_argument('--keep', action='store_true', help="结束后保留合成数据库")
+    parser.add_argument('--optimize', action='store_true', help="同时测量optimize_database")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--output', default=None, help="JSON报告输出路径，默认输出到标准输出")
+    args = parser.parse_args(argv)
+    if args.db_path and os.path.exists(args.db_path) and not args.overwrite:
+        parser.error(f"数据库文件已存在: {args.db_path}，确认覆盖请加 --overwrite")
+    
+    report = run_benchmark(
+        rows=args.rows, iterations=args.iterations, threads=args.threads, channels=args.channels,
+        storage_mode=args.storage_mode, db_path=args.db_path, keep=args.keep,
+        include_optimize=args.optimize, seed=args.seed, overwrite=args.overwrite
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        logger.info(f"基准测试报告已写入: {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,469 @@
+"""
+区间编码的历史记录存储模块
+将下载和转发历史按 (类型, 源, 目标) 存储为闭区间 [start_id, end_id]，插入时合并相邻区间，
+顺序转发/下载产生的大量连续记录只占用一行
+"""
+
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.history_schema import SCHEMA_V1, SQL_BY_VERSION, SQL_V1, create_counter_table, get_schema_version
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 历史记录类型
+KIND_DOWNLOAD = 'download'
+KIND_FORWARD = 'forward'
+
+# 存储模式
+STORAGE_MODE_ROWS = 'rows'
+STORAGE_MODE_INTERVALS = 'intervals'
+
+
+def ids_to_runs(ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    将消息ID序列压缩为连续区间列表
+    
+    Args:
+        ids: 消息ID序列（无需有序，允许重复）
+    
+    Returns:
+        List[Tuple[int, int]]: 按起始ID排序的闭区间列表
+    """
+    runs: List[Tuple[int, int]] = []
+    for message_id in sorted(set(ids)):
+        if runs and message_id == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], message_id)
+        else:
+            runs.append((message_id, message_id))
+    return runs
+
+
+class IntervalHistoryStore:
+    """
+    区间历史记录存储，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    
+    下载记录的target固定为空字符串；区间按主键 (kind, source, target, start_id) 聚簇存储，
+    单点查询和范围查询都只需要在主键上做一次前驱查找加一次范围扫描
+    """
+    
+    TABLE = 'history_intervals'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建区间表、元数据表和消息ID数计数器
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL DEFAULT '',
+                start_id INTEGER NOT NULL,
+                end_id INTEGER NOT NULL,
+                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (kind, source, target, start_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS history_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        self._ensure_id_counters(conn)
+    
+    def _counter_name(self, kind: str) -> str:
+        """获取某类记录的消息ID数计数器名称"""
+        return f'{self.TABLE}.{kind}'
+    
+    def _ensure_id_counters(self, conn: sqlite3.Connection):
+        """
+        创建由触发器维护的消息ID数计数器，区间合并和拆分都是删除旧区间再插入新区间，计数随之增减
+        
+        计数器不存在时按当前区间初始化，由调用方提交
+        
+        Args:
+            conn: 数据库连接
+        """
+        create_counter_table(conn)
+        for kind in (KIND_DOWNLOAD, KIND_FORWARD):
+            name = self._counter_name(kind)
+            if conn.execute('SELECT 1 FROM history_counters WHERE name = ?', (name,)).fetchone() is None:
+                count = conn.execute(
+                    f'SELECT COALESCE(SUM(end_id - start_id + 1), 0) FROM {self.TABLE} WHERE kind = ?',
+                    (kind,)
+                ).fetchone()[0]
+                conn.execute('INSERT INTO history_counters (name, value) VALUES (?, ?)', (name, count))
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{self.TABLE}_count_insert AFTER INSERT ON {self.TABLE}
+            BEGIN
+                UPDATE history_counters SET value = value + (NEW.end_id - NEW.start_id + 1)
+                WHERE name = '{self.TABLE}.' || NEW.kind;
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{self.TABLE}_count_delete AFTER DELETE ON {self.TABLE}
+            BEGIN
+                UPDATE history_counters SET value = value - (OLD.end_id - OLD.start_id + 1)
+                WHERE name = '{self.TABLE}.' || OLD.kind;
+            END
+        ''')
+    
+    def get_storage_mode(self, conn: sqlite3.Connection) -> str:
+        """
+        读取数据库记录的历史存储模式
+        
+        Args:
+            conn: 数据库连接
+        
+        Returns:
+            str: 存储模式，未记录时为行存储模式
+        """
+        row = conn.execute("SELECT value FROM history_meta WHERE key = 'storage_mode'").fetchone()
+        return row[0] if row else STORAGE_MODE_ROWS
+    
+    def set_storage_mode(self, conn: sqlite3.Connection, mode: str):
+        """
+        记录历史存储模式
+        
+        Args:
+            conn: 数据库连接
+            mode: 存储模式
+        """
+        conn.execute(
+            "INSERT OR REPLACE INTO history_meta (key, value) VALUES ('storage_mode', ?)",
+            (mode,)
+        )
+    
+    def _overlapping(self, conn: sqlite3.Connection, kind: str, source: str, target: str,
+                     start_id: int, end_id: int) -> List[Tuple[int, int]]:
+        """
+        查询与 [start_id, end_id] 重叠的区间
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+            target: 目标频道
+            start_id: 起始ID（包含）
+            end_id: 结束ID（包含）
+        
+        Returns:
+            List[Tuple[int, int]]: 按起始ID排序的重叠区间
+        """
+        key = (kind, source, target)
+        # 起始ID小于start_id的区间中只有最后一个可能与查询范围重叠
+        predecessor = conn.execute(
+            f'''SELECT start_id, end_id FROM {self.TABLE}
+                WHERE kind = ? AND source = ? AND target = ? AND start_id < ?
+                ORDER BY start_id DESC LIMIT 1''',
+            (*key, start_id)
+        ).fetchone()
+        intervals = []
+        if predecessor and predecessor[1] >= start_id:
+            intervals.append((predecessor[0], predecessor[1]))
+        cursor = conn.execute(
+            f'''SELECT start_id, end_id FROM {self.TABLE}
+                WHERE kind = ? AND source = ? AND target = ? AND start_id BETWEEN ? AND ?
+                ORDER BY start_id''',
+            (*key, start_id, end_id)
+        )
+        intervals.extend((row[0], row[1]) for row in cursor)
+        return intervals
+    
+    def add_range(self, conn: sqlite3.Connection, kind: str, source: str, target: str,
+                  start_id: int, end_id: int, updated_time: Optional[str] = None) -> int:
+        """
+        添加一段连续的消息ID，与已有的重叠或相邻区间合并
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+            target: 目标频道，下载记录为空字符串
+            start_id: 起始ID（包含）
+            end_id: 结束ID（包含）
+            updated_time: 区间的更新时间，为None时使用当前时间
+        
+        Returns:
+            int: 新增的消息ID数量
+        """
+        # 查询时向两侧各扩展1，把相邻区间一并合并
+        existing = self._overlapping(conn, kind, source, target, start_id - 1, end_id + 1)
+        merged_start, merged_end = start_id, end_id
+        covered = 0
+        for existing_start, existing_end in existing:
+            merged_start = min(merged_start, existing_start)
+            merged_end = max(merged_end, existing_end)
+            covered += max(0, min(existing_end, end_id) - max(existing_start, start_id) + 1)
+        
+        if len(existing) == 1 and existing[0] == (merged_start, merged_end):
+            # 已被现有区间完全覆盖
+            return 0
+        conn.executemany(
+            f'DELETE FROM {self.TABLE} WHERE kind = ? AND source = ? AND target = ? AND start_id = ?',
+            [(kind, source, target, existing_start) for existing_start, _ in existing]
+        )
+        conn.execute(
+            f'''INSERT INTO {self.TABLE} (kind, source, target, start_id, end_id, updated_time)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))''',
+            (kind, source, target, merged_start, merged_end, updated_time)
+        )
+        return (end_id - start_id + 1) - covered
+    
+    def add_ids(self, conn: sqlite3.Connection, kind: str, source: str, target: str, ids: Iterable[int]) -> int:
+        """
+        添加消息ID，与已有的重叠或相邻区间合并
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+            target: 目标频道，下载记录为空字符串
+            ids: 消息ID序列
+        
+        Returns:
+            int: 新增的消息ID数量
+        """
+        return sum(
+            self.add_range(conn, kind, source, target, run_start, run_end)
+            for run_start, run_end in ids_to_runs(ids)
+        )
+    
+    def contains(self, conn: sqlite3.Connection, kind: str, source: str, target: str, message_id: int) -> bool:
+        """
+        检查消息ID是否落在某个区间内
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+            target: 目标频道
+            message_id: 消息ID
+        
+        Returns:
+            bool: 是否存在记录
+        """
+        row = conn.execute(
+            f'''SELECT end_id FROM {self.TABLE}
+                WHERE kind = ? AND source = ? AND target = ? AND start_id <= ?
+                ORDER BY start_id DESC LIMIT 1''',
+            (kind, source, target, message_id)
+        ).fetchone()
+        return row is not None and row[0] >= message_id
+    
+    def get_intervals(self, conn: sqlite3.Connection, kind: str, source: str, target: str,
+                      start_id: Optional[int] = None, end_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        获取区间列表，指定范围时只返回与范围重叠的部分（已按范围截断）
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+            target: 目标频道
+            start_id: 起始ID（包含），为None表示不限
+            end_id: 结束ID（包含），为None表示不限
+        
+        Returns:
+            List[Tuple[int, int]]: 按起始ID排序的闭区间列表
+        """
+        if start_id is None and end_id is None:
+            cursor = conn.execute(
+                f'''SELECT start_id, end_id FROM {self.TABLE}
+                    WHERE kind = ? AND source = ? AND target = ? ORDER BY start_id''',
+                (kind, source, target)
+            )
+            return [(row[0], row[1]) for row in cursor]
+        
+        low = start_id if start_id is not None else 0
+        high = end_id if end_id is not None else (1 << 62)
+        return [(max(s, low), min(e, high)) for s, e in self._overlapping(conn, kind, source, target, low, high)]
+    
+    def get_targets(self, conn: sqlite3.Connection, kind: str, source: str) -> List[str]:
+        """
+        获取源频道有记录的所有目标频道
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            source: 源频道
+        
+        Returns:
+            List[str]: 目标频道列表
+        """
+        cursor = conn.execute(
+            f'SELECT DISTINCT target FROM {self.TABLE} WHERE kind = ? AND source = ?',
+            (kind, source)
+        )
+        return [row[0] for row in cursor]
+    
+    def count_ids(self, conn: sqlite3.Connection, kind: str) -> int:
+        """
+        统计某类记录覆盖的消息ID总数，读取触发器维护的计数器，无需扫描区间表
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+        
+        Returns:
+            int: 消息ID总数
+        """
+        row = conn.execute('SELECT value FROM history_counters WHERE name = ?', (self._counter_name(kind),)).fetchone()
+        return row[0] if row else 0
+    
+    def delete_older_than(self, conn: sqlite3.Connection, kind: str, cutoff_timestamp: str) -> int:
+        """
+        删除最后更新时间早于指定时间的区间
+        
+        区间只保留最后一次合并的时间，因此清理粒度是整个区间
+        
+        Args:
+            conn: 数据库连接
+            kind: 记录类型
+            cutoff_timestamp: 截止时间
+        
+        Returns:
+            int: 删除的消息ID数量
+        """
+        row = conn.execute(
+            f'''SELECT COALESCE(SUM(end_id - start_id + 1), 0) FROM {self.TABLE}
+                WHERE kind = ? AND updated_time < ?''',
+            (kind, cutoff_timestamp)
+        ).fetchone()
+        conn.execute(
+            f'DELETE FROM {self.TABLE} WHERE kind = ? AND updated_time < ?',
+            (kind, cutoff_timestamp)
+        )
+        return row[0]
+    
+    def _rewrite(self, conn: sqlite3.Connection, where: str, params: Tuple, mapper: Callable[[str], Any]):
+        """
+        读取满足条件的区间，改写其源和目标后重新合并写入
+        
+        Args:
+            conn: 数据库连接
+            where: 筛选区间的条件语句
+            params: 条件参数
+            mapper: 频道键映射函数，目标为空字符串的下载记录保持不变
+        """
+        rows = conn.execute(
+            f'SELECT kind, source, target, start_id, end_id, updated_time FROM {self.TABLE} WHERE {where}',
+            params
+        ).fetchall()
+        conn.execute(f'DELETE FROM {self.TABLE} WHERE {where}', params)
+        for kind, source, target, start_id, end_id, updated_time in rows:
+            new_target = mapper(target) if target != '' else ''
+            self.add_range(conn, kind, mapper(source), new_target, start_id, end_id, updated_time)
+    
+    def remap_keys(self, conn: sqlite3.Connection, mapper: Callable[[str], Any]):
+        """
+        按映射函数改写所有区间的源和目标，映射到同一键的区间会被合并
+        
+        Args:
+            conn: 数据库连接
+            mapper: 频道键映射函数
+        """
+        self._rewrite(conn, '1', (), mapper)
+    
+    def rekey(self, conn: sqlite3.Connection, old_key: Any, new_key: Any):
+        """
+        将使用某个频道键的区间改写为另一个频道键
+        
+        Args:
+            conn: 数据库连接
+            old_key: 原频道键
+            new_key: 新频道键
+        """
+        self._rewrite(
+            conn, 'source = ? OR target = ?', (old_key, old_key),
+            lambda key: new_key if str(key) == str(old_key) else key
+        )
+    
+    def migrate_rows(self, conn: sqlite3.Connection, batch_size: int = 100000,
+                     queries: Optional[Dict[str, str]] = None) -> Tuple[int, int]:
+        """
+        将行存储的下载和转发历史迁移为区间存储，并清空原行表
+        
+        迁移在一个事务中完成，迁移后将数据库的存储模式记录为区间模式
+        
+        Args:
+            conn: 数据库连接
+            batch_size: 每次从行表读取的记录数
+            queries: 当前表结构版本的SQL语句，为None时使用旧版表结构
+        
+        Returns:
+            Tuple[int, int]: (迁移的下载记录数, 迁移的转发记录数)
+        """
+        queries = queries or SQL_V1
+        migrated = []
+        for kind, sql in ((KIND_DOWNLOAD, queries['scan_download']), (KIND_FORWARD, queries['scan_forward'])):
+            count = 0
+            current_key = None
+            current_ids: List[int] = []
+            cursor = conn.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for source, target, message_id in rows:
+                    key = (source, target)
+                    if key != current_key and current_ids:
+                        self.add_ids(conn, kind, current_key[0], current_key[1], current_ids)
+                        current_ids = []
+                    current_key = key
+                    current_ids.append(message_id)
+                    count += 1
+                # 每批写入一次，避免单个频道的ID全部驻留内存
+                if current_ids:
+                    self.add_ids(conn, kind, current_key[0], current_key[1], current_ids)
+                    current_ids = []
+            migrated.append(count)
+        
+        conn.execute(queries['clear_download'])
+        conn.execute(queries['clear_forward'])
+        self.set_storage_mode(conn, STORAGE_MODE_INTERVALS)
+        return migrated[0], migrated[1]
+
+
+def migrate_database(db_path: str, vacuum: bool = True) -> Tuple[int, int]:
+    """
+    离线迁移历史数据库到区间存储模式，迁移期间不应有其他进程访问该数据库
+    
+    Args:
+        db_path: 数据库文件路径
+        vacuum: 迁移后是否执行VACUUM回收空间
+    
+    Returns:
+        Tuple[int, int]: (迁移的下载记录数, 迁移的转发记录数)
+    """
+    store = IntervalHistoryStore()
+    conn = sqlite3.connect(db_path)
+    try:
+        store.create_schema(conn)
+        if store.get_storage_mode(conn) == STORAGE_MODE_INTERVALS:
+            logger.info(f"数据库已是区间存储模式，无需迁移: {db_path}")
+            return 0, 0
+        version = get_schema_version(conn) or SCHEMA_V1
+        download_count, forward_count = store.migrate_rows(conn, queries=SQL_BY_VERSION[version])
+        conn.commit()
+        logger.info(f"区间存储迁移完成：下载记录 {download_count} 条，转发记录 {forward_count} 条")
+        if vacuum:
+            conn.execute('VACUUM')
+        return download_count, forward_count
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"区间存储迁移失败: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+    
+    migrate_database(sys.argv[1] if len(sys.argv) > 1 else "history/history.db")
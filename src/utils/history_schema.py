@@ -0,0 +1,502 @@
+"""
+历史数据库表结构模块，定义旧版（v1，以频道标识符文本为键）和新版（v2，以数字频道ID为键）的表结构、
+各版本对应的SQL语句，以及从v1到v2的迁移
+"""
+
+import hashlib
+import sqlite3
+from typing import Callable, Dict, Optional, Union
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 表结构版本
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+
+# 无法解析为数字ID的频道标识符使用的临时键区间，远离Telegram实际使用的ID范围
+_PROVISIONAL_KEY_BASE = -(1 << 62)
+_PROVISIONAL_KEY_LIMIT = -(1 << 61)
+
+ChannelKey = Union[str, int]
+
+# 各版本的SQL语句，参数统一使用命名参数，写缓冲中的记录字典可直接用于任一版本
+SQL_V1: Dict[str, str] = {
+    'insert_download': '''INSERT OR IGNORE INTO download_history (channel_id, real_channel_id, message_id)
+                          VALUES (:channel, :real_id, :message_id)''',
+    'insert_forward': '''INSERT OR IGNORE INTO forward_history (source_channel, real_source_id, message_id, target_channel)
+                         VALUES (:source, :real_id, :message_id, :target)''',
+    'insert_upload_path': '''INSERT OR IGNORE INTO upload_history (file_path, target_channel, file_size, media_type)
+                             VALUES (:file_path, :target, :file_size, :media_type)''',
+    'insert_upload_hash': '''INSERT OR IGNORE INTO upload_history (file_hash, file_path, target_channel, file_size, media_type)
+                             VALUES (:file_hash, :file_path, :target, :file_size, :media_type)''',
+    'select_download_ids': 'SELECT message_id FROM download_history WHERE channel_id = :channel',
+    'select_forward_ids': 'SELECT message_id FROM forward_history WHERE source_channel = :source AND target_channel = :target',
+    'select_forward_ids_any': 'SELECT DISTINCT message_id FROM forward_history WHERE source_channel = :source ORDER BY message_id',
+    'file_uploaded': 'SELECT 1 FROM upload_history WHERE file_path = :file_path AND target_channel = :target',
+    'hash_uploaded': 'SELECT 1 FROM upload_history WHERE file_hash = :file_hash AND target_channel = :target',
+    'uploaded_files': 'SELECT DISTINCT file_path FROM upload_history ORDER BY file_path',
+    'uploaded_files_target': 'SELECT DISTINCT file_path FROM upload_history WHERE target_channel = :target ORDER BY file_path',
+    # 尚未记录快速指纹的按哈希上传记录，每个哈希一行
+    'unindexed_uploads': '''SELECT u.file_hash, MIN(u.file_path), MAX(COALESCE(u.file_size, 0)) FROM upload_history u
+                            WHERE u.file_hash IS NOT NULL AND u.file_hash NOT LIKE 'path:%'
+                            AND NOT EXISTS (SELECT 1 FROM content_fingerprints c WHERE c.file_hash = u.file_hash)
+                            GROUP BY u.file_hash''',
+    # 按批删除过期记录，每批最多:limit条
+    'delete_download_batch': '''DELETE FROM download_history WHERE id IN
+                                (SELECT id FROM download_history WHERE download_time < :cutoff LIMIT :limit)''',
+    'delete_upload_batch': '''DELETE FROM upload_history WHERE id IN
+                              (SELECT id FROM upload_history WHERE upload_time < :cutoff LIMIT :limit)''',
+    'delete_forward_batch': '''DELETE FROM forward_history WHERE id IN
+                               (SELECT id FROM forward_history WHERE forward_time < :cutoff LIMIT :limit)''',
+    # 迁移为区间存储时按键顺序读取逐行记录
+    'scan_download': "SELECT channel_id, '', message_id FROM download_history ORDER BY channel_id, message_id",
+    'scan_forward': 'SELECT source_channel, target_channel, message_id FROM forward_history '
+                    'ORDER BY source_channel, target_channel, message_id',
+    'clear_download': 'DELETE FROM download_history',
+    'clear_forward': 'DELETE FROM forward_history',
+}
+
+SQL_V2: Dict[str, str] = {
+    'insert_download': '''INSERT OR IGNORE INTO download_history_v2 (channel_id, message_id)
+                          VALUES (:channel, :message_id)''',
+    'insert_forward': '''INSERT OR IGNORE INTO forward_history_v2 (source_id, target_id, message_id)
+                         VALUES (:source, :target, :message_id)''',
+    # 没有文件哈希的记录以路径作为唯一键
+    'insert_upload_path': '''INSERT OR IGNORE INTO upload_history_v2 (file_hash, target_id, file_path, file_size, media_type)
+                             VALUES ('path:' || :file_path, :target, :file_path, :file_size, :media_type)''',
+    'insert_upload_hash': '''INSERT OR IGNORE INTO upload_history_v2 (file_hash, target_id, file_path, file_size, media_type)
+                             VALUES (:file_hash, :target, :file_path, :file_size, :media_type)''',
+    'select_download_ids': 'SELECT message_id FROM download_history_v2 WHERE channel_id = :channel',
+    'select_forward_ids': 'SELECT message_id FROM forward_history_v2 WHERE source_id = :source AND target_id = :target',
+    'select_forward_ids_any': 'SELECT DISTINCT message_id FROM forward_history_v2 WHERE source_id = :source ORDER BY message_id',
+    'file_uploaded': 'SELECT 1 FROM upload_history_v2 WHERE file_path = :file_path AND target_id = :target',
+    'hash_uploaded': 'SELECT 1 FROM upload_history_v2 WHERE file_hash = :file_hash AND target_id = :target',
+    'uploaded_files': 'SELECT DISTINCT file_path FROM upload_history_v2 ORDER BY file_path',
+    'uploaded_files_target': 'SELECT DISTINCT file_path FROM upload_history_v2 WHERE target_id = :target ORDER BY file_path',
+    'unindexed_uploads': '''SELECT u.file_hash, MIN(u.file_path), MAX(COALESCE(u.file_size, 0)) FROM upload_history_v2 u
+                            WHERE u.file_hash NOT LIKE 'path:%'
+                            AND NOT EXISTS (SELECT 1 FROM content_fingerprints c WHERE c.file_hash = u.file_hash)
+                            GROUP BY u.file_hash''',
+    # WITHOUT ROWID表没有rowid，按主键分批删除
+    'delete_download_batch': '''DELETE FROM download_history_v2 WHERE (channel_id, message_id) IN
+                                (SELECT channel_id, message_id FROM download_history_v2
+                                 WHERE download_time < :cutoff LIMIT :limit)''',
+    'delete_upload_batch': '''DELETE FROM upload_history_v2 WHERE (file_hash, target_id) IN
+                              (SELECT file_hash, target_id FROM upload_history_v2
+                               WHERE upload_time < :cutoff LIMIT :limit)''',
+    'delete_forward_batch': '''DELETE FROM forward_history_v2 WHERE (source_id, target_id, message_id) IN
+                               (SELECT source_id, target_id, message_id FROM forward_history_v2
+                                WHERE forward_time < :cutoff LIMIT :limit)''',
+    'scan_download': "SELECT channel_id, '', message_id FROM download_history_v2 ORDER BY channel_id, message_id",
+    'scan_forward': 'SELECT source_id, target_id, message_id FROM forward_history_v2 '
+                    'ORDER BY source_id, target_id, message_id',
+    'clear_download': 'DELETE FROM download_history_v2',
+    'clear_forward': 'DELETE FROM forward_history_v2',
+}
+
+SQL_BY_VERSION: Dict[int, Dict[str, str]] = {SCHEMA_V1: SQL_V1, SCHEMA_V2: SQL_V2}
+
+# 各版本的历史表名，键为记录类型
+HISTORY_TABLES: Dict[int, Dict[str, str]] = {
+    SCHEMA_V1: {'download': 'download_history', 'upload': 'upload_history', 'forward': 'forward_history'},
+    SCHEMA_V2: {'download': 'download_history_v2', 'upload': 'upload_history_v2', 'forward': 'forward_history_v2'},
+}
+
+
+def parse_channel_id(identifier: ChannelKey) -> Optional[int]:
+    """
+    将数字形式的频道标识符转换为整数
+    
+    Args:
+        identifier: 频道标识符
+    
+    Returns:
+        Optional[int]: 数字频道ID，标识符不是数字形式时返回None
+    """
+    if isinstance(identifier, int):
+        return identifier
+    text = str(identifier).strip()
+    if text.isdigit() or (text.startswith('-') and text[1:].isdigit()):
+        return int(text)
+    return None
+
+
+def provisional_key(alias: str) -> int:
+    """
+    为暂时无法解析的频道标识符生成稳定的临时键，解析出真实ID后再整体改写
+    
+    Args:
+        alias: 频道标识符
+    
+    Returns:
+        int: 临时频道键
+    """
+    digest = hashlib.blake2b(alias.encode('utf-8'), digest_size=7).digest()
+    return _PROVISIONAL_KEY_BASE + int.from_bytes(digest, 'big')
+
+
+def is_provisional_key(key: ChannelKey) -> bool:
+    """
+    判断频道键是否为临时键
+    
+    Args:
+        key: 频道键
+    
+    Returns:
+        bool: 是否为临时键
+    """
+    return isinstance(key, int) and key < _PROVISIONAL_KEY_LIMIT
+
+
+def create_schema_v1(conn: sqlite3.Connection):
+    """
+    创建旧版表结构（以频道标识符文本为键）
+    
+    Args:
+        conn: 数据库连接
+    """
+    cursor = conn.cursor()
+    
+    # 创建下载历史表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id TEXT NOT NULL,
+            real_channel_id INTEGER,
+            message_id INTEGER NOT NULL,
+            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(channel_id, message_id)
+        )
+    ''')
+    
+    # 创建上传历史表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash TEXT NOT NULL,
+            file_path TEXT,
+            target_channel TEXT NOT NULL,
+            file_size INTEGER,
+            media_type TEXT,
+            upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(file_hash, target_channel)
+        )
+    ''')
+    
+    # 创建转发历史表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forward_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_channel TEXT NOT NULL,
+            real_source_id INTEGER,
+            message_id INTEGER NOT NULL,
+            target_channel TEXT NOT NULL,
+            forward_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(source_channel, message_id, target_channel)
+        )
+    ''')
+    
+    # 创建索引以提高查询性能
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_channel ON download_history(channel_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_message ON download_history(message_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_hash ON upload_history(file_hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_channel ON upload_history(target_channel)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_source ON forward_history(source_channel)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_message ON forward_history(message_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_target ON forward_history(target_channel)')
+    
+    # 创建时间索引用于数据清理
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_time ON download_history(download_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_time ON upload_history(upload_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_time ON forward_history(forward_time)')
+
+
+def create_schema_v2(conn: sqlite3.Connection):
+    """
+    创建新版表结构
+    
+    记录以数字频道ID为键，复合主键直接作为WITHOUT ROWID表的聚簇键，
+    除主键外只保留清理用的时间索引和按路径查询上传记录的索引
+    
+    Args:
+        conn: 数据库连接
+    """
+    cursor = conn.cursor()
+    
+    # 频道标识符（用户名、链接等）到数字频道ID的映射
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_aliases (
+            alias TEXT PRIMARY KEY,
+            channel_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_history_v2 (
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forward_history_v2 (
+            source_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            forward_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_id, target_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_history_v2 (
+            file_hash TEXT NOT NULL,
+            target_id INTEGER NOT NULL,
+            file_path TEXT,
+            file_size INTEGER,
+            media_type TEXT,
+            upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (file_hash, target_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_v2_path ON upload_history_v2(file_path, target_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_v2_time ON download_history_v2(download_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forward_v2_time ON forward_history_v2(forward_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_v2_time ON upload_history_v2(upload_time)')
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    """检查表是否存在"""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def get_schema_version(conn: sqlite3.Connection) -> Optional[int]:
+    """
+    读取数据库的表结构版本
+    
+    Args:
+        conn: 数据库连接
+    
+    Returns:
+        Optional[int]: 表结构版本，全新数据库返回None
+    """
+    if _table_exists(conn, 'history_meta'):
+        row = conn.execute("SELECT value FROM history_meta WHERE key = 'schema_version'").fetchone()
+        if row:
+            return int(row[0])
+    # 没有版本记录但存在旧表的数据库来自旧版本程序
+    if _table_exists(conn, 'download_history'):
+        return SCHEMA_V1
+    return None
+
+
+def set_schema_version(conn: sqlite3.Connection, version: int):
+    """
+    记录数据库的表结构版本
+    
+    Args:
+        conn: 数据库连接
+        version: 表结构版本
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS history_meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute(
+        "INSERT OR REPLACE INTO history_meta (key, value) VALUES ('schema_version', ?)",
+        (str(version),)
+    )
+
+
+def create_counter_table(conn: sqlite3.Connection):
+    """
+    创建计数器表，由历史表和区间表的触发器维护
+    
+    Args:
+        conn: 数据库连接
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS history_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def ensure_row_counters(conn: sqlite3.Connection, version: int):
+    """
+    为历史表创建由触发器维护的记录数计数器，统计记录数时无需全表扫描
+    
+    计数器不存在时按当前记录数初始化，与触发器在同一事务中创建，由调用方提交
+    
+    Args:
+        conn: 数据库连接
+        version: 表结构版本
+    """
+    create_counter_table(conn)
+    for table in HISTORY_TABLES[version].values():
+        if conn.execute('SELECT 1 FROM history_counters WHERE name = ?', (table,)).fetchone() is None:
+            count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            conn.execute('INSERT INTO history_counters (name, value) VALUES (?, ?)', (table, count))
+        # INSERT OR IGNORE忽略的行不会触发AFTER INSERT，计数与实际记录数一致
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE history_counters SET value = value + 1 WHERE name = '{table}';
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE history_counters SET value = value - 1 WHERE name = '{table}';
+            END
+        ''')
+
+
+def read_row_counters(conn: sqlite3.Connection, version: int) -> Dict[str, int]:
+    """
+    读取历史表的记录数计数器
+    
+    Args:
+        conn: 数据库连接
+        version: 表结构版本
+    
+    Returns:
+        Dict[str, int]: 记录类型 -> 记录数
+    """
+    values = {row[0]: row[1] for row in conn.execute('SELECT name, value FROM history_counters')}
+    return {kind: values.get(table, 0) for kind, table in HISTORY_TABLES[version].items()}
+
+
+def load_aliases(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    读取频道标识符到数字频道ID的映射
+    
+    Args:
+        conn: 数据库连接
+    
+    Returns:
+        Dict[str, int]: 频道标识符 -> 数字频道ID
+    """
+    return {row[0]: row[1] for row in conn.execute('SELECT alias, channel_id FROM channel_aliases')}
+
+
+def collect_v1_identifiers(conn: sqlite3.Connection) -> Dict[str, Optional[int]]:
+    """
+    收集旧版表中出现过的所有频道标识符，以及记录中已保存的真实频道ID
+    
+    Args:
+        conn: 数据库连接
+    
+    Returns:
+        Dict[str, Optional[int]]: 频道标识符 -> 已知的数字频道ID（未知为None）
+    """
+    identifiers: Dict[str, Optional[int]] = {}
+    for sql in (
+        'SELECT channel_id, MAX(real_channel_id) FROM download_history GROUP BY channel_id',
+        'SELECT source_channel, MAX(real_source_id) FROM forward_history GROUP BY source_channel',
+        'SELECT DISTINCT target_channel, NULL FROM forward_history',
+        'SELECT DISTINCT target_channel, NULL FROM upload_history',
+    ):
+        for identifier, real_id in conn.execute(sql):
+            identifier = str(identifier)
+            if identifiers.get(identifier) is None:
+                identifiers[identifier] = real_id
+    
+    # 区间存储的键同样是频道标识符
+    if _table_exists(conn, 'history_intervals'):
+        for source, target in conn.execute('SELECT DISTINCT source, target FROM history_intervals'):
+            identifiers.setdefault(str(source), None)
+            if target != '':
+                identifiers.setdefault(str(target), None)
+    return identifiers
+
+
+def migrate_v1_to_v2(conn: sqlite3.Connection, alias_map: Dict[str, int],
+                     remap_intervals: Callable[[sqlite3.Connection, Callable[[str], ChannelKey]], None]) -> Dict[str, int]:
+    """
+    将旧版表中的记录复制到新版表并删除旧表，在调用方的事务中执行，由调用方提交
+    
+    Args:
+        conn: 数据库连接
+        alias_map: 已解析的频道标识符 -> 数字频道ID，未包含的标识符使用临时键
+        remap_intervals: 改写区间存储键的回调，参数为连接和标识符映射函数
+    
+    Returns:
+        Dict[str, int]: 迁移使用的完整映射（包含临时键）
+    """
+    mapping: Dict[str, int] = {}
+    for identifier in collect_v1_identifiers(conn):
+        numeric = parse_channel_id(identifier)
+        if numeric is not None:
+            mapping[identifier] = numeric
+        elif identifier in alias_map:
+            mapping[identifier] = alias_map[identifier]
+        else:
+            mapping[identifier] = provisional_key(identifier)
+    
+    create_schema_v2(conn)
+    conn.execute('DROP TABLE IF EXISTS temp.migration_aliases')
+    conn.execute('CREATE TEMP TABLE migration_aliases (alias TEXT PRIMARY KEY, channel_id INTEGER NOT NULL) WITHOUT ROWID')
+    conn.executemany('INSERT INTO temp.migration_aliases (alias, channel_id) VALUES (?, ?)', mapping.items())
+    conn.executemany(
+        'INSERT OR REPLACE INTO channel_aliases (alias, channel_id) VALUES (?, ?)',
+        [(alias, key) for alias, key in mapping.items() if parse_channel_id(alias) is None]
+    )
+    
+    # 同一频道的不同写法合并为同一个数字ID，重复记录由主键去重
+    conn.execute('''
+        INSERT OR IGNORE INTO download_history_v2 (channel_id, message_id, download_time)
+        SELECT a.channel_id, d.message_id, d.download_time
+        FROM download_history d JOIN temp.migration_aliases a ON a.alias = d.channel_id
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO forward_history_v2 (source_id, target_id, message_id, forward_time)
+        SELECT s.channel_id, t.channel_id, f.message_id, f.forward_time
+        FROM forward_history f
+        JOIN temp.migration_aliases s ON s.alias = f.source_channel
+        JOIN temp.migration_aliases t ON t.alias = f.target_channel
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO upload_history_v2 (file_hash, target_id, file_path, file_size, media_type, upload_time)
+        SELECT u.file_hash, t.channel_id, u.file_path, u.file_size, u.media_type, u.upload_time
+        FROM upload_history u JOIN temp.migration_aliases t ON t.alias = u.target_channel
+    ''')
+    
+    remap_intervals(conn, lambda identifier: mapping.get(str(identifier), identifier))
+    
+    # 复制完成后再建立计数器，避免复制过程中逐行触发
+    ensure_row_counters(conn, SCHEMA_V2)
+    
+    # 删除旧表时其索引和触发器一并删除
+    for table in HISTORY_TABLES[SCHEMA_V1].values():
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.execute('DELETE FROM history_counters WHERE name = ?', (table,))
+    conn.execute('DROP TABLE temp.migration_aliases')
+    set_schema_version(conn, SCHEMA_V2)
+    return mapping
+
+
+def rekey_channel(conn: sqlite3.Connection, old_key: int, new_key: int):
+    """
+    将新版表中使用某个频道键的记录改写为另一个频道键，已存在相同记录时保留已有记录
+    
+    Args:
+        conn: 数据库连接
+        old_key: 原频道键
+        new_key: 新频道键
+    """
+    for table, column in (
+        ('download_history_v2', 'channel_id'),
+        ('forward_history_v2', 'source_id'),
+        ('forward_history_v2', 'target_id'),
+        ('upload_history_v2', 'target_id'),
+    ):
+        conn.execute(f'UPDATE OR IGNORE {table} SET {column} = ? WHERE {column} = ?', (new_key, old_key))
+        # 与已有记录冲突而未能改写的行是重复记录
+        conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (old_key,))
+    conn.execute('UPDATE channel_aliases SET channel_id = ? WHERE channel_id = ?', (new_key, old_key))
+
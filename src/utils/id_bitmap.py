@@ -0,0 +1,296 @@
+"""
+消息ID位图模块，提供压缩的整数集合，用于在内存中索引下载和转发历史
+采用类似Roaring Bitmap的分块结构：按ID高位分块，稀疏块使用有序数组，密集块使用位图
+"""
+
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, Optional
+
+# 每个分块覆盖的ID数量（低16位）
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+# 分块内元素超过该数量时由有序数组转换为位图（4096 * 2字节 = 8KB，与位图大小相同）
+_ARRAY_MAX_SIZE = 4096
+_BITMAP_BYTES = (1 << _CHUNK_BITS) // 8
+# 单字节中置位数查表
+_POPCOUNT = bytes(bin(value).count('1') for value in range(256))
+
+
+class _ArrayContainer:
+    """稀疏分块，使用有序的16位无符号整数数组存储"""
+    
+    __slots__ = ('values',)
+    
+    def __init__(self):
+        self.values = array('H')
+    
+    def add(self, low: int) -> bool:
+        values = self.values
+        index = bisect_left(values, low)
+        if index < len(values) and values[index] == low:
+            return False
+        values.insert(index, low)
+        return True
+    
+    def __contains__(self, low: int) -> bool:
+        values = self.values
+        index = bisect_left(values, low)
+        return index < len(values) and values[index] == low
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def iter_range(self, low_start: int, low_end: int) -> Iterator[int]:
+        values = self.values
+        index = bisect_left(values, low_start)
+        while index < len(values) and values[index] <= low_end:
+            yield values[index]
+            index += 1
+    
+    def memory_bytes(self) -> int:
+        return self.values.itemsize * len(self.values)
+    
+    def copy(self) -> '_ArrayContainer':
+        clone = _ArrayContainer()
+        clone.values = array('H', self.values)
+        return clone
+
+
+class _BitmapContainer:
+    """密集分块，使用8KB位图存储"""
+    
+    __slots__ = ('bits', 'count')
+    
+    def __init__(self, values: Iterable[int] = ()):
+        self.bits = bytearray(_BITMAP_BYTES)
+        self.count = 0
+        for low in values:
+            self.add(low)
+    
+    def add(self, low: int) -> bool:
+        byte_index = low >> 3
+        mask = 1 << (low & 7)
+        if self.bits[byte_index] & mask:
+            return False
+        self.bits[byte_index] |= mask
+        self.count += 1
+        return True
+    
+    def add_range(self, low_start: int, low_end: int) -> int:
+        bits = self.bits
+        first_byte = low_start >> 3
+        last_byte = low_end >> 3
+        before = sum(_POPCOUNT[bits[i]] for i in range(first_byte, last_byte + 1))
+        if first_byte == last_byte:
+            bits[first_byte] |= (0xFF << (low_start & 7)) & (0xFF >> (7 - (low_end & 7)))
+        else:
+            bits[first_byte] |= (0xFF << (low_start & 7)) & 0xFF
+            bits[last_byte] |= 0xFF >> (7 - (low_end & 7))
+            if last_byte - first_byte > 1:
+                bits[first_byte + 1:last_byte] = b'\xff' * (last_byte - first_byte - 1)
+        after = sum(_POPCOUNT[bits[i]] for i in range(first_byte, last_byte + 1))
+        self.count += after - before
+        return after - before
+    
+    def __contains__(self, low: int) -> bool:
+        return bool(self.bits[low >> 3] & (1 << (low & 7)))
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def iter_range(self, low_start: int, low_end: int) -> Iterator[int]:
+        bits = self.bits
+        for byte_index in range(low_start >> 3, (low_end >> 3) + 1):
+            byte = bits[byte_index]
+            if not byte:
+                continue
+            base = byte_index << 3
+            for bit in range(8):
+                if byte & (1 << bit):
+                    low = base + bit
+                    if low_start <= low <= low_end:
+                        yield low
+    
+    def memory_bytes(self) -> int:
+        return _BITMAP_BYTES
+    
+    def copy(self) -> '_BitmapContainer':
+        clone = _BitmapContainer()
+        clone.bits[:] = self.bits
+        clone.count = self.count
+        return clone
+
+
+class MessageIdBitmap:
+    """
+    压缩的消息ID集合，支持O(1)成员判断和按ID顺序的范围遍历
+    
+    连续的消息ID会落入少量位图分块中，百万级连续ID仅占用约百KB内存
+    """
+    
+    def __init__(self, ids: Optional[Iterable[int]] = None):
+        """
+        初始化消息ID集合
+        
+        Args:
+            ids: 初始消息ID序列
+        """
+        self._chunks: Dict[int, object] = {}
+        self._sorted_keys: list = []
+        self._size = 0
+        if ids is not None:
+            self.update(ids)
+    
+    def add(self, message_id: int) -> bool:
+        """
+        添加消息ID
+        
+        Args:
+            message_id: 消息ID（非负整数）
+        
+        Returns:
+            bool: 是否为新添加的ID
+        """
+        high = message_id >> _CHUNK_BITS
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            chunk = _ArrayContainer()
+            self._chunks[high] = chunk
+            insort(self._sorted_keys, high)
+        
+        if not chunk.add(message_id & _CHUNK_MASK):
+            return False
+        
+        self._size += 1
+        if isinstance(chunk, _ArrayContainer) and len(chunk) > _ARRAY_MAX_SIZE:
+            self._chunks[high] = _BitmapContainer(chunk.values)
+        return True
+    
+    def add_range(self, start_id: int, end_id: int):
+        """
+        添加一段连续的消息ID，按分块整体写入，适合从区间记录加载索引
+        
+        Args:
+            start_id: 起始ID（包含）
+            end_id: 结束ID（包含）
+        """
+        start_id = max(start_id, 0)
+        while start_id <= end_id:
+            high = start_id >> _CHUNK_BITS
+            chunk_end = min(end_id, ((high + 1) << _CHUNK_BITS) - 1)
+            low_start = start_id & _CHUNK_MASK
+            low_end = chunk_end & _CHUNK_MASK
+            
+            chunk = self._chunks.get(high)
+            if chunk is None:
+                chunk = _ArrayContainer()
+                self._chunks[high] = chunk
+                insort(self._sorted_keys, high)
+            
+            if isinstance(chunk, _ArrayContainer) and len(chunk) + (low_end - low_start + 1) <= _ARRAY_MAX_SIZE:
+                for low in range(low_start, low_end + 1):
+                    if chunk.add(low):
+                        self._size += 1
+            else:
+                if isinstance(chunk, _ArrayContainer):
+                    chunk = _BitmapContainer(chunk.values)
+                    self._chunks[high] = chunk
+                self._size += chunk.add_range(low_start, low_end)
+            
+            start_id = chunk_end + 1
+    
+    def update(self, ids: Iterable[int]):
+        """
+        批量添加消息ID
+        
+        Args:
+            ids: 消息ID序列
+        """
+        for message_id in ids:
+            self.add(message_id)
+    
+    def copy(self) -> 'MessageIdBitmap':
+        """
+        复制消息ID集合，之后对原集合的修改不影响副本
+        
+        Returns:
+            MessageIdBitmap: 独立的副本
+        """
+        clone = MessageIdBitmap()
+        clone._chunks = {high: chunk.copy() for high, chunk in self._chunks.items()}
+        clone._sorted_keys = list(self._sorted_keys)
+        clone._size = self._size
+        return clone
+    
+    def __contains__(self, message_id: int) -> bool:
+        if message_id < 0:
+            return False
+        chunk = self._chunks.get(message_id >> _CHUNK_BITS)
+        return chunk is not None and (message_id & _CHUNK_MASK) in chunk
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __iter__(self) -> Iterator[int]:
+        for high in self._sorted_keys:
+            base = high << _CHUNK_BITS
+            for low in self._chunks[high].iter_range(0, _CHUNK_MASK):
+                yield base + low
+    
+    def iter_range(self, start_id: int, end_id: int) -> Iterator[int]:
+        """
+        按ID顺序遍历指定范围内的消息ID
+        
+        Args:
+            start_id: 起始ID（包含）
+            end_id: 结束ID（包含）
+        
+        Yields:
+            int: 范围内的消息ID
+        """
+        # 允许end_id为float('inf')等超出范围的值，截断到最后一个分块的上界
+        end_id = int(min(end_id, self._upper_bound()))
+        start_id = max(int(start_id), 0)
+        if start_id > end_id:
+            return
+        high_start = start_id >> _CHUNK_BITS
+        high_end = end_id >> _CHUNK_BITS
+        keys = self._sorted_keys
+        index = bisect_left(keys, high_start)
+        while index < len(keys) and keys[index] <= high_end:
+            high = keys[index]
+            base = high << _CHUNK_BITS
+            low_start = start_id & _CHUNK_MASK if high == high_start else 0
+            low_end = end_id & _CHUNK_MASK if high == high_end else _CHUNK_MASK
+            for low in self._chunks[high].iter_range(low_start, low_end):
+                yield base + low
+            index += 1
+    
+    def count_range(self, start_id: int, end_id: int) -> int:
+        """
+        统计指定范围内的消息ID数量
+        
+        Args:
+            start_id: 起始ID（包含）
+            end_id: 结束ID（包含）
+        
+        Returns:
+            int: 范围内的ID数量
+        """
+        if not self._sorted_keys:
+            return 0
+        # 范围覆盖所有分块时直接返回总数
+        if start_id <= 0 and end_id >= self._upper_bound():
+            return self._size
+        return sum(1 for _ in self.iter_range(start_id, end_id))
+    
+    def _upper_bound(self) -> int:
+        """获取最后一个分块能表示的最大ID，集合为空时返回-1"""
+        if not self._sorted_keys:
+            return -1
+        return ((self._sorted_keys[-1] + 1) << _CHUNK_BITS) - 1
+    
+    def memory_bytes(self) -> int:
+        """估算分块数据占用的内存字节数"""
+        return sum(chunk.memory_bytes() for chunk in self._chunks.values())
@@ -0,0 +1,92 @@
+"""
+媒体文件索引模块
+按Telegram文件唯一ID (file_unique_id) 记录已下载文件的本地路径和大小，
+同一媒体在多个频道转发或因关键词出现在多个目录时，可以直接复用已下载的文件
+"""
+
+import sqlite3
+from typing import Optional, Tuple
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class MediaFileIndex:
+    """
+    媒体文件索引存储，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    
+    每个文件唯一ID只保留最近一次下载的位置，查询方需要确认文件仍然存在且大小一致
+    """
+    
+    TABLE = 'media_files'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建媒体文件索引表
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                file_unique_id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+    
+    def get(self, conn: sqlite3.Connection, file_unique_id: str) -> Optional[Tuple[str, int]]:
+        """
+        查询文件唯一ID对应的本地文件
+        
+        Args:
+            conn: 数据库连接
+            file_unique_id: 文件唯一ID
+        
+        Returns:
+            Optional[Tuple[str, int]]: (文件路径, 文件大小)，未记录时返回None
+        """
+        row = conn.execute(
+            f'SELECT file_path, file_size FROM {self.TABLE} WHERE file_unique_id = ?', (file_unique_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def put(self, conn: sqlite3.Connection, file_unique_id: str, file_path: str, file_size: int):
+        """
+        记录或更新文件唯一ID对应的本地文件
+        
+        Args:
+            conn: 数据库连接
+            file_unique_id: 文件唯一ID
+            file_path: 文件路径
+            file_size: 文件大小（字节）
+        """
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.TABLE} (file_unique_id, file_path, file_size, updated_time) '
+            f'VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
+            (file_unique_id, file_path, file_size)
+        )
+    
+    def remove(self, conn: sqlite3.Connection, file_unique_id: str):
+        """
+        删除文件唯一ID的记录
+        
+        Args:
+            conn: 数据库连接
+            file_unique_id: 文件唯一ID
+        """
+        conn.execute(f'DELETE FROM {self.TABLE} WHERE file_unique_id = ?', (file_unique_id,))
+    
+    def count(self, conn: sqlite3.Connection) -> int:
+        """
+        统计索引中的文件数
+        
+        Args:
+            conn: 数据库连接
+        
+        Returns:
+            int: 文件数
+        """
+        return conn.execute(f'SELECT COUNT(*) FROM {self.TABLE}').fetchone()[0]
@@ -0,0 +1,234 @@
+"""
+消息元数据存储模块
+按 (频道ID, 消息ID) 保存获取消息时顺带得到的紧凑元数据：媒体组ID、媒体类型、文件唯一ID、文件大小、
+说明文字及其哈希和转发/回复/链接等标志。再次处理同一ID区间时，范围规划和过滤可以先在本地完成，
+只有确实需要传输的消息才向服务器请求完整的Message对象
+"""
+
+import hashlib
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Union
+
+from src.utils.text_utils import contains_links
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 消息标志位
+FLAG_FORWARDED = 1
+FLAG_REPLY = 2
+FLAG_HAS_LINKS = 4
+FLAG_DELETED = 8
+
+# 按优先级检查的媒体属性，与下载器的媒体类型判断保持一致
+MEDIA_ATTRIBUTES = ('photo', 'video', 'document', 'audio', 'animation', 'sticker', 'voice', 'video_note')
+
+
+@dataclass
+class MessageMetadata:
+    """单条消息的紧凑元数据"""
+    
+    chat_id: int
+    message_id: int
+    media_group_id: Optional[str] = None
+    media_type: Optional[str] = None
+    file_unique_id: Optional[str] = None
+    file_size: int = 0
+    caption: str = ""
+    caption_hash: Optional[str] = None
+    flags: int = 0
+    
+    @property
+    def deleted(self) -> bool:
+        """消息是否不存在或已被删除"""
+        return bool(self.flags & FLAG_DELETED)
+    
+    @property
+    def forwarded(self) -> bool:
+        """消息是否为转发消息"""
+        return bool(self.flags & FLAG_FORWARDED)
+    
+    @property
+    def reply(self) -> bool:
+        """消息是否为回复消息"""
+        return bool(self.flags & FLAG_REPLY)
+    
+    @property
+    def has_links(self) -> bool:
+        """消息文本是否包含链接"""
+        return bool(self.flags & FLAG_HAS_LINKS)
+    
+    @property
+    def group_key(self) -> str:
+        """媒体组标识，单条消息为 single_<消息ID>，与下载器的分组方式一致"""
+        return self.media_group_id or f"single_{self.message_id}"
+
+
+def _text_hash(text: str) -> Optional[str]:
+    """计算文本的SHA1哈希，空文本返回None"""
+    if not text:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def extract_message_metadata(chat_id: int, message) -> MessageMetadata:
+    """
+    从Pyrogram消息对象提取元数据
+    
+    Args:
+        chat_id: 频道ID
+        message: 消息对象
+    
+    Returns:
+        MessageMetadata: 消息元数据，空消息标记为已删除
+    """
+    if getattr(message, 'empty', False):
+        return deleted_metadata(chat_id, message.id)
+    
+    media_type = None
+    media = None
+    for attribute in MEDIA_ATTRIBUTES:
+        media = getattr(message, attribute, None)
+        if media:
+            media_type = attribute
+            break
+    
+    text = message.caption or message.text or ""
+    entities = message.caption_entities if message.caption else message.entities
+    
+    flags = 0
+    if getattr(message, 'forward_date', None) or getattr(message, 'forward_from_chat', None):
+        flags |= FLAG_FORWARDED
+    if getattr(message, 'reply_to_message_id', None):
+        flags |= FLAG_REPLY
+    if text and contains_links(text, entities):
+        flags |= FLAG_HAS_LINKS
+    
+    return MessageMetadata(
+        chat_id=chat_id,
+        message_id=message.id,
+        media_group_id=str(message.media_group_id) if message.media_group_id else None,
+        media_type=media_type,
+        file_unique_id=getattr(media, 'file_unique_id', None) if media else None,
+        file_size=(getattr(media, 'file_size', 0) or 0) if media else 0,
+        caption=str(text),
+        caption_hash=_text_hash(str(text)),
+        flags=flags
+    )
+
+
+def deleted_metadata(chat_id: int, message_id: int) -> MessageMetadata:
+    """
+    构造已删除消息的元数据
+    
+    Args:
+        chat_id: 频道ID
+        message_id: 消息ID
+    
+    Returns:
+        MessageMetadata: 只带有删除标志的元数据
+    """
+    return MessageMetadata(chat_id=chat_id, message_id=message_id, flags=FLAG_DELETED)
+
+
+class MessageMetadataStore:
+    """
+    消息元数据存储，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    
+    记录带有更新时间，查询时可以按最长有效期过滤，过期的记录视为未知，由调用方重新获取
+    """
+    
+    TABLE = 'message_metadata'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建消息元数据表
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                media_group_id TEXT,
+                media_type TEXT,
+                file_unique_id TEXT,
+                file_size INTEGER NOT NULL DEFAULT 0,
+                caption TEXT NOT NULL DEFAULT '',
+                caption_hash TEXT,
+                flags INTEGER NOT NULL DEFAULT 0,
+                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, message_id)
+            ) WITHOUT ROWID
+        ''')
+    
+    def put_many(self, conn: sqlite3.Connection, records: Iterable[MessageMetadata]) -> int:
+        """
+        批量写入或更新消息元数据
+        
+        Args:
+            conn: 数据库连接
+            records: 消息元数据
+        
+        Returns:
+            int: 写入的记录数
+        """
+        rows = [
+            (r.chat_id, r.message_id, r.media_group_id, r.media_type, r.file_unique_id,
+             r.file_size, r.caption, r.caption_hash, r.flags)
+            for r in records
+        ]
+        if rows:
+            conn.executemany(
+                f'INSERT OR REPLACE INTO {self.TABLE} (chat_id, message_id, media_group_id, media_type, '
+                f'file_unique_id, file_size, caption, caption_hash, flags, updated_time) '
+                f'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)',
+                rows
+            )
+        return len(rows)
+    
+    def get_range(self, conn: sqlite3.Connection, chat_id: int, start_id: int, end_id: int,
+                  max_age_days: Optional[Union[int, float]] = None) -> Dict[int, MessageMetadata]:
+        """
+        查询一段消息ID区间内已记录的元数据
+        
+        Args:
+            conn: 数据库连接
+            chat_id: 频道ID
+            start_id: 起始消息ID（包含）
+            end_id: 结束消息ID（包含）
+            max_age_days: 记录的最长有效期（天），为None时不限制
+        
+        Returns:
+            Dict[int, MessageMetadata]: 消息ID -> 元数据，未记录或已过期的消息不包含在内
+        """
+        sql = (
+            f'SELECT message_id, media_group_id, media_type, file_unique_id, file_size, caption, caption_hash, flags '
+            f'FROM {self.TABLE} WHERE chat_id = ? AND message_id BETWEEN ? AND ?'
+        )
+        params = [chat_id, start_id, end_id]
+        if max_age_days is not None:
+            sql += " AND updated_time >= datetime('now', ?)"
+            params.append(f"-{float(max_age_days)} days")
+        
+        return {
+            row[0]: MessageMetadata(chat_id, row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+            for row in conn.execute(sql, params)
+        }
+    
+    def count(self, conn: sqlite3.Connection, chat_id: Optional[int] = None) -> int:
+        """
+        统计已记录的消息数
+        
+        Args:
+            conn: 数据库连接
+            chat_id: 频道ID，为None时统计所有频道
+        
+        Returns:
+            int: 记录数
+        """
+        if chat_id is None:
+            return conn.execute(f'SELECT COUNT(*) FROM {self.TABLE}').fetchone()[0]
+        return conn.execute(f'SELECT COUNT(*) FROM {self.TABLE} WHERE chat_id = ?', (chat_id,)).fetchone()[0]
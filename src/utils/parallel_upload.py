@@ -0,0 +1,323 @@
+"""
+大文件并行分片上传模块
+Pyrogram默认的上传路径在一个媒体会话上最多同时发送4个 upload.SaveBigFilePart，失败的分片只记录日志不重试，
+大文件的上传速度受往返延迟限制而不是带宽。这里把文件按512KB分片，分散到多个独立的媒体会话（is_media=True）上，
+同时在途的分片数和会话数可以配置，分片上传不占用主会话，单个分片失败时只重试该分片，
+全部分片完成后组装成 InputFileBig 交给发送接口
+
+同一客户端上同时进行的所有并行上传共用一组媒体会话名额，多个文件同时上传时打开的会话总数不超过上限，
+每个文件至少获得一个会话，其余会话只在名额空闲时使用
+
+通过替换客户端实例的 save_file 启用，send_video、send_document、send_media_group 等接口上传本地文件时
+都会经过 save_file，超过阈值的文件走并行上传，其余文件仍使用Pyrogram原有实现
+"""
+
+import os
+import random
+import asyncio
+import inspect
+from typing import Callable, List, Optional, Tuple
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 分片大小，Telegram允许的最大值
+UPLOAD_PART_SIZE = 512 * 1024
+# 超过该大小的文件必须使用 SaveBigFilePart
+BIG_FILE_SIZE = 10 * 1024 * 1024
+# 并行上传的默认在途分片数、媒体会话数和启用阈值，Pyrogram默认在一个媒体会话上同时发送4个分片
+DEFAULT_PARALLEL_UPLOAD_PARTS = 16
+DEFAULT_UPLOAD_SESSIONS = 4
+# 同一客户端上所有并行上传同时打开的媒体会话总数上限
+DEFAULT_MAX_UPLOAD_SESSIONS = 8
+DEFAULT_PARALLEL_UPLOAD_THRESHOLD = 64 * 1024 * 1024
+# 单个分片的最大重试次数和重试基础延迟（秒）
+DEFAULT_PART_RETRIES = 5
+PART_RETRY_BASE_DELAY = 1.0
+PART_RETRY_MAX_DELAY = 30.0
+
+# 客户端实例上记录并行上传设置和媒体会话名额的属性名
+_SETTINGS_ATTR = '_parallel_upload_settings'
+_SESSION_SLOTS_ATTR = '_parallel_upload_session_slots'
+
+
+def _read_part(file_obj, offset: int, size: int) -> bytes:
+    """在线程池中读取一个分片"""
+    file_obj.seek(offset)
+    return file_obj.read(size)
+
+
+async def _report_progress(progress: Optional[Callable], current: int, total: int, progress_args: Tuple = ()):
+    """按Pyrogram的约定调用进度回调，回调可以是普通函数或协程函数"""
+    if progress is None:
+        return
+    if inspect.iscoroutinefunction(progress):
+        await progress(current, total, *progress_args)
+    else:
+        progress(current, total, *progress_args)
+
+
+def set_max_upload_sessions(client, max_sessions: int):
+    """
+    设置客户端上所有并行上传同时打开的媒体会话总数上限，已在进行的上传继续使用原有名额
+    
+    Args:
+        client: Pyrogram客户端实例
+        max_sessions: 媒体会话总数上限
+    """
+    max_sessions = max(1, max_sessions)
+    slots = getattr(client, _SESSION_SLOTS_ATTR, None)
+    if slots is None or slots[0] != max_sessions:
+        setattr(client, _SESSION_SLOTS_ATTR, (max_sessions, asyncio.Semaphore(max_sessions)))
+
+
+async def acquire_session_slots(client, count: int) -> Tuple[asyncio.Semaphore, int]:
+    """
+    从客户端的媒体会话名额中获取最多count个名额，至少等待获得一个，其余名额只在空闲时获取
+    
+    每个上传先拿到一个名额再尝试更多，多个上传同时等待时不会因为各自持有部分名额而互相阻塞
+    
+    Args:
+        client: Pyrogram客户端实例
+        count: 希望获得的名额数
+    
+    Returns:
+        Tuple[asyncio.Semaphore, int]: (名额所属的信号量, 获得的名额数)，用完后通过信号量归还
+    """
+    if getattr(client, _SESSION_SLOTS_ATTR, None) is None:
+        set_max_upload_sessions(client, DEFAULT_MAX_UPLOAD_SESSIONS)
+    semaphore = getattr(client, _SESSION_SLOTS_ATTR)[1]
+    await semaphore.acquire()
+    acquired = 1
+    while acquired < count and not semaphore.locked():
+        await semaphore.acquire()
+        acquired += 1
+    return semaphore, acquired
+
+
+async def open_media_sessions(client, count: int) -> List[Session]:
+    """
+    打开连接到账号所在数据中心的媒体会话，与Pyrogram上传文件时使用的会话相同
+    
+    Args:
+        client: Pyrogram客户端实例
+        count: 会话数
+    
+    Returns:
+        List[Session]: 已启动的会话列表
+    """
+    dc_id = await client.storage.dc_id()
+    auth_key = await client.storage.auth_key()
+    test_mode = await client.storage.test_mode()
+    sessions = [Session(client, dc_id, auth_key, test_mode, is_media=True) for _ in range(count)]
+    results = await asyncio.gather(*(session.start() for session in sessions), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await close_media_sessions(
+            [session for session, result in zip(sessions, results) if not isinstance(result, BaseException)]
+        )
+        raise errors[0]
+    return sessions
+
+
+async def close_media_sessions(sessions: List[Session]):
+    """
+    关闭媒体会话，关闭失败时只记录日志
+    
+    Args:
+        sessions: 会话列表
+    """
+    for session in sessions:
+        try:
+            await session.stop()
+        except Exception as e:
+            logger.warning(f"关闭媒体会话失败: {e}")
+
+
+async def parallel_save_file(client, path: str, parts_in_flight: int = DEFAULT_PARALLEL_UPLOAD_PARTS,
+                             sessions: int = DEFAULT_UPLOAD_SESSIONS, max_retries: int = DEFAULT_PART_RETRIES,
+                             progress: Optional[Callable] = None, progress_args: Tuple = ()):
+    """
+    并行上传文件分片，返回可用于发送媒体的InputFile
+    
+    多个协程从同一个分片序号序列中领取分片，每个协程使用独立的文件句柄在线程池中读取数据，
+    同时在途的分片数等于协程数，协程轮流分配到各媒体会话上；分片上传失败时按指数退避重试，
+    遇到FloodWait时等待指定时间后重试，任一分片重试耗尽时取消其余分片并抛出异常
+    
+    Args:
+        client: Pyrogram客户端实例
+        path: 本地文件路径
+        parts_in_flight: 同时在途的分片数
+        sessions: 媒体会话数，不超过在途分片数，客户端的媒体会话名额不足时使用更少的会话
+        max_retries: 单个分片的最大重试次数
+        progress: 进度回调函数，参数为 (已上传字节数, 总字节数, *progress_args)
+        progress_args: 传给进度回调的额外参数
+    
+    Returns:
+        raw.types.InputFileBig 或 raw.types.InputFile: 已上传文件的引用
+    
+    Raises:
+        ValueError: 文件为空时抛出
+        Exception: 某个分片重试耗尽时抛出最后一次的错误
+    """
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        raise ValueError("文件大小为0，无法上传")
+    
+    is_big = file_size > BIG_FILE_SIZE
+    total_parts = (file_size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE
+    file_id = random.getrandbits(63)
+    file_name = os.path.basename(path)
+    part_numbers = iter(range(total_parts))
+    uploaded = 0
+    loop = asyncio.get_running_loop()
+    
+    def make_request(part: int, data: bytes):
+        """构造分片上传请求"""
+        if is_big:
+            return raw.functions.upload.SaveBigFilePart(
+                file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+            )
+        return raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data)
+    
+    async def upload_part(session: Session, part: int, data: bytes):
+        """上传一个分片，失败时重试"""
+        attempt = 0
+        while True:
+            try:
+                if await session.invoke(make_request(part, data)):
+                    return
+                raise OSError(f"服务器未确认分片 {part}")
+            except FloodWait as e:
+                wait_seconds = getattr(e, 'value', None) or getattr(e, 'x', None) or 1
+                logger.warning(f"上传分片 {part} 触发FloodWait，等待 {wait_seconds} 秒")
+                await asyncio.sleep(wait_seconds)
+            except Exception as e:
+                attempt += 1
+                if attempt > max_retries:
+                    logger.error(f"上传分片 {part}/{total_parts} 失败，已重试 {max_retries} 次: {file_name}, 错误: {e}")
+                    raise
+                delay = min(PART_RETRY_BASE_DELAY * 2 ** (attempt - 1), PART_RETRY_MAX_DELAY)
+                logger.warning(f"上传分片 {part}/{total_parts} 失败，{delay:.0f} 秒后重试 ({attempt}/{max_retries}): {e}")
+                await asyncio.sleep(delay)
+    
+    async def worker(session: Session):
+        """依次领取分片并上传，直到没有剩余分片"""
+        nonlocal uploaded
+        with open(path, 'rb') as f:
+            for part in part_numbers:
+                data = await loop.run_in_executor(None, _read_part, f, part * UPLOAD_PART_SIZE, UPLOAD_PART_SIZE)
+                await upload_part(session, part, data)
+                uploaded += len(data)
+                await _report_progress(progress, uploaded, file_size, progress_args)
+    
+    workers = max(1, min(parts_in_flight, total_parts))
+    semaphore, slots = await acquire_session_slots(client, max(1, min(sessions, workers)))
+    try:
+        media_sessions = await open_media_sessions(client, slots)
+        tasks = [asyncio.create_task(worker(media_sessions[i % len(media_sessions)])) for i in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # 任一分片失败或被取消时停止其余分片
+            for task in tasks:
+                task.cancel()
+            await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+            raise
+        finally:
+            await asyncio.shield(close_media_sessions(media_sessions))
+    finally:
+        for _ in range(slots):
+            semaphore.release()
+    
+    logger.debug(f"并行上传完成: {file_name}，{total_parts} 个分片，在途分片数 {workers}，媒体会话数 {len(media_sessions)}")
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+    return raw.types.InputFile(id=file_id, parts=total_parts, name=file_name, md5_checksum="")
+
+
+def enable_parallel_upload(client, parts_in_flight: int = DEFAULT_PARALLEL_UPLOAD_PARTS,
+                           threshold: int = DEFAULT_PARALLEL_UPLOAD_THRESHOLD,
+                           sessions: int = DEFAULT_UPLOAD_SESSIONS,
+                           max_retries: int = DEFAULT_PART_RETRIES,
+                           max_sessions: int = DEFAULT_MAX_UPLOAD_SESSIONS) -> bool:
+    """
+    为客户端启用大文件并行上传，重复调用时只更新设置
+    
+    Args:
+        client: Pyrogram客户端实例
+        parts_in_flight: 同时在途的分片数，小于2时恢复Pyrogram原有的上传方式
+        threshold: 启用并行上传的文件大小阈值（字节）
+        sessions: 每个文件使用的媒体会话数
+        max_retries: 单个分片的最大重试次数
+        max_sessions: 所有并行上传同时打开的媒体会话总数上限
+    
+    Returns:
+        bool: 并行上传是否处于启用状态
+    """
+    settings = getattr(client, _SETTINGS_ATTR, None)
+    if parts_in_flight < 2:
+        if settings is not None:
+            settings['enabled'] = False
+        return False
+    
+    if settings is None:
+        settings = {}
+        original_save_file = client.save_file
+        
+        async def save_file(path, file_id: int = None, file_part: int = 0,
+                            progress: Callable = None, progress_args: tuple = ()):
+            """超过阈值的本地文件并行上传，续传请求和其他来源交给原有实现"""
+            if (settings['enabled'] and isinstance(path, str) and file_id is None and file_part == 0
+                    and os.path.isfile(path) and os.path.getsize(path) >= settings['threshold']):
+                return await parallel_save_file(
+                    client, path,
+                    parts_in_flight=settings['parts_in_flight'],
+                    sessions=settings['sessions'],
+                    max_retries=settings['max_retries'],
+                    progress=progress,
+                    progress_args=progress_args
+                )
+            return await original_save_file(path, file_id=file_id, file_part=file_part,
+                                            progress=progress, progress_args=progress_args)
+        
+        client.save_file = save_file
+        setattr(client, _SETTINGS_ATTR, settings)
+    
+    settings.update(
+        enabled=True,
+        parts_in_flight=parts_in_flight,
+        threshold=max(threshold, BIG_FILE_SIZE + 1),
+        sessions=max(1, sessions),
+        max_retries=max_retries
+    )
+    set_max_upload_sessions(client, max_sessions)
+    return True
+
+
+def enable_parallel_upload_from_config(client, general_config: dict) -> bool:
+    """
+    按通用配置为客户端启用大文件并行上传
+    
+    Args:
+        client: Pyrogram客户端实例
+        general_config: 通用配置字典
+    
+    Returns:
+        bool: 并行上传是否处于启用状态
+    """
+    general_config = general_config or {}
+    return enable_parallel_upload(
+        client,
+        parts_in_flight=general_config.get('parallel_upload_parts', DEFAULT_PARALLEL_UPLOAD_PARTS),
+        threshold=general_config.get(
+            'parallel_upload_threshold_mb', DEFAULT_PARALLEL_UPLOAD_THRESHOLD // (1024 * 1024)
+        ) * 1024 * 1024,
+        sessions=general_config.get('parallel_upload_sessions', DEFAULT_UPLOAD_SESSIONS),
+        max_sessions=general_config.get('parallel_upload_max_sessions', DEFAULT_MAX_UPLOAD_SESSIONS)
+    )
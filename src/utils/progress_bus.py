@@ -0,0 +1,246 @@
+"""
+传输进度汇总模块
+Pyrogram和流式下载每收到一个数据块就回调一次进度，直接转发到日志和UI会在高速链路上产生大量日志和信号。
+进度聚合器按传输合并进度更新，以固定频率发布快照，用指数平滑估计速度和剩余时间，
+并限制每个传输写进度日志的频率
+"""
+
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 发布快照的间隔（秒），即UI刷新频率为10Hz
+DEFAULT_PUBLISH_INTERVAL = 0.1
+# 每个传输写进度日志的最短间隔（秒）
+DEFAULT_LOG_INTERVAL = 5.0
+# 速度估计的平滑系数，越大越接近瞬时速度
+DEFAULT_SPEED_SMOOTHING = 0.3
+
+
+@dataclass
+class TransferProgress:
+    """单个传输的进度快照"""
+    
+    key: Hashable
+    name: str
+    current: int
+    total: int
+    speed: float = 0.0
+    eta: Optional[float] = None
+    done: bool = False
+    
+    @property
+    def percent(self) -> float:
+        """完成百分比，总大小未知时为0"""
+        return min(100.0, self.current * 100.0 / self.total) if self.total > 0 else 0.0
+
+
+class _TransferState:
+    """聚合器内部记录的单个传输状态"""
+    
+    __slots__ = ('name', 'current', 'total', 'speed', 'sample_time', 'sample_bytes', 'last_log', 'dirty')
+    
+    def __init__(self, name: str, now: float):
+        self.name = name
+        self.current = 0
+        self.total = 0
+        self.speed = 0.0
+        self.sample_time = now
+        self.sample_bytes = 0
+        self.last_log = now
+        self.dirty = False
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """
+    把剩余时间格式化为日志文本
+    
+    Args:
+        seconds: 秒数，为None时表示未知
+    
+    Returns:
+        str: 形如 "12.0秒"、"3.5分钟" 的文本
+    """
+    if seconds is None:
+        return "未知"
+    if seconds < 60:
+        return f"{seconds:.1f}秒"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}分钟"
+    return f"{seconds / 3600:.1f}小时"
+
+
+class ProgressAggregator:
+    """
+    传输进度聚合器
+    
+    update() 只记录最新的进度，开销为O(1)；距上次发布超过发布间隔时立即发布，
+    否则在事件循环中安排一次延迟发布，保证最后一次更新也会被发布。
+    所有方法都应在同一个事件循环线程中调用
+    """
+    
+    def __init__(self, publish: Optional[Callable[[List[TransferProgress]], None]] = None,
+                 interval: float = DEFAULT_PUBLISH_INTERVAL, log_interval: float = DEFAULT_LOG_INTERVAL,
+                 smoothing: float = DEFAULT_SPEED_SMOOTHING, label: str = "传输"):
+        """
+        初始化进度聚合器
+        
+        Args:
+            publish: 发布回调，参数为本次有变化的传输快照列表
+            interval: 发布间隔（秒）
+            log_interval: 每个传输写进度日志的最短间隔（秒），为0时不写日志
+            smoothing: 速度估计的平滑系数
+            label: 日志中的传输类型名称
+        """
+        self.publish = publish
+        self.interval = interval
+        self.log_interval = log_interval
+        self.smoothing = smoothing
+        self.label = label
+        self._transfers: Dict[Hashable, _TransferState] = {}
+        self._last_publish = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+    
+    def update(self, key: Hashable, current: int, total: int, name: Optional[str] = None):
+        """
+        记录传输进度
+        
+        Args:
+            key: 传输标识，如消息ID
+            current: 已传输字节数
+            total: 总字节数，未知时为0
+            name: 显示名称，如文件名
+        """
+        now = time.monotonic()
+        state = self._transfers.get(key)
+        if state is None:
+            state = _TransferState(name or str(key), now)
+            # 续传时首次上报的进度包含之前已下载的部分，不计入速度
+            state.sample_bytes = current
+            self._transfers[key] = state
+        elif name:
+            state.name = name
+        state.current = current
+        state.total = total
+        state.dirty = True
+        
+        if now - self._last_publish >= self.interval:
+            self.flush()
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._timer = loop.call_later(self.interval - (now - self._last_publish), self._on_timer)
+    
+    def callback(self, key: Hashable, name: Optional[str] = None) -> Callable[[int, int], None]:
+        """
+        生成可直接传给Pyrogram或流式下载的进度回调
+        
+        Args:
+            key: 传输标识
+            name: 显示名称
+        
+        Returns:
+            Callable[[int, int], None]: 参数为 (已传输字节数, 总字节数) 的回调函数
+        """
+        def progress(current: int, total: int, *args):
+            self.update(key, current, total, name)
+        return progress
+    
+    def finish(self, key: Hashable):
+        """
+        结束一个传输，立即发布其最终进度并移除
+        
+        Args:
+            key: 传输标识
+        """
+        state = self._transfers.pop(key, None)
+        if state is None:
+            return
+        snapshot = self._snapshot(key, state, time.monotonic())
+        snapshot.done = True
+        self._publish([snapshot])
+    
+    def _on_timer(self):
+        """延迟发布"""
+        self._timer = None
+        self.flush()
+    
+    def _snapshot(self, key: Hashable, state: _TransferState, now: float) -> TransferProgress:
+        """更新平滑速度并生成快照"""
+        elapsed = now - state.sample_time
+        # 采样间隔过短时瞬时速度误差很大，沿用上一次的估计
+        if elapsed >= self.interval / 2:
+            instant = max(0, state.current - state.sample_bytes) / elapsed
+            state.speed = instant if state.speed == 0 else self.smoothing * instant + (1 - self.smoothing) * state.speed
+            state.sample_time = now
+            state.sample_bytes = state.current
+        eta = None
+        if state.total > 0 and state.speed > 0:
+            eta = max(0, state.total - state.current) / state.speed
+        return TransferProgress(key, state.name, state.current, state.total, state.speed, eta)
+    
+    def flush(self):
+        """立即发布所有有变化的传输"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self._last_publish = now
+        
+        snapshots = []
+        for key, state in self._transfers.items():
+            if not state.dirty:
+                continue
+            state.dirty = False
+            snapshot = self._snapshot(key, state, now)
+            snapshots.append(snapshot)
+            
+            if self.log_interval > 0 and now - state.last_log >= self.log_interval:
+                state.last_log = now
+                logger.info(
+                    f"{self.label}进度: {snapshot.percent:.1f}% ({snapshot.current}/{snapshot.total}) - "
+                    f"速度: {snapshot.speed / 1024:.1f} KB/s - 剩余时间: {format_duration(snapshot.eta)} - 文件: {snapshot.name}"
+                )
+        if snapshots:
+            self._publish(snapshots)
+    
+    def _publish(self, snapshots: List[TransferProgress]):
+        """调用发布回调"""
+        if not self.publish:
+            return
+        try:
+            self.publish(snapshots)
+        except Exception as e:
+            logger.error(f"发布{self.label}进度时出错: {e}")
+    
+    def snapshot(self) -> List[TransferProgress]:
+        """
+        获取所有进行中传输的最近一次进度，不更新速度估计
+        
+        Returns:
+            List[TransferProgress]: 进度快照列表
+        """
+        return [
+            TransferProgress(key, state.name, state.current, state.total, state.speed,
+                             max(0, state.total - state.current) / state.speed if state.total > 0 and state.speed > 0 else None)
+            for key, state in self._transfers.items()
+        ]
+    
+    @property
+    def total_speed(self) -> float:
+        """所有进行中传输的平滑速度之和（字节/秒）"""
+        return sum(state.speed for state in self._transfers.values())
+    
+    def clear(self):
+        """丢弃所有进行中的传输"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._transfers.clear()
@@ -0,0 +1,51 @@
+"""
+请求速率限制模块
+多个上传协程共享同一个限制器：每个请求前预约一个开始时间，相邻请求至少间隔最小间隔，
+任一协程遇到FloodWait时所有请求暂停到等待结束，取代各处写死的固定等待
+"""
+
+import asyncio
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class RequestRateLimiter:
+    """
+    按最小间隔依次放行请求的速率限制器，所有方法都应在同一个事件循环中调用
+    """
+    
+    def __init__(self, min_interval: float = 0.5):
+        """
+        初始化速率限制器
+        
+        Args:
+            min_interval: 相邻请求的最小间隔（秒）
+        """
+        self.min_interval = max(0.0, float(min_interval or 0))
+        self.flood_waits = 0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+    
+    async def wait(self):
+        """等待直到可以发出下一个请求"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_slot, self._paused_until)
+        self._next_slot = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+    
+    def record_flood_wait(self, wait_seconds: float):
+        """
+        上报FloodWait，之后的请求都等到限制解除后再发出
+        
+        Args:
+            wait_seconds: Telegram要求等待的秒数
+        """
+        self.flood_waits += 1
+        until = asyncio.get_running_loop().time() + wait_seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            logger.warning(f"触发FloodWait，所有上传请求暂停 {wait_seconds} 秒")
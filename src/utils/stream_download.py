@@ -0,0 +1,730 @@
+"""
+流式下载模块，将媒体文件按块直接写入磁盘
+下载协程只负责从Telegram拉取数据块，写盘由专用线程完成，两者之间使用有界队列传递，
+单个下载的内存占用只与队列容量和块大小有关，与文件大小无关
+
+未完成的下载保留 .part 文件和 .part.json 状态文件，记录文件唯一ID、预期大小和已落盘的字节偏移，
+再次下载同一文件时从最后一个完整数据块继续
+
+超过阈值的大文件可以分成多个按数据块对齐的区间并行下载，各区间的数据块按位置写入预分配的 .part 文件，
+单个文件的吞吐量随并行区间数增加
+"""
+
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from src.utils.dir_size_tracker import notify_file_added, notify_file_removed, tracked_file_size
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Pyrogram stream_media 每次返回的数据块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+# 写入队列中最多缓存的数据块数量
+DEFAULT_MAX_PENDING_CHUNKS = 4
+# 未完成下载的临时文件后缀
+PART_SUFFIX = '.part'
+# 未完成下载的状态文件后缀（附加在 .part 之后）
+STATE_SUFFIX = '.json'
+# 每写入多少个数据块保存一次断点
+DEFAULT_CHECKPOINT_CHUNKS = 8
+# 未完成下载的默认保留天数
+DEFAULT_PARTIAL_RETENTION_DAYS = 7
+# 并行分段下载的默认区间数和启用阈值
+DEFAULT_PARALLEL_PARTS = 4
+DEFAULT_PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# 可下载的媒体属性，与 Pyrogram Message 的字段对应
+_MEDIA_ATTRS = ('photo', 'video', 'document', 'audio', 'animation', 'sticker', 'voice', 'video_note')
+
+# 写入线程的结束标记
+_SENTINEL = object()
+
+
+def get_file_unique_id(message) -> Optional[str]:
+    """
+    获取消息媒体的文件唯一ID，该ID不随文件引用过期而变化，用于识别可续传的未完成下载
+    
+    Args:
+        message: 消息对象
+    
+    Returns:
+        Optional[str]: 文件唯一ID，消息没有媒体时返回None
+    """
+    for attr in _MEDIA_ATTRS:
+        media = getattr(message, attr, None)
+        if media:
+            if isinstance(media, list):
+                media = media[-1]
+            return getattr(media, 'file_unique_id', None)
+    return None
+
+
+def _state_path(part_path: str) -> str:
+    """获取 .part 文件对应的状态文件路径"""
+    return f"{part_path}{STATE_SUFFIX}"
+
+
+def load_partial_state(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    读取目标文件的未完成下载状态
+    
+    Args:
+        file_path: 最终文件路径
+    
+    Returns:
+        Optional[Dict[str, Any]]: 状态字典，包含 file_unique_id、expected_size、offset，
+            并行分段下载还包含各区间的进度 ranges，不存在或损坏时返回None
+    """
+    try:
+        with open(_state_path(f"{file_path}{PART_SUFFIX}"), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if isinstance(state, dict) and isinstance(state.get('offset'), int):
+            return state
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"读取下载状态失败: {file_path} - {e}")
+    return None
+
+
+def get_resume_offset(file_path: str, file_unique_id: Optional[str], expected_size: int) -> int:
+    """
+    校验未完成下载的状态，计算可续传的字节偏移
+    
+    只有状态中的文件唯一ID和预期大小都与当前文件一致、偏移按数据块对齐且 .part 文件不短于该偏移时才续传
+    
+    Args:
+        file_path: 最终文件路径
+        file_unique_id: 文件唯一ID
+        expected_size: 预期文件大小，为0表示未知
+    
+    Returns:
+        int: 续传的字节偏移，不可续传时返回0
+    """
+    if not file_unique_id:
+        return 0
+    state = load_partial_state(file_path)
+    if not state:
+        return 0
+    
+    part_path = f"{file_path}{PART_SUFFIX}"
+    offset = state['offset']
+    try:
+        part_size = os.path.getsize(part_path)
+    except OSError:
+        return 0
+    
+    if (state.get('file_unique_id') != file_unique_id
+            or state.get('expected_size', 0) != expected_size
+            or offset <= 0 or offset % STREAM_CHUNK_SIZE != 0
+            or offset > part_size
+            or (expected_size and offset > expected_size)):
+        logger.info(f"未完成下载的状态与当前文件不匹配，重新下载: {file_path}")
+        return 0
+    return offset
+
+
+def remove_partial(file_path: str):
+    """
+    删除目标文件的 .part 文件和状态文件
+    
+    Args:
+        file_path: 最终文件路径
+    """
+    part_path = f"{file_path}{PART_SUFFIX}"
+    for path in (_state_path(part_path), part_path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"删除临时文件失败: {path} - {e}")
+
+
+def cleanup_stale_partials(root_dir: str, max_age_days: float = DEFAULT_PARTIAL_RETENTION_DAYS) -> int:
+    """
+    删除长时间未更新的未完成下载
+    
+    以 .part 文件和状态文件中较新的修改时间作为最后活动时间
+    
+    Args:
+        root_dir: 下载根目录
+        max_age_days: 保留天数
+    
+    Returns:
+        int: 删除的未完成下载数量
+    """
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for dir_path, _, file_names in os.walk(root_dir):
+        names = set(file_names)
+        for name in file_names:
+            if not name.endswith(PART_SUFFIX):
+                continue
+            part_path = os.path.join(dir_path, name)
+            state_name = f"{name}{STATE_SUFFIX}"
+            try:
+                last_active = os.path.getmtime(part_path)
+                if state_name in names:
+                    last_active = max(last_active, os.path.getmtime(os.path.join(dir_path, state_name)))
+            except OSError:
+                continue
+            if last_active < cutoff:
+                # 未完成下载不计入目录大小统计，删除时不需要上报
+                remove_partial(part_path[:-len(PART_SUFFIX)])
+                removed += 1
+        # 清理没有对应 .part 文件的孤立状态文件
+        for name in file_names:
+            if name.endswith(f"{PART_SUFFIX}{STATE_SUFFIX}") and name[:-len(STATE_SUFFIX)] not in names:
+                try:
+                    os.remove(os.path.join(dir_path, name))
+                except OSError:
+                    pass
+    if removed:
+        logger.info(f"已清理 {removed} 个超过 {max_age_days} 天的未完成下载")
+    return removed
+
+
+class ChunkedFileWriter:
+    """
+    分块文件写入器，在独立线程中将数据块顺序写入 .part 文件，完成后原子重命名为目标文件
+    
+    写入队列有界，队列满时 write() 会等待写入线程腾出空间，从而对下载协程形成反压。
+    指定文件唯一ID时，每写入若干数据块就落盘并保存一次断点，中断后可从断点续传
+    """
+    
+    def __init__(self, file_path: str, max_pending_chunks: int = DEFAULT_MAX_PENDING_CHUNKS,
+                 resume_offset: int = 0, file_unique_id: Optional[str] = None, expected_size: int = 0,
+                 checkpoint_chunks: int = DEFAULT_CHECKPOINT_CHUNKS):
+        """
+        初始化写入器并启动写入线程
+        
+        Args:
+            file_path: 最终文件路径
+            max_pending_chunks: 写入队列中最多缓存的数据块数量
+            resume_offset: 续传的字节偏移，.part 文件会被截断到该位置后继续写入
+            file_unique_id: 文件唯一ID，为None时不保存断点
+            expected_size: 预期文件大小，保存在断点中用于续传校验
+            checkpoint_chunks: 每写入多少个数据块保存一次断点
+        """
+        self.file_path = file_path
+        self.part_path = f"{file_path}{PART_SUFFIX}"
+        self.bytes_written = resume_offset
+        self.file_unique_id = file_unique_id
+        self.expected_size = expected_size
+        self.checkpoint_chunks = max(1, checkpoint_chunks)
+        self._queue = queue.Queue(maxsize=max(1, max_pending_chunks))
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._chunks_since_checkpoint = 0
+        
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        if resume_offset > 0:
+            self._file = open(self.part_path, 'r+b')
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+        else:
+            self._file = open(self.part_path, 'wb')
+            if file_unique_id:
+                self._save_state(0)
+        self._thread = threading.Thread(
+            target=self._writer_loop,
+            name=f"chunk-writer-{os.path.basename(file_path)}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    @property
+    def resumable(self) -> bool:
+        """是否保存断点"""
+        return bool(self.file_unique_id)
+    
+    def _save_state(self, offset: int):
+        """
+        原子写入断点状态
+        
+        Args:
+            offset: 已落盘且按数据块对齐的字节偏移
+        """
+        state_path = _state_path(self.part_path)
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'file_unique_id': self.file_unique_id,
+                'expected_size': self.expected_size,
+                'offset': offset,
+                'updated_time': time.time()
+            }, f)
+        os.replace(temp_path, state_path)
+    
+    def _checkpoint(self):
+        """将已写入的数据落盘后保存断点，偏移向下对齐到数据块边界"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._chunks_since_checkpoint = 0
+        if self.resumable:
+            self._save_state(self.bytes_written - self.bytes_written % STREAM_CHUNK_SIZE)
+    
+    def _writer_loop(self):
+        """写入线程主循环，出错后继续消费队列以免下载协程阻塞在 put 上"""
+        while True:
+            chunk = self._queue.get()
+            if chunk is _SENTINEL:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._file.write(chunk)
+                self.bytes_written += len(chunk)
+                self._chunks_since_checkpoint += 1
+                if self.resumable and self._chunks_since_checkpoint >= self.checkpoint_chunks:
+                    self._checkpoint()
+            except Exception as e:
+                self._error = e
+                logger.error(f"写入分块失败: {self.part_path} - {e}")
+        
+        try:
+            if self._error is None:
+                self._checkpoint()
+        except Exception as e:
+            self._error = e
+            logger.error(f"刷新文件失败: {self.part_path} - {e}")
+        finally:
+            self._file.close()
+    
+    async def write(self, chunk: bytes):
+        """
+        提交一个数据块，队列满时异步等待
+        
+        Args:
+            chunk: 数据块
+        
+        Raises:
+            OSError: 写入线程已出错时抛出
+        """
+        if self._error is not None:
+            raise OSError(f"写入文件失败: {self.part_path}") from self._error
+        try:
+            self._queue.put_nowait(chunk)
+        except queue.Full:
+            # 在线程池中阻塞等待，不占用事件循环
+            await asyncio.get_running_loop().run_in_executor(None, self._queue.put, chunk)
+    
+    async def _close(self):
+        """发送结束标记并等待写入线程退出"""
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue.put, _SENTINEL)
+        await loop.run_in_executor(None, self._thread.join)
+        # 下载被取消时可能还有等待入队的数据块，清空队列让其完成
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+    
+    async def finish(self) -> int:
+        """
+        等待所有数据块写入完成，然后将 .part 文件原子重命名为目标文件
+        
+        Returns:
+            int: 文件的总字节数（包含续传前已下载的部分）
+        
+        Raises:
+            OSError: 写入或重命名失败时抛出，此时未完成下载会被删除
+        """
+        await self._close()
+        if self._error is not None:
+            remove_partial(self.file_path)
+            raise OSError(f"写入文件失败: {self.part_path}") from self._error
+        # os.replace 在同一文件系统内是原子操作，目标文件已存在时直接覆盖
+        replaced_size = tracked_file_size(self.file_path)
+        os.replace(self.part_path, self.file_path)
+        remove_partial(self.file_path)
+        if replaced_size is not None:
+            notify_file_removed(self.file_path, replaced_size)
+        notify_file_added(self.file_path, self.bytes_written)
+        return self.bytes_written
+    
+    async def abort(self, keep_partial: bool = False):
+        """
+        放弃下载，等待写入线程退出
+        
+        Args:
+            keep_partial: 是否保留 .part 文件和断点以便续传，只有保存断点的写入器才会保留
+        """
+        await self._close()
+        if not (keep_partial and self.resumable and self._error is None):
+            remove_partial(self.file_path)
+
+
+async def stream_media_to_file(client, media: Union[str, object], file_path: str,
+                               expected_size: int = 0,
+                               progress: Optional[Callable[[int, int], None]] = None,
+                               max_pending_chunks: int = DEFAULT_MAX_PENDING_CHUNKS,
+                               file_unique_id: Optional[str] = None) -> int:
+    """
+    使用 stream_media 按块下载媒体并写入文件
+    
+    指定文件唯一ID时支持断点续传：存在匹配的未完成下载时从断点继续，
+    下载中断（出错、超时或取消）时保留已下载部分
+    
+    Args:
+        client: Pyrogram客户端实例
+        media: 消息对象或文件ID
+        file_path: 最终文件路径
+        expected_size: 预期文件大小，为0表示未知，用于进度回调和完整性校验
+        progress: 进度回调函数，参数为 (已下载字节数, 总字节数)
+        max_pending_chunks: 写入队列中最多缓存的数据块数量
+        file_unique_id: 文件唯一ID，为None时不支持续传
+    
+    Returns:
+        int: 文件的总字节数
+    
+    Raises:
+        OSError: 写入失败或下载大小与预期不符时抛出
+    """
+    resume_offset = get_resume_offset(file_path, file_unique_id, expected_size)
+    if resume_offset:
+        logger.info(f"从断点续传: {file_path} ({resume_offset}/{expected_size or '?'} 字节)")
+    elif file_unique_id is None:
+        remove_partial(file_path)
+    
+    writer = ChunkedFileWriter(file_path, max_pending_chunks, resume_offset, file_unique_id, expected_size)
+    received = resume_offset
+    try:
+        # stream_media 的 offset 以数据块为单位
+        async for chunk in client.stream_media(media, offset=resume_offset // STREAM_CHUNK_SIZE):
+            await writer.write(chunk)
+            received += len(chunk)
+            if progress:
+                progress(received, expected_size or received)
+        
+        if expected_size and received != expected_size:
+            # 大小不符说明数据已损坏，不再保留断点
+            await writer.abort()
+            raise OSError(f"下载大小不完整: {received}/{expected_size} 字节")
+        
+        return await writer.finish()
+    except BaseException:
+        # 包括任务取消和超时，确保写入线程退出，可续传时保留已下载部分
+        await asyncio.shield(writer.abort(keep_partial=True))
+        raise
+
+
+def split_chunk_ranges(first_chunk: int, total_chunks: int, parts: int) -> List[List[int]]:
+    """
+    将数据块区间 [first_chunk, total_chunks) 均分为若干连续区间
+    
+    Args:
+        first_chunk: 起始数据块序号
+        total_chunks: 数据块总数
+        parts: 区间数
+    
+    Returns:
+        List[List[int]]: 区间列表，每项为 [下一个待下载的数据块, 结束数据块（不含）]
+    """
+    remaining = max(0, total_chunks - first_chunk)
+    parts = max(1, min(parts, remaining))
+    ranges = []
+    start = first_chunk
+    for index in range(parts):
+        length = remaining // parts + (1 if index < remaining % parts else 0)
+        if length:
+            ranges.append([start, start + length])
+        start += length
+    return ranges
+
+
+def _load_range_state(file_path: str, file_unique_id: Optional[str], expected_size: int,
+                      total_chunks: int) -> Optional[List[List[int]]]:
+    """
+    读取并校验并行分段下载的断点，.part 文件必须已按预期大小预分配
+    
+    Args:
+        file_path: 最终文件路径
+        file_unique_id: 文件唯一ID
+        expected_size: 预期文件大小
+        total_chunks: 数据块总数
+    
+    Returns:
+        Optional[List[List[int]]]: 各区间的剩余进度，不可续传时返回None
+    """
+    state = load_partial_state(file_path)
+    if not state or not isinstance(state.get('ranges'), list):
+        return None
+    try:
+        if (state.get('file_unique_id') != file_unique_id
+                or state.get('expected_size') != expected_size
+                or os.path.getsize(f"{file_path}{PART_SUFFIX}") != expected_size):
+            return None
+        ranges = [[int(start), int(end)] for start, end in state['ranges']]
+    except (OSError, TypeError, ValueError):
+        return None
+    if any(not 0 <= start <= end <= total_chunks for start, end in ranges):
+        return None
+    return ranges
+
+
+class RangeFileWriter:
+    """
+    分段文件写入器，预分配 .part 文件后按位置写入各区间的数据块，完成后原子重命名为目标文件
+    
+    每个区间按顺序写入，断点中记录各区间下一个待下载的数据块，中断后每个区间从各自的断点继续
+    """
+    
+    def __init__(self, file_path: str, expected_size: int, ranges: List[List[int]],
+                 file_unique_id: Optional[str] = None, checkpoint_chunks: int = DEFAULT_CHECKPOINT_CHUNKS):
+        """
+        初始化写入器并预分配 .part 文件
+        
+        Args:
+            file_path: 最终文件路径
+            expected_size: 预期文件大小
+            ranges: 区间列表，每项为 [下一个待下载的数据块, 结束数据块（不含）]，写入过程中原地更新
+            file_unique_id: 文件唯一ID，为None时不保存断点
+            checkpoint_chunks: 每写入多少个数据块保存一次断点
+        """
+        self.file_path = file_path
+        self.part_path = f"{file_path}{PART_SUFFIX}"
+        self.expected_size = expected_size
+        self.ranges = ranges
+        self.file_unique_id = file_unique_id
+        self.checkpoint_chunks = max(1, checkpoint_chunks)
+        self._chunks_since_checkpoint = 0
+        self._closed = False
+        # 不支持 os.pwrite 的平台（Windows）用锁保护 lseek + write
+        self._seek_lock = threading.Lock()
+        # 多个写入线程共享区间进度和断点文件
+        self._state_lock = threading.Lock()
+        # 线程池中尚未完成的写入，关闭文件前必须等待
+        self._pending_writes = set()
+        
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        try:
+            os.ftruncate(self._fd, expected_size)
+            if file_unique_id:
+                self._save_state()
+        except BaseException:
+            os.close(self._fd)
+            raise
+    
+    @property
+    def resumable(self) -> bool:
+        """是否保存断点"""
+        return bool(self.file_unique_id)
+    
+    def _save_state(self):
+        """原子写入各区间的断点，offset 为从文件开头连续完成的字节数，兼容顺序续传"""
+        offset = self.expected_size
+        for start, end in sorted(self.ranges):
+            if start < end:
+                offset = start * STREAM_CHUNK_SIZE
+                break
+        state_path = _state_path(self.part_path)
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'file_unique_id': self.file_unique_id,
+                'expected_size': self.expected_size,
+                'offset': offset,
+                'ranges': self.ranges,
+                'updated_time': time.time()
+            }, f)
+        os.replace(temp_path, state_path)
+    
+    def _pwrite(self, data: bytes, offset: int):
+        """在指定位置写入数据"""
+        if hasattr(os, 'pwrite'):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self._fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:
+            with self._seek_lock:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+    
+    def _write_chunk(self, index: int, chunk_no: int, data: bytes):
+        """写入区间的一个数据块并推进该区间的进度，达到间隔时落盘并保存断点"""
+        self._pwrite(data, chunk_no * STREAM_CHUNK_SIZE)
+        with self._state_lock:
+            self.ranges[index][0] = chunk_no + 1
+            self._chunks_since_checkpoint += 1
+            if self.resumable and self._chunks_since_checkpoint >= self.checkpoint_chunks:
+                self._checkpoint()
+    
+    def _checkpoint(self):
+        """将已写入的数据落盘后保存断点，调用方需持有状态锁"""
+        os.fsync(self._fd)
+        self._chunks_since_checkpoint = 0
+        if self.resumable:
+            self._save_state()
+    
+    def _locked_checkpoint(self):
+        """持有状态锁保存断点"""
+        with self._state_lock:
+            self._checkpoint()
+    
+    async def write(self, index: int, chunk_no: int, data: bytes):
+        """
+        在线程池中写入一个数据块
+        
+        Args:
+            index: 区间序号
+            chunk_no: 数据块序号
+            data: 数据块
+        """
+        future = asyncio.get_running_loop().run_in_executor(None, self._write_chunk, index, chunk_no, data)
+        self._pending_writes.add(future)
+        future.add_done_callback(self._pending_writes.discard)
+        await future
+    
+    async def _close(self):
+        """等待线程池中的写入结束后关闭文件描述符"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        if not self._closed:
+            self._closed = True
+            os.close(self._fd)
+    
+    async def finish(self) -> int:
+        """
+        校验所有区间已完成且文件大小与预期一致，然后将 .part 文件原子重命名为目标文件
+        
+        Returns:
+            int: 文件的总字节数
+        
+        Raises:
+            OSError: 区间未完成、大小不符或重命名失败时抛出，此时未完成下载会被删除
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, os.fsync, self._fd)
+            size = os.fstat(self._fd).st_size
+        finally:
+            await self._close()
+        if any(start < end for start, end in self.ranges) or size != self.expected_size:
+            remove_partial(self.file_path)
+            raise OSError(f"分段下载不完整: {size}/{self.expected_size} 字节")
+        replaced_size = tracked_file_size(self.file_path)
+        os.replace(self.part_path, self.file_path)
+        remove_partial(self.file_path)
+        if replaced_size is not None:
+            notify_file_removed(self.file_path, replaced_size)
+        notify_file_added(self.file_path, size)
+        return size
+    
+    async def abort(self, keep_partial: bool = False):
+        """
+        放弃下载
+        
+        Args:
+            keep_partial: 是否保留 .part 文件和断点以便续传，只有保存断点的写入器才会保留
+        """
+        try:
+            if self._pending_writes:
+                await asyncio.gather(*self._pending_writes, return_exceptions=True)
+            if keep_partial and self.resumable and not self._closed:
+                await asyncio.get_running_loop().run_in_executor(None, self._locked_checkpoint)
+        except Exception as e:
+            logger.warning(f"保存分段下载断点失败: {self.part_path} - {e}")
+            keep_partial = False
+        finally:
+            await self._close()
+        if not (keep_partial and self.resumable):
+            remove_partial(self.file_path)
+
+
+async def parallel_stream_media_to_file(client, media: Union[str, object], file_path: str,
+                                        expected_size: int, parts: int = DEFAULT_PARALLEL_PARTS,
+                                        progress: Optional[Callable[[int, int], None]] = None,
+                                        file_unique_id: Optional[str] = None) -> int:
+    """
+    将文件分成多个按数据块对齐的区间，每个区间用一个 stream_media 请求流并行下载
+    
+    stream_media 的 offset 和 limit 以数据块为单位，对应 upload.GetFile 按块对齐的偏移，
+    各区间同时在途，数据块按位置写入预分配的 .part 文件；指定文件唯一ID时支持断点续传，
+    顺序下载留下的断点会转换为剩余部分的分段下载
+    
+    Args:
+        client: Pyrogram客户端实例
+        media: 消息对象或文件ID
+        file_path: 最终文件路径
+        expected_size: 预期文件大小，必须大于0
+        parts: 并行区间数
+        progress: 进度回调函数，参数为 (已下载字节数, 总字节数)
+        file_unique_id: 文件唯一ID，为None时不支持续传
+    
+    Returns:
+        int: 文件的总字节数
+    
+    Raises:
+        ValueError: 预期文件大小未知时抛出
+        OSError: 写入失败或某个区间的数据不完整时抛出
+    """
+    if expected_size <= 0:
+        raise ValueError("分段下载需要已知的文件大小")
+    total_chunks = (expected_size + STREAM_CHUNK_SIZE - 1) // STREAM_CHUNK_SIZE
+    
+    ranges = _load_range_state(file_path, file_unique_id, expected_size, total_chunks) if file_unique_id else None
+    if ranges is None:
+        resume_offset = get_resume_offset(file_path, file_unique_id, expected_size)
+        if file_unique_id is None:
+            remove_partial(file_path)
+        ranges = split_chunk_ranges(resume_offset // STREAM_CHUNK_SIZE, total_chunks, parts)
+        if resume_offset:
+            logger.info(f"从断点续传: {file_path} ({resume_offset}/{expected_size} 字节)")
+    else:
+        logger.info(f"从分段断点续传: {file_path} (剩余区间: {[r for r in ranges if r[0] < r[1]]})")
+    
+    received = expected_size - sum(
+        min(end * STREAM_CHUNK_SIZE, expected_size) - start * STREAM_CHUNK_SIZE
+        for start, end in ranges if start < end
+    )
+    writer = RangeFileWriter(file_path, expected_size, ranges, file_unique_id)
+    
+    async def fetch_range(index: int):
+        """按顺序下载一个区间的数据块"""
+        nonlocal received
+        start, end = ranges[index]
+        if start >= end:
+            return
+        chunk_no = start
+        async for chunk in client.stream_media(media, offset=start, limit=end - start):
+            if chunk_no >= end:
+                break
+            # 除最后一个数据块外，每个数据块都应为完整大小
+            expected_len = min(STREAM_CHUNK_SIZE, expected_size - chunk_no * STREAM_CHUNK_SIZE)
+            if len(chunk) != expected_len:
+                raise OSError(f"数据块 {chunk_no} 大小异常: {len(chunk)}/{expected_len} 字节")
+            await writer.write(index, chunk_no, chunk)
+            chunk_no += 1
+            received += len(chunk)
+            if progress:
+                progress(received, expected_size)
+        if chunk_no != end:
+            raise OSError(f"区间 [{start}, {end}) 数据不完整，停止于数据块 {chunk_no}")
+    
+    tasks = [asyncio.create_task(fetch_range(index)) for index in range(len(ranges))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # 任一区间失败或被取消时停止其余区间，可续传时保留已下载部分
+        for task in tasks:
+            task.cancel()
+        await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+        await asyncio.shield(writer.abort(keep_partial=True))
+        raise
+    return await writer.finish()
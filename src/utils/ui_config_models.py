@@ -30,6 +30,13 @@ class ProxyType(str, Enum):
     HTTPS = "HTTPS"
 
 
+class DownloadOrder(str, Enum):
+    """下载排序策略枚举"""
+    OLDEST_FIRST = "oldest_first"
+    NEWEST_FIRST = "newest_first"
+    SMALLEST_FIRST = "smallest_first"
+
+
 class UIGeneralConfig(BaseModel):
     """通用配置模型"""
     api_id: int = Field(..., description="Telegram API ID")
@@ -47,6 +54,12 @@ class UIGeneralConfig(BaseModel):
     proxy_username: Optional[str] = Field(None, description="代理用户名(可选)")
     proxy_password: Optional[str] = Field(None, description="代理密码(可选)")
     auto_restart_session: bool = Field(True, description="连接断开后自动重连")
+    client_pool_size: int = Field(0, description="用于下载和上传的额外会话数量，0表示只使用主客户端", ge=0, le=8)
+    message_metadata_max_age_days: int = Field(7, description="本地消息元数据的有效天数，有效期内按本地记录过滤消息，0表示不使用本地记录", ge=0, le=365)
+    parallel_upload_parts: int = Field(16, description="大文件并行上传时同时在途的分片数，为1时使用Pyrogram默认上传", ge=1, le=64)
+    parallel_upload_sessions: int = Field(4, description="大文件并行上传使用的媒体会话数", ge=1, le=8)
+    parallel_upload_max_sessions: int = Field(8, description="所有并行上传同时打开的媒体会话总数上限", ge=1, le=32)
+    parallel_upload_threshold_mb: int = Field(64, description="启用并行分片上传的文件大小阈值(MB)", ge=11, le=100000)
 
     @validator('api_id')
     def validate_api_id(cls, v):
@@ -400,8 +413,19 @@ class UIDownloadConfig(BaseModel):
         ge=1, 
         le=50
     )
+    min_concurrent_downloads: int = Field(
+        1, 
+        description="自适应并发的最小并发下载数",
+        ge=1, 
+        le=50
+    )
     dir_size_limit_enabled: bool = Field(False, description="是否启用下载目录大小限制")
     dir_size_limit: int = Field(1000, description="下载目录大小限制(MB)", ge=1, le=100000)
+    partial_retention_days: int = Field(7, description="未完成下载的保留天数，超过后删除断点文件", ge=1, le=365)
+    parallel_range_parts: int = Field(4, description="大文件分段并行下载的区间数，为1时不分段", ge=1, le=16)
+    parallel_range_threshold_mb: int = Field(64, description="启用分段并行下载的文件大小阈值(MB)", ge=1, le=100000)
+    reuse_downloaded_files: bool = Field(True, description="同一媒体已下载过时通过硬链接或复制复用本地文件")
+    download_order: DownloadOrder = Field(DownloadOrder.OLDEST_FIRST, description="下载排序策略：oldest_first、newest_first或smallest_first")
 
     @validator('downloadSetting')
     def validate_download_settings(cls, v):
@@ -433,6 +457,8 @@ class UIUploadConfig(BaseModel):
     target_channels: List[str] = Field(..., description="目标频道列表")
     directory: str = Field("uploads", description="上传文件目录")
     delay_between_uploads: float = Field(0.5, description="上传间隔时间(秒)", ge=0)
+    max_concurrent_uploads: int = Field(3, description="同时上传的媒体组数", ge=1, le=10)
+    preserve_group_order: bool = Field(True, description="按文件夹顺序依次上传媒体组")
     options: dict = Field(
         default_factory=lambda: {
             "use_folder_name": True,
@@ -0,0 +1,197 @@
+"""
+已上传媒体缓存模块
+按文件内容哈希记录首次上传后Telegram返回的file_id（其中包含file_reference），
+之后向任意频道发送相同内容时直接使用file_id，不必再次上传文件数据，file_id失效时才重新上传
+
+也可以通过 messages.UploadMedia 只上传文件数据而不发送消息，提前得到file_id，
+需要按顺序发送的媒体组因此可以并发上传数据，轮到时只需用file_id发送消息
+"""
+
+import os
+import sqlite3
+import mimetypes
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+from pyrogram import raw
+from pyrogram.file_id import FileId, FileType, FileUniqueId, FileUniqueType, ThumbnailSource
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# 按优先级检查的消息媒体属性
+UPLOADED_MEDIA_ATTRIBUTES = ('photo', 'video', 'document', 'audio', 'animation')
+# 可以只上传数据的媒体类型及其file_id类型和默认MIME类型
+PRE_UPLOAD_FILE_TYPES = {
+    'photo': (FileType.PHOTO, 'image/jpeg'),
+    'video': (FileType.VIDEO, 'video/mp4'),
+    'document': (FileType.DOCUMENT, 'application/octet-stream'),
+    'audio': (FileType.AUDIO, 'audio/mpeg'),
+}
+
+
+def message_file_id(message) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    从消息对象提取媒体的file_id
+    
+    Args:
+        message: Pyrogram消息对象
+    
+    Returns:
+        Optional[Tuple[str, str, Optional[str]]]: (媒体类型, file_id, file_unique_id)，消息不含媒体时返回None
+    """
+    for attribute in UPLOADED_MEDIA_ATTRIBUTES:
+        media = getattr(message, attribute, None)
+        file_id = getattr(media, 'file_id', None) if media else None
+        if isinstance(file_id, str) and file_id:
+            return attribute, file_id, getattr(media, 'file_unique_id', None)
+    return None
+
+
+async def pre_upload_media(client, chat_id: Union[int, str], file_path: Union[str, Path], media_type: str,
+                           thumb: Optional[str] = None, width: Optional[int] = None, height: Optional[int] = None,
+                           duration: Optional[int] = None,
+                           progress: Optional[Callable] = None) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    上传文件数据但不发送消息，得到之后可以直接发送的file_id
+    
+    Args:
+        client: Pyrogram客户端实例
+        chat_id: 之后要发送到的聊天，UploadMedia需要指定对端
+        file_path: 文件路径
+        media_type: 媒体类型，photo、video、document或audio
+        thumb: 视频缩略图路径
+        width: 视频宽度
+        height: 视频高度
+        duration: 视频时长（秒）
+        progress: 上传进度回调，参数为 (已上传字节数, 总字节数)
+    
+    Returns:
+        Optional[Tuple[str, str, Optional[str]]]: (媒体类型, file_id, file_unique_id)，不支持的媒体类型返回None
+    """
+    if media_type not in PRE_UPLOAD_FILE_TYPES:
+        return None
+    file_type, default_mime = PRE_UPLOAD_FILE_TYPES[media_type]
+    file_path = str(file_path)
+    file_name = os.path.basename(file_path)
+    uploaded_file = await client.save_file(file_path, progress=progress)
+    
+    if media_type == 'photo':
+        input_media = raw.types.InputMediaUploadedPhoto(file=uploaded_file)
+    else:
+        attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+        if media_type == 'video':
+            attributes.insert(0, raw.types.DocumentAttributeVideo(
+                supports_streaming=True, duration=int(duration or 0), w=int(width or 0), h=int(height or 0)
+            ))
+        elif media_type == 'audio':
+            attributes.insert(0, raw.types.DocumentAttributeAudio(duration=int(duration or 0)))
+        input_media = raw.types.InputMediaUploadedDocument(
+            mime_type=mimetypes.guess_type(file_name)[0] or default_mime,
+            file=uploaded_file,
+            thumb=await client.save_file(thumb) if thumb else None,
+            attributes=attributes
+        )
+    
+    media = await client.invoke(raw.functions.messages.UploadMedia(
+        peer=await client.resolve_peer(chat_id),
+        media=input_media
+    ))
+    
+    if media_type == 'photo':
+        photo = media.photo
+        sizes = [size for size in photo.sizes if hasattr(size, 'w')]
+        file_id = FileId(
+            file_type=FileType.PHOTO,
+            dc_id=photo.dc_id,
+            media_id=photo.id,
+            access_hash=photo.access_hash,
+            file_reference=photo.file_reference,
+            thumbnail_source=ThumbnailSource.THUMBNAIL,
+            thumbnail_file_type=FileType.PHOTO,
+            thumbnail_size=max(sizes, key=lambda size: size.w * size.h).type if sizes else 'x',
+            volume_id=0,
+            local_id=0
+        ).encode()
+        media_id = photo.id
+    else:
+        document = media.document
+        file_id = FileId(
+            file_type=file_type,
+            dc_id=document.dc_id,
+            media_id=document.id,
+            access_hash=document.access_hash,
+            file_reference=document.file_reference
+        ).encode()
+        media_id = document.id
+    
+    file_unique_id = FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=media_id).encode()
+    return media_type, file_id, file_unique_id
+
+
+class UploadedMediaStore:
+    """
+    文件内容哈希到file_id的映射，所有方法都在调用方提供的连接上执行，由调用方负责事务提交
+    """
+    
+    TABLE = 'uploaded_media'
+    
+    def create_schema(self, conn: sqlite3.Connection):
+        """
+        创建已上传媒体表
+        
+        Args:
+            conn: 数据库连接
+        """
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                file_hash TEXT PRIMARY KEY,
+                media_type TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT,
+                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+    
+    def get(self, conn: sqlite3.Connection, file_hash: str) -> Optional[Tuple[str, str]]:
+        """
+        查询内容对应的file_id
+        
+        Args:
+            conn: 数据库连接
+            file_hash: 文件内容哈希
+        
+        Returns:
+            Optional[Tuple[str, str]]: (媒体类型, file_id)，未记录时返回None
+        """
+        row = conn.execute(f'SELECT media_type, file_id FROM {self.TABLE} WHERE file_hash = ?', (file_hash,)).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def put(self, conn: sqlite3.Connection, file_hash: str, media_type: str, file_id: str,
+            file_unique_id: Optional[str] = None):
+        """
+        记录或更新内容对应的file_id
+        
+        Args:
+            conn: 数据库连接
+            file_hash: 文件内容哈希
+            media_type: 媒体类型
+            file_id: Telegram文件ID
+            file_unique_id: Telegram文件唯一ID
+        """
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.TABLE} (file_hash, media_type, file_id, file_unique_id, updated_time) '
+            f'VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)',
+            (file_hash, media_type, file_id, file_unique_id)
+        )
+    
+    def remove(self, conn: sqlite3.Connection, file_hash: str):
+        """
+        删除内容对应的file_id，用于file_id失效后
+        
+        Args:
+            conn: 数据库连接
+            file_hash: 文件内容哈希
+        """
+        conn.execute(f'DELETE FROM {self.TABLE} WHERE file_hash = ?', (file_hash,))
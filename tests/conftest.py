@@ -0,0 +1,98 @@
+"""
+测试共用的假对象和fixture
+"""
+
+import pytest
+
+
+class FakeHistoryManager:
+    """
+    内存中的上传历史，实现上传器用到的异步历史记录接口
+    
+    同时充当同步管理器，get_async_manager返回自身，可以直接传给Uploader的构造函数
+    """
+    
+    def __init__(self, media=None, unindexed_rows=None):
+        self.media = dict(media or {})
+        self.unindexed_rows = unindexed_rows if unindexed_rows is not None else []
+        self.fingerprints = {}
+        self.uploaded = set()
+        self.upload_records = []
+        self.hash_queries = []
+    
+    def get_async_manager(self):
+        return self
+    
+    async def get_unindexed_uploads(self):
+        return self.unindexed_rows
+    
+    async def get_content_hashes(self, quick_key):
+        return list(self.fingerprints.get(quick_key, []))
+    
+    async def add_content_fingerprint(self, quick_key, file_hash):
+        self.fingerprints.setdefault(quick_key, set()).add(file_hash)
+    
+    async def is_file_hash_uploaded(self, file_hash, chat_id):
+        self.hash_queries.append(file_hash)
+        return (file_hash, chat_id) in self.uploaded
+    
+    async def add_upload_record_by_hash(self, file_hash, file_path, target_channel, file_size, media_type):
+        self.upload_records.append((file_hash, file_path, target_channel, file_size, media_type))
+        self.uploaded.add((file_hash, target_channel))
+    
+    async def get_cached_file_hash(self, file_path, fingerprint):
+        return None
+    
+    async def set_cached_file_hash(self, file_path, fingerprint, file_hash):
+        pass
+    
+    async def get_uploaded_media(self, file_hash):
+        return self.media.get(file_hash)
+    
+    async def set_uploaded_media(self, file_hash, media_type, file_id, file_unique_id=None):
+        self.media[file_hash] = (media_type, file_id)
+    
+    async def remove_uploaded_media(self, file_hash):
+        self.media.pop(file_hash, None)
+
+
+class FakeConfigManager:
+    """返回字典形式UI配置的配置管理器"""
+    
+    def __init__(self, config=None):
+        self.config = config or {'UPLOAD': {'delay_between_uploads': 0}, 'GENERAL': {}}
+    
+    def get_ui_config(self):
+        return self.config
+
+
+class FakeUploadClient:
+    """只提供上传器构造时用到的接口，发送接口由各测试按需添加"""
+    
+    async def save_file(self, path, file_id=None, file_part=0, progress=None, progress_args=()):
+        return None
+
+
+@pytest.fixture
+def make_uploader():
+    """
+    通过Uploader的构造函数创建使用内存上传历史的上传器
+    
+    上传历史为 uploader.async_history_manager，其余关键字参数传给FakeHistoryManager；
+    emit的事件记录在 uploader.events 中
+    """
+    from src.modules.uploader import Uploader
+    
+    uploaders = []
+    
+    def _make(client=None, config=None, **history_kwargs):
+        uploader = Uploader(client or FakeUploadClient(), FakeConfigManager(config), None,
+                            FakeHistoryManager(**history_kwargs))
+        uploader.events = []
+        uploader.emit = lambda *args, **kwargs: uploader.events.append(args)
+        uploaders.append(uploader)
+        return uploader
+    
+    yield _make
+    for uploader in uploaders:
+        uploader._hash_executor.shutdown(wait=True)
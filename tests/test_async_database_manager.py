@@ -0,0 +1,93 @@
+"""
+AsyncDatabaseManager 测试
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.utils.async_database_manager import AsyncDatabaseManager
+from src.utils.database_manager import DatabaseManager
+
+SOURCE = '-1001000000001'
+TARGET = '-1001000000002'
+
+
+@pytest.fixture
+def async_manager(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / 'history.db'), write_flush_interval_ms=10)
+    manager = AsyncDatabaseManager(db_manager)
+    yield manager
+    manager.stop()
+    db_manager.close()
+
+
+def test_calls_run_on_database_thread(async_manager):
+    """调用在数据库线程中执行，结果回到调用方的事件循环"""
+    async def run():
+        await async_manager.add_download_record(SOURCE, 1)
+        await async_manager.add_forward_records([(SOURCE, msg_id, TARGET, None) for msg_id in (1, 2)])
+        thread_name = await async_manager._call(lambda: threading.current_thread().name)
+        return (
+            thread_name,
+            await async_manager.is_message_downloaded(SOURCE, 1),
+            await async_manager.get_forwarded_matrix(SOURCE, [TARGET], start_id=1, end_id=5)
+        )
+    
+    thread_name, downloaded, matrix = asyncio.run(run())
+    assert thread_name == 'history-db-async'
+    assert downloaded
+    assert matrix == {TARGET: {1, 2}}
+
+
+def test_calls_keep_submission_order(async_manager):
+    """不等待结果的调用和可等待调用按提交顺序执行"""
+    order = []
+    
+    async def run():
+        for i in range(20):
+            async_manager._submit(order.append, i)
+        await async_manager._call(order.append, 'last')
+    
+    asyncio.run(run())
+    assert order == list(range(20)) + ['last']
+
+
+def test_errors_propagate_to_caller(async_manager):
+    """同步方法的异常在等待处抛出，不影响之后的调用"""
+    def fail():
+        raise ValueError('boom')
+    
+    async def run():
+        with pytest.raises(ValueError):
+            await async_manager._call(fail)
+        async_manager._submit(fail)
+        return await async_manager._call(lambda: 'still running')
+    
+    assert asyncio.run(run()) == 'still running'
+
+
+def test_stopped_manager_runs_synchronously(async_manager):
+    """数据库线程停止后调用直接同步执行"""
+    async_manager.stop()
+    
+    async def run():
+        await async_manager.add_download_record(SOURCE, 7)
+        return await async_manager.is_message_downloaded(SOURCE, 7)
+    
+    assert asyncio.run(run())
+
+
+def test_count_forwarded_range(async_manager):
+    """已转发消息数在数据库线程中按范围统计，未指定的边界不限制"""
+    async def run():
+        await async_manager.add_forward_records([(SOURCE, msg_id, TARGET, None) for msg_id in range(1, 11)])
+        return (
+            await async_manager.count_forwarded_range(SOURCE, TARGET),
+            await async_manager.count_forwarded_range(SOURCE, TARGET, 3, 5),
+            await async_manager.count_forwarded_range(SOURCE, TARGET, 8, None),
+            await async_manager.count_forwarded_range(SOURCE, TARGET, None, 2)
+        )
+    
+    assert asyncio.run(run()) == (10, 3, 3, 2)
@@ -0,0 +1,103 @@
+"""
+传输客户端池测试
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from src.utils import client_pool
+from src.utils.client_pool import ClientPool
+
+
+class FakeClient:
+    """只实现客户端池用到的接口"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.is_connected = True
+        self.storage = SimpleNamespace(update_peers=self._update_peers)
+    
+    async def _update_peers(self, peers):
+        return None
+    
+    async def start(self):
+        return None
+
+
+class FakeMainClient(FakeClient):
+    """resolve_peer在gate放行前挂起，fail为True时解析失败"""
+    
+    def __init__(self):
+        super().__init__('main')
+        self.gate = asyncio.Event()
+        self.fail = False
+    
+    async def export_session_string(self):
+        return 'session'
+    
+    async def resolve_peer(self, chat_id):
+        await self.gate.wait()
+        if self.fail:
+            raise ValueError('peer not found')
+        return SimpleNamespace(channel_id=chat_id, access_hash=1)
+
+
+def make_pool(monkeypatch, size=2):
+    monkeypatch.setattr(client_pool.utils, 'get_peer_id', lambda peer: peer.channel_id)
+    main = FakeMainClient()
+    pool = ClientPool(main, size, lambda index, session: FakeClient(f'pool-{index}'))
+    return main, pool
+
+
+def test_concurrent_leases_spread_while_preparing_peer(monkeypatch):
+    """同步对话期间已计入租用数，并发租用分散到不同客户端"""
+    main, pool = make_pool(monkeypatch)
+    
+    async def run():
+        await pool.start()
+        release = asyncio.Event()
+        leased = []
+        
+        async def hold():
+            async with pool.lease(-100) as client:
+                leased.append(client.name)
+                await release.wait()
+        
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert pool.snapshot()['load'] == [1, 1, 1]
+        main.gate.set()
+        while len(leased) < 3:
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return leased
+    
+    assert sorted(asyncio.run(run())) == ['main', 'pool-0', 'pool-1']
+    assert pool.snapshot()['load'] == [0, 0, 0]
+
+
+def test_failed_or_cancelled_prepare_releases_load(monkeypatch):
+    """同步对话失败时改用主客户端，失败或取消都撤销池客户端的租用数"""
+    main, pool = make_pool(monkeypatch, size=1)
+    main.fail = True
+    
+    async def run():
+        await pool.start()
+        
+        async def lease_once():
+            async with pool.lease(-100) as client:
+                return client.name, pool.snapshot()['load']
+        
+        cancelled = asyncio.create_task(lease_once())
+        await asyncio.sleep(0)
+        assert pool.snapshot()['load'] == [0, 1]
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert pool.snapshot()['load'] == [0, 0]
+        
+        main.gate.set()
+        return await lease_once()
+    
+    assert asyncio.run(run()) == ('main', [1, 0])
+    assert pool.snapshot()['load'] == [0, 0]
@@ -0,0 +1,107 @@
+"""
+AdaptiveConcurrencyController 测试
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils import concurrency_controller
+from src.utils.concurrency_controller import AdaptiveConcurrencyController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的单调时钟"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(concurrency_controller, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def finish_window(controller, clock, nbytes=1024):
+    """完成一次下载并推进到统计窗口结束"""
+    clock.value += controller.window_seconds
+    controller.active += 1
+    controller.release(nbytes, 1.0, True)
+
+
+def test_additive_increase_stops_at_ceiling(clock):
+    """吞吐量不下降时每个窗口并发数加1，不超过上限，请求间隔逐步归零"""
+    controller = AdaptiveConcurrencyController(min_limit=1, max_limit=4, initial_limit=2)
+    controller.spacing = 0.2
+    
+    limits = []
+    for _ in range(4):
+        finish_window(controller, clock)
+        limits.append(controller.limit)
+    
+    assert limits == [3, 4, 4, 4]
+    assert controller.spacing == 0.0
+
+
+def test_throughput_drop_steps_back(clock):
+    """增加并发后吞吐量明显下降时退回一步"""
+    controller = AdaptiveConcurrencyController(min_limit=1, max_limit=8, initial_limit=4)
+    finish_window(controller, clock, nbytes=10000)
+    assert controller.limit == 5
+    finish_window(controller, clock, nbytes=1000)
+    assert controller.limit == 4
+
+
+def test_multiplicative_decrease_once_per_window(clock):
+    """FloodWait和超时按比例减小并发数，同一窗口内只减一次，请求间隔加大"""
+    changes = []
+    controller = AdaptiveConcurrencyController(min_limit=1, max_limit=16, initial_limit=8, on_change=changes.append)
+    
+    controller.record_flood_wait(10)
+    assert controller.limit == 4
+    assert controller.spacing == 1.0
+    controller.record_timeout()
+    assert controller.limit == 4
+    assert controller.spacing == 2.0
+    
+    # 拥塞窗口内不增加并发
+    finish_window(controller, clock)
+    assert controller.limit == 4
+    
+    controller.record_timeout()
+    assert controller.limit == 2
+    assert (controller.flood_waits, controller.timeouts) == (1, 2)
+    assert changes[-1]['limit'] == 2
+
+
+def test_decrease_stops_at_floor_and_spacing_is_capped(clock):
+    """并发数不低于下限，请求间隔不超过上限"""
+    controller = AdaptiveConcurrencyController(min_limit=3, max_limit=10, initial_limit=10, max_spacing=4.0)
+    for _ in range(5):
+        controller.record_flood_wait(60)
+        clock.value += controller.window_seconds
+    
+    assert controller.limit == 3
+    assert controller.spacing == 4.0
+
+
+def test_set_bounds_clamps_limit(clock):
+    """更新上下限时当前并发数截断到新范围内"""
+    controller = AdaptiveConcurrencyController(min_limit=1, max_limit=10, initial_limit=8)
+    controller.set_bounds(2, 5)
+    assert controller.limit == 5
+    controller.set_bounds(6, 9)
+    assert controller.limit == 6
+
+
+def test_acquire_waits_for_release():
+    """活跃数达到并发数时等待，释放名额后唤醒等待者"""
+    controller = AdaptiveConcurrencyController(min_limit=1, max_limit=1)
+    
+    async def run():
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        controller.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        return controller.active
+    
+    assert asyncio.run(run()) == 1
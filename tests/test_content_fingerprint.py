@@ -0,0 +1,131 @@
+"""
+快速指纹与上传去重判定测试
+"""
+
+import asyncio
+import sqlite3
+
+from src.utils.content_fingerprint import ContentFingerprintStore, quick_fingerprint
+
+
+def test_quick_fingerprint_small_file(tmp_path):
+    """不超过三个样本大小的文件按全部内容计算，任何字节变化都会改变指纹"""
+    path = tmp_path / 'small.bin'
+    path.write_bytes(b'a' * 100)
+    key = quick_fingerprint(path, sample_size=64)
+    assert key.startswith('100:')
+    
+    path.write_bytes(b'a' * 99 + b'b')
+    assert quick_fingerprint(path, sample_size=64) != key
+
+
+def test_quick_fingerprint_samples_large_file(tmp_path):
+    """大文件只比较头部、中部和尾部样本"""
+    data = bytearray(b'x' * 1000)
+    path = tmp_path / 'large.bin'
+    path.write_bytes(bytes(data))
+    key = quick_fingerprint(path, sample_size=100)
+    assert key.startswith('1000:')
+    assert len(key.split(':', 1)[1]) == 24
+    
+    # 中部样本之外的字节变化不影响指纹
+    data[200] = ord('y')
+    path.write_bytes(bytes(data))
+    assert quick_fingerprint(path, sample_size=100) == key
+    
+    # 中部样本内的变化改变指纹
+    data[500] = ord('y')
+    path.write_bytes(bytes(data))
+    assert quick_fingerprint(path, sample_size=100) != key
+
+
+def test_quick_fingerprint_missing_file(tmp_path):
+    """文件不存在时返回None"""
+    assert quick_fingerprint(tmp_path / 'missing.bin') is None
+
+
+def test_fingerprint_store():
+    """一个快速指纹可以对应多个完整哈希，重复记录被忽略"""
+    store = ContentFingerprintStore()
+    conn = sqlite3.connect(':memory:')
+    store.create_schema(conn)
+    store.add(conn, '10:abc', 'hash1')
+    store.add(conn, '10:abc', 'hash2')
+    store.add(conn, '10:abc', 'hash1')
+    
+    assert sorted(store.get_hashes(conn, '10:abc')) == ['hash1', 'hash2']
+    assert store.get_hashes(conn, '10:def') == []
+
+
+def test_quick_key_conclusive(make_uploader):
+    """存在相同大小或大小未知的未索引记录时不能仅凭快速指纹判定"""
+    uploader = make_uploader()
+    assert not uploader._quick_key_conclusive('10:abc')
+    
+    uploader._unindexed_upload_sizes = {20}
+    assert uploader._quick_key_conclusive('10:abc')
+    assert not uploader._quick_key_conclusive('20:abc')
+    
+    uploader._unindexed_upload_sizes = {0}
+    assert not uploader._quick_key_conclusive('10:abc')
+
+
+def test_check_file_uploaded_skips_full_hash_on_miss(tmp_path, make_uploader):
+    """快速指纹未命中时不等待完整哈希直接判定为未上传"""
+    path = tmp_path / 'new.bin'
+    path.write_bytes(b'new content')
+    uploader = make_uploader()
+    history = uploader.async_history_manager
+    
+    async def run():
+        await uploader._refresh_unindexed_uploads()
+        result = await uploader._check_file_uploaded(path, '-100')
+        # 完整哈希在后台计算
+        await asyncio.gather(*uploader._hash_tasks.values())
+        return result
+    
+    assert asyncio.run(run()) == (False, None)
+    assert history.hash_queries == []
+    assert str(path) in uploader.file_hash_cache
+
+
+def test_check_file_uploaded_confirms_hit_with_full_hash(tmp_path, make_uploader):
+    """快速指纹命中时以完整哈希和上传历史为准"""
+    path = tmp_path / 'old.bin'
+    path.write_bytes(b'old content')
+    uploader = make_uploader()
+    history = uploader.async_history_manager
+    
+    async def run():
+        await uploader._refresh_unindexed_uploads()
+        file_hash = await uploader._compute_file_hash(path)
+        quick_key = await uploader._get_quick_key(path)
+        await history.add_content_fingerprint(quick_key, file_hash)
+        history.uploaded.add((file_hash, '-100'))
+        uploader.file_hash_cache.clear()
+        return file_hash, await uploader._check_file_uploaded(path, '-100'), \
+            await uploader._check_file_uploaded(path, '-200')
+    
+    file_hash, same_chat, other_chat = asyncio.run(run())
+    assert same_chat == (True, file_hash)
+    assert other_chat == (False, file_hash)
+
+
+def test_check_file_uploaded_waits_for_same_size_unindexed(tmp_path, make_uploader):
+    """存在相同大小的未索引记录时等待完整哈希，命中后补记快速指纹"""
+    path = tmp_path / 'legacy.bin'
+    path.write_bytes(b'legacy content')
+    uploader = make_uploader()
+    history = uploader.async_history_manager
+    
+    async def run():
+        file_hash = await uploader._compute_file_hash(path)
+        history.unindexed_rows = [(file_hash, None, path.stat().st_size)]
+        history.uploaded.add((file_hash, '-100'))
+        uploader.file_hash_cache.clear()
+        await uploader._refresh_unindexed_uploads()
+        return file_hash, await uploader._check_file_uploaded(path, '-100')
+    
+    file_hash, result = asyncio.run(run())
+    assert result == (True, file_hash)
+    assert history.fingerprints == {quick_fingerprint(path): {file_hash}}
@@ -0,0 +1,79 @@
+"""
+DirectorySizeTracker 测试
+"""
+
+import asyncio
+import os
+
+from src.utils import dir_size_tracker
+from src.utils.dir_size_tracker import DirectorySizeTracker, tracked_file_size
+from src.utils.stream_download import STREAM_CHUNK_SIZE, stream_media_to_file
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+def scanned_total(root):
+    """重新遍历目录得到的大小"""
+    tracker = DirectorySizeTracker(str(root))
+    tracker.start_scan()
+    assert tracker.wait_ready(5)
+    return tracker.total
+
+
+def test_totals_after_add_replace_and_delete(tmp_path):
+    """上报新增、覆盖和删除后计数与重新遍历的结果一致，临时文件不计入"""
+    write_file(str(tmp_path / 'a.bin'), 100)
+    write_file(str(tmp_path / 'sub' / 'b.bin'), 50)
+    write_file(str(tmp_path / 'sub' / 'c.mp4.part'), 999)
+    tracker = DirectorySizeTracker(str(tmp_path))
+    tracker.start_scan()
+    assert tracker.wait_ready(5)
+    assert tracker.total == 150
+    
+    # 新增
+    new_path = str(tmp_path / 'sub' / 'd.bin')
+    write_file(new_path, 30)
+    tracker.add_file(new_path, 30)
+    assert tracker.total == 180
+    
+    # 覆盖：先减去旧大小再加上新大小
+    replaced_path = str(tmp_path / 'a.bin')
+    old_size = tracked_file_size(replaced_path)
+    write_file(replaced_path, 10)
+    tracker.remove_file(replaced_path, old_size)
+    tracker.add_file(replaced_path, 10)
+    assert tracker.total == 90
+    
+    # 删除
+    removed_path = str(tmp_path / 'sub' / 'b.bin')
+    size = tracked_file_size(removed_path)
+    os.remove(removed_path)
+    tracker.remove_file(removed_path, size)
+    assert tracker.total == 40
+    assert tracker.total == scanned_total(tmp_path)
+
+
+def test_completed_download_reported_to_tracker(tmp_path, monkeypatch):
+    """下载完成后按最终大小上报，覆盖已有文件时减去旧文件大小，.part 文件不计入"""
+    monkeypatch.setattr(dir_size_tracker, '_trackers', {})
+    tracker = dir_size_tracker.get_directory_size_tracker(str(tmp_path))
+    assert tracker.wait_ready(5)
+    data = b'y' * (STREAM_CHUNK_SIZE + 7)
+    
+    class Client:
+        async def stream_media(self, media, offset=0, limit=0):
+            for start in range(offset * STREAM_CHUNK_SIZE, len(data), STREAM_CHUNK_SIZE):
+                yield data[start:start + STREAM_CHUNK_SIZE]
+    
+    file_path = str(tmp_path / 'channel' / 'video.mp4')
+    asyncio.run(stream_media_to_file(Client(), 'file-id', file_path, len(data), file_unique_id='uid'))
+    assert tracker.total == len(data)
+    
+    data = data[:100]
+    asyncio.run(stream_media_to_file(Client(), 'file-id', file_path, len(data), file_unique_id='uid2'))
+    assert tracker.total == 100
+    assert tracker.total == scanned_total(tmp_path)
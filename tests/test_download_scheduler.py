@@ -0,0 +1,119 @@
+"""
+SizeAwareScheduler 测试
+"""
+
+import asyncio
+
+import pytest
+
+from src.utils.download_scheduler import (
+    LANE_LARGE, LANE_MEDIUM, LANE_SMALL, ORDER_NEWEST_FIRST, ORDER_OLDEST_FIRST, ORDER_SMALLEST_FIRST,
+    SizeAwareScheduler, timeout_for_size
+)
+
+MB = 1024 * 1024
+
+
+def test_classify_and_timeout():
+    """按大小分道，大小未知的任务归入中等文件通道"""
+    scheduler = SizeAwareScheduler(lambda: 4)
+    assert scheduler.classify(1 * MB) == LANE_SMALL
+    assert scheduler.classify(50 * MB) == LANE_MEDIUM
+    assert scheduler.classify(500 * MB) == LANE_LARGE
+    assert scheduler.classify(0) == LANE_MEDIUM
+    
+    assert timeout_for_size(0, unknown=90) == 90
+    assert timeout_for_size(128 * 1024 * 10, base=30, min_speed=128 * 1024) == 40
+
+
+@pytest.mark.parametrize('policy, expected', [
+    (ORDER_OLDEST_FIRST, [1, 2, 3]),
+    (ORDER_NEWEST_FIRST, [3, 2, 1]),
+    (ORDER_SMALLEST_FIRST, [2, 3, 1]),
+])
+def test_policy_order_within_lane(policy, expected):
+    """通道内按排序策略取出任务"""
+    async def run():
+        scheduler = SizeAwareScheduler(lambda: 1, policy=policy)
+        for message_id, size in ((1, 3 * MB), (2, 1 * MB), (3, 2 * MB)):
+            await scheduler.put(message_id, size, message_id)
+        order = []
+        for _ in expected:
+            item, lane, _ = await scheduler.get()
+            order.append(item)
+            scheduler.task_done(lane)
+        return order
+    
+    assert asyncio.run(run()) == expected
+
+
+def test_unknown_policy_falls_back():
+    """未知的排序策略使用默认策略"""
+    assert SizeAwareScheduler(lambda: 1, policy='random').policy == ORDER_OLDEST_FIRST
+
+
+def test_large_files_cannot_take_reserved_slots():
+    """大文件排在前面时，小文件仍能使用预留名额，并发总数不超过容量"""
+    async def run():
+        scheduler = SizeAwareScheduler(lambda: 5)
+        for message_id in range(1, 11):
+            await scheduler.put(f'large-{message_id}', 500 * MB, message_id)
+        await scheduler.put('small-100', 1 * MB, 100)
+        await scheduler.put('small-101', 1 * MB, 101)
+        
+        picked = [(await scheduler.get())[0] for _ in range(5)]
+        snapshot = scheduler.snapshot()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.get(), 0.05)
+        return picked, snapshot
+    
+    picked, snapshot = asyncio.run(run())
+    assert picked == ['small-100', 'large-1', 'large-2', 'large-3', 'small-101']
+    assert snapshot[LANE_LARGE] == {'pending': 7, 'active': 3}
+    assert snapshot[LANE_SMALL] == {'pending': 0, 'active': 2}
+
+
+def test_put_blocks_when_full_and_close_drains():
+    """缓冲已满时put等待，关闭后取完剩余任务get返回None"""
+    async def run():
+        scheduler = SizeAwareScheduler(lambda: 2, maxsize=2)
+        await scheduler.put('a', MB, 1)
+        await scheduler.put('b', MB, 2)
+        blocked = asyncio.ensure_future(scheduler.put('c', MB, 3))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        
+        item, lane, _ = await scheduler.get()
+        await asyncio.wait_for(blocked, 1)
+        scheduler.task_done(lane)
+        scheduler.close()
+        
+        remaining = []
+        while True:
+            entry = await scheduler.get()
+            if entry is None:
+                break
+            remaining.append(entry[0])
+            scheduler.task_done(entry[1])
+        return item, remaining
+    
+    assert asyncio.run(run()) == ('a', ['b', 'c'])
+
+
+def test_capacity_change_wakes_waiting_worker():
+    """容量增加后等待分派的工作协程被唤醒"""
+    async def run():
+        capacity = [1]
+        scheduler = SizeAwareScheduler(lambda: capacity[0])
+        await scheduler.put('a', MB, 1)
+        await scheduler.put('b', MB, 2)
+        await scheduler.get()
+        waiting = asyncio.ensure_future(scheduler.get())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        
+        capacity[0] = 2
+        scheduler.notify_capacity_changed()
+        return (await asyncio.wait_for(waiting, 1))[0]
+    
+    assert asyncio.run(run()) == 'b'
@@ -0,0 +1,49 @@
+"""
+批量转发状态查询测试
+"""
+
+import pytest
+
+from src.utils.database_manager import DatabaseManager
+
+SOURCE = '-1001000000001'
+TARGET_A = '-1001000000002'
+TARGET_B = '-1001000000003'
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'history.db'), write_flush_interval_ms=10)
+    yield manager
+    manager.close()
+
+
+def test_matrix_by_range(manager):
+    """按ID范围返回各目标频道已转发的消息，包括尚未写入数据库的记录"""
+    manager.add_forward_records([(SOURCE, msg_id, TARGET_A, None) for msg_id in (1, 2, 3, 10)])
+    manager.flush()
+    manager.add_forward_record(SOURCE, 5, TARGET_B)
+    
+    matrix = manager.get_forwarded_matrix(SOURCE, [TARGET_A, TARGET_B], start_id=2, end_id=9)
+    assert matrix == {TARGET_A: {2, 3}, TARGET_B: {5}}
+
+
+def test_matrix_by_ids(manager):
+    """指定消息ID列表时只返回列表中的ID"""
+    manager.add_forward_records([(SOURCE, msg_id, TARGET_A, None) for msg_id in range(1, 100)])
+    manager.flush()
+    
+    matrix = manager.get_forwarded_matrix(SOURCE, [TARGET_A, TARGET_B], message_ids=[5, 50, 500])
+    assert matrix == {TARGET_A: {5, 50}, TARGET_B: set()}
+    
+    # 与逐条查询的结果一致
+    for msg_id in (5, 50, 500):
+        assert (msg_id in matrix[TARGET_A]) == manager.is_message_forwarded(SOURCE, msg_id, TARGET_A)
+
+
+def test_matrix_empty_arguments(manager):
+    """没有目标频道或查询范围时返回空结果"""
+    manager.add_forward_record(SOURCE, 1, TARGET_A)
+    assert manager.get_forwarded_matrix(SOURCE, []) == {}
+    assert manager.get_forwarded_matrix(SOURCE, [TARGET_A]) == {TARGET_A: set()}
+    assert manager.get_forwarded_matrix(SOURCE, [TARGET_A], message_ids=[]) == {TARGET_A: set()}
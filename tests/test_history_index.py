@@ -0,0 +1,63 @@
+"""
+历史记录内存ID索引的并发读取测试
+"""
+
+import threading
+
+import pytest
+
+from src.utils.database_manager import DatabaseManager
+
+CHANNEL = '-1001000000001'
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'history.db'), write_flush_interval_ms=10)
+    yield manager
+    manager.close()
+
+
+def test_returned_index_is_a_snapshot(manager):
+    """get_downloaded_index返回的索引不随之后的记录变化"""
+    manager.add_download_record(CHANNEL, 1)
+    snapshot = manager.get_downloaded_index(CHANNEL)
+    manager.add_download_record(CHANNEL, 2)
+    
+    assert list(snapshot) == [1]
+    assert manager.is_message_downloaded(CHANNEL, 2)
+
+
+def test_reads_while_records_are_added(manager):
+    """并发添加记录时读取的结果始终有序且与索引副本一致"""
+    manager.get_downloaded_index(CHANNEL)
+    stop = threading.Event()
+    errors = []
+    
+    def writer():
+        try:
+            # 倒序插入，使有序数组在头部插入，分块键也逐个插入到有序列表前部
+            for chunk in range(20, 0, -1):
+                for low in range(3000, 0, -1):
+                    manager.add_download_record(CHANNEL, (chunk << 16) + low * 7)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+    
+    thread = threading.Thread(target=writer)
+    thread.start()
+    reads = 0
+    try:
+        while not stop.is_set() or reads < 3:
+            ids = list(manager.iter_downloaded_ids(CHANNEL, 0, 1 << 30))
+            assert all(a < b for a, b in zip(ids, ids[1:]))
+            snapshot = manager.get_downloaded_index(CHANNEL)
+            assert len(snapshot) == sum(1 for _ in snapshot)
+            assert snapshot.count_range(0, 1 << 30) == len(snapshot)
+            reads += 1
+    finally:
+        thread.join()
+    
+    assert not errors
+    assert len(manager.get_downloaded_index(CHANNEL)) == 20 * 3000
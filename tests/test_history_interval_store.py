@@ -0,0 +1,130 @@
+"""
+IntervalHistoryStore 测试
+"""
+
+import sqlite3
+
+import pytest
+
+from src.utils.history_interval_store import (
+    IntervalHistoryStore, KIND_DOWNLOAD, KIND_FORWARD, STORAGE_MODE_INTERVALS, STORAGE_MODE_ROWS, ids_to_runs
+)
+
+
+@pytest.fixture
+def store():
+    return IntervalHistoryStore()
+
+
+@pytest.fixture
+def conn(store):
+    connection = sqlite3.connect(':memory:')
+    store.create_schema(connection)
+    yield connection
+    connection.close()
+
+
+def test_ids_to_runs():
+    """无序且重复的ID压缩为有序闭区间"""
+    assert ids_to_runs([5, 1, 2, 3, 3, 9, 10]) == [(1, 3), (5, 5), (9, 10)]
+    assert ids_to_runs([]) == []
+
+
+def test_add_range_merges_adjacent_and_overlapping(store, conn):
+    """相邻和重叠的区间合并为一行，返回值只计新增的ID"""
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 1, 10) == 10
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 11, 20) == 10
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 5, 25) == 5
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 3, 8) == 0
+    assert store.get_intervals(conn, KIND_DOWNLOAD, 'a', '') == [(1, 25)]
+    
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 30, 40) == 11
+    assert store.add_range(conn, KIND_DOWNLOAD, 'a', '', 20, 35) == 4
+    assert store.get_intervals(conn, KIND_DOWNLOAD, 'a', '') == [(1, 40)]
+    assert store.count_ids(conn, KIND_DOWNLOAD) == 40
+
+
+def test_contains_and_truncated_range(store, conn):
+    """单点查询只命中区间内的ID，范围查询按范围截断"""
+    store.add_ids(conn, KIND_FORWARD, 'a', 'b', [1, 2, 3, 7, 8, 20])
+    
+    assert store.contains(conn, KIND_FORWARD, 'a', 'b', 2)
+    assert store.contains(conn, KIND_FORWARD, 'a', 'b', 8)
+    assert not store.contains(conn, KIND_FORWARD, 'a', 'b', 5)
+    assert not store.contains(conn, KIND_FORWARD, 'a', 'c', 2)
+    assert store.get_intervals(conn, KIND_FORWARD, 'a', 'b', 2, 7) == [(2, 3), (7, 7)]
+    assert store.get_targets(conn, KIND_FORWARD, 'a') == ['b']
+
+
+def test_rekey_merges_into_existing_key(store, conn):
+    """改写频道键后与新键已有的区间合并，下载记录的空目标保持不变"""
+    store.add_range(conn, KIND_DOWNLOAD, 'alias', '', 1, 10)
+    store.add_range(conn, KIND_DOWNLOAD, '-100', '', 11, 20)
+    store.add_range(conn, KIND_FORWARD, 'x', 'alias', 5, 6)
+    
+    store.rekey(conn, 'alias', '-100')
+    
+    assert store.get_intervals(conn, KIND_DOWNLOAD, '-100', '') == [(1, 20)]
+    assert store.get_intervals(conn, KIND_DOWNLOAD, 'alias', '') == []
+    assert store.get_intervals(conn, KIND_FORWARD, 'x', '-100') == [(5, 6)]
+
+
+def test_delete_older_than(store, conn):
+    """按区间的更新时间清理，返回删除的ID数量"""
+    store.add_range(conn, KIND_DOWNLOAD, 'a', '', 1, 10, updated_time='2020-01-01 00:00:00')
+    store.add_range(conn, KIND_DOWNLOAD, 'b', '', 1, 5)
+    
+    assert store.delete_older_than(conn, KIND_DOWNLOAD, '2021-01-01 00:00:00') == 10
+    assert store.get_intervals(conn, KIND_DOWNLOAD, 'a', '') == []
+    assert store.get_intervals(conn, KIND_DOWNLOAD, 'b', '') == [(1, 5)]
+
+
+def test_storage_mode(store, conn):
+    """未记录时为行存储模式"""
+    assert store.get_storage_mode(conn) == STORAGE_MODE_ROWS
+    store.set_storage_mode(conn, STORAGE_MODE_INTERVALS)
+    assert store.get_storage_mode(conn) == STORAGE_MODE_INTERVALS
+
+
+def test_id_counter_tracks_merge_rekey_and_delete(store, conn):
+    """消息ID数计数器随区间合并、改写和清理增减，与按区间求和的结果一致"""
+    def summed(kind):
+        return conn.execute(
+            'SELECT COALESCE(SUM(end_id - start_id + 1), 0) FROM history_intervals WHERE kind = ?', (kind,)
+        ).fetchone()[0]
+    
+    store.add_ids(conn, KIND_DOWNLOAD, 'alias', '', [1, 2, 3, 7, 8])
+    store.add_range(conn, KIND_DOWNLOAD, '-100', '', 5, 20, updated_time='2020-01-01 00:00:00')
+    store.add_range(conn, KIND_DOWNLOAD, 'alias', '', 4, 6)
+    store.add_range(conn, KIND_FORWARD, 'x', 'y', 1, 3)
+    assert store.count_ids(conn, KIND_DOWNLOAD) == summed(KIND_DOWNLOAD) == 8 + 16
+    
+    store.rekey(conn, 'alias', '-100')
+    assert store.get_intervals(conn, KIND_DOWNLOAD, '-100', '') == [(1, 20)]
+    assert store.count_ids(conn, KIND_DOWNLOAD) == summed(KIND_DOWNLOAD) == 20
+    
+    store.add_range(conn, KIND_DOWNLOAD, 'b', '', 1, 5, updated_time='2020-01-01 00:00:00')
+    store.delete_older_than(conn, KIND_DOWNLOAD, '2021-01-01 00:00:00')
+    assert store.count_ids(conn, KIND_DOWNLOAD) == summed(KIND_DOWNLOAD) == 20
+    assert store.count_ids(conn, KIND_FORWARD) == 3
+
+
+def test_id_counter_initialized_from_existing_intervals(store):
+    """已有区间的数据库首次创建计数器时按现有区间初始化"""
+    connection = sqlite3.connect(':memory:')
+    connection.execute('''
+        CREATE TABLE history_intervals (
+            kind TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL DEFAULT '',
+            start_id INTEGER NOT NULL, end_id INTEGER NOT NULL,
+            updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, source, target, start_id)
+        ) WITHOUT ROWID
+    ''')
+    connection.execute("INSERT INTO history_intervals (kind, source, target, start_id, end_id) VALUES ('forward', 'a', 'b', 1, 10)")
+    
+    store.create_schema(connection)
+    store.add_range(connection, KIND_FORWARD, 'a', 'b', 11, 15)
+    
+    assert store.count_ids(connection, KIND_FORWARD) == 15
+    assert store.count_ids(connection, KIND_DOWNLOAD) == 0
+    connection.close()
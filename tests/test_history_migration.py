@@ -0,0 +1,138 @@
+"""
+历史数据库v2表结构迁移和临时频道键改写测试
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from src.utils.database_manager import DatabaseManager
+from src.utils.history_schema import SCHEMA_V1, SCHEMA_V2, create_schema_v1, is_provisional_key
+
+
+@pytest.fixture
+def v1_db_path(tmp_path):
+    """只有旧版表结构的数据库文件"""
+    db_path = str(tmp_path / 'history.db')
+    conn = sqlite3.connect(db_path)
+    create_schema_v1(conn)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def open_manager():
+    managers = []
+    
+    def _open(db_path, **kwargs):
+        kwargs.setdefault('write_flush_interval_ms', 10)
+        manager = DatabaseManager(db_path, **kwargs)
+        managers.append(manager)
+        return manager
+    
+    yield _open
+    for manager in managers:
+        manager.close()
+
+
+def test_new_database_uses_v2(tmp_path, open_manager):
+    """新数据库直接使用v2表结构"""
+    db = open_manager(str(tmp_path / 'history.db'))
+    assert db.schema_version == SCHEMA_V2
+
+
+def test_migrate_v1_to_v2(v1_db_path, open_manager):
+    """迁移后已解析的标识符合并到数字ID，未解析的使用临时键，写缓冲中的记录不丢失"""
+    db = open_manager(v1_db_path)
+    assert db.schema_version == SCHEMA_V1
+    
+    db.add_download_record('@chan', 1)
+    db.add_download_record('-1001', 2)
+    db.add_forward_record('@chan', 10, '@other')
+    db.flush()
+    # 迁移开始时仍在写缓冲中的记录
+    db.add_download_record('@chan', 3)
+    
+    assert db.get_legacy_channel_identifiers().keys() >= {'@chan', '-1001', '@other'}
+    assert db.migrate_to_v2({'@chan': -1001}, vacuum=False)
+    assert db.schema_version == SCHEMA_V2
+    assert not db.migrate_to_v2({})
+    
+    assert sorted(db.get_downloaded_messages('-1001')) == [1, 2, 3]
+    assert sorted(db.get_downloaded_messages('@chan')) == [1, 2, 3]
+    assert db.is_message_forwarded('-1001', 10, '@other')
+    assert is_provisional_key(db._channel_key('@other'))
+    
+    # 重新打开后别名和记录仍然有效
+    db.close()
+    reopened = open_manager(v1_db_path)
+    assert reopened.schema_version == SCHEMA_V2
+    assert reopened.is_message_downloaded('@chan', 3)
+    assert reopened.is_message_forwarded('@chan', 10, '@other')
+
+
+def test_register_alias_rekeys_provisional_records(tmp_path, open_manager):
+    """临时键下的记录在解析出数字ID后改写到该ID，并与已有记录合并"""
+    db = open_manager(str(tmp_path / 'history.db'))
+    db.add_download_record('@late', 1)
+    db.add_forward_record('@late', 5, '-1009')
+    db.flush()
+    db.add_download_record('@late', 2)
+    db.add_download_record('-1002', 3)
+    assert db.is_message_downloaded('@late', 1)
+    assert is_provisional_key(db._channel_key('@late'))
+    
+    db.register_channel_alias('@late', -1002)
+    
+    assert db._channel_key('@late') == -1002
+    assert sorted(db.get_downloaded_messages('-1002')) == [1, 2, 3]
+    assert db.is_message_forwarded('-1002', 5, '-1009')
+    db.flush()
+    with sqlite3.connect(db.db_path) as conn:
+        keys = {row[0] for row in conn.execute('SELECT DISTINCT channel_id FROM download_history_v2')}
+    assert keys == {-1002}
+
+
+def test_rekey_via_async_manager_runs_off_caller(tmp_path, open_manager):
+    """解析回调立即返回，改写在数据库线程中完成"""
+    db = open_manager(str(tmp_path / 'history.db'))
+    db.add_download_record('@queued', 7)
+    async_db = db.get_async_manager()
+    
+    async_db.register_channel_alias_nowait('@queued', -1003)
+    # 排在改写之后的调用返回时改写已经完成
+    assert asyncio.run(async_db.is_message_downloaded('-1003', 7))
+
+
+def test_reads_do_not_register_aliases(tmp_path, open_manager):
+    """查询未见过的频道标识符不写入别名"""
+    db = open_manager(str(tmp_path / 'history.db'))
+    
+    assert not db.is_message_downloaded('@unseen', 1)
+    assert not db.is_message_forwarded('@unseen', 1, '@target')
+    assert len(db.get_downloaded_index('@unseen')) == 0
+    assert is_provisional_key(db._channel_key('@unseen'))
+    
+    assert db._alias_cache == {}
+    assert db._pending_aliases == {}
+    assert db._pending_count() == 0
+
+
+def test_record_alias_applied_with_write_buffer(tmp_path, open_manager):
+    """写入记录附带的数字频道ID排入写缓冲，提交时再改写临时键下的记录"""
+    db = open_manager(str(tmp_path / 'history.db'), write_flush_interval_ms=60000)
+    db.add_download_record('@late', 1)
+    db.flush()
+    
+    db.add_download_record('@late', 2, -1005)
+    # 改写尚未执行，记录仍在临时键下可见
+    assert db._pending_alias_registrations == {'@late': -1005}
+    assert is_provisional_key(db._channel_key('@late'))
+    assert sorted(db.get_downloaded_messages('@late')) == [1, 2]
+    
+    db.flush()
+    assert db._pending_alias_registrations == {}
+    assert db._channel_key('@late') == -1005
+    assert sorted(db.get_downloaded_messages('-1005')) == [1, 2]
@@ -0,0 +1,79 @@
+"""
+MessageIdBitmap 测试
+"""
+
+import random
+
+from src.utils.id_bitmap import MessageIdBitmap
+
+
+def test_add_and_contains():
+    """添加的ID可以查到，重复添加返回False"""
+    bitmap = MessageIdBitmap()
+    assert bitmap.add(5)
+    assert not bitmap.add(5)
+    assert 5 in bitmap
+    assert 6 not in bitmap
+    assert -1 not in bitmap
+    assert len(bitmap) == 1
+
+
+def test_matches_set_across_container_conversion():
+    """稀疏块转换为位图块前后与set的结果一致"""
+    rng = random.Random(1)
+    ids = {rng.randrange(0, 300000) for _ in range(20000)}
+    ids.update(range(70000, 80000))
+    bitmap = MessageIdBitmap(ids)
+    
+    assert len(bitmap) == len(ids)
+    assert list(bitmap) == sorted(ids)
+    for message_id in range(0, 300000, 7):
+        assert (message_id in bitmap) == (message_id in ids)
+
+
+def test_add_range_spanning_chunks():
+    """跨越多个分块的区间全部写入，已存在的ID不重复计数"""
+    bitmap = MessageIdBitmap([65535, 65536])
+    bitmap.add_range(65000, 200000)
+    
+    assert len(bitmap) == 200000 - 65000 + 1
+    assert 64999 not in bitmap
+    assert 65000 in bitmap
+    assert 200000 in bitmap
+    assert 200001 not in bitmap
+
+
+def test_iter_range_and_count_range():
+    """范围遍历按ID升序返回，统计结果与遍历一致"""
+    ids = [1, 3, 65535, 65536, 131072, 500000]
+    bitmap = MessageIdBitmap(ids)
+    
+    assert list(bitmap.iter_range(2, 131072)) == [3, 65535, 65536, 131072]
+    assert list(bitmap.iter_range(0, float('inf'))) == ids
+    assert list(bitmap.iter_range(10, 5)) == []
+    assert bitmap.count_range(0, 1 << 30) == len(ids)
+    assert bitmap.count_range(65535, 65536) == 2
+
+
+def test_empty_bitmap():
+    """空集合的遍历和统计"""
+    bitmap = MessageIdBitmap()
+    assert len(bitmap) == 0
+    assert list(bitmap.iter_range(0, 100)) == []
+    assert bitmap.count_range(0, 100) == 0
+
+
+def test_copy_is_independent():
+    """副本与原集合互不影响，包括稀疏块和位图块"""
+    bitmap = MessageIdBitmap([1, 2])
+    bitmap.add_range(70000, 80000)
+    clone = bitmap.copy()
+    
+    bitmap.add(3)
+    bitmap.add(200000)
+    clone.add(4)
+    
+    assert 3 not in clone and 200000 not in clone
+    assert 4 not in bitmap
+    assert len(clone) == 2 + 10001 + 1
+    assert list(clone.iter_range(0, 10)) == [1, 2, 4]
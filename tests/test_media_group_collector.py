@@ -0,0 +1,76 @@
+"""
+MediaGroupCollector 预过滤测试
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from src.modules.forward.media_group_collector import MediaGroupCollector
+from src.utils.message_metadata_store import deleted_metadata
+
+SOURCE_ID = -100
+PAIR = {'start_id': 1, 'end_id': 6}
+
+
+class FakeIterator:
+    """按范围返回未删除的消息，并记录按ID获取的消息"""
+    
+    def __init__(self, deleted_ids):
+        self.deleted_ids = set(deleted_ids)
+        self.fetched_ids = []
+    
+    async def iter_messages(self, chat_id, start_id, end_id):
+        for message_id in range(start_id, end_id + 1):
+            if message_id not in self.deleted_ids:
+                yield SimpleNamespace(id=message_id, media_group_id=None)
+    
+    async def iter_messages_by_ids(self, chat_id, message_ids):
+        self.fetched_ids.extend(message_ids)
+        for message_id in message_ids:
+            yield SimpleNamespace(id=message_id, media_group_id=None)
+
+
+class FakeFilter:
+    """不过滤任何消息"""
+    
+    def apply_all_filters(self, messages, pair):
+        return messages, [], {}
+    
+    def _extract_media_group_texts(self, messages):
+        return {}
+
+
+class FakeHistory:
+    """消息1、2已转发到所有目标频道，本地元数据记录消息4已删除"""
+    
+    def get_async_manager(self):
+        return self
+    
+    async def get_forwarded_matrix(self, source_channel, target_channels, start_id=None, end_id=None):
+        return {target: {1, 2} for target in target_channels}
+    
+    async def get_message_metadata(self, chat_id, start_id, end_id, max_age_days):
+        return {4: deleted_metadata(chat_id, 4)}
+
+
+def make_collector():
+    iterator = FakeIterator(deleted_ids=[4])
+    return iterator, MediaGroupCollector(iterator, FakeFilter())
+
+
+def test_pending_ids_skip_forwarded_and_deleted():
+    """已转发到所有目标频道和已知已删除的ID都不需要处理"""
+    _, collector = make_collector()
+    pending = asyncio.run(collector._pending_message_ids(SOURCE_ID, 1, 6, 'source', ['a', 'b'], FakeHistory()))
+    assert pending == [3, 5, 6]
+
+
+def test_both_collection_paths_prune_deleted_ids():
+    """按消息和按消息ID收集媒体组时都跳过已删除的消息"""
+    iterator, collector = make_collector()
+    groups, _ = asyncio.run(collector.get_media_groups_optimized(SOURCE_ID, 'source', ['a'], PAIR, FakeHistory()))
+    assert iterator.fetched_ids == [3, 5, 6]
+    assert sorted(groups) == ['single_3', 'single_5', 'single_6']
+    
+    info, _ = asyncio.run(collector.get_media_groups_info_optimized(SOURCE_ID, 'source', ['a'], PAIR, FakeHistory()))
+    assert info == [('single_3', [3]), ('single_5', [5]), ('single_6', [6])]
@@ -0,0 +1,208 @@
+"""
+大文件并行分片上传测试
+"""
+
+import asyncio
+
+import pytest
+from pyrogram import raw
+
+from src.utils import parallel_upload
+from src.utils.parallel_upload import enable_parallel_upload, parallel_save_file, set_max_upload_sessions
+
+
+class FakeSession:
+    """记录收到的分片请求，按 fail_parts 指定的次数让分片失败"""
+    
+    instances = []
+    fail_parts = {}
+    open_count = 0
+    max_open = 0
+    
+    def __init__(self, client, dc_id, auth_key, test_mode, is_media=False):
+        self.is_media = is_media
+        self.started = False
+        self.stopped = False
+        self.requests = []
+        FakeSession.instances.append(self)
+    
+    async def start(self):
+        self.started = True
+        FakeSession.open_count += 1
+        FakeSession.max_open = max(FakeSession.max_open, FakeSession.open_count)
+    
+    async def stop(self):
+        self.stopped = True
+        FakeSession.open_count -= 1
+    
+    async def invoke(self, request):
+        await asyncio.sleep(0)
+        remaining = FakeSession.fail_parts.get(request.file_part, 0)
+        if remaining:
+            FakeSession.fail_parts[request.file_part] = remaining - 1
+            raise OSError(f"part {request.file_part} failed")
+        self.requests.append(request)
+        return True
+
+
+class FakeStorage:
+    async def dc_id(self):
+        return 2
+    
+    async def auth_key(self):
+        return b'key'
+    
+    async def test_mode(self):
+        return False
+
+
+class FakeClient:
+    """原有save_file只记录调用"""
+    
+    def __init__(self):
+        self.storage = FakeStorage()
+        self.original_calls = []
+    
+    async def save_file(self, path, file_id=None, file_part=0, progress=None, progress_args=()):
+        self.original_calls.append(path)
+        return 'original'
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    """使用很小的分片和大文件阈值，并去掉重试延迟"""
+    FakeSession.instances = []
+    FakeSession.fail_parts = {}
+    FakeSession.open_count = 0
+    FakeSession.max_open = 0
+    monkeypatch.setattr(parallel_upload, 'Session', FakeSession)
+    monkeypatch.setattr(parallel_upload, 'UPLOAD_PART_SIZE', 4)
+    monkeypatch.setattr(parallel_upload, 'BIG_FILE_SIZE', 20)
+    monkeypatch.setattr(parallel_upload, 'PART_RETRY_BASE_DELAY', 0)
+
+
+def uploaded_parts():
+    """所有会话收到的 (分片序号, 数据)"""
+    return sorted((request.file_part, request.bytes) for session in FakeSession.instances for request in session.requests)
+
+
+def test_big_file_uploads_every_part(tmp_path):
+    """大文件的每个分片都通过媒体会话上传一次，完成后关闭所有会话"""
+    path = tmp_path / 'big.bin'
+    path.write_bytes(b'0123456789abcdefghijklmnopqrstuvwxyz')
+    progress = []
+    
+    result = asyncio.run(parallel_save_file(
+        FakeClient(), str(path), parts_in_flight=4, sessions=2,
+        progress=lambda current, total: progress.append((current, total))
+    ))
+    
+    assert isinstance(result, raw.types.InputFileBig)
+    assert result.parts == 9
+    assert uploaded_parts() == [(i, path.read_bytes()[i * 4:i * 4 + 4]) for i in range(9)]
+    assert all(isinstance(request, raw.functions.upload.SaveBigFilePart)
+               for session in FakeSession.instances for request in session.requests)
+    assert len(FakeSession.instances) == 2
+    assert all(session.is_media and session.started and session.stopped for session in FakeSession.instances)
+    assert progress[-1] == (36, 36)
+
+
+def test_small_file_uses_save_file_part(tmp_path):
+    """不超过大文件阈值的文件使用 SaveFilePart"""
+    path = tmp_path / 'small.bin'
+    path.write_bytes(b'0123456789')
+    
+    result = asyncio.run(parallel_save_file(FakeClient(), str(path), parts_in_flight=8, sessions=8))
+    
+    assert isinstance(result, raw.types.InputFile)
+    assert result.parts == 3
+    assert [part for part, _ in uploaded_parts()] == [0, 1, 2]
+    assert all(isinstance(request, raw.functions.upload.SaveFilePart)
+               for session in FakeSession.instances for request in session.requests)
+    # 会话数不超过分片数
+    assert len(FakeSession.instances) == 3
+
+
+def test_failed_part_is_retried(tmp_path):
+    """失败的分片单独重试"""
+    path = tmp_path / 'retry.bin'
+    path.write_bytes(b'0123456789abcdefghijklmnopqrstuvwxyz')
+    FakeSession.fail_parts = {3: 2}
+    
+    asyncio.run(parallel_save_file(FakeClient(), str(path), parts_in_flight=4, sessions=2, max_retries=2))
+    
+    assert [part for part, _ in uploaded_parts()] == list(range(9))
+
+
+def test_exhausted_retries_raise_and_close_sessions(tmp_path):
+    """分片重试耗尽时抛出错误并关闭所有会话"""
+    path = tmp_path / 'fail.bin'
+    path.write_bytes(b'0123456789abcdefghijklmnopqrstuvwxyz')
+    FakeSession.fail_parts = {3: 10}
+    
+    with pytest.raises(OSError):
+        asyncio.run(parallel_save_file(FakeClient(), str(path), parts_in_flight=4, sessions=2, max_retries=1))
+    
+    assert FakeSession.instances
+    assert all(session.stopped for session in FakeSession.instances)
+
+
+def test_empty_file_rejected(tmp_path):
+    """空文件不能上传"""
+    path = tmp_path / 'empty.bin'
+    path.write_bytes(b'')
+    
+    with pytest.raises(ValueError):
+        asyncio.run(parallel_save_file(FakeClient(), str(path)))
+    assert FakeSession.instances == []
+
+
+def test_enable_parallel_upload_threshold(tmp_path):
+    """只有超过阈值的本地文件走并行上传，关闭后恢复原有实现"""
+    client = FakeClient()
+    small = tmp_path / 'small.bin'
+    small.write_bytes(b'x' * 10)
+    large = tmp_path / 'large.bin'
+    large.write_bytes(b'x' * 40)
+    
+    assert enable_parallel_upload(client, parts_in_flight=4, threshold=30, sessions=2)
+    
+    async def run():
+        return (
+            await client.save_file(str(small)),
+            await client.save_file(str(large)),
+            await client.save_file(str(large), file_id=1, file_part=2)
+        )
+    
+    small_result, large_result, resumed_result = asyncio.run(run())
+    assert small_result == 'original'
+    assert isinstance(large_result, raw.types.InputFileBig)
+    assert resumed_result == 'original'
+    assert client.original_calls == [str(small), str(large)]
+    
+    # 重复调用只更新设置，小于2个在途分片时关闭
+    assert not enable_parallel_upload(client, parts_in_flight=1)
+    assert asyncio.run(client.save_file(str(large))) == 'original'
+    assert client.original_calls == [str(small), str(large), str(large)]
+
+
+def test_open_sessions_capped_across_uploads(tmp_path):
+    """同时上传多个文件时打开的媒体会话总数不超过客户端上限，每个文件至少使用一个会话"""
+    client = FakeClient()
+    set_max_upload_sessions(client, 3)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f'file{i}.bin'
+        path.write_bytes(bytes([i]) * 36)
+        paths.append(path)
+    
+    async def run():
+        return await asyncio.gather(*(
+            parallel_save_file(client, str(path), parts_in_flight=4, sessions=4) for path in paths
+        ))
+    
+    results = asyncio.run(run())
+    assert all(result.parts == 9 for result in results)
+    assert FakeSession.max_open == 3
+    assert FakeSession.open_count == 0
+    assert len(uploaded_parts()) == 5 * 9
@@ -0,0 +1,184 @@
+"""
+流式下载断点续传和分段并行下载测试
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from src.utils.stream_download import (
+    PART_SUFFIX, STATE_SUFFIX, STREAM_CHUNK_SIZE, RangeFileWriter, load_partial_state,
+    parallel_stream_media_to_file, split_chunk_ranges, stream_media_to_file
+)
+
+CHUNK = STREAM_CHUNK_SIZE
+
+
+def make_data(chunks, tail=0):
+    """生成每个数据块内容不同的测试数据"""
+    return b''.join(bytes([index % 251]) * CHUNK for index in range(chunks)) + b'\xff' * tail
+
+
+class FakeStreamClient:
+    """按数据块返回文件内容，记录每次请求的 (offset, limit)"""
+    
+    def __init__(self, data, fail_at=None, delays=None):
+        self.data = data
+        self.requests = []
+        # 数据块序号 -> 返回该块前抛出的异常，只抛出一次
+        self.fail_at = dict(fail_at or {})
+        # 请求的起始块 -> 每块之前的等待时间
+        self.delays = delays or {}
+    
+    async def stream_media(self, media, offset=0, limit=0):
+        self.requests.append((offset, limit))
+        chunk_no = offset
+        while chunk_no * CHUNK < len(self.data) and (not limit or chunk_no < offset + limit):
+            await asyncio.sleep(self.delays.get(offset, 0))
+            error = self.fail_at.pop(chunk_no, None)
+            if error is not None:
+                raise error
+            yield self.data[chunk_no * CHUNK:(chunk_no + 1) * CHUNK]
+            chunk_no += 1
+
+
+def write_partial(file_path, content, state):
+    """写入未完成下载的 .part 文件和状态文件"""
+    part_path = f"{file_path}{PART_SUFFIX}"
+    with open(part_path, 'wb') as f:
+        f.write(content)
+    with open(f"{part_path}{STATE_SUFFIX}", 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def assert_no_partial(file_path):
+    assert not os.path.exists(f"{file_path}{PART_SUFFIX}")
+    assert not os.path.exists(f"{file_path}{PART_SUFFIX}{STATE_SUFFIX}")
+
+
+def test_resume_truncates_part_file_to_checkpoint(tmp_path):
+    """.part 文件比断点长时截断到断点，从断点所在的数据块继续下载"""
+    data = make_data(3, tail=100)
+    file_path = str(tmp_path / 'video.mp4')
+    # 断点之后还写入了半个数据块，进程随即中断
+    write_partial(file_path, data[:CHUNK + CHUNK // 2],
+                  {'file_unique_id': 'uid', 'expected_size': len(data), 'offset': CHUNK})
+    client = FakeStreamClient(data)
+    
+    size = asyncio.run(stream_media_to_file(client, 'file-id', file_path, len(data), file_unique_id='uid'))
+    
+    assert size == len(data)
+    assert client.requests == [(1, 0)]
+    assert read(file_path) == data
+    assert_no_partial(file_path)
+
+
+def test_part_file_shorter_than_checkpoint_restarts(tmp_path):
+    """.part 文件比断点短或文件唯一ID不符时从头下载"""
+    data = make_data(2, tail=10)
+    file_path = str(tmp_path / 'video.mp4')
+    write_partial(file_path, data[:CHUNK // 2],
+                  {'file_unique_id': 'uid', 'expected_size': len(data), 'offset': CHUNK})
+    client = FakeStreamClient(data)
+    asyncio.run(stream_media_to_file(client, 'file-id', file_path, len(data), file_unique_id='uid'))
+    assert client.requests == [(0, 0)]
+    assert read(file_path) == data
+    
+    write_partial(file_path, data[:CHUNK], {'file_unique_id': 'other', 'expected_size': len(data), 'offset': CHUNK})
+    client = FakeStreamClient(data)
+    asyncio.run(stream_media_to_file(client, 'file-id', file_path, len(data), file_unique_id='uid'))
+    assert client.requests == [(0, 0)]
+
+
+def test_interrupted_stream_keeps_checkpoint(tmp_path):
+    """下载中断时保留断点，再次下载只请求剩余的数据块"""
+    data = make_data(10)
+    file_path = str(tmp_path / 'video.mp4')
+    client = FakeStreamClient(data, fail_at={9: ConnectionError('reset')})
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(stream_media_to_file(client, 'file-id', file_path, len(data), file_unique_id='uid'))
+    assert load_partial_state(file_path)['offset'] == 9 * CHUNK
+    
+    asyncio.run(stream_media_to_file(client, 'file-id', file_path, len(data), file_unique_id='uid'))
+    assert client.requests[-1] == (9, 0)
+    assert read(file_path) == data
+
+
+def test_range_writer_out_of_order_completion(tmp_path):
+    """区间按任意顺序完成时按位置写入，断点的连续偏移停在第一个未完成的区间"""
+    data = make_data(6, tail=10)
+    file_path = str(tmp_path / 'video.mp4')
+    ranges = split_chunk_ranges(0, 7, 3)
+    assert ranges == [[0, 3], [3, 5], [5, 7]]
+    
+    async def run():
+        writer = RangeFileWriter(file_path, len(data), ranges, 'uid', checkpoint_chunks=1)
+        order = [(2, 5), (2, 6), (1, 3), (0, 0), (1, 4), (0, 1)]
+        for index, chunk_no in order:
+            await writer.write(index, chunk_no, data[chunk_no * CHUNK:(chunk_no + 1) * CHUNK])
+        state = load_partial_state(file_path)
+        assert state['ranges'] == [[2, 3], [5, 5], [7, 7]]
+        assert state['offset'] == 2 * CHUNK
+        await writer.write(0, 2, data[2 * CHUNK:3 * CHUNK])
+        return await writer.finish()
+    
+    assert asyncio.run(run()) == len(data)
+    assert read(file_path) == data
+    assert_no_partial(file_path)
+
+
+def test_parallel_ranges_finish_out_of_order(tmp_path):
+    """靠后的区间先完成时文件内容仍然正确"""
+    data = make_data(8, tail=1)
+    file_path = str(tmp_path / 'video.mp4')
+    client = FakeStreamClient(data, delays={0: 0.02, 3: 0.01})
+    
+    size = asyncio.run(parallel_stream_media_to_file(client, 'file-id', file_path, len(data), parts=3,
+                                                     file_unique_id='uid'))
+    
+    assert size == len(data)
+    assert sorted(client.requests) == [(0, 3), (3, 3), (6, 3)]
+    assert read(file_path) == data
+
+
+def test_failed_range_is_retried_from_its_checkpoint(tmp_path):
+    """某个区间失败时其余区间停止并保留各自进度，重试时每个区间从自己的断点继续"""
+    data = make_data(8, tail=1)
+    file_path = str(tmp_path / 'video.mp4')
+    client = FakeStreamClient(data, fail_at={4: ConnectionError('reset')})
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(parallel_stream_media_to_file(client, 'file-id', file_path, len(data), parts=3,
+                                                  file_unique_id='uid'))
+    state = load_partial_state(file_path)
+    assert state['ranges'][1] == [4, 6]
+    remaining = sorted((start, end - start) for start, end in state['ranges'] if start < end)
+    
+    client.requests.clear()
+    asyncio.run(parallel_stream_media_to_file(client, 'file-id', file_path, len(data), parts=3,
+                                              file_unique_id='uid'))
+    # 失败的区间从数据块4继续，其他区间只请求尚未完成的部分
+    assert sorted(client.requests) == remaining
+    assert read(file_path) == data
+    assert_no_partial(file_path)
+
+
+def test_failed_range_without_unique_id_cleans_up(tmp_path):
+    """不支持续传时区间失败后删除 .part 文件"""
+    data = make_data(6)
+    file_path = str(tmp_path / 'video.mp4')
+    client = FakeStreamClient(data, fail_at={2: ConnectionError('reset')})
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(parallel_stream_media_to_file(client, 'file-id', file_path, len(data), parts=2))
+    
+    assert_no_partial(file_path)
+    assert not os.path.exists(file_path)
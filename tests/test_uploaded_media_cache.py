@@ -0,0 +1,184 @@
+"""
+已上传媒体file_id缓存测试
+"""
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from types import SimpleNamespace
+
+from pyrogram.errors import FileReferenceExpired
+
+from src.utils.database_manager import DatabaseManager
+from src.utils.uploaded_media_cache import UploadedMediaStore, message_file_id
+
+def test_message_file_id():
+    """按优先级提取消息媒体的file_id，没有媒体时返回None"""
+    message = SimpleNamespace(
+        photo=None,
+        video=SimpleNamespace(file_id='video-id', file_unique_id='video-unique'),
+        document=SimpleNamespace(file_id='document-id', file_unique_id=None)
+    )
+    assert message_file_id(message) == ('video', 'video-id', 'video-unique')
+    assert message_file_id(SimpleNamespace(text='hello')) is None
+    assert message_file_id(SimpleNamespace(video=SimpleNamespace(file_id=''))) is None
+
+
+def test_uploaded_media_store():
+    """记录、覆盖和删除内容对应的file_id"""
+    store = UploadedMediaStore()
+    conn = sqlite3.connect(':memory:')
+    store.create_schema(conn)
+    assert store.get(conn, 'hash') is None
+    
+    store.put(conn, 'hash', 'video', 'old-id')
+    store.put(conn, 'hash', 'document', 'new-id', 'unique')
+    assert store.get(conn, 'hash') == ('document', 'new-id')
+    
+    store.remove(conn, 'hash')
+    assert store.get(conn, 'hash') is None
+
+
+def test_database_manager_uploaded_media(tmp_path):
+    """数据库管理器上的file_id缓存在重新打开后仍然可用"""
+    db_path = str(tmp_path / 'history.db')
+    manager = DatabaseManager(db_path)
+    try:
+        manager.set_uploaded_media('hash', 'photo', 'photo-id', 'photo-unique')
+    finally:
+        manager.close()
+    
+    manager = DatabaseManager(db_path)
+    try:
+        assert manager.get_uploaded_media('hash') == ('photo', 'photo-id')
+        manager.remove_uploaded_media('hash')
+        assert manager.get_uploaded_media('hash') is None
+    finally:
+        manager.close()
+
+
+def test_cached_file_id_requires_same_media_type(make_uploader):
+    """只有媒体类型相同时才使用缓存的file_id"""
+    uploader = make_uploader(media={'hash': ('video', 'video-id')})
+    
+    async def run():
+        return (
+            await uploader._get_cached_file_id('hash', 'video'),
+            await uploader._get_cached_file_id('hash', 'document'),
+            await uploader._get_cached_file_id(None, 'video')
+        )
+    
+    assert asyncio.run(run()) == ('video-id', None, None)
+
+
+def test_send_with_valid_file_id(make_uploader):
+    """file_id有效时不上传文件数据"""
+    uploader = make_uploader(media={'hash': ('video', 'video-id')})
+    sent = []
+    
+    async def send(source):
+        sent.append(source)
+        return source
+    
+    result = asyncio.run(uploader._send_with_file_id(send, Path('a.mp4'), 'hash', 'video-id'))
+    assert result == 'video-id'
+    assert sent == ['video-id']
+
+
+class FakeVideoProcessor:
+    """返回固定缩略图和视频尺寸"""
+    
+    def __init__(self, thumb):
+        self.thumb = thumb
+        self.calls = []
+    
+    async def extract_thumbnail_async(self, path):
+        self.calls.append(path)
+        return self.thumb, 640, 360, 12.5
+
+
+class FakeSendClient:
+    """以file_id发送时抛出FileReferenceExpired，以文件路径发送时记录参数"""
+    
+    def __init__(self):
+        self.sent = []
+        self.group_attempts = []
+    
+    async def save_file(self, path, file_id=None, file_part=0, progress=None, progress_args=()):
+        return None
+    
+    async def send_video(self, chat_id, video, **kwargs):
+        self.sent.append((video, kwargs))
+        if not video.endswith('.mp4'):
+            raise FileReferenceExpired()
+        return SimpleNamespace(video=SimpleNamespace(file_id='new-video-id', file_unique_id='unique'))
+    
+    async def send_media_group(self, chat_id, media):
+        self.group_attempts.append([vars(item).copy() for item in media])
+        if any(not item.media.endswith(('.mp4', '.jpg')) for item in media):
+            raise FileReferenceExpired()
+        return [SimpleNamespace() for _ in media]
+
+
+def test_send_with_expired_file_id_falls_back_to_upload(tmp_path, make_uploader):
+    """file_id失效时删除缓存并改为上传文件，上传时生成缩略图和视频尺寸，本次运行中不再使用该file_id"""
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(b'video data')
+    thumb = tmp_path / 'clip_thumb.jpg'
+    thumb.write_bytes(b'thumb')
+    client = FakeSendClient()
+    uploader = make_uploader(client=client)
+    uploader.video_processor = FakeVideoProcessor(str(thumb))
+    history = uploader.async_history_manager
+    
+    async def run():
+        # 相同内容之前以file_id上传过
+        file_hash = await uploader._compute_file_hash(path)
+        await history.add_content_fingerprint(await uploader._get_quick_key(path), file_hash)
+        history.media[file_hash] = ('video', 'video-id')
+        return file_hash, await uploader._upload_single_file_with_message(path, -100)
+    
+    file_hash, (success, actually_uploaded, message) = asyncio.run(run())
+    assert success and actually_uploaded
+    assert [video for video, _ in client.sent] == ['video-id', str(path)]
+    
+    # 以file_id发送时不生成缩略图，改为上传文件时补上
+    by_id, by_file = client.sent[0][1], client.sent[1][1]
+    assert by_id['thumb'] is None and by_id['width'] is None
+    assert (by_file['thumb'], by_file['width'], by_file['height'], by_file['duration']) == (str(thumb), 640, 360, 12)
+    assert uploader.video_processor.calls == [str(path)]
+    
+    assert uploader._invalid_file_ids == {'video-id'}
+    assert history.media[file_hash] == ('video', 'new-video-id')
+    assert not thumb.exists()
+
+
+def test_media_group_fallback_generates_video_attributes(tmp_path, make_uploader):
+    """媒体组中缓存的file_id失效时全部改为上传文件，视频补上缩略图和尺寸"""
+    from src.modules.uploader import InputMediaPhoto, InputMediaVideo
+    
+    video_file = tmp_path / 'clip.mp4'
+    photo_file = tmp_path / 'photo.jpg'
+    thumb = tmp_path / 'clip_thumb.jpg'
+    client = FakeSendClient()
+    uploader = make_uploader(client=client, media={'video-hash': ('video', 'video-id'),
+                                                   'photo-hash': ('photo', 'photo-id')})
+    uploader.video_processor = FakeVideoProcessor(str(thumb))
+    video = InputMediaVideo(media='video-id', thumb=None, supports_streaming=True, width=None, height=None, duration=None)
+    photo = InputMediaPhoto(media='photo-id')
+    cached_media = [(video, video_file), (photo, photo_file)]
+    file_hashes = {str(video_file): 'video-hash', str(photo_file): 'photo-hash'}
+    thumbnails = []
+    
+    messages = asyncio.run(uploader._send_media_group(-100, [video, photo], cached_media, file_hashes, thumbnails))
+    
+    assert len(messages) == 2
+    assert len(client.group_attempts) == 2
+    resent_video, resent_photo = client.group_attempts[1]
+    assert resent_video['media'] == str(video_file)
+    assert (resent_video['thumb'], resent_video['width'], resent_video['height'], resent_video['duration']) == \
+        (str(thumb), 640, 360, 12)
+    assert resent_photo['media'] == str(photo_file)
+    assert thumbnails == [str(thumb)]
+    assert uploader._invalid_file_ids == {'video-id', 'photo-id'}
+    assert uploader.async_history_manager.media == {}